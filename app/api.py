@@ -0,0 +1,328 @@
+"""
+API HTTP JSON sobre `app.crud` para integraciones.
+
+Es opcional: requiere `starlette` y, para servirla, `uvicorn`
+(pip install -e .[api]). Recursos: empleados, herramientas y prestamos.
+
+    GET  /{recurso}?despues=<id>&limite=<n>    Página por clave: ids mayores que `despues`
+    GET  /{recurso}/{id}                       Una fila
+    POST /{recurso}                            Crear (cuerpo: argumentos de create_*)
+                                               Con Idempotency-Key, un reintento devuelve la fila ya creada
+    POST /{recurso}/lote                       Crear varias filas en una petición
+    POST /prestamos/{id}/devolucion            Devolver un préstamo
+    POST /prestamos/devoluciones               Devolver varios préstamos ({"ids": [...]})
+    GET  /cambios?desde=<secuencia>&limite=<n> Cambios confirmados (ver app.crud.auditoria)
+
+`limite` va de 1 a LIMITE_MAXIMO y `despues`/`desde` no pueden ser
+negativos; un valor fuera de rango recibe `400`.
+
+Las lecturas llevan un ETag derivado de la versión de las filas (la secuencia
+de su último cambio en el registro de auditoría) y, para una fila, la fecha
+de ese cambio como Last-Modified. Una petición con If-None-Match (o
+If-Modified-Since) que coincide recibe `304 Not Modified` sin cuerpo.
+
+Uso:
+    python -m app.api --host 127.0.0.1 --port 8000
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, NamedTuple, get_args
+
+from sqlmodel import Session, SQLModel
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from app.crud import (
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_cambios_desde,
+    get_empleado_by_id,
+    get_empleados,
+    get_eventos_auditoria,
+    get_herramienta_by_id,
+    get_herramientas,
+    get_prestamo_by_id,
+    get_prestamos,
+    get_versiones,
+)
+from app.crud.concurrencia import ConflictoVersion
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+
+
+class Recurso(NamedTuple):
+    entidad: str
+    modelo: type[SQLModel]
+    clave: str
+    listar: Callable
+    obtener: Callable
+    crear: Callable
+
+
+RECURSOS = {
+    "empleados": Recurso("empleado", Empleado, "id", get_empleados, get_empleado_by_id, create_empleado),
+    "herramientas": Recurso(
+        "herramienta", Herramienta, "id_herramienta", get_herramientas, get_herramienta_by_id, create_herramienta
+    ),
+    "prestamos": Recurso("prestamo", Prestamo, "id_prestamo", get_prestamos, get_prestamo_by_id, create_prestamo),
+}
+
+LIMITE_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+# Filas por petición en las operaciones en lote
+LOTE_MAXIMO = 1000
+
+
+def _recurso(request) -> Recurso:
+    recurso = RECURSOS.get(request.path_params["recurso"])
+    if recurso is None:
+        raise HTTPException(404, "Recurso no encontrado")
+    return recurso
+
+
+def _entero(params, nombre: str, defecto: int | None, minimo: int = 0, maximo: int | None = None) -> int | None:
+    """Leer un parámetro entero de la consulta; fuera de [minimo, maximo] es un 400"""
+    valor = params.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise HTTPException(400, f"Parámetro inválido: {nombre}")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        rango = f"entre {minimo} y {maximo}" if maximo is not None else f"mayor o igual a {minimo}"
+        raise HTTPException(400, f"Parámetro inválido: {nombre} debe estar {rango}")
+    return numero
+
+
+def _argumentos(modelo, datos) -> dict:
+    """Argumentos de create_* a partir del cuerpo JSON (las fechas llegan en ISO 8601)"""
+    if not isinstance(datos, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    argumentos = {}
+    for campo, valor in datos.items():
+        info = modelo.model_fields.get(campo)
+        if isinstance(valor, str) and info is not None and datetime in (info.annotation, *get_args(info.annotation)):
+            valor = datetime.fromisoformat(valor)
+        argumentos[campo] = valor
+    return argumentos
+
+
+def _coincide_etag(headers, etag: str) -> bool:
+    cabecera = headers.get("if-none-match")
+    if cabecera is None:
+        return False
+    etiquetas = {etiqueta.strip().removeprefix("W/") for etiqueta in cabecera.split(",")}
+    return "*" in etiquetas or etag in etiquetas
+
+
+def _no_modificado_desde(headers, fecha: datetime | None) -> bool:
+    # If-Modified-Since solo se usa si la petición no trae If-None-Match
+    cabecera = headers.get("if-modified-since")
+    if cabecera is None or fecha is None or "if-none-match" in headers:
+        return False
+    try:
+        return fecha.replace(microsecond=0) <= parsedate_to_datetime(cabecera)
+    except (TypeError, ValueError):
+        return False
+
+
+def _respuesta(contenido, headers, etag: str, modificado: datetime | None = None) -> Response:
+    """Respuesta JSON con validadores, o 304 si el cliente ya tiene esta versión"""
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modificado is not None:
+        modificado = modificado.astimezone(timezone.utc)
+        cabeceras["Last-Modified"] = format_datetime(modificado, usegmt=True)
+    if _coincide_etag(headers, etag) or _no_modificado_desde(headers, modificado):
+        return Response(status_code=304, headers=cabeceras)
+    return JSONResponse(contenido() if callable(contenido) else contenido, headers=cabeceras)
+
+
+def listar(engine, recurso: Recurso, params, headers) -> Response:
+    """Página por clave; el ETag cubre los ids de la página y sus versiones"""
+    despues = _entero(params, "despues", 0)
+    limite = _entero(params, "limite", LIMITE_DEFECTO, 1, LIMITE_MAXIMO)
+    with Session(engine) as session:
+        filas = recurso.listar(session, limit=limite, despues=despues)
+        ids = [getattr(fila, recurso.clave) for fila in filas]
+        versiones = get_versiones(session, recurso.entidad, ids)
+    huella = hashlib.blake2b(
+        repr((despues, limite, [(id_, versiones.get(id_, 0)) for id_ in ids])).encode(), digest_size=12
+    ).hexdigest()
+    # El cuerpo solo se serializa si el cliente no tiene ya esta página
+    return _respuesta(
+        lambda: {
+            "items": [fila.model_dump(mode="json") for fila in filas],
+            "siguiente": ids[-1] if len(ids) == limite else None,
+        },
+        headers,
+        f'"{recurso.entidad}s-{huella}"',
+    )
+
+
+def obtener(engine, recurso: Recurso, id_: int, headers) -> Response:
+    with Session(engine) as session:
+        fila = recurso.obtener(session, id_)
+        if fila is None:
+            return JSONResponse({"error": "No encontrado"}, status_code=404)
+        ultimo = get_eventos_auditoria(session, recurso.entidad, id_, limit=1)
+    version = ultimo[0].secuencia if ultimo else 0
+    return _respuesta(
+        lambda: fila.model_dump(mode="json"),
+        headers,
+        f'"{recurso.entidad}-{id_}-{version}"',
+        ultimo[0].fecha if ultimo else None,
+    )
+
+
+def _crear(session, recurso: Recurso, datos, clave: str | None = None) -> tuple[int, dict]:
+    """Crear una fila. Retorna (código HTTP, cuerpo)"""
+    try:
+        fila = recurso.crear(session, **_argumentos(recurso.modelo, datos), clave_idempotencia=clave)
+    except (TypeError, ValueError) as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        return 409, {"error": str(e)}
+    if fila is None:
+        # create_prestamo: sin stock, herramienta inactiva o choque con una reserva
+        return 409, {"error": "No se pudo crear: sin unidades disponibles"}
+    return 201, fila.model_dump(mode="json")
+
+
+def crear(engine, recurso: Recurso, datos, clave: str | None = None) -> Response:
+    with Session(engine) as session:
+        estado, cuerpo = _crear(session, recurso, datos, clave)
+    return JSONResponse(cuerpo, status_code=estado)
+
+
+def crear_lote(engine, recurso: Recurso, datos) -> Response:
+    """Crear varias filas con una sesión; cada una informa su propio resultado"""
+    if not isinstance(datos, list) or len(datos) > LOTE_MAXIMO:
+        return JSONResponse({"error": f"Se esperaba una lista de hasta {LOTE_MAXIMO} objetos"}, status_code=400)
+    with Session(engine) as session:
+        resultados = [_crear(session, recurso, item) for item in datos]
+    return JSONResponse([{"estado": estado, "item": cuerpo} for estado, cuerpo in resultados])
+
+
+def _devolver(session, prestamo_id: int) -> tuple[int, dict]:
+    try:
+        if not devolver_prestamo(session, prestamo_id):
+            return 404, {"error": "No encontrado"}
+    except ConflictoVersion as e:
+        # Otra sesión ya lo devolvió o canceló
+        return 409, {"error": str(e)}
+    except Exception as e:
+        return 500, {"error": str(e)}
+    return 200, get_prestamo_by_id(session, prestamo_id).model_dump(mode="json")
+
+
+def devolver(engine, prestamo_id: int) -> Response:
+    with Session(engine) as session:
+        estado, cuerpo = _devolver(session, prestamo_id)
+    return JSONResponse(cuerpo, status_code=estado)
+
+
+def devolver_lote(engine, datos) -> Response:
+    ids = datos.get("ids") if isinstance(datos, dict) else None
+    if not isinstance(ids, list) or len(ids) > LOTE_MAXIMO:
+        return JSONResponse({"error": f"Se esperaba {{\"ids\": [...]}} con hasta {LOTE_MAXIMO} ids"}, status_code=400)
+    with Session(engine) as session:
+        resultados = [(id_, *_devolver(session, id_)) for id_ in ids]
+    return JSONResponse([{"id": id_, "estado": estado, "item": cuerpo} for id_, estado, cuerpo in resultados])
+
+
+def cambios(engine, params) -> Response:
+    desde = _entero(params, "desde", 0)
+    limite = _entero(params, "limite", LIMITE_DEFECTO, 1, LIMITE_MAXIMO)
+    entidades = params.get("entidad")
+    with Session(engine) as session:
+        lote = get_cambios_desde(session, desde, limite, entidades.split(",") if entidades else None)
+    return JSONResponse({"cambios": lote, "siguiente": lote[-1]["secuencia"] if lote else desde})
+
+
+async def _error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+async def _json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise HTTPException(400, "Cuerpo JSON inválido")
+
+
+# Los manejadores leen la petición y ejecutan el trabajo con la base de datos,
+# que es sincrónico, en el pool de hilos de Starlette
+async def _listar(request):
+    return await run_in_threadpool(
+        listar, request.app.state.engine, _recurso(request), request.query_params, request.headers
+    )
+
+
+async def _obtener(request):
+    return await run_in_threadpool(
+        obtener, request.app.state.engine, _recurso(request), request.path_params["id"], request.headers
+    )
+
+
+async def _crear_uno(request):
+    recurso, datos = _recurso(request), await _json(request)
+    clave = request.headers.get("idempotency-key")
+    return await run_in_threadpool(crear, request.app.state.engine, recurso, datos, clave)
+
+
+async def _crear_lote(request):
+    recurso, datos = _recurso(request), await _json(request)
+    return await run_in_threadpool(crear_lote, request.app.state.engine, recurso, datos)
+
+
+async def _devolver_uno(request):
+    return await run_in_threadpool(devolver, request.app.state.engine, request.path_params["id"])
+
+
+async def _devolver_lote(request):
+    datos = await _json(request)
+    return await run_in_threadpool(devolver_lote, request.app.state.engine, datos)
+
+
+async def _cambios(request):
+    return await run_in_threadpool(cambios, request.app.state.engine, request.query_params)
+
+
+def crear_app(engine=None) -> Starlette:
+    """Construir la aplicación ASGI sobre `engine` (por defecto el de app.database.config)"""
+    if engine is None:
+        from app.database.config import engine
+
+    app = Starlette(exception_handlers={HTTPException: _error}, routes=[
+        Route("/cambios", _cambios, methods=["GET"]),
+        Route("/prestamos/devoluciones", _devolver_lote, methods=["POST"]),
+        Route("/prestamos/{id:int}/devolucion", _devolver_uno, methods=["POST"]),
+        Route("/{recurso}", _listar, methods=["GET"]),
+        Route("/{recurso}", _crear_uno, methods=["POST"]),
+        Route("/{recurso}/lote", _crear_lote, methods=["POST"]),
+        Route("/{recurso}/{id:int}", _obtener, methods=["GET"]),
+    ])
+    app.state.engine = engine
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API HTTP del gestor de herramientas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run(crear_app(), host=args.host, port=args.port, log_level="warning")
@@ -2,7 +2,12 @@
 Módulo principal para acceder a todas las operaciones CRUD del sistema.
 
 Este módulo exporta todas las funciones disponibles para interactuar con la base de datos,
-organizadas por entidad (empleados, herramientas, préstamos).
+organizadas por entidad (empleados, herramientas, préstamos, reservas), los reportes
+y el registro de auditoría.
+
+Los submódulos se importan al pedir el primer nombre que definen: quien usa
+solo empleados no carga préstamos, reservas ni reportes. Las páginas importan
+directamente del submódulo que necesitan (`from app.crud.crud_empleado import ...`).
 
 Ejemplo de uso:
     from app.crud import create_empleado, get_empleados, create_prestamo
@@ -14,101 +19,101 @@ Ejemplo de uso:
     empleados = get_empleados(session)
 """
 
-# Categorías
-from .crud_categoria import (
-    create_categoria,
-    get_categoria_by_id,
-    get_categorias,
-    get_herramientas_por_categoria,
-    get_categorias_activas,
-    update_categoria,
-    inhabilitar_categoria,
-    habilitar_categoria,
-    delete_categoria,
-)
-
-# Empleados
-from .crud_empleado import (
-    create_empleado,
-    get_empleado_by_id,
-    get_empleados,
-    get_empleados_activos,
-    get_empleados_por_area,
-    update_empleado,
-    inhabilitar_empleado,
-    habilitar_empleado,
-)
-
-# Herramientas
-from .crud_herramienta import (
-    create_herramienta,
-    get_herramienta_by_id,
-    get_herramientas,
-    get_herramientas_disponibles,
-    get_herramientas_por_categoria,
-    update_herramienta,
-    inhabilitar_herramienta,
-    habilitar_herramienta,
-    generate_codigo_interno,
-)
-
-# Préstamos
-from .crud_prestamo import (
-    create_prestamo,
-    get_prestamo_by_id,
-    get_prestamos,
-    get_prestamos_activos,
-    get_prestamos_por_empleado,
-    get_prestamos_por_herramienta,
-    get_prestamos_vencidos,
-    update_prestamo,
-    devolver_prestamo,
-    cancelar_prestamo,
-)
+from importlib import import_module
 
-# Documentación de la API
-__all__ = [
+# Nombre exportado -> submódulo que lo define
+_EXPORTACIONES = {
     # Categorías
-    'create_categoria',
-    'get_categoria_by_id',
-    'get_categorias',
-    'get_herramientas_por_categoria',
-    'get_categorias_activas',
-    'update_categoria',
-    'inhabilitar_categoria',
-    'habilitar_categoria',
-    'delete_categoria',
+    "create_categoria": "crud_categoria",
+    "get_categoria_by_id": "crud_categoria",
+    "get_categorias": "crud_categoria",
+    "get_categorias_activas": "crud_categoria",
+    "buscar_categorias": "crud_categoria",
+    "contar_categorias": "crud_categoria",
+    "get_diccionario_categorias": "crud_categoria",
+    "update_categoria": "crud_categoria",
+    "inhabilitar_categoria": "crud_categoria",
+    "habilitar_categoria": "crud_categoria",
+    "delete_categoria": "crud_categoria",
 
     # Empleados
-    'create_empleado',
-    'get_empleado_by_id',
-    'get_empleados',
-    'get_empleados_activos',
-    'get_empleados_por_area',
-    'update_empleado',
-    'inhabilitar_empleado',
-    'habilitar_empleado',
+    "create_empleado": "crud_empleado",
+    "get_empleado_by_id": "crud_empleado",
+    "get_empleados": "crud_empleado",
+    "get_empleados_activos": "crud_empleado",
+    "get_empleados_por_area": "crud_empleado",
+    "buscar_empleados": "crud_empleado",
+    "sugerir_empleados": "crud_empleado",
+    "autocompletar_empleados": "crud_empleado",
+    "update_empleado": "crud_empleado",
+    "inhabilitar_empleado": "crud_empleado",
+    "habilitar_empleado": "crud_empleado",
 
     # Herramientas
-    'create_herramienta',
-    'get_herramienta_by_id',
-    'get_herramientas',
-    'get_herramientas_disponibles',
-    'get_herramientas_por_categoria',
-    'update_herramienta',
-    'inhabilitar_herramienta',
-    'habilitar_herramienta',
-    'generate_codigo_interno',
+    "create_herramienta": "crud_herramienta",
+    "get_herramienta_by_id": "crud_herramienta",
+    "get_herramientas": "crud_herramienta",
+    "get_herramientas_disponibles": "crud_herramienta",
+    "get_herramientas_por_categoria": "crud_herramienta",
+    "buscar_herramientas": "crud_herramienta",
+    "sugerir_herramientas": "crud_herramienta",
+    "autocompletar_herramientas": "crud_herramienta",
+    "contar_herramientas": "crud_herramienta",
+    "update_herramienta": "crud_herramienta",
+    "inhabilitar_herramienta": "crud_herramienta",
+    "habilitar_herramienta": "crud_herramienta",
+    "generate_codigo_interno": "crud_herramienta",
 
     # Préstamos
-    'create_prestamo',
-    'get_prestamo_by_id',
-    'get_prestamos',
-    'get_prestamos_activos',
-    'get_prestamos_por_empleado',
-    'get_prestamos_por_herramienta',
-    'get_prestamos_vencidos',
-    'update_prestamo',
-    'devolver_prestamo',
-    'cancelar_prestamo',
-]
\ No newline at end of file
+    "create_prestamo": "crud_prestamo",
+    "get_prestamo_by_id": "crud_prestamo",
+    "get_prestamos": "crud_prestamo",
+    "get_prestamos_activos": "crud_prestamo",
+    "get_prestamos_por_empleado": "crud_prestamo",
+    "get_prestamos_por_herramienta": "crud_prestamo",
+    "get_prestamos_vencidos": "crud_prestamo",
+    "buscar_prestamos": "crud_prestamo",
+    "contar_prestamos_por_estado": "crud_prestamo",
+    "update_prestamo": "crud_prestamo",
+    "devolver_prestamo": "crud_prestamo",
+    "cancelar_prestamo": "crud_prestamo",
+    "reconciliar_contadores": "crud_prestamo",
+    "archivar_prestamos": "archivo",
+
+    # Reservas
+    "create_reserva": "crud_reserva",
+    "get_reserva_by_id": "crud_reserva",
+    "get_reservas_por_herramienta": "crud_reserva",
+    "buscar_reservas": "crud_reserva",
+    "cancelar_reserva": "crud_reserva",
+    "unidades_libres": "crud_reserva",
+
+    # Reportes
+    "get_herramientas_mas_solicitadas": "crud_reporte",
+    "get_empleados_mas_activos": "crud_reporte",
+    "get_estadisticas_generales": "crud_reporte",
+    "get_utilizacion_herramientas": "utilizacion",
+    "get_estadisticas_duracion": "estadisticas",
+    "get_antiguedad_vencidos": "estadisticas",
+
+    # Auditoría
+    "get_eventos_auditoria": "auditoria",
+    "get_cambios_desde": "auditoria",
+    "get_versiones": "auditoria",
+}
+
+# Documentación de la API
+__all__ = list(_EXPORTACIONES)
+
+
+def __getattr__(nombre):
+    submodulo = _EXPORTACIONES.get(nombre)
+    if submodulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(import_module(f".{submodulo}", __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,380 @@
+"""
+Agenda en memoria de las unidades comprometidas de cada herramienta.
+
+Cada herramienta tiene una línea de tiempo con los compromisos vigentes:
+reservas activas en [fecha_inicio, fecha_fin) y préstamos activos en
+[fecha_prestamo, fecha_devolucion_estimada). La línea de tiempo es un árbol
+(treap) ordenado por fecha cuyos nodos guardan el cambio de unidades en esa
+fecha; cada subárbol guarda además la suma y el máximo acumulado de sus
+cambios, así "cuántas unidades están comprometidas como máximo entre t1 y t2"
+se responde recorriendo O(log n) nodos.
+
+Un préstamo vencido sigue ocupando su unidad aunque su período ya terminó; por
+eso las fechas estimadas de devolución se guardan en una segunda línea de
+tiempo y los préstamos vencidos se suman a cualquier período futuro.
+
+La agenda se construye desde la base de datos la primera vez que se usa y
+luego se actualiza con cada commit de una sesión de este proceso que crea o
+modifica préstamos o reservas, igual que el índice de `indice_texto`. Los
+cambios confirmados por otros procesos se incorporan, también como en el
+índice, antes de cada consulta cuando `version_datos` avanzó. Después de
+cargas masivas con `insert()` hay que llamar a `recargar_agenda`.
+"""
+
+import random
+import threading
+import weakref
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SessionORM
+from sqlmodel import Session, select
+
+from app.models.prestamo import Prestamo
+from app.models.reserva import Reserva
+from .auditoria import get_cambios_desde, version_datos
+
+
+# Con más cambios de otros procesos que estos, la agenda se reconstruye en lugar de releer las filas
+MAX_CAMBIOS_SINCRONIZAR = 1000
+
+# Columnas que definen el compromiso de un préstamo o de una reserva
+COLUMNAS_PRESTAMO = ("id_prestamo", "id_herramienta_h", "estado", "fecha_prestamo", "fecha_devolucion_estimada")
+COLUMNAS_RESERVA = ("id_reserva", "id_herramienta_h", "estado", "fecha_inicio", "fecha_fin", "cantidad")
+
+
+class _Nodo:
+    __slots__ = ("clave", "delta", "prioridad", "izq", "der", "suma", "maximo")
+
+    def __init__(self, clave, delta):
+        self.clave = clave
+        self.delta = delta
+        self.prioridad = random.random()
+        self.izq = None
+        self.der = None
+        self.suma = delta
+        self.maximo = max(0, delta)
+
+
+def _suma(nodo):
+    return nodo.suma if nodo else 0
+
+
+def _maximo(nodo):
+    return nodo.maximo if nodo else 0
+
+
+def _actualizar(nodo):
+    # maximo: mayor suma acumulada de un prefijo del subárbol (0 para el prefijo vacío)
+    izquierda = _suma(nodo.izq) + nodo.delta
+    nodo.suma = izquierda + _suma(nodo.der)
+    nodo.maximo = max(_maximo(nodo.izq), izquierda, izquierda + _maximo(nodo.der))
+    return nodo
+
+
+def _unir(a, b):
+    # Todas las claves de a son menores que las de b
+    if a is None or b is None:
+        return a or b
+    if a.prioridad > b.prioridad:
+        a.der = _unir(a.der, b)
+        return _actualizar(a)
+    b.izq = _unir(a, b.izq)
+    return _actualizar(b)
+
+
+def _partir(nodo, clave, incluir):
+    # (claves < clave, resto); con incluir=True el corte es (claves <= clave, resto)
+    if nodo is None:
+        return None, None
+    if nodo.clave < clave or (incluir and nodo.clave == clave):
+        nodo.der, resto = _partir(nodo.der, clave, incluir)
+        return _actualizar(nodo), resto
+    menores, nodo.izq = _partir(nodo.izq, clave, incluir)
+    return menores, _actualizar(nodo)
+
+
+def _combinar(a, b):
+    # Tramos (suma, máximo acumulado) consecutivos
+    return a[0] + b[0], max(a[1], a[0] + b[1])
+
+
+def _despues_de(nodo, clave):
+    # Tramo de las claves > clave
+    if nodo is None:
+        return 0, 0
+    if nodo.clave <= clave:
+        return _despues_de(nodo.der, clave)
+    tramo = _combinar(_despues_de(nodo.izq, clave), (nodo.delta, max(0, nodo.delta)))
+    return _combinar(tramo, (_suma(nodo.der), _maximo(nodo.der)))
+
+
+def _antes_de(nodo, clave):
+    # Tramo de las claves < clave
+    if nodo is None:
+        return 0, 0
+    if nodo.clave >= clave:
+        return _antes_de(nodo.izq, clave)
+    tramo = _combinar((_suma(nodo.izq), _maximo(nodo.izq)), (nodo.delta, max(0, nodo.delta)))
+    return _combinar(tramo, _antes_de(nodo.der, clave))
+
+
+def _entre(nodo, desde, hasta):
+    # Tramo de las claves en (desde, hasta)
+    while nodo is not None and (nodo.clave <= desde or nodo.clave >= hasta):
+        nodo = nodo.der if nodo.clave <= desde else nodo.izq
+    if nodo is None:
+        return 0, 0
+    tramo = _combinar(_despues_de(nodo.izq, desde), (nodo.delta, max(0, nodo.delta)))
+    return _combinar(tramo, _antes_de(nodo.der, hasta))
+
+
+class LineaDeTiempo:
+    """
+    Cambios de unidades ordenados por fecha.
+
+    El valor en un instante t es la suma de los cambios con fecha <= t; un
+    intervalo [inicio, fin) con n unidades se guarda como +n en inicio y -n en fin.
+    """
+
+    def __init__(self):
+        self._raiz = None
+
+    def sumar(self, clave, delta: int):
+        """Sumar un cambio en una fecha (las fechas iguales se acumulan en un solo nodo)"""
+        menores, resto = _partir(self._raiz, clave, False)
+        nodo, mayores = _partir(resto, clave, True)
+        if nodo is None:
+            nodo = _Nodo(clave, delta)
+        else:
+            nodo.delta += delta
+            _actualizar(nodo)
+        if nodo.delta == 0:
+            nodo = None
+        self._raiz = _unir(_unir(menores, nodo), mayores)
+
+    def valor(self, clave) -> int:
+        """Suma de los cambios con fecha <= clave"""
+        total, nodo = 0, self._raiz
+        while nodo is not None:
+            if nodo.clave <= clave:
+                total += _suma(nodo.izq) + nodo.delta
+                nodo = nodo.der
+            else:
+                nodo = nodo.izq
+        return total
+
+    def maximo(self, desde, hasta) -> int:
+        """Mayor valor alcanzado en [desde, hasta)"""
+        inicial = self.valor(desde)
+        if hasta <= desde:
+            return inicial
+        return inicial + _entre(self._raiz, desde, hasta)[1]
+
+
+class Agenda:
+    """Compromisos de una herramienta: reservas y préstamos activos, por clave"""
+
+    def __init__(self):
+        self._ocupacion = LineaDeTiempo()
+        # Fechas estimadas de devolución de los préstamos, para contar los vencidos
+        self._devoluciones = LineaDeTiempo()
+        # clave -> (inicio, fin, cantidad, es_prestamo)
+        self._compromisos = {}
+
+    def __len__(self):
+        return len(self._compromisos)
+
+    def __contains__(self, clave):
+        return clave in self._compromisos
+
+    def agregar(self, clave, inicio: datetime, fin: datetime, cantidad: int = 1, es_prestamo: bool = False):
+        """Agregar o reemplazar un compromiso"""
+        self.quitar(clave)
+        if cantidad <= 0 or (fin <= inicio and not es_prestamo):
+            return
+        self._compromisos[clave] = (inicio, fin, cantidad, es_prestamo)
+        if inicio < fin:
+            self._ocupacion.sumar(inicio, cantidad)
+            self._ocupacion.sumar(fin, -cantidad)
+        if es_prestamo:
+            self._devoluciones.sumar(fin, cantidad)
+
+    def quitar(self, clave):
+        """Quitar un compromiso (no falla si no existe)"""
+        compromiso = self._compromisos.pop(clave, None)
+        if compromiso is None:
+            return
+        inicio, fin, cantidad, es_prestamo = compromiso
+        if inicio < fin:
+            self._ocupacion.sumar(inicio, -cantidad)
+            self._ocupacion.sumar(fin, cantidad)
+        if es_prestamo:
+            self._devoluciones.sumar(fin, -cantidad)
+
+    def ocupadas(self, desde: datetime, hasta: datetime, ahora: datetime | None = None) -> int:
+        """
+        Máximo de unidades comprometidas en algún instante de [desde, hasta).
+
+        El período se recorta para empezar en `ahora`; los préstamos que
+        vencieron antes de `ahora` y siguen activos cuentan en todo el período.
+        """
+        ahora = ahora or datetime.now()
+        desde = max(desde, ahora)
+        return self._ocupacion.maximo(desde, hasta) + self._devoluciones.valor(ahora)
+
+
+def compromiso_de(objeto, es_prestamo: bool | None = None) -> tuple | None:
+    """
+    Período que compromete un préstamo o una reserva.
+
+    Args:
+        objeto: Prestamo o Reserva, o una fila con sus columnas de compromiso
+        es_prestamo: Tipo de una fila (None: según la clase del objeto)
+
+    Returns:
+        (clave, id de herramienta, (inicio, fin, cantidad, es_prestamo)), con el
+        período en None si el préstamo o la reserva ya no está activo
+    """
+    if isinstance(objeto, Prestamo) if es_prestamo is None else es_prestamo:
+        periodo = None
+        if objeto.estado == "activo":
+            periodo = (objeto.fecha_prestamo, objeto.fecha_devolucion_estimada, 1, True)
+        return ("prestamo", objeto.id_prestamo), objeto.id_herramienta_h, periodo
+    periodo = None
+    if objeto.estado == "activa":
+        periodo = (objeto.fecha_inicio, objeto.fecha_fin, objeto.cantidad, False)
+    return ("reserva", objeto.id_reserva), objeto.id_herramienta_h, periodo
+
+
+class _Agendas:
+    """Agendas de todas las herramientas de un motor de base de datos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_herramienta: dict[int, Agenda] = {}
+        # clave del compromiso -> herramienta, para quitarlo si cambia de herramienta
+        self.herramienta_de = {}
+        # Versión de los datos incorporada (ver `_sincronizar`)
+        self.secuencia = 0
+
+    def registrar(self, clave, herramienta_id: int, periodo: tuple | None):
+        anterior = self.herramienta_de.pop(clave, None)
+        if anterior is not None:
+            self.por_herramienta[anterior].quitar(clave)
+        if periodo is None:
+            return
+        agenda = self.por_herramienta.setdefault(herramienta_id, Agenda())
+        agenda.agregar(clave, *periodo)
+        if clave in agenda:
+            self.herramienta_de[clave] = herramienta_id
+
+
+# Agendas por motor de base de datos
+_agendas = weakref.WeakKeyDictionary()
+_lock_carga = threading.Lock()
+
+
+def _construir(session: Session) -> _Agendas:
+    agendas = _Agendas()
+    # Antes que las filas: un cambio confirmado en el medio se vuelve a aplicar después
+    agendas.secuencia = version_datos(session)
+    ahora = datetime.now()
+    prestamos = select(Prestamo).where(Prestamo.estado == "activo")
+    reservas = select(Reserva).where(Reserva.estado == "activa", Reserva.fecha_fin > ahora)
+    for statement in (prestamos, reservas):
+        for objeto in session.exec(statement):
+            agendas.registrar(*compromiso_de(objeto))
+    return agendas
+
+
+def _agendas_de(session: Session) -> _Agendas:
+    engine = session.get_bind()
+    agendas = _agendas.get(engine)
+    if agendas is None:
+        with _lock_carga:
+            agendas = _agendas.get(engine)
+            if agendas is None:
+                agendas = _agendas[engine] = _construir(session)
+                return agendas
+    return _sincronizar(session, agendas)
+
+
+def _sincronizar(session: Session, agendas: _Agendas) -> _Agendas:
+    """Incorporar los préstamos y reservas cambiados por otros procesos desde la última versión vista"""
+    vista = agendas.secuencia
+    version = version_datos(session)
+    if version <= vista:
+        return agendas
+    cambios = get_cambios_desde(session, vista, limit=MAX_CAMBIOS_SINCRONIZAR, entidades=["prestamo", "reserva"])
+    if len(cambios) == MAX_CAMBIOS_SINCRONIZAR:
+        agendas = _agendas[session.get_bind()] = _construir(session)
+        return agendas
+
+    compromisos = {}
+    for modelo, entidad, columnas in ((Prestamo, "prestamo", COLUMNAS_PRESTAMO), (Reserva, "reserva", COLUMNAS_RESERVA)):
+        ids = {cambio["id"] for cambio in cambios if cambio["entidad"] == entidad}
+        if not ids:
+            continue
+        # Un préstamo o reserva que ya no existe (borrado o archivado) deja de comprometer unidades
+        compromisos.update({(entidad, id_): (None, None) for id_ in ids})
+        statement = select(*(getattr(modelo, c) for c in columnas)).where(getattr(modelo, columnas[0]).in_(ids))
+        # Sin autoflush: solo interesa lo confirmado, los cambios de esta sesión llegan con su commit
+        with session.no_autoflush:
+            for fila in session.exec(statement):
+                clave, herramienta_id, periodo = compromiso_de(fila, es_prestamo=modelo is Prestamo)
+                compromisos[clave] = (herramienta_id, periodo)
+
+    # Los cambios de este proceso ya están aplicados; registrarlos otra vez no cambia nada
+    with agendas.lock:
+        for clave, (herramienta_id, periodo) in compromisos.items():
+            agendas.registrar(clave, herramienta_id, periodo)
+        agendas.secuencia = max(agendas.secuencia, version)
+    return agendas
+
+
+def recargar_agenda(session: Session):
+    """Reconstruir desde la base de datos las agendas de todas las herramientas"""
+    _agendas[session.get_bind()] = _construir(session)
+
+
+def unidades_ocupadas(session: Session, herramienta_id: int, desde: datetime, hasta: datetime) -> int:
+    """Máximo de unidades de una herramienta comprometidas en [desde, hasta), según la agenda en memoria"""
+    agendas = _agendas_de(session)
+    with agendas.lock:
+        agenda = agendas.por_herramienta.get(herramienta_id)
+        return agenda.ocupadas(desde, hasta) if agenda else 0
+
+
+# Sincronización con las escrituras: los cambios se anotan en cada flush y se
+# aplican a la agenda solo cuando la transacción se confirma
+@event.listens_for(SessionORM, "after_flush")
+def _anotar_cambios(session, flush_context):
+    cambios = None
+    for objetos, borrado in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for objeto in objetos:
+            if not isinstance(objeto, (Prestamo, Reserva)):
+                continue
+            if cambios is None:
+                cambios = session.info.setdefault("agenda_cambios", {})
+            # Se guardan los valores del flush: el objeto expira con el commit
+            clave, herramienta_id, periodo = compromiso_de(objeto)
+            cambios[clave] = (herramienta_id, None if borrado else periodo)
+
+
+@event.listens_for(SessionORM, "after_commit")
+def _aplicar_cambios(session):
+    cambios = session.info.pop("agenda_cambios", None)
+    if not cambios:
+        return
+    agendas = _agendas.get(session.get_bind())
+    if agendas is None:
+        return
+    with agendas.lock:
+        for clave, (herramienta_id, compromiso) in cambios.items():
+            agendas.registrar(clave, herramienta_id, compromiso)
+
+
+@event.listens_for(SessionORM, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop("agenda_cambios", None)
@@ -0,0 +1,165 @@
+"""
+Archivo de préstamos cerrados.
+
+La tabla `prestamo` guarda los préstamos activos y la historia reciente; los
+préstamos devueltos o cancelados más antiguos que ANTIGUEDAD_ARCHIVO_DIAS se
+mueven en lotes acotados a `prestamo_archivado`, así las consultas de
+préstamos activos y las listas del día a día no recorren años de historia.
+
+Las funciones de historia de `crud_prestamo` consultan la entidad que
+devuelve `fuente_prestamos`: la tabla `prestamo` sola, o su unión con el
+archivo cuando el estado y el período pedidos pueden incluir préstamos
+archivados.
+
+El archivado se ejecuta con:
+    python -m app.crud.archivo --dias 180 --lote 5000
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, union_all
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from app.models.prestamo import Prestamo
+from app.models.prestamo_archivado import PrestamoArchivado
+
+
+# Antigüedad (por fecha de préstamo) a partir de la cual se archiva un préstamo cerrado
+ANTIGUEDAD_ARCHIVO_DIAS = int(os.getenv("PRESTAMOS_ARCHIVO_DIAS", "180"))
+
+# Préstamos movidos por transacción
+TAMANO_LOTE_ARCHIVO = 5000
+
+ESTADOS_CERRADOS = ("devuelto", "cancelado")
+
+# Columnas comunes a las dos tablas, en el orden de Prestamo
+COLUMNAS_PRESTAMO = [columna.name for columna in Prestamo.__table__.columns]
+
+
+def frontera_archivo(session: Session) -> datetime | None:
+    """Fecha de préstamo más reciente del archivo, o None si está vacío (una búsqueda en el índice)"""
+    return session.exec(select(func.max(PrestamoArchivado.fecha_prestamo))).one()
+
+
+def usa_archivo(session: Session, estado: str | None = None, desde: datetime | None = None) -> bool:
+    """
+    Indicar si una consulta de préstamos puede alcanzar el archivo.
+
+    Solo si puede devolver préstamos cerrados (estado None, "devuelto" o
+    "cancelado") y su período empieza antes del préstamo archivado más reciente.
+    """
+    if estado not in (None, *ESTADOS_CERRADOS):
+        return False
+    frontera = frontera_archivo(session)
+    return frontera is not None and (desde is None or desde <= frontera)
+
+
+def fuente_prestamos(
+    session: Session,
+    estado: str | None = None,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+):
+    """
+    Entidad sobre la que consultar la historia de préstamos.
+
+    El archivo se incluye solo cuando `usa_archivo` lo indica. El período y el
+    estado se aplican dentro de cada parte de la unión para que usen sus
+    índices; el llamador igual debe filtrar la entidad devuelta.
+
+    Args:
+        session: Sesión de base de datos
+        estado: Estado pedido por la consulta ("vencido" cuenta como activo)
+        desde: Inicio del período por fecha de préstamo (None: sin límite)
+        hasta: Fin del período por fecha de préstamo (None: sin límite)
+
+    Returns:
+        `Prestamo`, o un alias de `Prestamo` sobre la unión con el archivo
+    """
+    if not usa_archivo(session, estado, desde):
+        return Prestamo
+
+    partes = []
+    for modelo in (Prestamo, PrestamoArchivado):
+        parte = select(*(getattr(modelo, columna) for columna in COLUMNAS_PRESTAMO))
+        if estado is not None:
+            parte = parte.where(modelo.estado == estado)
+        if desde is not None:
+            parte = parte.where(modelo.fecha_prestamo >= desde)
+        if hasta is not None:
+            parte = parte.where(modelo.fecha_prestamo <= hasta)
+        partes.append(parte)
+    return aliased(Prestamo, union_all(*partes).subquery("prestamo_historia"), adapt_on_names=True)
+
+
+def archivar_prestamos(
+    session: Session,
+    antiguedad_dias: int | None = None,
+    lote: int = TAMANO_LOTE_ARCHIVO,
+    max_lotes: int | None = None,
+):
+    """
+    Mover al archivo los préstamos cerrados más antiguos que `antiguedad_dias`.
+
+    Cada lote se copia y se borra de `prestamo` en su propia transacción, así
+    las escrituras de la aplicación nunca esperan más que un lote.
+
+    Args:
+        session: Sesión de base de datos
+        antiguedad_dias: Antigüedad mínima (por defecto ANTIGUEDAD_ARCHIVO_DIAS)
+        lote: Préstamos por transacción
+        max_lotes: Detenerse después de este número de lotes (None: hasta terminar)
+
+    Returns:
+        Número de préstamos archivados
+    """
+    dias = ANTIGUEDAD_ARCHIVO_DIAS if antiguedad_dias is None else antiguedad_dias
+    corte = datetime.now() - timedelta(days=dias)
+    columnas = [getattr(Prestamo, columna) for columna in COLUMNAS_PRESTAMO]
+    archivados = lotes = 0
+    try:
+        while max_lotes is None or lotes < max_lotes:
+            # Sin ORDER BY: ordenar obligaría a recorrer todos los cerrados en cada lote
+            ids = session.exec(
+                select(Prestamo.id_prestamo)
+                .where(Prestamo.fecha_prestamo < corte, Prestamo.estado.in_(ESTADOS_CERRADOS))
+                .limit(lote)
+            ).all()
+            if not ids:
+                break
+            session.execute(
+                insert(PrestamoArchivado).from_select(
+                    [*COLUMNAS_PRESTAMO, "fecha_archivo"],
+                    select(*columnas, literal(datetime.now())).where(Prestamo.id_prestamo.in_(ids)),
+                )
+            )
+            session.execute(
+                delete(Prestamo)
+                .where(Prestamo.id_prestamo.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            archivados += len(ids)
+            lotes += 1
+        return archivados
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al archivar préstamos: {str(e)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.config import engine
+
+    parser = argparse.ArgumentParser(description="Archivar préstamos cerrados antiguos")
+    parser.add_argument("--dias", type=int, default=ANTIGUEDAD_ARCHIVO_DIAS)
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_ARCHIVO)
+    parser.add_argument("--max-lotes", type=int, default=None)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        total = archivar_prestamos(session, args.dias, args.lote, args.max_lotes)
+    print(f"Préstamos archivados: {total}")
@@ -0,0 +1,281 @@
+"""
+Registro de auditoría de las entidades.
+
+Cada creación, modificación o borrado de categorías, empleados, herramientas,
+préstamos y reservas hecho a través de la sesión queda registrado en
+`evento_auditoria` con la entidad, su id, los campos cambiados
+({campo: [antes, después]}), la fecha y el actor.
+
+Los cambios se leen del historial de atributos del ORM en cada flush (los
+valores anteriores ya están cargados en el objeto, no hace falta volver a
+leerlos) y se escriben justo antes del commit con un único INSERT de varias
+filas, en la misma transacción que el cambio: un rollback descarta también
+los eventos. Las operaciones masivas con `update()`/`insert()` no pasan por el
+historial del ORM; registran sus eventos con `registrar_eventos`, que se
+escriben en el mismo INSERT.
+
+El actor se toma de `session.info["actor"]` o, si no está, del contexto
+abierto con `con_actor`. Los listeners se registran al importar este módulo;
+cada módulo crud que escribe lo importa, aunque `app.crud` cargue sus
+submódulos bajo demanda.
+
+El mismo registro sirve de fuente de cambios para integraciones: cada evento
+recibe al confirmarse un número de `secuencia` consecutivo, tomado de un
+contador de una fila que queda bloqueado hasta el commit, de modo que las
+secuencias siguen el orden de los commits y no tienen huecos. Un consumidor
+que guarda la última secuencia leída y pide `get_cambios_desde(secuencia)`
+recibe cada cambio una sola vez y en orden.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from sqlalchemy import event, func, inspect, insert, update
+from sqlalchemy.orm import Session as SessionORM
+from sqlmodel import Session, select
+
+from app.models.categoria import Categoria
+from app.models.empleado import Empleado
+from app.models.evento_auditoria import EventoAuditoria
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+from app.models.reserva import Reserva
+from app.models.secuencia_cambios import SecuenciaCambios
+
+
+# Modelos auditados y nombre de la entidad en el registro
+ENTIDADES_AUDITADAS = {
+    Categoria: "categoria",
+    Empleado: "empleado",
+    Herramienta: "herramienta",
+    Prestamo: "prestamo",
+    Reserva: "reserva",
+}
+
+# Filas por sentencia INSERT (SQLite limita los parámetros por sentencia)
+FILAS_POR_INSERT = 500
+
+_actor: ContextVar[str | None] = ContextVar("actor_auditoria", default=None)
+
+
+@contextmanager
+def con_actor(actor: str | None):
+    """Atribuir a `actor` los cambios hechos dentro del bloque"""
+    token = _actor.set(actor)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def actor_actual(session: Session) -> str | None:
+    """Actor al que se atribuyen los cambios de la sesión"""
+    return session.info.get("actor") or _actor.get()
+
+
+def _valor(valor):
+    """Valor serializable en JSON"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def evento(session: Session, entidad: str, id_entidad: int, accion: str, cambios: dict) -> dict:
+    """Fila de `evento_auditoria` lista para `registrar_eventos`"""
+    return {
+        "entidad": entidad,
+        "id_entidad": id_entidad,
+        "accion": accion,
+        "cambios": {campo: [_valor(antes), _valor(despues)] for campo, (antes, despues) in cambios.items()},
+        "fecha": datetime.now(),
+        "actor": actor_actual(session),
+    }
+
+
+def registrar_eventos(session: Session, eventos: list[dict]):
+    """Agregar eventos a la transacción en curso; se escriben con el commit"""
+    if eventos:
+        session.info.setdefault("auditoria_eventos", []).extend(eventos)
+
+
+def _cambios_de(objeto, accion: str) -> dict:
+    """Campos cambiados de un objeto en el flush en curso: {campo: (antes, después)}"""
+    estado = inspect(objeto)
+    cambios = {}
+    for atributo in estado.mapper.column_attrs:
+        campo = atributo.key
+        if accion == "crear":
+            valor = estado.dict.get(campo)
+            if valor is not None:
+                cambios[campo] = (None, valor)
+        elif accion == "borrar":
+            cambios[campo] = (estado.dict.get(campo), None)
+        else:
+            historial = estado.attrs[campo].history
+            if not historial.has_changes():
+                continue
+            antes = historial.deleted[0] if historial.deleted else None
+            despues = historial.added[0] if historial.added else None
+            if antes != despues:
+                cambios[campo] = (antes, despues)
+    return cambios
+
+
+def get_eventos_auditoria(
+    session: Session,
+    entidad: str,
+    id_entidad: int | None = None,
+    skip: int = 0,
+    limit: int = 50,
+):
+    """
+    Obtener el historial de cambios de una entidad, del más reciente al más antiguo.
+
+    Args:
+        session: Sesión de base de datos
+        entidad: Nombre de la entidad ("empleado", "herramienta", "prestamo", ...)
+        id_entidad: Id de la fila (None: todas las filas de la entidad)
+        skip: Eventos a omitir
+        limit: Máximo de eventos a devolver
+
+    Returns:
+        Lista de EventoAuditoria
+    """
+    statement = select(EventoAuditoria).where(EventoAuditoria.entidad == entidad)
+    if id_entidad is not None:
+        statement = statement.where(EventoAuditoria.id_entidad == id_entidad)
+    statement = statement.order_by(EventoAuditoria.secuencia.desc()).offset(skip).limit(limit)
+    return session.exec(statement).all()
+
+
+def get_versiones(session: Session, entidad: str, ids: list[int]) -> dict[int, int]:
+    """
+    Obtener la versión de cada fila: la secuencia de su último cambio.
+
+    Se resuelve solo con el índice de auditoría. Las filas sin eventos (p. ej.
+    cargadas con inserciones masivas) no aparecen en el resultado.
+
+    Args:
+        session: Sesión de base de datos
+        entidad: Nombre de la entidad
+        ids: Ids de las filas
+
+    Returns:
+        Diccionario {id: secuencia}
+    """
+    if not ids:
+        return {}
+    statement = (
+        select(EventoAuditoria.id_entidad, func.max(EventoAuditoria.secuencia))
+        .where(EventoAuditoria.entidad == entidad, EventoAuditoria.id_entidad.in_(ids))
+        .group_by(EventoAuditoria.id_entidad)
+    )
+    return dict(session.exec(statement).all())
+
+
+def version_datos(session: Session) -> int:
+    """
+    Versión de todos los datos auditados: la secuencia del último cambio confirmado.
+
+    Cambia con cada commit que registra eventos; sirve de clave para cachear
+    resultados calculados sobre los datos. Las cargas masivas con `insert()`
+    que no registran eventos no la cambian.
+    """
+    return session.exec(select(SecuenciaCambios.valor).where(SecuenciaCambios.id == 1)).one()
+
+
+def get_cambios_desde(
+    session: Session,
+    secuencia: int = 0,
+    limit: int = 1000,
+    entidades: list[str] | None = None,
+):
+    """
+    Obtener los cambios confirmados después de `secuencia`, en orden.
+
+    Cada cambio es compacto: solo los valores nuevos de los campos cambiados
+    (vacío para un borrado). El consumidor guarda la `secuencia` del último
+    cambio recibido y la pasa en la siguiente llamada.
+
+    Args:
+        session: Sesión de base de datos
+        secuencia: Última secuencia ya procesada (0: desde el principio)
+        limit: Máximo de cambios a devolver
+        entidades: Limitar a estas entidades (None: todas)
+
+    Returns:
+        Lista de {"secuencia", "entidad", "id", "accion", "cambios": {campo: valor}}
+    """
+    statement = select(
+        EventoAuditoria.secuencia,
+        EventoAuditoria.entidad,
+        EventoAuditoria.id_entidad,
+        EventoAuditoria.accion,
+        EventoAuditoria.cambios,
+    ).where(EventoAuditoria.secuencia > secuencia)
+    if entidades:
+        statement = statement.where(EventoAuditoria.entidad.in_(entidades))
+    statement = statement.order_by(EventoAuditoria.secuencia).limit(limit)
+    return [
+        {
+            "secuencia": fila.secuencia,
+            "entidad": fila.entidad,
+            "id": fila.id_entidad,
+            "accion": fila.accion,
+            "cambios": {} if fila.accion == "borrar" else {campo: despues for campo, (_, despues) in fila.cambios.items()},
+        }
+        for fila in session.exec(statement)
+    ]
+
+
+def _reservar_secuencias(connection, cantidad: int) -> int:
+    """Reservar `cantidad` secuencias consecutivas; retorna la primera. Bloquea el contador hasta el commit"""
+    ultima = connection.execute(
+        update(SecuenciaCambios)
+        .where(SecuenciaCambios.id == 1)
+        .values(valor=SecuenciaCambios.valor + cantidad)
+        .returning(SecuenciaCambios.valor)
+    ).scalar_one()
+    return ultima - cantidad + 1
+
+
+# Captura: los cambios se anotan en cada flush, se escriben antes del commit
+# y se descartan con el rollback
+@event.listens_for(SessionORM, "after_flush")
+def _anotar_cambios(session, flush_context):
+    eventos = []
+    for objetos, accion in ((session.new, "crear"), (session.dirty, "actualizar"), (session.deleted, "borrar")):
+        for objeto in objetos:
+            entidad = ENTIDADES_AUDITADAS.get(type(objeto))
+            if entidad is None:
+                continue
+            cambios = _cambios_de(objeto, accion)
+            if not cambios:
+                continue
+            # Desde el diccionario del objeto: un objeto borrado no se puede recargar
+            estado = inspect(objeto)
+            id_entidad = estado.dict.get(estado.mapper.primary_key[0].key)
+            eventos.append(evento(session, entidad, id_entidad, accion, cambios))
+    registrar_eventos(session, eventos)
+
+
+@event.listens_for(SessionORM, "before_commit")
+def _escribir_eventos(session):
+    # before_commit corre antes del último flush del commit: vaciar primero
+    # la sesión para que sus cambios también se registren
+    session.flush()
+    eventos = session.info.pop("auditoria_eventos", None)
+    if not eventos:
+        return
+    connection = session.connection()
+    primera = _reservar_secuencias(connection, len(eventos))
+    for numero, fila in enumerate(eventos, start=primera):
+        fila["secuencia"] = numero
+    for inicio in range(0, len(eventos), FILAS_POR_INSERT):
+        connection.execute(insert(EventoAuditoria).values(eventos[inicio:inicio + FILAS_POR_INSERT]))
+
+
+@event.listens_for(SessionORM, "after_rollback")
+def _descartar_eventos(session):
+    session.info.pop("auditoria_eventos", None)
@@ -0,0 +1,111 @@
+"""
+Filtros de búsqueda de texto sobre los índices de texto completo.
+
+Las funciones `buscar_*` de cada entidad delegan aquí el filtro del cuadro
+de búsqueda. En SQLite y PostgreSQL se consulta el índice de
+`app.database.busqueda` y se obtiene además una columna de relevancia; en
+otros motores, o si el texto no tiene palabras, se usa LIKE sobre las mismas
+columnas.
+"""
+
+import re
+
+from sqlalchemy import func, literal_column, or_, select, table
+from sqlmodel import Session
+
+from app.database.busqueda import DIALECTOS_SOPORTADOS, INDICES_BUSQUEDA, documento, nombre_indice, vector
+from .paginacion import patron_busqueda
+
+
+def palabras_busqueda(texto: str | None) -> list[str]:
+    """Separar el texto buscado en palabras (letras y dígitos)"""
+    return re.findall(r"\w+", texto.casefold()) if texto else []
+
+
+def coincidencias(session: Session, entidad: str, texto: str, columnas: tuple[str, ...] | None = None):
+    """
+    Subconsulta con las filas de una entidad que coinciden con el texto.
+
+    Cada palabra se busca como prefijo y deben aparecer todas. La subconsulta
+    tiene las columnas `id` y `rango`; un rango menor es más relevante.
+
+    Args:
+        session: Sesión de base de datos
+        entidad: "empleado", "herramienta" o "prestamo"
+        texto: Texto escrito en el cuadro de búsqueda
+        columnas: Limitar la búsqueda a estas columnas indexadas (solo SQLite;
+            en PostgreSQL el índice cubre el texto completo de la fila)
+
+    Returns:
+        La subconsulta, o None si el motor no tiene índice o el texto no tiene palabras
+    """
+    palabras = palabras_busqueda(texto)
+    dialecto = session.get_bind().dialect.name
+    if not palabras or dialecto not in DIALECTOS_SOPORTADOS:
+        return None
+
+    tabla, columna_id, _ = INDICES_BUSQUEDA[entidad]
+    if dialecto == "sqlite":
+        fts = literal_column(nombre_indice(entidad))
+        consulta = " ".join(f'"{palabra}"*' for palabra in palabras)
+        if columnas:
+            consulta = f"{{{' '.join(columnas)}}} : ({consulta})"
+        statement = (
+            select(literal_column("rowid").label("id"), func.bm25(fts).label("rango"))
+            .select_from(table(nombre_indice(entidad)))
+            .where(fts.op("MATCH")(consulta))
+        )
+    else:
+        # Palabras por prefijo con tsvector, o texto parcial (p. ej. en códigos) con pg_trgm
+        consulta = func.to_tsquery("simple", " & ".join(f"{palabra}:*" for palabra in palabras))
+        documento_fila = func.lower(literal_column(documento(entidad)))
+        statement = (
+            select(
+                literal_column(columna_id).label("id"),
+                (-func.ts_rank(literal_column(vector(entidad)), consulta)).label("rango"),
+            )
+            .select_from(table(tabla))
+            .where(or_(
+                literal_column(vector(entidad)).op("@@")(consulta),
+                documento_fila.like(patron_busqueda(texto), escape="\\"),
+            ))
+        )
+    return statement.subquery()
+
+
+def filtrar_por_texto(
+    session: Session,
+    statement,
+    entidad: str,
+    columna_id,
+    texto: str | None,
+    columnas_like,
+    columnas: tuple[str, ...] | None = None,
+):
+    """
+    Filtrar una consulta por el texto del cuadro de búsqueda.
+
+    Args:
+        session: Sesión de base de datos
+        statement: Consulta `select` de la entidad
+        entidad: Nombre de la entidad en INDICES_BUSQUEDA
+        columna_id: Columna de la consulta con el id de la entidad
+        texto: Texto buscado (vacío o None no filtra)
+        columnas_like: Columnas para la búsqueda con LIKE cuando no se usa el índice
+        columnas: Limitar la búsqueda en el índice a estas columnas (ver `coincidencias`)
+
+    Returns:
+        Tupla (consulta filtrada, columna de relevancia o None)
+    """
+    if not texto or not texto.strip():
+        return statement, None
+
+    encontrados = coincidencias(session, entidad, texto, columnas)
+    if encontrados is None:
+        patron = patron_busqueda(texto)
+        return statement.where(or_(
+            *(func.lower(columna).like(patron, escape="\\") for columna in columnas_like)
+        )), None
+
+    statement = statement.join(encontrados, encontrados.c.id == columna_id)
+    return statement, encontrados.c.rango
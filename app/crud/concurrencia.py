@@ -0,0 +1,50 @@
+"""
+Control de concurrencia optimista.
+
+Categorías, empleados, herramientas, préstamos y reservas tienen una columna
+`version` declarada como `version_id_col`: el ORM la incrementa en cada
+UPDATE y la agrega a su WHERE. Si otra sesión cambió la fila desde que se
+leyó, el UPDATE no encuentra la fila y el commit falla; nada queda bloqueado
+mientras tanto.
+
+Eso cubre el tiempo entre leer y escribir en una misma llamada. Para cubrir
+el tiempo que el usuario pasa con el formulario abierto, las funciones
+update_* aceptan la `version` que se mostró y la comparan con la actual antes
+de escribir. En los dos casos se lanza ConflictoVersion, que las páginas
+muestran como tal en lugar de pisar el cambio del otro usuario.
+
+Las sentencias en bloque no pasan por el ORM: las que cambian columnas que se
+editan en los formularios (el stock en `_mover_stock`) incrementan la versión
+ellas mismas; las que solo corrigen contadores derivados (prestamos_activos,
+unidades_prestadas) no, así un préstamo no invalida la edición del empleado.
+"""
+
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session
+
+
+class ConflictoVersion(Exception):
+    """Otra sesión modificó la fila desde que se leyó."""
+
+    def __init__(self, entidad: str, id_entidad, esperada: int | None = None, actual: int | None = None):
+        self.entidad = entidad
+        self.id_entidad = id_entidad
+        self.esperada = esperada
+        self.actual = actual
+        detalle = f" (versión {esperada}, actual {actual})" if esperada is not None else ""
+        super().__init__(f"{entidad} {id_entidad} fue modificado por otro usuario{detalle}")
+
+
+def comprobar_version(entidad: str, id_entidad, fila, version: int | None):
+    """Lanzar ConflictoVersion si `fila` ya no está en la `version` esperada (None: no comprobar)"""
+    if version is not None and fila.version != version:
+        raise ConflictoVersion(entidad, id_entidad, version, fila.version)
+
+
+def confirmar(session: Session, entidad: str, id_entidad):
+    """Hacer commit; si el UPDATE no encontró la versión leída, lanzar ConflictoVersion"""
+    try:
+        session.commit()
+    except StaleDataError as e:
+        session.rollback()
+        raise ConflictoVersion(entidad, id_entidad) from e
@@ -5,14 +5,63 @@ Las categorías están asociadas a herramientas específicas y permiten
 organizar y categorizar las herramientas en el sistema.
 """
 
+import threading
+import weakref
+from typing import NamedTuple
+
+from sqlalchemy import case, func
 from sqlmodel import Session, select
+from app.metricas import contar_cache
 from app.models.categoria import Categoria
+from .auditoria import version_datos
+from .concurrencia import ConflictoVersion, comprobar_version, confirmar
+from .idempotencia import creado_antes, registrar_clave
+from .paginacion import con_opciones_carga, paginar
+
+
+# Columnas por las que se puede ordenar la lista de categorías
+COLUMNAS_ORDEN_CATEGORIA = {
+    "id": Categoria.id_categoria,
+    "nombre": Categoria.nombre,
+    "estado": Categoria.estado,
+}
+
+# Nombre que se muestra para una herramienta sin categoría
+SIN_CATEGORIA = "Sin categoría"
+
+
+class DiccionarioCategorias(NamedTuple):
+    """Nombres de todas las categorías y lista de las activas; no hay que modificarlos."""
+
+    nombres: dict  # {id_categoria: nombre}, activas e inactivas
+    activas: list  # [(id_categoria, nombre)] de las activas, por nombre
+
+    def nombre(self, id_categoria: int | None, defecto: str = SIN_CATEGORIA) -> str:
+        """Nombre de la categoría (`defecto` si es None o no existe)"""
+        return self.nombres.get(id_categoria, defecto)
+
+
+# Diccionario por motor de base de datos: {engine: (version_datos, DiccionarioCategorias)}.
+# Las escrituras de este módulo lo descartan enseguida; las de otros procesos
+# cambian `version_datos` y se detectan en la siguiente lectura. `_generacion`
+# evita guardar uno leído antes de una escritura que terminó mientras se leía
+_diccionarios = weakref.WeakKeyDictionary()
+_lock_diccionarios = threading.Lock()
+_generacion = 0
+
+
+def _invalidar_diccionario():
+    global _generacion
+    with _lock_diccionarios:
+        _generacion += 1
+        _diccionarios.clear()
 
 
 def create_categoria(
     session: Session,
     nombre: str,
     estado: bool = True,
+    clave_idempotencia: str | None = None,
 ):
     """
     Crear una nueva categoría.
@@ -21,17 +70,24 @@ def create_categoria(
         session: Sesión de base de datos
         nombre: Nombre de la categoría
         estado: Estado activo/inactivo de la categoría (default: True)
+        clave_idempotencia: Clave del envío; repetirla devuelve la categoría ya creada
     
     Returns:
         La categoría creada
     """
     try:
+        previa = creado_antes(session, Categoria, "categoria", clave_idempotencia)
+        if previa is not None:
+            return previa
+
         categoria = Categoria(
             nombre=nombre,
             estado=estado,
         )
         session.add(categoria)
+        categoria = registrar_clave(session, "categoria", clave_idempotencia, categoria)
         session.commit()
+        _invalidar_diccionario()
         session.refresh(categoria)
 
         return categoria
@@ -57,7 +113,7 @@ def get_categoria_by_id(session: Session, categoria_id: int):
     return session.exec(statement).first()
 
 
-def get_categorias(session: Session, skip: int = 0, limit: int = 100):
+def get_categorias(session: Session, skip: int = 0, limit: int = 100, opciones_carga=()):
     """
     Obtener todas las categorías con paginación.
     
@@ -65,14 +121,63 @@ def get_categorias(session: Session, skip: int = 0, limit: int = 100):
         session: Sesión de base de datos
         skip: Número de registros a saltar
         limit: Número máximo de registros a retornar
+        opciones_carga: Opciones de carga de relaciones (p. ej. selectinload(Categoria.herramientas))
     
     Returns:
         Lista de categorías
     """
-    statement = select(Categoria).offset(skip).limit(limit)
+    statement = con_opciones_carga(select(Categoria), Categoria, opciones_carga).offset(skip).limit(limit)
     return session.exec(statement).all()
 
 
+def buscar_categorias(
+    session: Session,
+    estado: bool | None = None,
+    orden: str = "id",
+    descendente: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+):
+    """
+    Buscar categorías con filtro, orden y paginación en la base de datos.
+    
+    Args:
+        session: Sesión de base de datos
+        estado: Si se indica, solo categorías activas (True) o inactivas (False)
+        orden: Columna de orden (id, nombre, estado)
+        descendente: Ordenar de mayor a menor
+        skip: Número de registros a saltar
+        limit: Número máximo de registros a retornar
+    
+    Returns:
+        Tupla (categorías de la página, total de categorías que cumplen el filtro)
+    """
+    statement = select(Categoria)
+    if estado is not None:
+        statement = statement.where(Categoria.estado == estado)
+    return paginar(
+        session, statement, COLUMNAS_ORDEN_CATEGORIA, orden, descendente, skip, limit,
+        desempate=Categoria.id_categoria,
+    )
+
+
+def contar_categorias(session: Session):
+    """
+    Contar categorías activas, inactivas y totales con una sola consulta.
+    
+    Args:
+        session: Sesión de base de datos
+    
+    Returns:
+        Diccionario con las claves activas, inactivas y total
+    """
+    activas, inactivas = session.exec(select(
+        func.coalesce(func.sum(case((Categoria.estado == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Categoria.estado == False, 1), else_=0)), 0),
+    )).one()
+    return {"activas": activas, "inactivas": inactivas, "total": activas + inactivas}
+
+
 def get_herramientas_por_categoria(session: Session, id_categoria_h: int):
     """
     Obtener todas las herramientas asociadas a una categoría específica.
@@ -89,27 +194,71 @@ def get_herramientas_por_categoria(session: Session, id_categoria_h: int):
     return session.exec(statement).all()
 
 
-def get_categorias_activas(session: Session):
+def get_categorias_activas(session: Session, opciones_carga=()):
     """
     Obtener solo las categorías activas.
     
     Args:
         session: Sesión de base de datos
+        opciones_carga: Opciones de carga de relaciones (p. ej. selectinload(Categoria.herramientas))
     
     Returns:
         Lista de categorías activas
     """
-    statement = select(Categoria).where(Categoria.estado == True)
+    statement = con_opciones_carga(select(Categoria), Categoria, opciones_carga).where(Categoria.estado == True)
     return session.exec(statement).all()
 
 
-def update_categoria(session: Session, categoria_id: int, **kwargs):
+def get_diccionario_categorias(session: Session) -> DiccionarioCategorias:
+    """
+    Obtener los nombres de las categorías y la lista de las activas.
+
+    El diccionario se comparte en todo el proceso y se lee de nuevo (con una
+    sola consulta) después de crear, modificar, habilitar, inhabilitar o
+    borrar una categoría con este módulo, o cuando `version_datos` avanzó
+    porque otro proceso (la API, otra instancia) confirmó cambios. Las listas
+    y los reportes lo piden una vez por página para mostrar el nombre de la
+    categoría de cada herramienta sin una consulta por fila.
+
+    Args:
+        session: Sesión de base de datos
+
+    Returns:
+        DiccionarioCategorias con `nombres` ({id: nombre}) y `activas`
+        ([(id, nombre)] ordenadas por nombre)
+    """
+    engine = session.get_bind()
+    with _lock_diccionarios:
+        guardado = _diccionarios.get(engine)
+        generacion = _generacion
+    version = version_datos(session)
+    acierto = guardado is not None and guardado[0] == version
+    contar_cache("categorias", acierto)
+    if acierto:
+        return guardado[1]
+
+    filas = session.exec(
+        select(Categoria.id_categoria, Categoria.nombre, Categoria.estado).order_by(Categoria.nombre)
+    ).all()
+    diccionario = DiccionarioCategorias(
+        nombres={id_categoria: nombre for id_categoria, nombre, _ in filas},
+        activas=[(id_categoria, nombre) for id_categoria, nombre, estado in filas if estado],
+    )
+    with _lock_diccionarios:
+        if generacion == _generacion:
+            _diccionarios[engine] = (version, diccionario)
+    return diccionario
+
+
+def update_categoria(session: Session, categoria_id: int, version: int | None = None, **kwargs):
     """
     Actualizar una categoría existente.
     
     Args:
         session: Sesión de base de datos
         categoria_id: ID de la categoría a actualizar
+        version: Versión que vio el usuario; si la categoría cambió desde
+            entonces se lanza ConflictoVersion (None: no comprobar)
         **kwargs: Campos a actualizar (nombre, id_herramienta_h, estado)
     
     Returns:
@@ -119,13 +268,18 @@ def update_categoria(session: Session, categoria_id: int, **kwargs):
         db_categoria = get_categoria_by_id(session, categoria_id)
         if not db_categoria:
             return None
+        comprobar_version("categoria", categoria_id, db_categoria, version)
 
         for key, value in kwargs.items():
             setattr(db_categoria, key, value)
 
-        session.commit()
+        confirmar(session, "categoria", categoria_id)
+        _invalidar_diccionario()
         session.refresh(db_categoria)
         return db_categoria
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
@@ -150,6 +304,7 @@ def inhabilitar_categoria(session: Session, categoria_id: int):
 
     db_categoria.estado = False
     session.commit()
+    _invalidar_diccionario()
     session.refresh(db_categoria)
     return True
 
@@ -171,6 +326,7 @@ def habilitar_categoria(session: Session, categoria_id: int):
 
     db_categoria.estado = True
     session.commit()
+    _invalidar_diccionario()
     session.refresh(db_categoria)
     return True
 
@@ -192,4 +348,5 @@ def delete_categoria(session: Session, categoria_id: int):
 
     session.delete(db_categoria)
     session.commit()
+    _invalidar_diccionario()
     return True
@@ -1,5 +1,23 @@
 from sqlmodel import Session, select
 from app.models.empleado import Empleado
+from . import auditoria  # noqa: F401  (registrar la captura de cambios)
+from .busqueda import filtrar_por_texto
+from .concurrencia import ConflictoVersion, comprobar_version, confirmar
+from .idempotencia import creado_antes, registrar_clave
+from .indice_texto import buscar_aproximado
+from .paginacion import con_opciones_carga, paginar
+
+
+# Columnas por las que se puede ordenar la lista de empleados
+COLUMNAS_ORDEN_EMPLEADO = {
+    "id": Empleado.id,
+    "nombre": Empleado.nombre,
+    "apellido": Empleado.apellido,
+    "area": Empleado.area,
+    "correo": Empleado.correo,
+    "activo": Empleado.activo,
+    "prestamos_activos": Empleado.prestamos_activos,
+}
 
 
 def create_empleado(
@@ -9,9 +27,14 @@ def create_empleado(
     area: str,
     correo: str | None = None,
     activo: bool = True,
+    clave_idempotencia: str | None = None,
 ):
-    "Crear empleado nuevo"
+    "Crear empleado nuevo; repetir la `clave_idempotencia` de un envío devuelve el empleado ya creado"
     try:
+        previo = creado_antes(session, Empleado, "empleado", clave_idempotencia)
+        if previo is not None:
+            return previo
+
         # Convertir cadena vacía a None para evitar conflictos de unicidad
         correo = None if correo == "" else correo
         
@@ -23,6 +46,7 @@ def create_empleado(
             activo=activo,
         )
         session.add(empleado)
+        empleado = registrar_clave(session, "empleado", clave_idempotencia, empleado)
         session.commit()
         session.refresh(empleado)
 
@@ -40,30 +64,81 @@ def get_empleado_by_id(session: Session, empleado_id: int):
     return session.exec(statement).first()
 
 
-def get_empleados(session: Session, skip: int = 0, limit: int = 100):
-    "Obtener todos los empleados con paginación"
-    statement = select(Empleado).offset(skip).limit(limit)
+def get_empleados(
+    session: Session, skip: int = 0, limit: int = 100, despues: int | None = None, opciones_carga=(),
+):
+    "Obtener todos los empleados con paginación; con `despues`, por clave: los ids mayores, en orden"
+    statement = con_opciones_carga(select(Empleado), Empleado, opciones_carga)
+    if despues is not None:
+        statement = statement.where(Empleado.id > despues).order_by(Empleado.id)
+    statement = statement.offset(skip).limit(limit)
     return session.exec(statement).all()
 
 
-def get_empleados_activos(session: Session):
+def get_empleados_activos(session: Session, opciones_carga=()):
     "Obtener solo empleados activos"
-    statement = select(Empleado).where(Empleado.activo == True)
+    statement = con_opciones_carga(select(Empleado), Empleado, opciones_carga).where(Empleado.activo == True)
     return session.exec(statement).all()
 
 
-def get_empleados_por_area(session: Session, area: str):
+def get_empleados_por_area(session: Session, area: str, opciones_carga=()):
     "Obtener empleados por área"
-    statement = select(Empleado).where(Empleado.area == area)
+    statement = con_opciones_carga(select(Empleado), Empleado, opciones_carga).where(Empleado.area == area)
     return session.exec(statement).all()
 
 
-def update_empleado(session: Session, empleado_id: int, **kwargs):
-    "Actualizar empleado"
+def buscar_empleados(
+    session: Session,
+    texto: str | None = None,
+    activo: bool | None = None,
+    orden: str = "id",
+    descendente: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+):
+    "Buscar empleados con filtros, orden y paginación en la base de datos (orden 'relevancia' si hay texto). Retorna (empleados, total)"
+    statement, rango = filtrar_por_texto(
+        session, select(Empleado), "empleado", Empleado.id, texto,
+        (Empleado.nombre, Empleado.apellido, Empleado.correo, Empleado.area),
+    )
+    if activo is not None:
+        statement = statement.where(Empleado.activo == activo)
+    columnas = COLUMNAS_ORDEN_EMPLEADO if rango is None else {**COLUMNAS_ORDEN_EMPLEADO, "relevancia": rango}
+    return paginar(
+        session, statement, columnas, orden, descendente, skip, limit,
+        desempate=Empleado.id,
+    )
+
+
+
+def sugerir_empleados(session: Session, texto: str, limite: int = 5):
+    "Buscar empleados por nombre con el índice de trigramas (sin acentos y tolerando errores). Retorna los más parecidos primero"
+    ids = [id_ for id_, _ in buscar_aproximado(session, "empleado", texto, limite)]
+    if not ids:
+        return []
+    por_id = {e.id: e for e in session.exec(select(Empleado).where(Empleado.id.in_(ids))).all()}
+    return [por_id[id_] for id_ in ids if id_ in por_id]
+
+
+def autocompletar_empleados(session: Session, texto: str | None = None, limite: int = 20):
+    "Empleados activos cuyo nombre, apellido o área empieza con las palabras escritas, para selectores con búsqueda. Retorna como máximo `limite`"
+    statement, rango = filtrar_por_texto(
+        session, select(Empleado).where(Empleado.activo == True), "empleado", Empleado.id, texto,
+        (Empleado.nombre, Empleado.apellido, Empleado.area), columnas=("nombre", "apellido", "area"),
+    )
+    orden = [Empleado.nombre, Empleado.apellido, Empleado.id]
+    if rango is not None:
+        orden.insert(0, rango)
+    return session.exec(statement.order_by(*orden).limit(limite)).all()
+
+
+def update_empleado(session: Session, empleado_id: int, version: int | None = None, **kwargs):
+    "Actualizar empleado; con `version`, solo si nadie lo modificó desde esa versión (si no, ConflictoVersion)"
     try:
         db_empleado = get_empleado_by_id(session, empleado_id)
         if not db_empleado:
             return None
+        comprobar_version("empleado", empleado_id, db_empleado, version)
 
         for key, value in kwargs.items():
             # Convertir cadena vacía a None para el campo correo
@@ -71,9 +146,12 @@ def update_empleado(session: Session, empleado_id: int, **kwargs):
                 value = None
             setattr(db_empleado, key, value)
 
-        session.commit()
+        confirmar(session, "empleado", empleado_id)
         session.refresh(db_empleado)
         return db_empleado
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
@@ -1,5 +1,25 @@
+import random
+
+from sqlalchemy import case, func
 from sqlmodel import Session, select
 from app.models.herramienta import Herramienta
+from . import auditoria  # noqa: F401  (registrar la captura de cambios)
+from .busqueda import filtrar_por_texto
+from .concurrencia import ConflictoVersion, comprobar_version, confirmar
+from .idempotencia import creado_antes, registrar_clave
+from .indice_texto import buscar_aproximado
+from .paginacion import con_opciones_carga, paginar
+
+
+# Columnas por las que se puede ordenar la lista de herramientas
+COLUMNAS_ORDEN_HERRAMIENTA = {
+    "id": Herramienta.id_herramienta,
+    "nombre": Herramienta.nombre,
+    "codigo_interno": Herramienta.codigo_interno,
+    "cantidad_disponible": Herramienta.cantidad_disponible,
+    "unidades_prestadas": Herramienta.unidades_prestadas,
+    "estado": Herramienta.estado,
+}
 
 
 def generate_codigo_interno(nombre: str) -> str:
@@ -11,7 +31,6 @@ def generate_codigo_interno(nombre: str) -> str:
         codigo = nombre.upper() + "0" * (3 - len(nombre))
     
     # Generar un número aleatorio de 4 dígitos
-    import random
     numero = random.randint(1000, 9999)
     
     return f"{codigo}-{numero}"
@@ -25,9 +44,14 @@ def create_herramienta(
     codigo_interno: str = None,
     cantidad_disponible: int = 1,
     descripcion: str = None,
+    clave_idempotencia: str | None = None,
 ):
-    "Crear una nueva herramienta"
+    "Crear una nueva herramienta; repetir la `clave_idempotencia` de un envío devuelve la herramienta ya creada"
     try:
+        previa = creado_antes(session, Herramienta, "herramienta", clave_idempotencia)
+        if previa is not None:
+            return previa
+
         # Generar código interno automático si no se proporciona
         if not codigo_interno:
             codigo_interno = generate_codigo_interno(nombre)
@@ -42,6 +66,7 @@ def create_herramienta(
             descripcion=descripcion,
         )
         session.add(herramienta)
+        herramienta = registrar_clave(session, "herramienta", clave_idempotencia, herramienta)
         session.commit()
         session.refresh(herramienta)
 
@@ -59,30 +84,103 @@ def get_herramienta_by_id(session: Session, herramienta_id: int):
     return session.exec(statement).first()
 
 
-def get_herramientas(session: Session, skip: int = 0, limit: int = 100):
-    "Obtener todas las herramientas con paginación"
-    statement = select(Herramienta).offset(skip).limit(limit)
+def get_herramientas(
+    session: Session, skip: int = 0, limit: int = 100, despues: int | None = None, opciones_carga=(),
+):
+    "Obtener todas las herramientas con paginación; con `despues`, por clave: los ids mayores, en orden"
+    statement = con_opciones_carga(select(Herramienta), Herramienta, opciones_carga)
+    if despues is not None:
+        statement = statement.where(Herramienta.id_herramienta > despues).order_by(Herramienta.id_herramienta)
+    statement = statement.offset(skip).limit(limit)
     return session.exec(statement).all()
 
 
-def get_herramientas_disponibles(session: Session):
+def get_herramientas_disponibles(session: Session, opciones_carga=()):
     "Obtener solo herramientas disponibles"
-    statement = select(Herramienta).where(Herramienta.estado == True)
+    statement = con_opciones_carga(select(Herramienta), Herramienta, opciones_carga).where(Herramienta.estado == True)
     return session.exec(statement).all()
 
 
-def get_herramientas_por_categoria(session: Session, categoria: str):
+def get_herramientas_por_categoria(session: Session, categoria: str, opciones_carga=()):
     "Obtener herramientas por categoría"
-    statement = select(Herramienta).where(Herramienta.categoria == categoria)
+    statement = con_opciones_carga(select(Herramienta), Herramienta, opciones_carga).where(Herramienta.categoria == categoria)
     return session.exec(statement).all()
 
 
-def update_herramienta(session: Session, herramienta_id: int, **kwargs):
-    "Actualizar herramienta"
+def buscar_herramientas(
+    session: Session,
+    texto: str | None = None,
+    estado: bool | None = None,
+    disponible: bool | None = None,
+    orden: str = "id",
+    descendente: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+):
+    "Buscar herramientas con filtros, orden y paginación en la base de datos (orden 'relevancia' si hay texto). Retorna (herramientas, total)"
+    statement, rango = filtrar_por_texto(
+        session, select(Herramienta), "herramienta", Herramienta.id_herramienta, texto,
+        (Herramienta.nombre, Herramienta.codigo_interno, Herramienta.descripcion),
+    )
+    if estado is not None:
+        statement = statement.where(Herramienta.estado == estado)
+    if disponible is True:
+        statement = statement.where(Herramienta.cantidad_disponible > 0)
+    elif disponible is False:
+        statement = statement.where(Herramienta.cantidad_disponible <= 0)
+    columnas = COLUMNAS_ORDEN_HERRAMIENTA if rango is None else {**COLUMNAS_ORDEN_HERRAMIENTA, "relevancia": rango}
+    return paginar(
+        session, statement, columnas, orden, descendente, skip, limit,
+        desempate=Herramienta.id_herramienta,
+    )
+
+
+
+def sugerir_herramientas(session: Session, texto: str, limite: int = 5):
+    "Buscar herramientas por nombre o código con el índice de trigramas (sin acentos y tolerando errores). Retorna las más parecidas primero"
+    ids = [id_ for id_, _ in buscar_aproximado(session, "herramienta", texto, limite)]
+    if not ids:
+        return []
+    statement = select(Herramienta).where(Herramienta.id_herramienta.in_(ids))
+    por_id = {h.id_herramienta: h for h in session.exec(statement).all()}
+    return [por_id[id_] for id_ in ids if id_ in por_id]
+
+
+def autocompletar_herramientas(session: Session, texto: str | None = None, limite: int = 20, con_stock: bool = True):
+    "Herramientas en servicio (y con stock, salvo con_stock=False) cuyo nombre o código empieza con las palabras escritas, para selectores con búsqueda. Retorna como máximo `limite`"
+    disponibles = select(Herramienta).where(Herramienta.estado == True)
+    if con_stock:
+        disponibles = disponibles.where(Herramienta.cantidad_disponible > 0)
+    statement, rango = filtrar_por_texto(
+        session, disponibles, "herramienta", Herramienta.id_herramienta, texto,
+        (Herramienta.nombre, Herramienta.codigo_interno), columnas=("nombre", "codigo_interno"),
+    )
+    orden = [Herramienta.nombre, Herramienta.id_herramienta]
+    if rango is not None:
+        orden.insert(0, rango)
+    return session.exec(statement.order_by(*orden).limit(limite)).all()
+
+
+def contar_herramientas(session: Session):
+    "Contar herramientas en servicio, fuera de servicio y totales con una sola consulta"
+    en_servicio, fuera_servicio = session.exec(select(
+        func.coalesce(func.sum(case((Herramienta.estado == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Herramienta.estado == False, 1), else_=0)), 0),
+    )).one()
+    return {
+        "en_servicio": en_servicio,
+        "fuera_servicio": fuera_servicio,
+        "total": en_servicio + fuera_servicio,
+    }
+
+
+def update_herramienta(session: Session, herramienta_id: int, version: int | None = None, **kwargs):
+    "Actualizar herramienta; con `version`, solo si nadie la modificó desde esa versión (si no, ConflictoVersion)"
     try:
         db_herramienta = get_herramienta_by_id(session, herramienta_id)
         if not db_herramienta:
             return None
+        comprobar_version("herramienta", herramienta_id, db_herramienta, version)
 
         # Si se está actualizando el nombre y no se proporciona código interno,
         # generar uno automáticamente
@@ -106,9 +204,12 @@ def update_herramienta(session: Session, herramienta_id: int, **kwargs):
         for key, value in kwargs.items():
             setattr(db_herramienta, key, value)
 
-        session.commit()
+        confirmar(session, "herramienta", herramienta_id)
         session.refresh(db_herramienta)
         return db_herramienta
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
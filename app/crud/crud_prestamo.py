@@ -1,7 +1,95 @@
+from sqlalchemy import String, bindparam, cast, false, func, or_, update
 from sqlmodel import Session, select
 from app.models.prestamo import Prestamo
+from app.models.prestamo_archivado import PrestamoArchivado
 from app.models.herramienta import Herramienta
+from app.models.empleado import Empleado
 from datetime import datetime, timedelta
+from .archivo import fuente_prestamos, usa_archivo
+from .auditoria import evento, registrar_eventos
+from .busqueda import coincidencias
+from .concurrencia import ConflictoVersion, comprobar_version, confirmar
+from .crud_reserva import cabe_prestamo
+from .idempotencia import creado_antes, registrar_clave
+from .paginacion import con_opciones_carga, paginar, patron_busqueda
+
+
+def _columnas_orden(P=Prestamo):
+    """Columnas por las que se puede ordenar la lista de préstamos (P puede incluir el archivo)"""
+    return {
+        "id": P.id_prestamo,
+        "fecha_prestamo": P.fecha_prestamo,
+        "fecha_devolucion_estimada": P.fecha_devolucion_estimada,
+        "estado": P.estado,
+        "empleado": Empleado.nombre,
+        "herramienta": Herramienta.nombre,
+    }
+
+
+COLUMNAS_ORDEN_PRESTAMO = _columnas_orden()
+
+
+def _en_periodo(statement, P, desde: datetime | None, hasta: datetime | None):
+    """Filtrar una consulta por fecha de préstamo"""
+    if desde is not None:
+        statement = statement.where(P.fecha_prestamo >= desde)
+    if hasta is not None:
+        statement = statement.where(P.fecha_prestamo <= hasta)
+    return statement
+
+
+def _sumar_prestamos_activos(session: Session, empleado_id: int, cantidad: int):
+    """Actualizar el contador de préstamos activos del empleado en la misma transacción"""
+    activos = session.execute(
+        update(Empleado)
+        .where(Empleado.id == empleado_id)
+        .values(prestamos_activos=Empleado.prestamos_activos + cantidad)
+        .returning(Empleado.prestamos_activos)
+    ).scalar()
+    if activos is not None:
+        registrar_eventos(session, [
+            evento(session, "empleado", empleado_id, "actualizar", {"prestamos_activos": (activos - cantidad, activos)})
+        ])
+
+
+def _mover_stock(session: Session, herramienta_id: int, unidades: int, *condiciones) -> bool:
+    """
+    Pasar `unidades` del stock de una herramienta a prestadas (negativo: devolverlas).
+
+    La sentencia solo cambia la fila si se cumplen `condiciones`; los valores
+    nuevos vuelven en la misma sentencia y el cambio queda en la auditoría.
+    Retorna False si la fila no cambió.
+    """
+    fila = session.execute(
+        update(Herramienta)
+        .where(Herramienta.id_herramienta == herramienta_id, *condiciones)
+        .values(
+            cantidad_disponible=Herramienta.cantidad_disponible - unidades,
+            unidades_prestadas=Herramienta.unidades_prestadas + unidades,
+            # El stock se edita en el formulario de la herramienta: una edición
+            # abierta antes de este movimiento ya no puede pisarlo
+            version=Herramienta.version + 1,
+        )
+        .returning(Herramienta.cantidad_disponible, Herramienta.unidades_prestadas)
+    ).first()
+    if fila is None:
+        return False
+    registrar_eventos(session, [
+        evento(session, "herramienta", herramienta_id, "actualizar", {
+            "cantidad_disponible": (fila.cantidad_disponible + unidades, fila.cantidad_disponible),
+            "unidades_prestadas": (fila.unidades_prestadas - unidades, fila.unidades_prestadas),
+        })
+    ])
+    return True
+
+
+def _cerrar_prestamo(session: Session, prestamo: Prestamo):
+    """Devolver al stock la unidad de un préstamo activo y descontarlo de los contadores"""
+    if prestamo.estado != "activo":
+        # Otra sesión (o esta misma antes) ya lo cerró y ajustó el stock y los contadores
+        raise ConflictoVersion("prestamo", prestamo.id_prestamo)
+    _mover_stock(session, prestamo.id_herramienta_h, -1)
+    _sumar_prestamos_activos(session, prestamo.id_empleado_h, -1)
 
 
 def create_prestamo(
@@ -12,9 +100,22 @@ def create_prestamo(
     fecha_devolucion_estimada: datetime = None,
     observaciones: str = None,
     estado: str = "activo",
+    clave_idempotencia: str | None = None,
 ):
-    """Crear un nuevo préstamo"""
+    """
+    Crear un nuevo préstamo. Retorna None si no hay stock o si el préstamo dejaría sin unidades a una reserva.
+
+    Repetir la `clave_idempotencia` de un envío devuelve el préstamo ya creado,
+    sin volver a descontar el stock.
+    """
     try:
+        previo = creado_antes(session, Prestamo, "prestamo", clave_idempotencia)
+        if previo is not None:
+            return previo
+
+        fecha_prestamo = fecha_prestamo or datetime.now()
+        fecha_devolucion_estimada = fecha_devolucion_estimada or (datetime.now() + timedelta(days=1))
+
         # Obtener la herramienta para validar stock y estado
         herramienta = session.get(Herramienta, id_herramienta_h)
         if not herramienta:
@@ -24,24 +125,37 @@ def create_prestamo(
         if not herramienta.estado:
             return None  # Herramienta inactiva
         
-        # Validar que haya stock disponible
-        if herramienta.cantidad_disponible <= 0:
-            return None  # No hay stock disponible
+        # Solo un préstamo activo ocupa una unidad: uno registrado ya devuelto o
+        # cancelado no toca el stock ni los contadores (ver reconciliar_contadores)
+        if estado == "activo":
+            # Descontar del stock solo si todavía queda: la condición se evalúa en la
+            # misma sentencia, así dos préstamos simultáneos no pueden llevarlo a negativo
+            if not _mover_stock(
+                session, id_herramienta_h, 1,
+                Herramienta.estado == True,
+                Herramienta.cantidad_disponible > 0,
+            ):
+                session.rollback()
+                return None  # No hay stock disponible
+
+            # La unidad tiene que seguir libre hasta la devolución estimada: si el
+            # empleado la tenía reservada, el préstamo usa su reserva
+            if not cabe_prestamo(session, id_herramienta_h, id_empleado_h, fecha_prestamo, fecha_devolucion_estimada):
+                session.rollback()
+                return None  # Chocaría con una reserva de otro empleado
+            _sumar_prestamos_activos(session, id_empleado_h, 1)
         
         # Crear el préstamo
         prestamo = Prestamo(
             id_empleado_h=id_empleado_h,
             id_herramienta_h=id_herramienta_h,
-            fecha_prestamo=fecha_prestamo or datetime.now(),
-            fecha_devolucion_estimada=fecha_devolucion_estimada or (datetime.now() + timedelta(days=1)),
+            fecha_prestamo=fecha_prestamo,
+            fecha_devolucion_estimada=fecha_devolucion_estimada,
             observaciones=observaciones,
             estado=estado,
         )
         session.add(prestamo)
-        
-        # Descontar del stock
-        herramienta.cantidad_disponible -= 1
-        
+        prestamo = registrar_clave(session, "prestamo", clave_idempotencia, prestamo)
         session.commit()
         session.refresh(prestamo)
 
@@ -59,53 +173,196 @@ def get_prestamo_by_id(session: Session, prestamo_id: int):
     return session.exec(statement).first()
 
 
-def get_prestamos(session: Session, skip: int = 0, limit: int = 100):
-    """Obtener todos los préstamos con paginación"""
-    statement = select(Prestamo).offset(skip).limit(limit)
+def get_prestamos(
+    session: Session,
+    skip: int = 0,
+    limit: int | None = 100,
+    desde: datetime = None,
+    hasta: datetime = None,
+    despues: int | None = None,
+    opciones_carga=(),
+):
+    """
+    Obtener todos los préstamos con paginación, opcionalmente por período de fecha
+    de préstamo (incluye los archivados). Con `despues` la paginación es por clave:
+    los ids mayores, en orden.
+
+    `opciones_carga` elige cómo cargar empleado y herramienta; con un período
+    la consulta puede ser sobre un alias (la unión con el archivo), así que
+    conviene pasar funciones de la entidad: `lambda P: selectinload(P.empleado)`.
+    """
+    P = fuente_prestamos(session, desde=desde, hasta=hasta)
+    statement = _en_periodo(con_opciones_carga(select(P), P, opciones_carga), P, desde, hasta)
+    if despues is not None:
+        statement = statement.where(P.id_prestamo > despues).order_by(P.id_prestamo)
+    statement = statement.offset(skip).limit(limit)
     return session.exec(statement).all()
 
 
-def get_prestamos_activos(session: Session):
+def get_prestamos_activos(session: Session, opciones_carga=()):
     """Obtener solo préstamos activos (no devueltos)"""
-    statement = select(Prestamo).where(Prestamo.estado == "activo")
+    statement = con_opciones_carga(select(Prestamo), Prestamo, opciones_carga).where(Prestamo.estado == "activo")
     return session.exec(statement).all()
 
 
-def get_prestamos_por_empleado(session: Session, empleado_id: int):
-    """Obtener préstamos de un empleado específico"""
-    statement = select(Prestamo).where(Prestamo.id_empleado_h == empleado_id)
+def get_prestamos_por_empleado(
+    session: Session, empleado_id: int, desde: datetime = None, hasta: datetime = None, opciones_carga=(),
+):
+    """Obtener préstamos de un empleado específico, opcionalmente por período (incluye los archivados; ver get_prestamos)"""
+    P = fuente_prestamos(session, desde=desde, hasta=hasta)
+    statement = con_opciones_carga(select(P), P, opciones_carga).where(P.id_empleado_h == empleado_id)
+    statement = _en_periodo(statement, P, desde, hasta)
     return session.exec(statement).all()
 
 
-def get_prestamos_por_herramienta(session: Session, herramienta_id: int):
-    """Obtener préstamos de una herramienta específica"""
-    statement = select(Prestamo).where(Prestamo.id_herramienta_h == herramienta_id)
+def get_prestamos_por_herramienta(
+    session: Session, herramienta_id: int, desde: datetime = None, hasta: datetime = None, opciones_carga=(),
+):
+    """Obtener préstamos de una herramienta específica, opcionalmente por período (incluye los archivados; ver get_prestamos)"""
+    P = fuente_prestamos(session, desde=desde, hasta=hasta)
+    statement = con_opciones_carga(select(P), P, opciones_carga).where(P.id_herramienta_h == herramienta_id)
+    statement = _en_periodo(statement, P, desde, hasta)
     return session.exec(statement).all()
 
 
-def get_prestamos_vencidos(session: Session):
+def get_prestamos_vencidos(session: Session, opciones_carga=()):
     """Obtener préstamos vencidos (fecha_devolucion_estimada < hoy)"""
     hoy = datetime.now()
-    statement = select(Prestamo).where(
+    statement = con_opciones_carga(select(Prestamo), Prestamo, opciones_carga).where(
         (Prestamo.fecha_devolucion_estimada < hoy) &
         (Prestamo.estado == "activo")
     )
     return session.exec(statement).all()
 
 
-def update_prestamo(session: Session, prestamo_id: int, **kwargs):
-    """Actualizar préstamo"""
+def _filtrar_prestamos(
+    session: Session,
+    statement,
+    texto: str | None,
+    empleado_id: int | None,
+    P=Prestamo,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+):
+    """Aplicar los filtros de texto, empleado y período comunes a la búsqueda y al conteo"""
+    if texto and texto.strip():
+        patron = patron_busqueda(texto)
+        condiciones = [cast(P.id_prestamo, String).like(patron, escape="\\")]
+        # Un préstamo coincide por sus observaciones, su empleado o su herramienta
+        # (las observaciones de los préstamos archivados no están en el índice)
+        indices = [
+            (P.id_prestamo, coincidencias(session, "prestamo", texto)),
+            (P.id_empleado_h, coincidencias(session, "empleado", texto)),
+            (P.id_herramienta_h, coincidencias(session, "herramienta", texto)),
+        ]
+        if all(encontrados is not None for _, encontrados in indices):
+            condiciones += [columna.in_(select(encontrados.c.id)) for columna, encontrados in indices]
+        else:
+            condiciones += [
+                func.lower(columna).like(patron, escape="\\")
+                for columna in (
+                    P.observaciones, Empleado.nombre, Empleado.apellido,
+                    Herramienta.nombre, Herramienta.codigo_interno,
+                )
+            ]
+        statement = statement.where(or_(*condiciones))
+    if empleado_id is not None:
+        statement = statement.where(P.id_empleado_h == empleado_id)
+    return _en_periodo(statement, P, desde, hasta)
+
+
+def buscar_prestamos(
+    session: Session,
+    texto: str | None = None,
+    estado: str | None = None,
+    empleado_id: int | None = None,
+    orden: str = "id",
+    descendente: bool = True,
+    skip: int = 0,
+    limit: int = 50,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+):
+    """
+    Buscar préstamos con filtros, orden y paginación en la base de datos.
+
+    El estado puede ser "activo", "devuelto", "cancelado" o "vencido" (activo
+    con fecha estimada de devolución pasada). Cada fila trae el empleado y la
+    herramienta del préstamo, obtenidos en la misma consulta. Los préstamos
+    archivados se incluyen solo si el estado y el período (por fecha de
+    préstamo) pueden alcanzarlos.
+
+    Retorna (filas, total), donde cada fila es (prestamo, empleado, herramienta).
+    """
+    P = fuente_prestamos(session, estado=estado, desde=desde, hasta=hasta)
+    statement = (
+        select(P, Empleado, Herramienta)
+        .outerjoin(Empleado, Empleado.id == P.id_empleado_h)
+        .outerjoin(Herramienta, Herramienta.id_herramienta == P.id_herramienta_h)
+    )
+    statement = _filtrar_prestamos(session, statement, texto, empleado_id, P, desde, hasta)
+    if estado == "vencido":
+        statement = statement.where(
+            (P.estado == "activo") & (P.fecha_devolucion_estimada < datetime.now())
+        )
+    elif estado is not None:
+        statement = statement.where(P.estado == estado)
+    return paginar(
+        session, statement, _columnas_orden(P), orden, descendente, skip, limit,
+        desempate=P.id_prestamo,
+    )
+
+
+def contar_prestamos_por_estado(
+    session: Session,
+    texto: str | None = None,
+    empleado_id: int | None = None,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+):
+    """Contar préstamos por estado (incluye "vencido") con los mismos filtros que buscar_prestamos"""
+    # Un conteo agrupado por tabla: sumar los dos resultados evita recorrer la
+    # unión, y en el archivo (solo cerrados) no hay vencidos que calcular
+    conteo = {"activo": 0, "vencido": 0, "devuelto": 0, "cancelado": 0}
+    modelos = [Prestamo, PrestamoArchivado] if usa_archivo(session, desde=desde) else [Prestamo]
+    for P in modelos:
+        if P is Prestamo:
+            vencido = (P.estado == "activo") & (P.fecha_devolucion_estimada < datetime.now())
+            statement = select(P.estado, vencido, func.count()).select_from(P)
+        else:
+            statement = select(P.estado, false(), func.count()).select_from(P)
+        if texto and texto.strip():
+            statement = (
+                statement
+                .outerjoin(Empleado, Empleado.id == P.id_empleado_h)
+                .outerjoin(Herramienta, Herramienta.id_herramienta == P.id_herramienta_h)
+            )
+        statement = _filtrar_prestamos(session, statement, texto, empleado_id, P, desde, hasta)
+        agrupado = statement.group_by(P.estado, vencido) if P is Prestamo else statement.group_by(P.estado)
+        for estado, es_vencido, cantidad in session.exec(agrupado).all():
+            conteo[estado] = conteo.get(estado, 0) + cantidad
+            if es_vencido:
+                conteo["vencido"] += cantidad
+    return conteo
+
+
+def update_prestamo(session: Session, prestamo_id: int, version: int | None = None, **kwargs):
+    """Actualizar préstamo; con `version`, solo si nadie lo modificó desde esa versión (si no, ConflictoVersion)"""
     try:
         db_prestamo = get_prestamo_by_id(session, prestamo_id)
         if not db_prestamo:
             return None
+        comprobar_version("prestamo", prestamo_id, db_prestamo, version)
 
         for key, value in kwargs.items():
             setattr(db_prestamo, key, value)
 
-        session.commit()
+        confirmar(session, "prestamo", prestamo_id)
         session.refresh(db_prestamo)
         return db_prestamo
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
@@ -114,23 +371,28 @@ def update_prestamo(session: Session, prestamo_id: int, **kwargs):
 
 
 def devolver_prestamo(session: Session, prestamo_id: int, fecha_devolucion: datetime = None):
-    """Marcar un préstamo como devuelto"""
+    """
+    Marcar un préstamo como devuelto. Retorna False si no existe.
+
+    Si ya no está activo (otra sesión lo devolvió o canceló, antes o al mismo
+    tiempo), lanza ConflictoVersion y el stock no se suma dos veces.
+    """
     try:
         db_prestamo = get_prestamo_by_id(session, prestamo_id)
         if not db_prestamo:
             return False
 
-        # Obtener la herramienta para actualizar el stock
-        herramienta = session.get(Herramienta, db_prestamo.id_herramienta_h)
-        if herramienta:
-            # Sumar al stock al devolver
-            herramienta.cantidad_disponible += 1
+        # Sumar al stock al devolver y actualizar los contadores
+        _cerrar_prestamo(session, db_prestamo)
 
         db_prestamo.estado = "devuelto"
         db_prestamo.fecha_devolucion = fecha_devolucion or datetime.now()
-        session.commit()
+        confirmar(session, "prestamo", prestamo_id)
         session.refresh(db_prestamo)
         return True
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
@@ -139,24 +401,79 @@ def devolver_prestamo(session: Session, prestamo_id: int, fecha_devolucion: date
 
 
 def cancelar_prestamo(session: Session, prestamo_id: int):
-    """Cancelar un préstamo"""
+    """Cancelar un préstamo. Retorna False si no existe; ConflictoVersion si ya no está activo"""
     try:
         db_prestamo = get_prestamo_by_id(session, prestamo_id)
         if not db_prestamo:
             return False
 
-        # Obtener la herramienta para actualizar el stock
-        herramienta = session.get(Herramienta, db_prestamo.id_herramienta_h)
-        if herramienta:
-            # Sumar al stock al cancelar (porque el préstamo nunca se concretó)
-            herramienta.cantidad_disponible += 1
+        # Sumar al stock al cancelar (porque el préstamo nunca se concretó)
+        _cerrar_prestamo(session, db_prestamo)
 
         db_prestamo.estado = "cancelado"
-        session.commit()
+        confirmar(session, "prestamo", prestamo_id)
         session.refresh(db_prestamo)
         return True
+    except ConflictoVersion:
+        session.rollback()
+        raise
     except Exception as e:
         # Hacer rollback en caso de error
         session.rollback()
         # Re-lanzar la excepción para que el llamador pueda manejarla
         raise Exception(f"Error al cancelar préstamo: {str(e)}")
+
+
+def reconciliar_contadores(session: Session):
+    """
+    Recalcular en bloque los contadores de préstamos activos a partir de los préstamos.
+
+    Corrige `Empleado.prestamos_activos` y `Herramienta.unidades_prestadas`
+    a partir de un conteo agrupado de los préstamos activos; solo se actualizan
+    las filas desfasadas (por ejemplo tras cargas masivas o cambios de estado
+    con update_prestamo).
+    Las correcciones quedan en el registro de auditoría.
+
+    Retorna {"empleados": filas corregidas, "herramientas": filas corregidas}
+    """
+    try:
+        corregidas = {}
+        for entidad, modelo, columna_id, contador, columna_prestamo in (
+            ("empleado", Empleado, Empleado.id, Empleado.prestamos_activos, Prestamo.id_empleado_h),
+            ("herramienta", Herramienta, Herramienta.id_herramienta, Herramienta.unidades_prestadas, Prestamo.id_herramienta_h),
+        ):
+            # Contar los activos de una vez: una subconsulta correlacionada por fila
+            # puede recorrer todos los préstamos activos por cada fila si el
+            # planificador elige el índice de estado
+            activos = (
+                select(columna_prestamo.label("id"), func.count().label("n"))
+                .where(Prestamo.estado == "activo")
+                .group_by(columna_prestamo)
+                .subquery()
+            )
+            conteo = func.coalesce(activos.c.n, 0)
+            desfasadas = session.exec(
+                select(columna_id, contador, conteo)
+                .outerjoin(activos, activos.c.id == columna_id)
+                .where(contador != conteo)
+            ).all()
+            if desfasadas:
+                # UPDATE por clave primaria, en lote. Sobre la tabla y no el modelo: los
+                # contadores son derivados y corregirlos no cambia la versión de la fila
+                tabla = modelo.__table__
+                session.execute(
+                    update(tabla)
+                    .where(tabla.c[columna_id.key] == bindparam("b_id"))
+                    .values({contador.key: bindparam("b_n")}),
+                    [{"b_id": id_, "b_n": despues} for id_, _, despues in desfasadas],
+                )
+            corregidas[entidad] = len(desfasadas)
+            registrar_eventos(session, [
+                evento(session, entidad, id_, "actualizar", {contador.key: (antes, despues)})
+                for id_, antes, despues in desfasadas
+            ])
+        session.commit()
+        return {"empleados": corregidas["empleado"], "herramientas": corregidas["herramienta"]}
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al reconciliar contadores: {str(e)}")
@@ -0,0 +1,135 @@
+"""
+Agregaciones utilizadas por la página de Relatórios.
+
+Estas funciones vivían en la página de Streamlit; se movieron a la capa CRUD
+para poder reutilizarlas y medirlas sin levantar la interfaz. Los conteos se
+hacen en la base de datos (`GROUP BY` y `func.count`) sobre toda la historia
+de préstamos, incluido el archivo; las filas del ranking se leen después con
+una consulta `IN`.
+"""
+
+from sqlalchemy import case, func
+from sqlmodel import Session, select
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from .archivo import fuente_prestamos
+from .crud_prestamo import contar_prestamos_por_estado
+
+
+def _ranking(session: Session, columna_id, top_n: int):
+    """[(id, préstamos)] de los `top_n` valores de `columna_id` con más préstamos (desempate por id)"""
+    cantidad = func.count().label("prestamos")
+    statement = (
+        select(columna_id, cantidad)
+        .group_by(columna_id)
+        .order_by(cantidad.desc(), columna_id)
+        .limit(top_n)
+    )
+    return session.exec(statement).all()
+
+
+def get_herramientas_mas_solicitadas(session: Session, top_n: int = 5):
+    """
+    Obtener las herramientas más solicitadas.
+
+    Args:
+        session: Sesión de base de datos
+        top_n: Número de herramientas a retornar
+
+    Returns:
+        Lista de diccionarios con la herramienta, el total de préstamos
+        y los nombres de los empleados que la pidieron
+    """
+    P = fuente_prestamos(session)
+    ranking = _ranking(session, P.id_herramienta_h, top_n)
+    if not ranking:
+        return []
+
+    ids = [herramienta_id for herramienta_id, _ in ranking]
+    herramientas = {
+        h.id_herramienta: h
+        for h in session.exec(select(Herramienta).where(Herramienta.id_herramienta.in_(ids))).all()
+    }
+    # Empleados distintos de cada herramienta del ranking, en una consulta
+    empleados = {herramienta_id: [] for herramienta_id in ids}
+    statement = (
+        select(P.id_herramienta_h, Empleado.nombre, Empleado.apellido)
+        .join(Empleado, Empleado.id == P.id_empleado_h)
+        .where(P.id_herramienta_h.in_(ids))
+        .distinct()
+        .order_by(P.id_herramienta_h, Empleado.nombre, Empleado.apellido)
+    )
+    for herramienta_id, nombre, apellido in session.exec(statement).all():
+        empleados[herramienta_id].append(f"{nombre} {apellido}")
+
+    return [
+        {
+            "herramienta": herramientas[herramienta_id],
+            "prestamos": cantidad,
+            "empleados": empleados[herramienta_id],
+        }
+        for herramienta_id, cantidad in ranking
+        if herramienta_id in herramientas
+    ]
+
+
+def get_empleados_mas_activos(session: Session, top_n: int = 5):
+    """
+    Obtener los empleados con más préstamos.
+
+    Args:
+        session: Sesión de base de datos
+        top_n: Número de empleados a retornar
+
+    Returns:
+        Lista de diccionarios con el empleado y su total de préstamos
+    """
+    P = fuente_prestamos(session)
+    ranking = _ranking(session, P.id_empleado_h, top_n)
+    if not ranking:
+        return []
+
+    ids = [empleado_id for empleado_id, _ in ranking]
+    empleados = {e.id: e for e in session.exec(select(Empleado).where(Empleado.id.in_(ids))).all()}
+    return [
+        {"empleado": empleados[empleado_id], "prestamos": cantidad}
+        for empleado_id, cantidad in ranking
+        if empleado_id in empleados
+    ]
+
+
+def get_estadisticas_generales(session: Session):
+    """
+    Obtener estadísticas generales.
+
+    Args:
+        session: Sesión de base de datos
+
+    Returns:
+        Diccionario con los totales de préstamos, empleados y herramientas
+    """
+    # "vencido" es parte de "activo": no se suma al total
+    prestamos = contar_prestamos_por_estado(session)
+    total_empleados, empleados_activos = session.exec(
+        select(func.count(), func.count(case((Empleado.activo, 1)))).select_from(Empleado)
+    ).one()
+    total_herramientas, herramientas_activas, herramientas_disponibles = session.exec(
+        select(
+            func.count(),
+            func.count(case((Herramienta.estado, 1))),
+            func.coalesce(func.sum(Herramienta.cantidad_disponible), 0),
+        ).select_from(Herramienta)
+    ).one()
+
+    return {
+        "total_prestamos": sum(cantidad for estado, cantidad in prestamos.items() if estado != "vencido"),
+        "prestamos_activos": prestamos["activo"],
+        "prestamos_vencidos": prestamos["vencido"],
+        "prestamos_devueltos": prestamos["devuelto"],
+        "prestamos_cancelados": prestamos["cancelado"],
+        "total_empleados": total_empleados,
+        "empleados_activos": empleados_activos,
+        "total_herramientas": total_herramientas,
+        "herramientas_activas": herramientas_activas,
+        "herramientas_disponibles": herramientas_disponibles,
+    }
@@ -0,0 +1,230 @@
+from sqlmodel import Session, select
+from app.models.reserva import Reserva
+from app.models.prestamo import Prestamo
+from app.models.herramienta import Herramienta
+from app.models.empleado import Empleado
+from datetime import datetime
+from . import auditoria  # noqa: F401  (registrar la captura de cambios)
+from .agenda import Agenda, compromiso_de, unidades_ocupadas
+from .idempotencia import creado_antes, registrar_clave
+from .paginacion import paginar
+
+
+# Columnas por las que se puede ordenar la lista de reservas
+COLUMNAS_ORDEN_RESERVA = {
+    "fecha_inicio": Reserva.fecha_inicio,
+    "fecha_fin": Reserva.fecha_fin,
+    "id": Reserva.id_reserva,
+    "empleado": Empleado.nombre,
+    "herramienta": Herramienta.nombre,
+}
+
+
+def _capacidad(session: Session, herramienta_id: int):
+    """Unidades totales de una herramienta en servicio (en stock más prestadas), o None"""
+    return session.exec(
+        select(Herramienta.cantidad_disponible + Herramienta.unidades_prestadas)
+        .where(Herramienta.id_herramienta == herramienta_id, Herramienta.estado == True)
+    ).first()
+
+
+def _reservas_en_periodo(session: Session, herramienta_id: int, desde: datetime, hasta: datetime):
+    """Reservas activas de una herramienta que se solapan con [desde, hasta) (usa el índice por rango)"""
+    statement = select(Reserva).where(
+        Reserva.id_herramienta_h == herramienta_id,
+        Reserva.estado == "activa",
+        Reserva.fecha_fin > desde,
+        Reserva.fecha_inicio < hasta,
+    ).order_by(Reserva.fecha_inicio, Reserva.id_reserva)
+    return session.exec(statement).all()
+
+
+def _ocupadas_en_bd(session: Session, herramienta_id: int, desde: datetime, hasta: datetime, reservas):
+    """
+    Máximo de unidades comprometidas en [desde, hasta) calculado desde la base de datos.
+
+    Los préstamos activos de una herramienta son pocos (como mucho sus
+    unidades), así que se cargan todos; las reservas son las del período.
+    """
+    agenda = Agenda()
+    prestamos = session.exec(
+        select(Prestamo).where(Prestamo.id_herramienta_h == herramienta_id, Prestamo.estado == "activo")
+    ).all()
+    for objeto in [*prestamos, *reservas]:
+        clave, _, periodo = compromiso_de(objeto)
+        if periodo is not None:
+            agenda.agregar(clave, *periodo)
+    return agenda.ocupadas(desde, hasta)
+
+
+def cabe_prestamo(session: Session, herramienta_id: int, empleado_id: int, desde: datetime, hasta: datetime):
+    """
+    Comprobar dentro de la transacción de create_prestamo que un préstamo nuevo
+    no deja sin unidades a una reserva.
+
+    Si el empleado tiene una reserva de la herramienta que se solapa con el
+    préstamo, el préstamo usa una de sus unidades (y la reserva queda
+    "cumplida" al retirar la última). No hace commit.
+
+    Retorna True si el préstamo se puede registrar.
+    """
+    desde = max(desde, datetime.now())
+    reservas = _reservas_en_periodo(session, herramienta_id, desde, hasta)
+    if not reservas:
+        return True  # Sin reservas en el período, el stock descontado alcanza
+
+    propia = next((r for r in reservas if r.id_empleado_h == empleado_id), None)
+    if propia is not None:
+        propia.cantidad -= 1
+        if propia.cantidad == 0:
+            propia.estado = "cumplida"
+        session.add(propia)
+
+    capacidad = _capacidad(session, herramienta_id) or 0
+    return _ocupadas_en_bd(session, herramienta_id, desde, hasta, reservas) + 1 <= capacidad
+
+
+def create_reserva(
+    session: Session,
+    id_empleado_h: int,
+    id_herramienta_h: int,
+    fecha_inicio: datetime,
+    fecha_fin: datetime,
+    cantidad: int = 1,
+    observaciones: str = None,
+    clave_idempotencia: str | None = None,
+):
+    """
+    Reservar unidades de una herramienta para un período futuro [fecha_inicio, fecha_fin).
+
+    Retorna la reserva, o None si la herramienta no existe o está inactiva, el
+    período no es válido o no quedan unidades libres en todo el período.
+    Repetir la `clave_idempotencia` de un envío devuelve la reserva ya creada.
+    """
+    try:
+        previa = creado_antes(session, Reserva, "reserva", clave_idempotencia)
+        if previa is not None:
+            return previa
+
+        if fecha_fin <= fecha_inicio or fecha_fin <= datetime.now() or cantidad < 1:
+            return None
+
+        # Bloquear la herramienta (en PostgreSQL) para que dos reservas
+        # simultáneas no tomen las mismas unidades
+        herramienta = session.exec(
+            select(Herramienta)
+            .where(Herramienta.id_herramienta == id_herramienta_h)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).first()
+        if not herramienta or not herramienta.estado:
+            return None
+
+        reservas = _reservas_en_periodo(session, id_herramienta_h, max(fecha_inicio, datetime.now()), fecha_fin)
+        ocupadas = _ocupadas_en_bd(session, id_herramienta_h, fecha_inicio, fecha_fin, reservas)
+        if ocupadas + cantidad > herramienta.cantidad_disponible + herramienta.unidades_prestadas:
+            session.rollback()
+            return None  # No hay unidades libres en todo el período
+
+        reserva = Reserva(
+            id_empleado_h=id_empleado_h,
+            id_herramienta_h=id_herramienta_h,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            cantidad=cantidad,
+            observaciones=observaciones,
+        )
+        session.add(reserva)
+        reserva = registrar_clave(session, "reserva", clave_idempotencia, reserva)
+        session.commit()
+        session.refresh(reserva)
+        return reserva
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al crear reserva: {str(e)}")
+
+
+def get_reserva_by_id(session: Session, reserva_id: int):
+    """Obtener reserva por su ID"""
+    return session.get(Reserva, reserva_id)
+
+
+def get_reservas_por_herramienta(session: Session, herramienta_id: int, desde: datetime = None):
+    """Obtener las reservas activas de una herramienta que terminan después de `desde` (por defecto, ahora)"""
+    statement = select(Reserva).where(
+        Reserva.id_herramienta_h == herramienta_id,
+        Reserva.estado == "activa",
+        Reserva.fecha_fin > (desde or datetime.now()),
+    ).order_by(Reserva.fecha_inicio)
+    return session.exec(statement).all()
+
+
+def buscar_reservas(
+    session: Session,
+    estado: str | None = "activa",
+    herramienta_id: int | None = None,
+    empleado_id: int | None = None,
+    orden: str = "fecha_inicio",
+    descendente: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+):
+    """
+    Buscar reservas con filtros, orden y paginación en la base de datos.
+
+    El estado puede ser "activa" (todavía no terminó), "vencida" (activa con
+    el período ya terminado sin retirar las unidades), "cumplida" o "cancelada".
+
+    Retorna (filas, total), donde cada fila es (reserva, empleado, herramienta).
+    """
+    statement = (
+        select(Reserva, Empleado, Herramienta)
+        .outerjoin(Empleado, Empleado.id == Reserva.id_empleado_h)
+        .outerjoin(Herramienta, Herramienta.id_herramienta == Reserva.id_herramienta_h)
+    )
+    ahora = datetime.now()
+    if estado == "activa":
+        statement = statement.where(Reserva.estado == "activa", Reserva.fecha_fin > ahora)
+    elif estado == "vencida":
+        statement = statement.where(Reserva.estado == "activa", Reserva.fecha_fin <= ahora)
+    elif estado is not None:
+        statement = statement.where(Reserva.estado == estado)
+    if herramienta_id is not None:
+        statement = statement.where(Reserva.id_herramienta_h == herramienta_id)
+    if empleado_id is not None:
+        statement = statement.where(Reserva.id_empleado_h == empleado_id)
+    return paginar(
+        session, statement, COLUMNAS_ORDEN_RESERVA, orden, descendente, skip, limit,
+        desempate=Reserva.id_reserva,
+    )
+
+
+def cancelar_reserva(session: Session, reserva_id: int):
+    """Cancelar una reserva activa, liberando sus unidades"""
+    try:
+        reserva = get_reserva_by_id(session, reserva_id)
+        if not reserva or reserva.estado != "activa":
+            return False
+
+        reserva.estado = "cancelada"
+        session.commit()
+        session.refresh(reserva)
+        return True
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al cancelar reserva: {str(e)}")
+
+
+def unidades_libres(session: Session, herramienta_id: int, desde: datetime, hasta: datetime):
+    """
+    Unidades de una herramienta libres durante todo el período [desde, hasta).
+
+    Descuenta los préstamos activos (los vencidos cuentan hasta que se
+    devuelven) y las reservas activas. Usa la agenda en memoria, así el costo
+    es logarítmico en el número de compromisos de la herramienta. Retorna 0
+    si la herramienta no existe o está inactiva.
+    """
+    capacidad = _capacidad(session, herramienta_id)
+    if capacidad is None:
+        return 0
+    return max(0, capacidad - unidades_ocupadas(session, herramienta_id, desde, hasta))
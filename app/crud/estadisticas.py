@@ -0,0 +1,276 @@
+"""
+Distribución de la duración y del atraso de los préstamos.
+
+Para cada categoría de herramienta y cada área de empleado se calculan la
+mediana y el percentil 90 de:
+
+- duración: días entre el préstamo y la devolución (solo préstamos devueltos)
+- atraso: días después de la fecha estimada en que se devolvió, o que lleva
+  vencido si sigue activo (0 si se devolvió a tiempo)
+
+El cálculo es de una sola pasada sobre los préstamos del período. En
+PostgreSQL lo hace la base de datos con `percentile_cont` y GROUPING SETS (una
+consulta para categorías, áreas y el total). En otros motores los préstamos se
+leen en arreglos de NumPy y cada percentil sale de un único ordenamiento por
+grupo y valor, interpolando como `percentile_cont`.
+
+Los resultados se guardan en memoria por motor, período y hora de cálculo, y
+valen mientras no cambie la versión de los datos (`version_datos`, la
+secuencia del registro de auditoría). El atraso de los préstamos activos se
+mide hasta el comienzo de la hora actual.
+"""
+
+import threading
+import weakref
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import case, extract, func, literal, tuple_
+from sqlmodel import Session, select
+
+from app.metricas import contar_cache
+from app.models.categoria import Categoria
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+from .archivo import fuente_prestamos
+from .auditoria import version_datos
+from .utilizacion import SEGUNDOS_POR_DIA, a_segundos, leer_enteros, segundos_en_bd
+
+
+# Percentiles calculados: nombre de la columna -> fracción
+PERCENTILES = {"mediana": 0.5, "p90": 0.9}
+
+# Antigüedad de los préstamos vencidos: (etiqueta, máximo de días vencidos o None)
+TRAMOS_VENCIDOS = (("0-1", 1), ("2-7", 7), ("8-30", 30), ("30+", None))
+
+# Resultados guardados por motor (los de versiones anteriores se descartan)
+MAX_RESULTADOS_CACHE = 32
+
+# Resultados por motor de base de datos: {engine: {(desde, hasta, ahora): (versión, resultado)}}
+_cache = weakref.WeakKeyDictionary()
+_lock_cache = threading.Lock()
+
+
+def get_antiguedad_vencidos(session: Session, ahora: datetime | None = None):
+    """
+    Contar los préstamos activos vencidos por días de atraso.
+
+    Args:
+        session: Sesión de base de datos
+        ahora: Fecha de referencia (por defecto, ahora)
+
+    Returns:
+        Diccionario {tramo: cantidad} con los tramos de TRAMOS_VENCIDOS, en orden
+    """
+    ahora = ahora or datetime.now()
+    # Días vencidos (enteros) <= n  <=>  fecha estimada > ahora - (n + 1) días
+    columnas = [
+        func.count(case((Prestamo.fecha_devolucion_estimada > ahora - timedelta(days=maximo + 1), 1)))
+        for _, maximo in TRAMOS_VENCIDOS[:-1]
+    ]
+    statement = select(func.count(), *columnas).where(
+        Prestamo.estado == "activo",
+        Prestamo.fecha_devolucion_estimada < ahora,
+    )
+    total, *acumulados = session.exec(statement).one()
+    acumulados.append(total)
+    return {
+        etiqueta: acumulado - anterior
+        for (etiqueta, _), acumulado, anterior in zip(TRAMOS_VENCIDOS, acumulados, [0] + acumulados[:-1])
+    }
+
+
+def _fila(prestamos: int, devueltos: int, duracion, atraso) -> dict:
+    """Fila de resultado; percentiles en días (None si no hay préstamos)"""
+    fila = {"prestamos": int(prestamos), "devueltos": int(devueltos)}
+    for prefijo, valores in (("duracion", duracion), ("atraso", atraso)):
+        for nombre, valor in zip(PERCENTILES, valores):
+            fila[f"{prefijo}_{nombre}"] = None if valor is None or np.isnan(valor) else float(valor) / SEGUNDOS_POR_DIA
+    return fila
+
+
+def _estadisticas_sql(session: Session, desde: datetime, hasta: datetime, ahora: datetime):
+    """Percentiles por categoría, por área y en total con una consulta (PostgreSQL)"""
+    P = fuente_prestamos(session, desde=desde, hasta=hasta)
+    duracion = extract("epoch", P.fecha_devolucion - P.fecha_prestamo)
+    atraso = func.greatest(
+        extract("epoch", func.coalesce(P.fecha_devolucion, literal(ahora)) - P.fecha_devolucion_estimada), 0,
+    )
+    categoria, area = Categoria.nombre, Empleado.area
+    statement = (
+        select(
+            categoria, area, func.grouping(categoria), func.grouping(area),
+            func.count(), func.count(P.fecha_devolucion),
+            *(func.percentile_cont(q).within_group(duracion) for q in PERCENTILES.values()),
+            *(func.percentile_cont(q).within_group(atraso) for q in PERCENTILES.values()),
+        )
+        .join(Herramienta, Herramienta.id_herramienta == P.id_herramienta_h)
+        .join(Empleado, Empleado.id == P.id_empleado_h)
+        .outerjoin(Categoria, Categoria.id_categoria == Herramienta.id_categoria_h)
+        .where(P.estado != "cancelado", P.fecha_prestamo >= desde, P.fecha_prestamo < hasta)
+        .group_by(func.grouping_sets(tuple_(categoria), tuple_(area), tuple_()))
+    )
+    k = len(PERCENTILES)
+    general, por_categoria, por_area = _fila(0, 0, [None] * k, [None] * k), [], []
+    for fila in session.exec(statement):
+        nombre_categoria, nombre_area, sin_categoria, sin_area, prestamos, devueltos = fila[:6]
+        datos = _fila(prestamos, devueltos, fila[6:6 + k], fila[6 + k:])
+        if sin_categoria and sin_area:
+            general = datos
+        elif sin_area:
+            por_categoria.append({"grupo": nombre_categoria, **datos})
+        else:
+            por_area.append({"grupo": nombre_area, **datos})
+    return general, por_categoria, por_area
+
+
+def _percentiles(grupo, valores, n: int):
+    """
+    Percentiles de PERCENTILES de los valores (enteros, >= 0) de cada grupo 0..n-1.
+
+    Un solo `np.sort` de una clave que combina grupo y valor deja los valores
+    de cada grupo contiguos y ordenados; cada percentil se interpola entre los
+    dos valores vecinos de su posición, como `percentile_cont`.
+
+    Returns:
+        Arreglo (n, len(PERCENTILES)); NaN para los grupos sin valores
+    """
+    paso = int(valores.max(initial=0)) + 1
+    ordenados = np.sort(grupo * paso + valores) % paso
+    cantidad = np.bincount(grupo, minlength=n)
+    comienzo = np.concatenate(([0], np.cumsum(cantidad)[:-1]))
+    hay = cantidad > 0
+    resultado = np.full((n, len(PERCENTILES)), np.nan)
+    for j, q in enumerate(PERCENTILES.values()):
+        posicion = comienzo[hay] + q * (cantidad[hay] - 1)
+        abajo = np.floor(posicion).astype(np.int64)
+        arriba = np.minimum(abajo + 1, comienzo[hay] + cantidad[hay] - 1)
+        resultado[hay, j] = ordenados[abajo] + (posicion - abajo) * (ordenados[arriba] - ordenados[abajo])
+    return resultado
+
+
+def _codigos(session: Session, statement):
+    """
+    Código de grupo de cada id a partir de filas (id, nombre del grupo).
+
+    Returns:
+        (arreglo indexado por id con el código de su grupo, nombres de los grupos por código)
+    """
+    filas = session.exec(statement).all()
+    nombres = {}
+    codigo_de = np.zeros(max((fila[0] for fila in filas), default=0) + 1, dtype=np.int64)
+    for id_, nombre in filas:
+        codigo_de[id_] = nombres.setdefault(nombre, len(nombres))
+    return codigo_de, list(nombres)
+
+
+def _estadisticas_numpy(session: Session, desde: datetime, hasta: datetime, ahora: datetime):
+    """Percentiles por categoría, por área y en total leyendo los préstamos en arreglos"""
+    P = fuente_prestamos(session, desde=desde, hasta=hasta)
+    inicio = segundos_en_bd(session, P.fecha_prestamo)
+    # El período se filtra sobre los segundos y no sobre la columna: recorrer
+    # una parte grande de la tabla por el índice de fecha_prestamo es varias
+    # veces más lento que leerla en orden (ver utilizacion._cargar_intervalos)
+    prestamos = leer_enteros(session, select(
+        P.id_herramienta_h,
+        P.id_empleado_h,
+        inicio,
+        segundos_en_bd(session, P.fecha_devolucion_estimada),
+        func.coalesce(segundos_en_bd(session, P.fecha_devolucion), literal(a_segundos(ahora))),
+        case((P.fecha_devolucion == None, 0), else_=1),  # noqa: E711
+    ).where(P.estado != "cancelado", inicio >= a_segundos(desde), inicio < a_segundos(hasta)), 6)
+    herramienta, empleado, inicio, estimada, fin, devuelto = prestamos.T
+    devuelto = devuelto.astype(bool)
+    duracion = np.maximum(fin - inicio, 0)
+    atraso = np.maximum(fin - estimada, 0)
+
+    categoria_de, categorias = _codigos(session, select(Herramienta.id_herramienta, Categoria.nombre).outerjoin(
+        Categoria, Categoria.id_categoria == Herramienta.id_categoria_h,
+    ))
+    area_de, areas = _codigos(session, select(Empleado.id, Empleado.area))
+    categoria, area = categoria_de[herramienta], area_de[empleado]
+
+    def por_grupo(grupo, n: int):
+        """Filas de los grupos 0..n-1"""
+        cantidad = np.bincount(grupo, minlength=n)
+        devueltos = np.bincount(grupo[devuelto], minlength=n)
+        p_duracion = _percentiles(grupo[devuelto], duracion[devuelto], n)
+        p_atraso = _percentiles(grupo, atraso, n)
+        return [_fila(cantidad[i], devueltos[i], p_duracion[i], p_atraso[i]) for i in range(n)]
+
+    general = por_grupo(np.zeros(len(prestamos), dtype=np.int64), 1)[0]
+    por_categoria, por_area = (
+        [{"grupo": nombre, **fila} for nombre, fila in zip(nombres, por_grupo(grupo, len(nombres))) if fila["prestamos"]]
+        for grupo, nombres in ((categoria, categorias), (area, areas))
+    )
+    return general, por_categoria, por_area
+
+
+def get_estadisticas_duracion(
+    session: Session,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    usar_cache: bool = True,
+):
+    """
+    Calcular la mediana y el percentil 90 de la duración y del atraso de los préstamos.
+
+    Se consideran los préstamos no cancelados hechos en el período (también los
+    archivados). Los resultados se reutilizan mientras no cambien los datos;
+    no hay que modificarlos.
+
+    Args:
+        session: Sesión de base de datos
+        desde: Inicio del período por fecha de préstamo (por defecto, 90 días antes de `hasta`)
+        hasta: Fin del período (por defecto, ahora)
+        usar_cache: Si es False se recalcula siempre
+
+    Returns:
+        Diccionario con el período ("desde", "hasta"), la fila "general", las
+        filas "por_categoria" y "por_area" (de más a menos préstamos; "grupo"
+        es None para las herramientas sin categoría) y la antigüedad de los
+        préstamos vencidos ahora en "vencidos" (ver get_antiguedad_vencidos).
+        Cada fila tiene "prestamos", "devueltos" y los percentiles en días:
+        "duracion_mediana", "duracion_p90", "atraso_mediana" y "atraso_p90"
+        (None si no hay préstamos con qué calcularlos)
+    """
+    ahora = datetime.now().replace(minute=0, second=0, microsecond=0)
+    hasta = hasta or ahora
+    desde = desde or hasta - timedelta(days=90)
+    if desde >= hasta:
+        raise ValueError("El inicio del período debe ser anterior al fin")
+
+    engine = session.get_bind()
+    clave = (desde, hasta, ahora)
+    version = version_datos(session)
+    if usar_cache:
+        guardado = _cache.get(engine, {}).get(clave)
+        acierto = guardado is not None and guardado[0] == version
+        contar_cache("estadisticas_duracion", acierto)
+        if acierto:
+            return guardado[1]
+
+    if session.get_bind().dialect.name == "postgresql":
+        general, por_categoria, por_area = _estadisticas_sql(session, desde, hasta, ahora)
+    else:
+        general, por_categoria, por_area = _estadisticas_numpy(session, desde, hasta, ahora)
+    orden = lambda f: (-f["prestamos"], f["grupo"] is None, f["grupo"] or "")  # noqa: E731
+    resultado = {
+        "desde": desde,
+        "hasta": hasta,
+        "general": general,
+        "por_categoria": sorted(por_categoria, key=orden),
+        "por_area": sorted(por_area, key=orden),
+        "vencidos": get_antiguedad_vencidos(session, ahora),
+    }
+
+    with _lock_cache:
+        guardados = _cache.setdefault(engine, {})
+        for otra, (otra_version, _) in list(guardados.items()):
+            if otra_version != version:
+                del guardados[otra]
+        guardados[clave] = (version, resultado)
+        while len(guardados) > MAX_RESULTADOS_CACHE:
+            del guardados[next(iter(guardados))]
+    return resultado
@@ -0,0 +1,96 @@
+"""
+Claves de idempotencia de las funciones create_*.
+
+Un formulario enviado dos veces (doble clic, conexión lenta, un rerun que
+repite el envío) llama dos veces a la misma create_*. Con
+`clave_idempotencia`, la primera llamada guarda la clave con el id de la fila
+creada, en la misma transacción; las siguientes la encuentran con una
+búsqueda por clave primaria y devuelven esa fila sin escribir nada.
+
+Si dos llamadas con la misma clave corren a la vez, las dos pasan la búsqueda
+pero solo una puede insertar la clave: la otra descarta su creación (el
+rollback deshace también el stock y los contadores) y devuelve la fila de la
+primera.
+
+Una clave solo tiene que durar lo que dura un reintento: `purgar_claves`
+borra las de más de VIGENCIA_CLAVES_HORAS.
+
+Uso:
+    python -m app.crud.idempotencia    # purgar las claves vencidas
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.models.clave_idempotencia import ClaveIdempotencia
+
+
+# Horas durante las que una clave devuelve la fila que creó
+VIGENCIA_CLAVES_HORAS = int(os.getenv("CLAVES_IDEMPOTENCIA_HORAS", "24"))
+
+
+def creado_antes(session: Session, modelo, entidad: str, clave: str | None):
+    """
+    Fila creada antes con `clave`, o None si la clave es None o no se usó.
+
+    También None si la fila ya no existe (por ejemplo, se borró o se archivó).
+    """
+    if clave is None:
+        return None
+    previa = session.get(ClaveIdempotencia, clave)
+    if previa is None:
+        return None
+    if previa.entidad != entidad:
+        raise ValueError(f"la clave de idempotencia {clave} ya se usó para crear {previa.entidad}")
+    return session.get(modelo, previa.id_entidad)
+
+
+def registrar_clave(session: Session, entidad: str, clave: str | None, objeto):
+    """
+    Guardar la clave de `objeto`, recién creado y sin confirmar.
+
+    Retorna `objeto` o, si otra llamada con la misma clave confirmó antes, la
+    fila que creó esa llamada (la creación de esta se descarta con un rollback).
+    """
+    if clave is None:
+        return objeto
+    session.flush()
+    session.add(ClaveIdempotencia(clave=clave, entidad=entidad, id_entidad=inspect(objeto).identity[0]))
+    try:
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        return creado_antes(session, type(objeto), entidad, clave)
+    return objeto
+
+
+def purgar_claves(session: Session, horas: int | None = None) -> int:
+    """Borrar las claves de más de `horas` (por defecto VIGENCIA_CLAVES_HORAS). Retorna cuántas borró"""
+    horas = VIGENCIA_CLAVES_HORAS if horas is None else horas
+    try:
+        borradas = session.execute(
+            delete(ClaveIdempotencia).where(ClaveIdempotencia.fecha < datetime.now() - timedelta(hours=horas))
+        ).rowcount
+        session.commit()
+        return borradas
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al purgar claves de idempotencia: {str(e)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.config import engine
+
+    parser = argparse.ArgumentParser(description="Borrar las claves de idempotencia vencidas")
+    parser.add_argument("--horas", type=int, default=VIGENCIA_CLAVES_HORAS)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        total = purgar_claves(session, args.horas)
+    print(f"Claves borradas: {total}")
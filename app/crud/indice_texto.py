@@ -0,0 +1,327 @@
+"""
+Índice en memoria de trigramas para búsqueda aproximada e instantánea.
+
+Los nombres y códigos de empleados y herramientas se normalizan (minúsculas
+y sin acentos, "Núñez" -> "nunez") y se descomponen en trigramas. Una
+búsqueda puntúa cada entidad por la fracción de trigramas del texto buscado
+que contiene, de modo que tolera errores de tipeo ("furadiera") y trata la
+última palabra como prefijo ("llave ing").
+
+El índice se construye desde la base de datos la primera vez que se usa y
+luego se actualiza con cada commit de una sesión de este proceso que crea,
+modifica o borra empleados o herramientas. Los cambios hechos por otros
+procesos (la API, las tareas, otra instancia de la aplicación) se incorporan
+antes de cada búsqueda: si la versión de los datos (`version_datos`) avanzó
+desde la última vez, se releen las filas que el registro de cambios muestra
+modificadas desde entonces. Las inserciones masivas con `insert()` no pasan
+por la sesión ni por el registro de cambios; después de ellas hay que llamar
+a `recargar_indice`.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+import weakref
+from array import array
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SessionORM
+from sqlmodel import Session, select
+
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from .auditoria import get_cambios_desde, version_datos
+
+
+# Campos indexados por entidad: (modelo, columna id, columnas de texto)
+CAMPOS_INDICE = {
+    "empleado": (Empleado, "id", ("nombre", "apellido")),
+    "herramienta": (Herramienta, "id_herramienta", ("nombre", "codigo_interno")),
+}
+
+PALABRA = re.compile(r"\w+")
+
+# Con más cambios de otros procesos que estos, el índice se reconstruye en lugar de releer las filas
+MAX_CAMBIOS_SINCRONIZAR = 1000
+
+
+def normalizar(texto: str | None) -> str:
+    """Pasar un texto a minúsculas y sin acentos"""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def trigramas(texto: str, prefijo: bool = False) -> set[str]:
+    """
+    Obtener los trigramas de un texto ya normalizado.
+
+    Cada palabra se rodea de espacios, así " ll" y "ve " marcan inicio y fin de
+    palabra; además se agrega el inicio de dos caracteres (" l") para que una
+    sola letra también encuentre resultados.
+
+    Args:
+        texto: Texto normalizado con `normalizar`
+        prefijo: Si es True la última palabra se trata como incompleta (no se
+            agrega su trigrama de fin de palabra)
+
+    Returns:
+        Conjunto de trigramas
+    """
+    palabras = PALABRA.findall(texto)
+    resultado = set()
+    for posicion, palabra in enumerate(palabras):
+        rellena = f" {palabra}" if prefijo and posicion == len(palabras) - 1 else f" {palabra} "
+        resultado.add(rellena[:2])
+        resultado.update(rellena[i:i + 3] for i in range(len(rellena) - 2))
+    return resultado
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido de trigramas sobre textos identificados por un entero.
+
+    Cada texto ocupa una posición; las listas de cada trigrama guardan
+    posiciones en arreglos compactos y la puntuación se hace con NumPy. Al
+    reemplazar o quitar un texto su posición solo se marca como borrada, y
+    el índice se compacta cuando las posiciones borradas son la mitad.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vaciar()
+
+    def _vaciar(self):
+        # trigrama -> posiciones que lo contienen
+        self._listas: dict[str, array] = {}
+        # Datos por posición
+        self._ids = array("q")
+        self._largos = array("H")
+        self._vivos = bytearray()
+        self._textos: list[str] = []
+        # id -> posición vigente
+        self._posiciones: dict[int, int] = {}
+        self._borrados = 0
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def agregar(self, id_: int, texto: str):
+        """Agregar o reemplazar el texto de un id"""
+        normalizado = normalizar(texto)
+        with self._lock:
+            self._quitar(id_)
+            self._agregar(id_, normalizado)
+            if self._borrados > 1000 and self._borrados * 2 > len(self._textos):
+                self._compactar()
+
+    def _agregar(self, id_: int, normalizado: str):
+        posicion = len(self._textos)
+        self._posiciones[id_] = posicion
+        self._ids.append(id_)
+        self._largos.append(min(len(normalizado), 0xFFFF))
+        self._vivos.append(1)
+        self._textos.append(normalizado)
+        for t in trigramas(normalizado):
+            lista = self._listas.get(t)
+            if lista is None:
+                lista = self._listas[t] = array("i")
+            lista.append(posicion)
+
+    def quitar(self, id_: int):
+        """Quitar un id del índice (no falla si no existe)"""
+        with self._lock:
+            self._quitar(id_)
+
+    def _quitar(self, id_: int):
+        posicion = self._posiciones.pop(id_, None)
+        if posicion is not None:
+            self._vivos[posicion] = 0
+            self._textos[posicion] = ""
+            self._borrados += 1
+
+    def _compactar(self):
+        vigentes = [(id_, self._textos[posicion]) for id_, posicion in self._posiciones.items()]
+        self._vaciar()
+        for id_, normalizado in vigentes:
+            self._agregar(id_, normalizado)
+
+    def buscar(self, consulta: str, limite: int = 10, minimo: float = 0.5) -> list[tuple[int, float]]:
+        """
+        Buscar los ids cuyo texto se parece más a la consulta.
+
+        Args:
+            consulta: Texto buscado, con o sin acentos
+            limite: Número máximo de resultados
+            minimo: Fracción mínima de trigramas de la consulta que debe contener un resultado
+
+        Returns:
+            Lista de (id, puntaje) de mayor a menor puntaje; el puntaje va de 0 a 1
+            y sube un poco si el texto contiene la consulta tal cual
+        """
+        normalizado = normalizar(consulta)
+        # Mientras se escribe, la última palabra se busca como prefijo
+        tri = trigramas(normalizado, prefijo=not consulta[-1:].isspace())
+        if not tri:
+            return []
+        necesario = max(1, math.ceil(len(tri) * minimo))
+        # numpy se importa con la primera búsqueda: las páginas que solo listan
+        # (Início) importan este módulo a través de crud_empleado/crud_herramienta
+        # y no necesitan cargarlo; después es una consulta a sys.modules
+        import numpy as np
+
+        with self._lock:
+            listas = [self._listas[t] for t in tri if t in self._listas]
+            if len(listas) < necesario:
+                return []
+            # Cuántos trigramas de la consulta tiene cada posición
+            conteo = np.bincount(
+                np.concatenate([np.frombuffer(lista, dtype=np.int32) for lista in listas]),
+                minlength=len(self._textos),
+            )
+            conteo *= np.frombuffer(self._vivos, dtype=np.uint8)
+            candidatos = np.flatnonzero(conteo >= necesario)
+            if not len(candidatos):
+                return []
+            # Preseleccionar por trigramas en común y, a igualdad, por texto más corto
+            largos = np.frombuffer(self._largos, dtype=np.uint16)[candidatos].astype(np.int64)
+            clave = conteo[candidatos] * 0x10000 - largos
+            k = min(limite * 4, len(candidatos))
+            mejores = candidatos[np.argpartition(-clave, k - 1)[:k]]
+            documentos = [(self._ids[p], int(conteo[p]), self._textos[p]) for p in mejores]
+
+        texto = normalizado.strip()
+        resultados = []
+        for id_, c, documento in documentos:
+            puntaje = c / len(tri)
+            if texto and texto in documento:
+                puntaje += 0.1 * len(texto) / len(documento)
+            resultados.append((id_, min(puntaje, 1.0), len(documento)))
+        resultados.sort(key=lambda r: (-r[1], r[2], r[0]))
+        return [(id_, puntaje) for id_, puntaje, _ in resultados[:limite]]
+
+
+# Índices por motor de base de datos: {engine: {entidad: IndiceTrigramas}}
+_indices = weakref.WeakKeyDictionary()
+# Versión de los datos incorporada a cada índice: {engine: {entidad: secuencia}}
+_secuencias = weakref.WeakKeyDictionary()
+_lock_carga = threading.Lock()
+
+
+def _texto(objeto, columnas) -> str:
+    return " ".join(str(getattr(objeto, c) or "") for c in columnas)
+
+
+def _filas(session: Session, entidad: str, ids=None):
+    """(id, texto) de las filas de una entidad, o solo de `ids`"""
+    modelo, columna_id, columnas = CAMPOS_INDICE[entidad]
+    statement = select(getattr(modelo, columna_id), *(getattr(modelo, c) for c in columnas))
+    if ids is not None:
+        statement = statement.where(getattr(modelo, columna_id).in_(ids))
+    # Sin autoflush: solo interesa lo confirmado, los cambios de esta sesión llegan con su commit
+    with session.no_autoflush:
+        return [(fila[0], " ".join(str(v or "") for v in fila[1:])) for fila in session.exec(statement)]
+
+
+def _construir(session: Session, entidad: str) -> IndiceTrigramas:
+    # La versión se lee antes que las filas: un cambio confirmado en el medio
+    # se vuelve a aplicar en la próxima sincronización, y aplicarlo dos veces no cambia nada
+    _secuencias.setdefault(session.get_bind(), {})[entidad] = version_datos(session)
+    indice = IndiceTrigramas()
+    for id_, texto in _filas(session, entidad):
+        indice.agregar(id_, texto)
+    return indice
+
+
+def _sincronizar(session: Session, entidad: str, indice: IndiceTrigramas):
+    """Incorporar al índice los cambios confirmados por otros procesos desde su última versión"""
+    secuencias = _secuencias.setdefault(session.get_bind(), {})
+    vista = secuencias.get(entidad, 0)
+    version = version_datos(session)
+    if version <= vista:
+        return
+    cambios = get_cambios_desde(session, vista, limit=MAX_CAMBIOS_SINCRONIZAR, entidades=[entidad])
+    if len(cambios) == MAX_CAMBIOS_SINCRONIZAR:
+        _indices[session.get_bind()][entidad] = _construir(session, entidad)
+        return
+    # Los cambios de este proceso ya están aplicados; releerlos no cambia nada
+    ids = {cambio["id"] for cambio in cambios}
+    leidas = dict(_filas(session, entidad, ids)) if ids else {}
+    for id_ in ids:
+        if id_ in leidas:
+            indice.agregar(id_, leidas[id_])
+        else:
+            indice.quitar(id_)
+    secuencias[entidad] = max(secuencias.get(entidad, 0), version)
+
+
+def indice_de(session: Session, entidad: str) -> IndiceTrigramas:
+    """Obtener el índice de una entidad para el motor de la sesión, construyéndolo o poniéndolo al día"""
+    engine = session.get_bind()
+    indices = _indices.get(engine)
+    if indices is None or entidad not in indices:
+        with _lock_carga:
+            indices = _indices.setdefault(engine, {})
+            if entidad not in indices:
+                indices[entidad] = _construir(session, entidad)
+                return indices[entidad]
+    _sincronizar(session, entidad, indices[entidad])
+    return indices[entidad]
+
+
+def recargar_indice(session: Session, entidad: str | None = None):
+    """Reconstruir desde la base de datos el índice de una entidad (o de todas)"""
+    indices = _indices.setdefault(session.get_bind(), {})
+    for nombre in [entidad] if entidad else CAMPOS_INDICE:
+        indices[nombre] = _construir(session, nombre)
+
+
+def buscar_aproximado(session: Session, entidad: str, texto: str, limite: int = 10) -> list[tuple[int, float]]:
+    """Buscar ids de una entidad con el índice de trigramas. Retorna [(id, puntaje)]"""
+    if not texto or not texto.strip():
+        return []
+    return indice_de(session, entidad).buscar(texto, limite)
+
+
+# Sincronización con las escrituras: los cambios se anotan en cada flush y se
+# aplican al índice solo cuando la transacción se confirma
+_ENTIDADES_POR_MODELO = {modelo: entidad for entidad, (modelo, _, _) in CAMPOS_INDICE.items()}
+
+
+@event.listens_for(SessionORM, "after_flush")
+def _anotar_cambios(session, flush_context):
+    cambios = None
+    for objetos, borrado in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for objeto in objetos:
+            entidad = _ENTIDADES_POR_MODELO.get(type(objeto))
+            if entidad is None:
+                continue
+            _, columna_id, columnas = CAMPOS_INDICE[entidad]
+            if cambios is None:
+                cambios = session.info.setdefault("indice_texto_cambios", {})
+            cambios[(entidad, getattr(objeto, columna_id))] = None if borrado else _texto(objeto, columnas)
+
+
+@event.listens_for(SessionORM, "after_commit")
+def _aplicar_cambios(session):
+    cambios = session.info.pop("indice_texto_cambios", None)
+    if not cambios:
+        return
+    indices = _indices.get(session.get_bind())
+    if not indices:
+        return
+    for (entidad, id_), texto in cambios.items():
+        indice = indices.get(entidad)
+        if indice is None:
+            continue
+        if texto is None:
+            indice.quitar(id_)
+        else:
+            indice.agregar(id_, texto)
+
+
+@event.listens_for(SessionORM, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop("indice_texto_cambios", None)
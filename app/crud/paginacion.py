@@ -0,0 +1,71 @@
+"""
+Utilidades de paginación y ordenamiento del lado del servidor.
+
+Las funciones `buscar_*` de cada entidad arman su consulta con filtros y
+delegan aquí el conteo total, el orden y el recorte de la página, de modo que
+el costo de mostrar una página depende del tamaño de la página y no del de
+la tabla.
+"""
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+
+def paginar(
+    session: Session,
+    statement,
+    columnas_orden: dict,
+    orden: str | None = None,
+    descendente: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+    desempate=None,
+):
+    """
+    Ordenar y recortar una consulta, devolviendo también el total de filas.
+
+    Args:
+        session: Sesión de base de datos
+        statement: Consulta `select` con los filtros ya aplicados
+        columnas_orden: Columnas permitidas para ordenar, por nombre
+        orden: Nombre de la columna de orden (si no es válido se usa la primera)
+        descendente: Ordenar de mayor a menor
+        skip: Número de registros a saltar
+        limit: Número máximo de registros a retornar
+        desempate: Columna única para que el orden sea estable entre páginas
+
+    Returns:
+        Tupla (filas de la página, total de filas que cumplen los filtros)
+    """
+    total = session.exec(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).one()
+
+    columna = columnas_orden.get(orden) if orden else None
+    if columna is None:
+        columna = next(iter(columnas_orden.values()))
+    criterios = [columna.desc() if descendente else columna.asc()]
+    if desempate is not None and desempate is not columna:
+        criterios.append(desempate.desc() if descendente else desempate.asc())
+
+    filas = session.exec(statement.order_by(*criterios).offset(skip).limit(limit)).all()
+    return filas, total
+
+
+def con_opciones_carga(statement, entidad, opciones_carga):
+    """
+    Agregar a la consulta opciones de carga de relaciones (selectinload, joinedload, raiseload).
+
+    Cada opción puede ser también una función que recibe la entidad consultada
+    y retorna la opción: hace falta cuando la entidad es un alias, como la
+    unión de los préstamos con el archivo (`lambda P: selectinload(P.empleado)`).
+    """
+    if not opciones_carga:
+        return statement
+    return statement.options(*(opcion(entidad) if callable(opcion) else opcion for opcion in opciones_carga))
+
+
+def patron_busqueda(texto: str) -> str:
+    """Construir el patrón LIKE para una búsqueda parcial sin distinguir mayúsculas."""
+    texto = texto.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{texto}%"
@@ -0,0 +1,248 @@
+"""
+Utilización de las herramientas en un período.
+
+Para dimensionar el stock interesa qué fracción de las unidades de cada
+herramienta estuvo prestada, cuántas unidades llegaron a estar prestadas a la
+vez (pico) y cuántos días no salió ninguna (días ociosos).
+
+Los intervalos de préstamo (`fecha_prestamo` hasta `fecha_devolucion`, o
+hasta ahora si sigue activo) se leen como segundos enteros calculados por la
+base de datos, en lotes de FILAS_POR_LOTE filas, y se acumulan en arreglos de
+NumPy; todo el cálculo posterior es vectorizado:
+
+- tiempo prestado: suma de la duración de los intervalos por herramienta
+  (`bincount` con pesos)
+- pico: barrido de eventos (+1 al prestar, -1 al devolver) ordenados por
+  herramienta y fecha; la suma acumulada es el número de unidades prestadas
+  después de cada evento y vuelve a 0 al terminar cada herramienta
+- días ociosos: los tramos en que la suma acumulada es positiva son los
+  períodos con alguna unidad afuera; se cuentan los días que tocan
+- serie diaria y pico de la flota: sumas prefijas sobre las fechas de
+  préstamo y de devolución ordenadas
+
+Los préstamos cancelados no se cuentan: nunca sacaron la unidad del stock.
+"""
+
+from datetime import datetime, timedelta
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import BigInteger, Integer, cast, extract, func, literal
+from sqlmodel import Session, select
+
+from app.models.herramienta import Herramienta
+from .archivo import fuente_prestamos
+
+
+# Filas leídas por lote: acota la memoria de las filas de Python intermedias
+FILAS_POR_LOTE = 100_000
+
+SEGUNDOS_POR_DIA = 86_400
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def a_segundos(fecha: datetime) -> int:
+    """Segundos desde 1970 de una fecha"""
+    return int((fecha - _EPOCA).total_seconds())
+
+
+def segundos_en_bd(session: Session, columna):
+    """Segundos desde 1970 de una columna de fecha, calculados en la base de datos"""
+    if session.get_bind().dialect.name == "sqlite":
+        # julianday es bastante más barato que strftime('%s') por fila
+        return cast(func.round((func.julianday(columna) - 2440587.5) * SEGUNDOS_POR_DIA), Integer)
+    return cast(extract("epoch", columna), BigInteger)
+
+
+def leer_enteros(session: Session, statement, columnas: int):
+    """
+    Ejecutar una consulta de columnas enteras y acumular sus filas en un arreglo int64.
+
+    Las filas se piden directamente al cursor del driver, en lotes de
+    FILAS_POR_LOTE: construir un Row de SQLAlchemy por fila cuesta casi tanto
+    como leerla. Los parámetros de la consulta (fechas y constantes) se
+    escriben en la sentencia.
+
+    Returns:
+        Arreglo de forma (filas, columnas)
+    """
+    sql = str(statement.compile(dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}))
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(sql)
+        lotes = []
+        while filas := cursor.fetchmany(FILAS_POR_LOTE):
+            lotes.append(np.fromiter(chain.from_iterable(filas), dtype=np.int64, count=columnas * len(filas)))
+    finally:
+        cursor.close()
+    return np.concatenate(lotes).reshape(-1, columnas) if lotes else np.empty((0, columnas), dtype=np.int64)
+
+
+def _cargar_intervalos(session: Session, desde: datetime, hasta: datetime, ahora: datetime):
+    """
+    Intervalos de préstamo que pueden cruzarse con el período, leídos en lotes.
+
+    Solo se filtra por el fin del intervalo, con una expresión que no usa
+    índices: casi todos los préstamos empiezan antes de `hasta`, y recorrerlos
+    por el índice de fecha_prestamo es varias veces más lento que leer la tabla
+    en orden. Los que empiezan después del período se descartan al recortar.
+
+    Returns:
+        Arreglo int64 de (id_herramienta, inicio, fin), con las fechas en segundos desde 1970
+    """
+    P = fuente_prestamos(session, hasta=hasta)
+    statement = select(
+        P.id_herramienta_h,
+        segundos_en_bd(session, P.fecha_prestamo),
+        func.coalesce(segundos_en_bd(session, P.fecha_devolucion), literal(a_segundos(ahora))),
+    ).where(
+        P.estado != "cancelado",
+        func.coalesce(P.fecha_devolucion, ahora) > desde,
+    )
+    return leer_enteros(session, statement, 3)
+
+
+def _barrido(posicion, inicio, fin, duracion: int):
+    """
+    Eventos de préstamo (+1) y devolución (-1) ordenados por herramienta y fecha.
+
+    A igual herramienta y fecha la devolución va primero, así un préstamo que
+    empieza cuando termina otro no se suma a él. El orden se obtiene con un
+    solo `np.sort` de una clave entera que combina herramienta, fecha y tipo.
+
+    Returns:
+        (herramienta, fecha, unidades prestadas después del evento) de cada evento
+    """
+    paso = 2 * (duracion + 1)
+    clave = np.sort(np.concatenate((posicion * paso + 2 * inicio + 1, posicion * paso + 2 * fin)))
+    herramienta, resto = np.divmod(clave, paso)
+    prestamo = resto & 1
+    return herramienta, resto >> 1, np.cumsum(2 * prestamo - 1)
+
+
+def _dias_ocupados(herramienta, fecha, prestadas, n: int):
+    """Días del período que tocan algún tramo con unidades afuera, por herramienta"""
+    # Un tramo empieza al pasar de 0 a >0 unidades prestadas y termina al volver a 0
+    anteriores = np.concatenate(([0], prestadas[:-1]))
+    empieza = np.flatnonzero((prestadas > 0) & (anteriores == 0))
+    termina = np.flatnonzero(prestadas == 0)
+    tramo = herramienta[empieza]
+    primero = fecha[empieza] // SEGUNDOS_POR_DIA
+    ultimo = (fecha[termina] - 1) // SEGUNDOS_POR_DIA
+    dias = np.bincount(tramo, weights=ultimo - primero + 1, minlength=n)
+    # Un día que comparten dos tramos seguidos de la misma herramienta se contó dos veces
+    repetido = (tramo[1:] == tramo[:-1]) & (primero[1:] == ultimo[:-1])
+    return (dias - np.bincount(tramo[1:][repetido], minlength=n)).astype(np.int64)
+
+
+def _flota(inicio, fin, limites):
+    """
+    Unidades-segundo prestadas entre límites consecutivos y pico de unidades a la vez.
+
+    Prestado antes de B = suma(B - inicio, inicio < B) - suma(B - fin, fin < B),
+    con las fechas de inicio y de fin ordenadas por separado.
+    """
+    inicio, fin = np.sort(inicio), np.sort(fin)
+    suma_inicio = np.concatenate(([0], np.cumsum(inicio)))
+    suma_fin = np.concatenate(([0], np.cumsum(fin)))
+    n_inicio = np.searchsorted(inicio, limites)
+    n_fin = np.searchsorted(fin, limites)
+    prestado = (n_inicio * limites - suma_inicio[n_inicio]) - (n_fin * limites - suma_fin[n_fin])
+    # Justo después del k-ésimo préstamo hay k + 1 iniciados, menos los devueltos hasta ese momento
+    pico = (np.arange(1, len(inicio) + 1) - np.searchsorted(fin, inicio, side="right")).max(initial=0)
+    return np.diff(prestado), int(pico)
+
+
+def get_utilizacion_herramientas(session: Session, desde: datetime = None, hasta: datetime = None):
+    """
+    Calcular la utilización de cada herramienta en un período.
+
+    Las unidades de una herramienta son su stock actual (disponibles más
+    prestadas), o el pico del período si fue mayor.
+
+    Args:
+        session: Sesión de base de datos
+        desde: Inicio del período (por defecto, 90 días antes de `hasta`)
+        hasta: Fin del período (por defecto, y como máximo, ahora)
+
+    Returns:
+        Diccionario con el período ("desde", "hasta", "dias"), los préstamos
+        considerados, la utilización y el pico de toda la flota, una fila por
+        herramienta en "herramientas" (unidades, horas prestadas, utilización
+        de 0 a 1, pico de unidades prestadas a la vez y días ociosos; de mayor
+        a menor utilización) y las unidades prestadas en promedio cada día en
+        "diaria"
+    """
+    ahora = datetime.now()
+    hasta = min(hasta or ahora, ahora)
+    desde = desde or hasta - timedelta(days=90)
+    if desde >= hasta:
+        raise ValueError("El inicio del período debe ser anterior al fin")
+    origen = a_segundos(desde)
+    duracion = a_segundos(hasta) - origen
+    dias = -(-duracion // SEGUNDOS_POR_DIA)
+
+    herramientas = session.exec(
+        select(
+            Herramienta.id_herramienta, Herramienta.nombre, Herramienta.codigo_interno, Herramienta.estado,
+            Herramienta.cantidad_disponible + Herramienta.unidades_prestadas,
+        ).order_by(Herramienta.id_herramienta)
+    ).all()
+    n = len(herramientas)
+    ids = np.fromiter((h[0] for h in herramientas), dtype=np.int64, count=n)
+
+    # Fechas relativas al inicio del período, recortadas a él; sin herramientas inexistentes
+    intervalos = _cargar_intervalos(session, desde, hasta, ahora)
+    inicio = np.clip(intervalos[:, 1] - origen, 0, duracion)
+    fin = np.clip(intervalos[:, 2] - origen, 0, duracion)
+    posicion = np.searchsorted(ids, intervalos[:, 0])
+    validos = (fin > inicio) & (posicion < n)
+    validos[validos] = ids[posicion[validos]] == intervalos[validos, 0]
+    posicion, inicio, fin = posicion[validos], inicio[validos], fin[validos]
+
+    segundos_prestados = np.bincount(posicion, weights=fin - inicio, minlength=n)
+    herramienta, fecha, prestadas = _barrido(posicion, inicio, fin, duracion)
+    pico = np.zeros(n, dtype=np.int64)
+    if len(prestadas):
+        grupos = np.flatnonzero(np.diff(herramienta, prepend=-1))
+        pico[herramienta[grupos]] = np.maximum.reduceat(prestadas, grupos)
+    ociosos = dias - _dias_ocupados(herramienta, fecha, prestadas, n)
+
+    stock = np.fromiter((h[4] or 0 for h in herramientas), dtype=np.int64, count=n)
+    unidades = np.maximum(stock, np.maximum(pico, 1))
+    utilizacion = segundos_prestados / (unidades * duracion)
+
+    limites = np.minimum(np.arange(dias + 1, dtype=np.int64) * SEGUNDOS_POR_DIA, duracion)
+    prestado_por_dia, pico_flota = _flota(inicio, fin, limites)
+
+    filas = [
+        {
+            "id_herramienta": h[0],
+            "nombre": h[1],
+            "codigo_interno": h[2],
+            "estado": h[3],
+            "unidades": int(unidades[i]),
+            "horas_prestadas": round(float(segundos_prestados[i]) / 3600, 1),
+            "utilizacion": float(utilizacion[i]),
+            "pico": int(pico[i]),
+            "dias_ociosos": int(ociosos[i]),
+        }
+        for i, h in enumerate(herramientas)
+    ]
+    filas.sort(key=lambda f: (-f["utilizacion"], f["id_herramienta"]))
+
+    capacidad = int(unidades.sum()) * duracion
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "dias": dias,
+        "prestamos": len(inicio),
+        "utilizacion": float(segundos_prestados.sum()) / capacidad if capacidad else 0.0,
+        "pico": pico_flota,
+        "herramientas": filas,
+        "diaria": [
+            {"fecha": (desde + timedelta(days=d)).date(), "unidades_prestadas": round(float(v), 2)}
+            for d, v in enumerate(prestado_por_dia / np.diff(limites))
+        ],
+    }
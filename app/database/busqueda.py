@@ -0,0 +1,125 @@
+"""
+Índices de búsqueda de texto completo.
+
+En SQLite se usa una tabla virtual FTS5 de contenido externo por entidad,
+mantenida al día por triggers sobre la tabla original. En PostgreSQL se usan
+índices GIN sobre expresiones (`tsvector` para palabras y `pg_trgm` para
+coincidencias parciales), que la base de datos mantiene sola.
+
+Los índices se crean junto con las tablas en `SQLModel.metadata.create_all`
+y se pueden reconstruir con:
+    python -m app.database.busqueda
+"""
+
+from sqlalchemy import event, inspect, text
+from sqlmodel import SQLModel
+
+
+# Columnas indexadas de cada entidad: (tabla, columna id, columnas de texto)
+INDICES_BUSQUEDA = {
+    "empleado": ("empleado", "id", ("nombre", "apellido", "correo", "area")),
+    "herramienta": ("herramienta", "id_herramienta", ("nombre", "codigo_interno", "descripcion")),
+    "prestamo": ("prestamo", "id_prestamo", ("observaciones",)),
+}
+
+# Dialectos con índice de texto completo; en los demás se busca con LIKE
+DIALECTOS_SOPORTADOS = ("sqlite", "postgresql")
+
+
+def nombre_indice(entidad: str) -> str:
+    """Nombre de la tabla FTS5 (SQLite) o del índice GIN (PostgreSQL) de una entidad"""
+    return f"{entidad}_fts"
+
+
+def documento(entidad: str) -> str:
+    """Expresión SQL con el texto indexado de una fila, usada por PostgreSQL"""
+    _, _, columnas = INDICES_BUSQUEDA[entidad]
+    return " || ' ' || ".join(f"coalesce({columna}, '')" for columna in columnas)
+
+
+def vector(entidad: str) -> str:
+    """Expresión `tsvector` de una entidad, idéntica a la del índice GIN"""
+    return f"to_tsvector('simple', {documento(entidad)})"
+
+
+def _sentencias_sqlite(entidad: str) -> list[str]:
+    tabla, columna_id, columnas = INDICES_BUSQUEDA[entidad]
+    fts = nombre_indice(entidad)
+    lista = ", ".join(columnas)
+    nuevos = ", ".join(f"new.{c}" for c in columnas)
+    viejos = ", ".join(f"old.{c}" for c in columnas)
+    borrar = f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.{columna_id}, {viejos});"
+    insertar = f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.{columna_id}, {nuevos});"
+    return [
+        # remove_diacritics permite buscar "nunez" y encontrar "Núñez"
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, "
+        f"content='{tabla}', content_rowid='{columna_id}', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END",
+        # Solo los cambios en columnas indexadas tocan el índice (no habilitar/devolver)
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} "
+        f"BEGIN {borrar} {insertar} END",
+    ]
+
+
+def _sentencias_postgresql(entidad: str) -> list[str]:
+    tabla, _, _ = INDICES_BUSQUEDA[entidad]
+    return [
+        f"CREATE INDEX IF NOT EXISTS {nombre_indice(entidad)} ON {tabla} USING GIN ({vector(entidad)})",
+        f"CREATE INDEX IF NOT EXISTS {nombre_indice(entidad)}_trgm ON {tabla} "
+        f"USING GIN ((lower({documento(entidad)})) gin_trgm_ops)",
+    ]
+
+
+def crear_indices_busqueda(connection):
+    """
+    Crear los índices de búsqueda que falten.
+
+    Es idempotente. En SQLite, si una tabla FTS5 se crea sobre una tabla que
+    ya tiene filas, se llena en el momento.
+    """
+    dialecto = connection.dialect.name
+    if dialecto == "sqlite":
+        existentes = set(inspect(connection).get_table_names())
+        for entidad in INDICES_BUSQUEDA:
+            nueva = nombre_indice(entidad) not in existentes
+            for sentencia in _sentencias_sqlite(entidad):
+                connection.execute(text(sentencia))
+            if nueva:
+                _reconstruir(connection, entidad)
+    elif dialecto == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for entidad in INDICES_BUSQUEDA:
+            for sentencia in _sentencias_postgresql(entidad):
+                connection.execute(text(sentencia))
+
+
+def _reconstruir(connection, entidad: str):
+    if connection.dialect.name == "sqlite":
+        fts = nombre_indice(entidad)
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text(f"REINDEX INDEX {nombre_indice(entidad)}"))
+        connection.execute(text(f"REINDEX INDEX {nombre_indice(entidad)}_trgm"))
+
+
+def reconstruir_indices_busqueda(engine):
+    """Volver a construir los índices de búsqueda desde las tablas originales"""
+    with engine.begin() as connection:
+        crear_indices_busqueda(connection)
+        for entidad in INDICES_BUSQUEDA:
+            _reconstruir(connection, entidad)
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _al_crear_tablas(metadata, connection, **kw):
+    # Tablas con los nombres de INDICES_BUSQUEDA: solo si el esquema las contiene
+    if all(tabla in metadata.tables for tabla, _, _ in INDICES_BUSQUEDA.values()):
+        crear_indices_busqueda(connection)
+
+
+if __name__ == "__main__":
+    from app.database.config import engine
+
+    reconstruir_indices_busqueda(engine)
+    print("Índices de búsqueda reconstruidos exitosamente")
@@ -1,29 +1,48 @@
-from sqlmodel import create_engine, Session
+from functools import cache
 import os
+
 from dotenv import load_dotenv
+from sqlmodel import create_engine, Session
+
 
-# Cargar variables de entorno
-load_dotenv()
+def get_database_url():
+    """URL de la base de datos desde las variables de entorno (y el archivo .env)"""
+    load_dotenv()
+    return os.getenv("DATABASE_URL", "sqlite:///gestor_herramientas.db")
 
-# Obtener la URL de la base de datos desde variables de entorno
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///gestor_herramientas.db")
 
-# Configurar el motor de la base de datos
+# El motor se crea en el primer uso y no al importar el módulo: las páginas,
+# la API y los scripts importan este módulo sin leer .env ni cargar el
+# dialecto hasta que necesitan la base de datos.
 # Para producción con PostgreSQL, recomendamos:
 # - pool_size=5 (o más según la carga)
 # - max_overflow=10
 # - pool_timeout=30
 # - pool_recycle=1800 (30 minutos)
 # - pool_pre_ping=True para verificar conexiones antes de usarlas
-engine = create_engine(
-    DATABASE_URL,
-    echo=os.getenv("DEBUG", "False") == "True",
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-    pool_pre_ping=True
-)
+@cache
+def get_engine():
+    """Motor de la base de datos, compartido por todo el proceso"""
+    return create_engine(
+        get_database_url(),
+        echo=os.getenv("DEBUG", "False") == "True",
+        pool_size=5,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True
+    )
+
+
+def __getattr__(nombre):
+    # Compatibilidad: `from app.database.config import engine` (o DATABASE_URL)
+    # sigue funcionando y crea el motor en ese momento
+    if nombre == "engine":
+        return get_engine()
+    if nombre == "DATABASE_URL":
+        return get_database_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 
 # Función para obtener una nueva sesión cada vez
 # Esto es importante para Streamlit ya que reejecuta el script
@@ -33,7 +52,7 @@ def get_session():
     Obtiene una nueva sesión de base de datos.
     Cada llamada a esta función debe crear una nueva sesión.
     """
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         try:
             yield session
         except Exception as e:
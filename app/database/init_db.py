@@ -1,20 +1,18 @@
-from sqlmodel import SQLModel
-from app.database.config import engine
-from app.models.empleado import Empleado
-from app.models.herramienta import Herramienta
-from app.models.prestamo import Prestamo
-from app.models.categoria import Categoria
+from app.database.config import get_engine
+from app.database.migraciones import migrar
 
 
 def create_table():
     """
-    Crea todas las tablas en la base de datos si no existen.
+    Crea o actualiza el esquema aplicando las migraciones pendientes
+    (ver app.database.migraciones).
     
     Esta función es idempotente y puede ejecutarse múltiples veces
-    sin causar errores.
+    sin causar errores; con la base al día solo consulta la versión.
     """
     try:
-        SQLModel.metadata.create_all(engine)
+        for migracion in migrar(get_engine()):
+            print(f"Migración aplicada: {migracion}")
         print("Tablas creadas/verificadas exitosamente")
     except Exception as e:
         print(f"Error al crear tablas: {e}")
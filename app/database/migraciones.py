@@ -0,0 +1,205 @@
+"""
+Migraciones versionadas del esquema.
+
+La tabla `schema_version` guarda las migraciones aplicadas. Al arrancar,
+`migrar` lee la última versión y aplica solo las pendientes, en orden y en
+una transacción; con la base al día el arranque hace una sola consulta en
+lugar de inspeccionar cada tabla como `create_all`.
+
+La migración 1 crea las tablas que falten con la definición actual de los
+modelos, así una base nueva queda completa desde el principio. Por eso las
+migraciones siguientes comprueban el estado antes de cambiarlo (una columna
+puede existir ya): una base nueva las registra sin hacer nada y una base
+creada antes de esta tabla, o con una versión anterior, recibe los cambios
+que le falten. `create_all` no agrega índices a una tabla que ya existe; la
+migración 10 crea los índices de los modelos que falten, y un índice nuevo
+en un modelo necesita su propia migración que lo cree de la misma forma.
+
+Para cambiar el esquema se agrega una migración al final de MIGRACIONES.
+
+Las migraciones pendientes se aplican con:
+    python -m app.database.migraciones
+"""
+
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import func, inspect, insert, select, text
+from sqlmodel import SQLModel
+
+from app.database.busqueda import crear_indices_busqueda  # también crea los índices junto con las tablas
+from app.models.aviso_prestamo import AvisoPrestamo
+from app.models.categoria import Categoria  # noqa: F401  (registrar todas las tablas)
+from app.models.clave_idempotencia import ClaveIdempotencia
+from app.models.empleado import Empleado  # noqa: F401
+from app.models.evento_auditoria import EventoAuditoria  # noqa: F401
+from app.models.herramienta import Herramienta  # noqa: F401
+from app.models.mensaje_salida import MensajeSalida
+from app.models.prestamo import Prestamo
+from app.models.prestamo_archivado import PrestamoArchivado  # noqa: F401
+from app.models.reserva import Reserva  # noqa: F401
+from app.models.secuencia_cambios import SecuenciaCambios  # noqa: F401
+from app.models.tarea import Tarea
+from app.models.version_esquema import VersionEsquema
+
+
+class Migracion(NamedTuple):
+    version: int
+    descripcion: str
+    aplicar: Callable
+
+
+def _agregar_columna(connection, tabla: str, nombre: str) -> bool:
+    """Agregar una columna del modelo (y sus índices) si la tabla no la tiene. Retorna True si la agregó"""
+    if nombre in {c["name"] for c in inspect(connection).get_columns(tabla)}:
+        return False
+    columna = SQLModel.metadata.tables[tabla].c[nombre]
+    tipo = columna.type.compile(dialect=connection.dialect)
+    ddl = f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}"
+    if columna.server_default is not None:
+        ddl += f" DEFAULT {columna.server_default.arg}"
+    if not columna.nullable:
+        ddl += " NOT NULL"
+    connection.execute(text(ddl))
+    for indice in SQLModel.metadata.tables[tabla].indexes:
+        if nombre in indice.columns:
+            indice.create(connection, checkfirst=True)
+    return True
+
+
+def _tablas_iniciales(connection):
+    SQLModel.metadata.create_all(connection)
+
+
+def _contadores_prestamos(connection):
+    agregadas = [
+        _agregar_columna(connection, "empleado", "prestamos_activos"),
+        _agregar_columna(connection, "herramienta", "unidades_prestadas"),
+    ]
+    if any(agregadas):
+        # Calcular los contadores a partir de los préstamos existentes
+        connection.execute(text(
+            "UPDATE empleado SET prestamos_activos = (SELECT COUNT(*) FROM prestamo "
+            "WHERE prestamo.id_empleado_h = empleado.id AND prestamo.estado = 'activo')"
+        ))
+        connection.execute(text(
+            "UPDATE herramienta SET unidades_prestadas = (SELECT COUNT(*) FROM prestamo "
+            "WHERE prestamo.id_herramienta_h = herramienta.id_herramienta AND prestamo.estado = 'activo')"
+        ))
+
+
+def _secuencia_cambios(connection):
+    if _agregar_columna(connection, "evento_auditoria", "secuencia"):
+        # Numerar los eventos existentes en el orden en que se registraron
+        connection.execute(text("UPDATE evento_auditoria SET secuencia = id_evento"))
+        connection.execute(text(
+            "UPDATE secuencia_cambios SET valor = (SELECT COALESCE(MAX(secuencia), 0) FROM evento_auditoria)"
+        ))
+
+
+def _indice_auditoria_por_secuencia(connection):
+    if "ix_evento_auditoria_entidad" in {i["name"] for i in inspect(connection).get_indexes("evento_auditoria")}:
+        connection.execute(text("DROP INDEX ix_evento_auditoria_entidad"))
+    for indice in EventoAuditoria.__table__.indexes:
+        indice.create(connection, checkfirst=True)
+
+
+def _bandeja_salida(connection):
+    MensajeSalida.__table__.create(connection, checkfirst=True)
+    AvisoPrestamo.__table__.create(connection, checkfirst=True)
+
+
+def _cola_tareas(connection):
+    Tarea.__table__.create(connection, checkfirst=True)
+
+
+def _versiones_filas(connection):
+    for tabla in ("categoria", "empleado", "herramienta", "prestamo", "prestamo_archivado", "reserva"):
+        _agregar_columna(connection, tabla, "version")
+
+
+def _claves_idempotencia(connection):
+    ClaveIdempotencia.__table__.create(connection, checkfirst=True)
+
+
+def _ids_prestamo_sin_reutilizar(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'prestamo'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        # SQLite no agrega AUTOINCREMENT con ALTER TABLE: rehacer la tabla con la definición del modelo
+        columnas = ", ".join(c.name for c in Prestamo.__table__.columns)
+        for indice in inspect(connection).get_indexes("prestamo"):
+            connection.execute(text(f"DROP INDEX {indice['name']}"))
+        connection.execute(text("ALTER TABLE prestamo RENAME TO prestamo_anterior"))
+        Prestamo.__table__.create(connection)
+        connection.execute(text(f"INSERT INTO prestamo ({columnas}) SELECT {columnas} FROM prestamo_anterior"))
+        connection.execute(text("DROP TABLE prestamo_anterior"))
+        # Los triggers del índice de búsqueda se borraron con la tabla anterior
+        crear_indices_busqueda(connection)
+    # Seguir después del id más alto, esté en la tabla o ya en el archivo
+    maximo = connection.execute(text(
+        "SELECT MAX(id) FROM (SELECT MAX(id_prestamo) AS id FROM prestamo "
+        "UNION ALL SELECT MAX(id_prestamo) FROM prestamo_archivado)"
+    )).scalar() or 0
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'prestamo'"))
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('prestamo', :maximo)"), {"maximo": maximo})
+
+
+def _indices_modelos(connection):
+    for tabla in SQLModel.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(connection, checkfirst=True)
+
+
+MIGRACIONES = [
+    Migracion(1, "Tablas iniciales", _tablas_iniciales),
+    Migracion(2, "Contadores de préstamos activos", _contadores_prestamos),
+    Migracion(3, "Secuencia del registro de cambios", _secuencia_cambios),
+    Migracion(4, "Índice de auditoría por entidad y secuencia", _indice_auditoria_por_secuencia),
+    Migracion(5, "Bandeja de salida de avisos de préstamos vencidos", _bandeja_salida),
+    Migracion(6, "Cola de tareas en segundo plano", _cola_tareas),
+    Migracion(7, "Versión de las filas para la concurrencia optimista", _versiones_filas),
+    Migracion(8, "Claves de idempotencia de las creaciones", _claves_idempotencia),
+    Migracion(9, "Ids de préstamos sin reutilizar (AUTOINCREMENT en SQLite)", _ids_prestamo_sin_reutilizar),
+    Migracion(10, "Índices de los modelos en tablas creadas antes que ellos", _indices_modelos),
+]
+
+
+def version_actual(connection) -> int:
+    """Última migración aplicada (0 si la base no tiene la tabla de versiones)"""
+    if not inspect(connection).has_table(VersionEsquema.__tablename__):
+        return 0
+    return connection.execute(select(func.max(VersionEsquema.version))).scalar() or 0
+
+
+def migrar(engine) -> list[str]:
+    """
+    Aplicar las migraciones pendientes en una transacción.
+
+    Args:
+        engine: Motor de la base de datos a migrar
+
+    Returns:
+        Lista de migraciones aplicadas ("versión: descripción"), vacía si ya estaba al día
+    """
+    with engine.begin() as connection:
+        actual = version_actual(connection)
+        pendientes = [m for m in MIGRACIONES if m.version > actual]
+        if pendientes:
+            VersionEsquema.__table__.create(connection, checkfirst=True)
+        for migracion in pendientes:
+            migracion.aplicar(connection)
+            connection.execute(insert(VersionEsquema).values(
+                version=migracion.version, descripcion=migracion.descripcion, fecha=datetime.now()
+            ))
+    return [f"{m.version}: {m.descripcion}" for m in pendientes]
+
+
+if __name__ == "__main__":
+    from app.database.config import engine
+
+    aplicadas = migrar(engine)
+    for migracion in aplicadas:
+        print(f"Migración aplicada: {migracion}")
+    print(f"Esquema en la versión {MIGRACIONES[-1].version}")
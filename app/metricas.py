@@ -0,0 +1,344 @@
+"""
+Métricas del proceso en el formato de texto de Prometheus.
+
+Contadores e histogramas en memoria, sin dependencias externas:
+
+    gestor_sql_sentencias_total{funcion}    Sentencias SQL por función de app.crud
+    gestor_sql_segundos{funcion}            Duración de cada sentencia
+    gestor_pool_checkouts_total             Conexiones tomadas del pool
+    gestor_pool_espera_segundos             Espera para obtener una conexión
+    gestor_pool_desbordes_total             Conexiones tomadas más allá de pool_size
+    gestor_pool_timeouts_total              Esperas que superaron pool_timeout
+    gestor_pool_en_uso / _desborde / _tamano  Estado del pool al consultar las métricas
+    gestor_cache_total{cache,resultado}     Aciertos y fallos de los cachés de la aplicación
+    gestor_pagina_segundos{pagina}          Duración de cada ejecución de una página
+
+Las sentencias se atribuyen a la función de `app.crud` más externa en curso
+("otra" fuera de ellas): `instrumentar_crud` envuelve las funciones
+exportadas para anotar su nombre en una ContextVar, que el evento de
+SQLAlchemy lee. En el camino de cada sentencia solo hay una lectura de esa
+variable, un `perf_counter` y dos incrementos bajo un lock.
+
+`run_streamlit.py` llama a `iniciar_metricas`, que instrumenta el motor y
+sirve las métricas en http://METRICAS_HOST:METRICAS_PUERTO/metrics
+(127.0.0.1:9464 por defecto; METRICAS_PUERTO=0 no las sirve).
+
+Uso:
+    curl http://127.0.0.1:9464/metrics
+"""
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+
+
+# Puerto del endpoint /metrics (0: no se sirve)
+PUERTO = int(os.getenv("METRICAS_PUERTO", "9464"))
+
+# Dirección del endpoint: solo local, Prometheus lo consulta desde la misma máquina
+HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+
+# Límites superiores de los histogramas de duración, en segundos
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Tipo de contenido del formato de texto de Prometheus
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Métricas registradas, en el orden en que se exponen
+_REGISTRO = []
+
+# Función de app.crud en curso en este hilo (o tarea asyncio)
+_funcion_actual = ContextVar("funcion_crud", default="otra")
+
+# Motor cuyo pool describen los medidores gestor_pool_* (el último instrumentado)
+_motor = None
+
+_lock_inicio = threading.Lock()
+_servidor = None
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    return "+Inf" if valor == float("inf") else repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monótono, con un valor por combinación de etiquetas."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def inc(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def valor(self, *valores):
+        return self._valores.get(valores, 0)
+
+    def muestras(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for etiquetas, valor in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma de duraciones con los límites de LIMITES_SEGUNDOS."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), limites: tuple = LIMITES_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = limites
+        # {etiquetas: [cuenta por intervalo..., cuenta sobre el último límite, suma]}
+        self._valores = {}
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def observar(self, valor: float, *valores):
+        i = bisect_left(self.limites, valor)
+        with self._lock:
+            cubetas = self._valores.get(valores)
+            if cubetas is None:
+                cubetas = self._valores[valores] = [0] * (len(self.limites) + 1) + [0.0]
+            cubetas[i] += 1
+            cubetas[-1] += valor
+
+    @contextmanager
+    def medir(self, *valores):
+        """Observar la duración del bloque (también si termina con una excepción)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *valores)
+
+    def cuenta(self, *valores) -> int:
+        return sum(self._valores.get(valores, [0.0])[:-1])
+
+    def muestras(self):
+        with self._lock:
+            valores = sorted((etiquetas, list(cubetas)) for etiquetas, cubetas in self._valores.items())
+        for etiquetas, cubetas in valores:
+            acumulado = 0
+            for limite, cuenta in zip((*self.limites, float("inf")), cubetas):
+                acumulado += cuenta
+                le = f'le="{_numero(limite)}"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(cubetas[-1])}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}"
+
+
+class Medidor:
+    """Valor instantáneo que se calcula al exponer las métricas."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, leer):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.leer = leer
+        _REGISTRO.append(self)
+
+    def muestras(self):
+        valor = self.leer()
+        if valor is not None:
+            yield f"{self.nombre} {_numero(valor)}"
+
+
+SQL_SENTENCIAS = Contador("gestor_sql_sentencias_total", "Sentencias SQL ejecutadas", ("funcion",))
+SQL_SEGUNDOS = Histograma("gestor_sql_segundos", "Duración de las sentencias SQL", ("funcion",))
+POOL_CHECKOUTS = Contador("gestor_pool_checkouts_total", "Conexiones tomadas del pool")
+POOL_ESPERA = Histograma("gestor_pool_espera_segundos", "Espera para obtener una conexión del pool")
+POOL_DESBORDES = Contador("gestor_pool_desbordes_total", "Conexiones tomadas más allá de pool_size")
+POOL_TIMEOUTS = Contador("gestor_pool_timeouts_total", "Esperas de una conexión que superaron pool_timeout")
+CACHE = Contador("gestor_cache_total", "Consultas a los cachés de la aplicación", ("cache", "resultado"))
+PAGINA_SEGUNDOS = Histograma("gestor_pagina_segundos", "Duración de cada ejecución de una página", ("pagina",))
+
+
+def _leer_pool(metodo: str):
+    def leer():
+        pool = _motor.pool if _motor is not None else None
+        return getattr(pool, metodo)() if hasattr(pool, metodo) else None
+    return leer
+
+
+POOL_EN_USO = Medidor("gestor_pool_en_uso", "Conexiones del pool en uso", _leer_pool("checkedout"))
+POOL_DESBORDE = Medidor(
+    "gestor_pool_desborde", "Conexiones abiertas más allá de pool_size (negativo: sin abrir)", _leer_pool("overflow")
+)
+POOL_TAMANO = Medidor("gestor_pool_tamano", "pool_size del motor", _leer_pool("size"))
+
+
+def contar_cache(cache: str, acierto: bool):
+    """Registrar un acierto o un fallo del caché `cache`"""
+    CACHE.inc(cache, "acierto" if acierto else "fallo")
+
+
+def medir_pagina(pagina: str):
+    """Decorador para el `main` de una página: observa la duración de cada ejecución"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with PAGINA_SEGUNDOS.medir(pagina):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _medir_funcion(nombre: str, funcion):
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        # Las llamadas anidadas (create_prestamo -> unidades_libres) cuentan
+        # para la función que llamó la página
+        if _funcion_actual.get() != "otra":
+            return funcion(*args, **kwargs)
+        token = _funcion_actual.set(nombre)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _funcion_actual.reset(token)
+    envoltura._funcion_metricas = nombre
+    return envoltura
+
+
+def instrumentar_crud():
+    """
+    Envolver las funciones exportadas por app.crud para atribuirles sus sentencias.
+
+    Se reemplazan en sus submódulos: debe llamarse antes de que las páginas
+    hagan `from app.crud.crud_x import ...`, como hace run_streamlit.py.
+    """
+    import app.crud as crud
+
+    for nombre, submodulo in crud._EXPORTACIONES.items():
+        modulo = import_module(f"app.crud.{submodulo}")
+        funcion = getattr(modulo, nombre)
+        if getattr(funcion, "_funcion_metricas", None) is None:
+            setattr(modulo, nombre, _medir_funcion(nombre, funcion))
+        crud.__dict__.pop(nombre, None)  # El próximo acceso toma la versión envuelta
+
+
+def instrumentar_motor(engine):
+    """Registrar las sentencias y el uso del pool del motor en las métricas"""
+    global _motor
+    _motor = engine
+    if getattr(engine, "_metricas", False):
+        return engine
+    engine._metricas = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._inicio_metricas = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        funcion = _funcion_actual.get()
+        SQL_SENTENCIAS.inc(funcion)
+        inicio = getattr(context, "_inicio_metricas", None)
+        if inicio is not None:
+            SQL_SEGUNDOS.observar(time.perf_counter() - inicio, funcion)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+        overflow = getattr(engine.pool, "overflow", None)
+        if overflow is not None and overflow() > 0:
+            POOL_DESBORDES.inc()
+
+    # SQLAlchemy no tiene un evento antes de pedir la conexión al pool: la
+    # espera se mide envolviendo Engine.raw_connection, que usan todas las
+    # conexiones del motor (y que sobrevive a engine.dispose())
+    raw_connection = engine.raw_connection
+
+    @wraps(raw_connection)
+    def _raw_connection():
+        inicio = time.perf_counter()
+        try:
+            return raw_connection()
+        except TimeoutPool:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_ESPERA.observar(time.perf_counter() - inicio)
+
+    engine.raw_connection = _raw_connection
+    return engine
+
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = []
+    for metrica in _REGISTRO:
+        lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+        lineas.extend(metrica.muestras())
+    return "\n".join(lineas) + "\n"
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = exponer().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTENIDO)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass  # Prometheus consulta cada pocos segundos: no llenar la salida
+
+
+def servir(host: str = HOST, puerto: int = PUERTO) -> ThreadingHTTPServer:
+    """Servir /metrics en un hilo aparte. Retorna el servidor (server_address tiene el puerto real)"""
+    servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+def iniciar_metricas(engine, puerto: int = PUERTO, host: str = HOST):
+    """Instrumentar el motor y app.crud y servir las métricas, una vez por proceso (None si `puerto` es 0)"""
+    global _servidor
+    with _lock_inicio:
+        if _servidor is None and puerto > 0:
+            instrumentar_motor(engine)
+            instrumentar_crud()
+            try:
+                _servidor = servir(host, puerto)
+            except OSError as e:
+                print(f"No se pudo servir las métricas en {host}:{puerto}: {e}", file=sys.stderr)
+        return _servidor
@@ -0,0 +1,19 @@
+"""
+Modelos de la base de datos.
+
+Préstamos, empleados, herramientas y categorías se relacionan entre sí con
+`Relationship`, que SQLAlchemy resuelve por nombre de clase al configurar los
+mappers: se importan aquí juntos para que importar cualquiera de ellos
+registre también los demás.
+"""
+
+import os
+
+
+# Estrategia de carga por defecto de las relaciones. "select" consulta al
+# acceder al atributo (una consulta por objeto); las listas piden la que
+# convenga con opciones de carga (selectinload, joinedload). Los tests usan
+# "raise_on_sql" para que un acceso que dispararía esa consulta falle.
+CARGA_RELACIONES = os.getenv("CARGA_RELACIONES", "select")
+
+from . import categoria, empleado, herramienta, prestamo  # noqa: E402, F401
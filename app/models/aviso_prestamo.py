@@ -0,0 +1,12 @@
+from sqlmodel import SQLModel, Field
+from datetime import date
+
+
+class AvisoPrestamo(SQLModel, table=True):
+    # Préstamo vencido ya avisado en un día: evita encolar dos avisos del
+    # mismo préstamo el mismo día (ver app.notificador)
+    __tablename__ = "aviso_prestamo"
+
+    id_prestamo: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    dia: date = Field(primary_key=True)
+    id_mensaje: int = Field(foreign_key="mensaje_salida.id_mensaje", index=True)
@@ -1,7 +1,26 @@
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy.orm import declared_attr
+from typing import TYPE_CHECKING
+
+from app.models import CARGA_RELACIONES
+
+if TYPE_CHECKING:
+    from app.models.herramienta import Herramienta
 
 
 class Categoria(SQLModel, table=True):
     id_categoria: int | None = Field(default=None, primary_key=True)
     nombre: str
     estado: bool = Field(default=True)
+    # Concurrencia optimista: el ORM la incrementa en cada UPDATE (ver app.crud.concurrencia)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    # Borrar una categoría no carga sus herramientas para desvincularlas
+    herramientas: list["Herramienta"] = Relationship(
+        back_populates="categoria_h",
+        sa_relationship_kwargs={"lazy": CARGA_RELACIONES, "passive_deletes": True},
+    )
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class ClaveIdempotencia(SQLModel, table=True):
+    # Clave de una creación ya hecha: repetir la petición con la misma clave
+    # devuelve la fila creada la primera vez (ver app.crud.idempotencia)
+    __tablename__ = "clave_idempotencia"
+
+    clave: str = Field(primary_key=True)
+    # Nombre de la entidad creada ("prestamo", "empleado", ...) y su id
+    entidad: str
+    id_entidad: int
+    # Las claves más antiguas que VIGENCIA_CLAVES_HORAS se borran con purgar_claves
+    fecha: datetime = Field(default_factory=datetime.now, index=True)
@@ -1,10 +1,17 @@
-from sqlmodel import SQLModel, Field, Column
+from sqlmodel import SQLModel, Field, Column, Relationship
 from sqlalchemy import String, CheckConstraint
+from sqlalchemy.orm import declared_attr
+from typing import TYPE_CHECKING
+
+from app.models import CARGA_RELACIONES
+
+if TYPE_CHECKING:
+    from app.models.prestamo import Prestamo
 
 
 class Empleado(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
-    nombre: str
+    nombre: str = Field(index=True)
     apellido: str
     area: str
     # Correo es opcional y único solo para valores no nulos
@@ -21,3 +28,15 @@ class Empleado(SQLModel, table=True):
         )
     )
     activo: bool = Field(default=True)
+    # Contador mantenido por create/devolver/cancelar_prestamo (ver reconciliar_contadores)
+    prestamos_activos: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Concurrencia optimista: el ORM la incrementa en cada UPDATE (ver app.crud.concurrencia)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    prestamos: list["Prestamo"] = Relationship(
+        back_populates="empleado", sa_relationship_kwargs={"lazy": CARGA_RELACIONES}
+    )
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
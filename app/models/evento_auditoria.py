@@ -0,0 +1,25 @@
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import JSON, Index
+from datetime import datetime
+
+
+class EventoAuditoria(SQLModel, table=True):
+    # Registro de solo inserción de los cambios en las entidades (ver app.crud.auditoria)
+    __tablename__ = "evento_auditoria"
+    # Historia de una entidad o de una fila, de la más reciente a la más antigua,
+    # y versión (última secuencia) de una fila sin leer la tabla
+    __table_args__ = (
+        Index("ix_evento_auditoria_entidad_secuencia", "entidad", "id_entidad", "secuencia"),
+    )
+
+    id_evento: int | None = Field(default=None, primary_key=True)
+    # Número en el registro de cambios, asignado al confirmar: sigue el orden de los commits
+    secuencia: int | None = Field(default=None, unique=True, index=True)
+    entidad: str
+    id_entidad: int
+    # "crear", "actualizar" o "borrar"
+    accion: str
+    # {campo: [valor anterior, valor nuevo]}
+    cambios: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    fecha: datetime = Field(default_factory=datetime.now)
+    actor: str | None = None
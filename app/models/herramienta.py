@@ -1,12 +1,36 @@
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy.orm import declared_attr
+from typing import TYPE_CHECKING, Optional
+
+from app.models import CARGA_RELACIONES
+
+if TYPE_CHECKING:
+    from app.models.categoria import Categoria
+    from app.models.prestamo import Prestamo
 
 
 class Herramienta(SQLModel, table=True):
     id_herramienta: int | None = Field(default=None, primary_key=True)
-    nombre: str
+    nombre: str = Field(index=True)
     categoria: str | None = None
     estado: bool = Field(default=True)
     codigo_interno: str | None = Field(default=None, unique=True)
     cantidad_disponible: int = Field(default=1)
     descripcion: str | None = None
     id_categoria_h: int | None = Field(default=None, foreign_key="categoria.id_categoria")
+    # Unidades en préstamos activos, mantenido por create/devolver/cancelar_prestamo
+    unidades_prestadas: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Concurrencia optimista: el ORM la incrementa en cada UPDATE (ver app.crud.concurrencia)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    # Categoría de id_categoria_h (`categoria` es el campo de texto legado)
+    categoria_h: Optional["Categoria"] = Relationship(
+        back_populates="herramientas", sa_relationship_kwargs={"lazy": CARGA_RELACIONES}
+    )
+    prestamos: list["Prestamo"] = Relationship(
+        back_populates="herramienta", sa_relationship_kwargs={"lazy": CARGA_RELACIONES}
+    )
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
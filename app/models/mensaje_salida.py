@@ -0,0 +1,29 @@
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import JSON, Index
+from datetime import datetime
+
+
+class MensajeSalida(SQLModel, table=True):
+    # Bandeja de salida de correos, encolados en la base de datos y enviados
+    # por el notificador (ver app.notificador)
+    __tablename__ = "mensaje_salida"
+    # Mensajes por enviar en el orden en que vencen sus intentos
+    __table_args__ = (
+        Index("ix_mensaje_salida_estado_proximo_intento", "estado", "proximo_intento"),
+    )
+
+    id_mensaje: int | None = Field(default=None, primary_key=True)
+    id_empleado_h: int = Field(foreign_key="empleado.id", index=True)
+    destinatario: str
+    asunto: str
+    cuerpo: str
+    # Ids de los préstamos avisados en el mensaje
+    prestamos: list = Field(default_factory=list, sa_column=Column(JSON, nullable=False))
+    # "pendiente", "enviado" o "fallido"
+    estado: str = Field(default="pendiente")
+    intentos: int = Field(default=0)
+    # Un mensaje pendiente se envía a partir de esta fecha (reintentos y reclamos)
+    proximo_intento: datetime = Field(default_factory=datetime.now)
+    ultimo_error: str | None = None
+    fecha_creacion: datetime = Field(default_factory=datetime.now)
+    fecha_envio: datetime | None = None
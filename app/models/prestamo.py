@@ -1,16 +1,41 @@
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy.orm import declared_attr
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+from app.models import CARGA_RELACIONES
+
+if TYPE_CHECKING:
+    from app.models.empleado import Empleado
+    from app.models.herramienta import Herramienta
 
 
 class Prestamo(SQLModel, table=True):
+    # AUTOINCREMENT en SQLite: sin él, el id del préstamo más reciente se
+    # reutiliza cuando se archiva (ver app.crud.archivo) y choca con el archivo
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id_prestamo: int | None = Field(default=None, primary_key=True)
-    id_empleado_h: int = Field(foreign_key="empleado.id")
-    id_herramienta_h: int = Field(foreign_key="herramienta.id_herramienta")
-    fecha_prestamo: datetime = Field(default_factory=datetime.now)
+    id_empleado_h: int = Field(foreign_key="empleado.id", index=True)
+    id_herramienta_h: int = Field(foreign_key="herramienta.id_herramienta", index=True)
+    fecha_prestamo: datetime = Field(default_factory=datetime.now, index=True)
     fecha_devolucion_estimada: datetime = Field(
-        default_factory=lambda: datetime.now() + timedelta(days=1)
+        default_factory=lambda: datetime.now() + timedelta(days=1),
+        index=True,
     )
     fecha_devolucion: datetime | None = None
     observaciones: str | None = None
-    estado: str = Field(default="activo")
+    estado: str = Field(default="activo", index=True)
+    # Concurrencia optimista: el ORM la incrementa en cada UPDATE (ver app.crud.concurrencia)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    empleado: Optional["Empleado"] = Relationship(
+        back_populates="prestamos", sa_relationship_kwargs={"lazy": CARGA_RELACIONES}
+    )
+    herramienta: Optional["Herramienta"] = Relationship(
+        back_populates="prestamos", sa_relationship_kwargs={"lazy": CARGA_RELACIONES}
+    )
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
@@ -0,0 +1,20 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class PrestamoArchivado(SQLModel, table=True):
+    # Préstamos cerrados (devueltos o cancelados) movidos fuera de la tabla
+    # prestamo por app.crud.archivo; conservan el mismo id_prestamo
+    __tablename__ = "prestamo_archivado"
+
+    id_prestamo: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    id_empleado_h: int = Field(foreign_key="empleado.id", index=True)
+    id_herramienta_h: int = Field(foreign_key="herramienta.id_herramienta", index=True)
+    fecha_prestamo: datetime = Field(index=True)
+    fecha_devolucion_estimada: datetime
+    fecha_devolucion: datetime | None = None
+    observaciones: str | None = None
+    estado: str = Field(index=True)
+    # Versión con la que se archivó; el archivo no se modifica
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    fecha_archivo: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,29 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from sqlalchemy.orm import declared_attr
+from datetime import datetime
+
+
+class Reserva(SQLModel, table=True):
+    # Búsqueda por rango de las reservas de una herramienta que se solapan con un
+    # período: fecha_fin va primero para saltar las reservas ya terminadas
+    __table_args__ = (
+        Index("ix_reserva_herramienta_periodo", "id_herramienta_h", "estado", "fecha_fin", "fecha_inicio"),
+    )
+
+    id_reserva: int | None = Field(default=None, primary_key=True)
+    id_empleado_h: int = Field(foreign_key="empleado.id", index=True)
+    id_herramienta_h: int = Field(foreign_key="herramienta.id_herramienta")
+    # Período reservado [fecha_inicio, fecha_fin)
+    fecha_inicio: datetime
+    fecha_fin: datetime
+    cantidad: int = Field(default=1)
+    observaciones: str | None = None
+    # "activa", "cumplida" (el empleado retiró las unidades) o "cancelada"
+    estado: str = Field(default="activa")
+    # Concurrencia optimista: el ORM la incrementa en cada UPDATE (ver app.crud.concurrencia)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
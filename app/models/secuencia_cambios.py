@@ -0,0 +1,18 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import DDL, event
+
+
+class SecuenciaCambios(SQLModel, table=True):
+    # Contador de una sola fila que numera los eventos del registro de cambios
+    # (ver app.crud.auditoria); la fila se crea junto con la tabla
+    __tablename__ = "secuencia_cambios"
+
+    id: int = Field(default=1, primary_key=True)
+    valor: int = 0
+
+
+event.listen(
+    SecuenciaCambios.__table__,
+    "after_create",
+    DDL("INSERT INTO secuencia_cambios (id, valor) VALUES (1, 0)"),
+)
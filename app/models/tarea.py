@@ -0,0 +1,36 @@
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import JSON, Index
+from datetime import datetime
+
+
+class Tarea(SQLModel, table=True):
+    # Cola persistente de operaciones largas, ejecutadas por los trabajadores
+    # de app.tareas fuera del hilo de la página
+    __tablename__ = "tarea"
+    # Próxima tarea pendiente y tareas en curso
+    __table_args__ = (
+        Index("ix_tarea_estado_id", "estado", "id_tarea"),
+    )
+
+    id_tarea: int | None = Field(default=None, primary_key=True)
+    # Nombre registrado con @tipo_tarea
+    tipo: str
+    # Argumentos de la función de la tarea
+    parametros: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    # "pendiente", "en_curso", "terminada", "fallida" o "cancelada"
+    estado: str = Field(default="pendiente")
+    # De 0 a 1, con un mensaje opcional ("120 de 500")
+    progreso: float = Field(default=0)
+    mensaje: str | None = None
+    # Pedido de cancelación para una tarea en curso
+    cancelar: bool = Field(default=False)
+    resultado: dict | None = Field(default=None, sa_column=Column(JSON, nullable=True))
+    error: str | None = None
+    # Actor al que se atribuyen los cambios hechos por la tarea
+    actor: str | None = None
+    trabajador: str | None = None
+    fecha_creacion: datetime = Field(default_factory=datetime.now)
+    fecha_inicio: datetime | None = None
+    # Última señal de vida del trabajador que la ejecuta
+    latido: datetime | None = None
+    fecha_fin: datetime | None = None
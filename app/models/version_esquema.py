@@ -0,0 +1,11 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class VersionEsquema(SQLModel, table=True):
+    # Migraciones aplicadas a la base de datos (ver app.database.migraciones)
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    descripcion: str
+    fecha: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,316 @@
+"""
+Avisos por correo de los préstamos vencidos.
+
+Los préstamos vencidos solo se ven si alguien abre Relatórios; el notificador
+avisa por correo a cada empleado de sus préstamos vencidos, en dos pasos:
+
+1. `encolar_avisos_vencidos` busca los préstamos activos vencidos (con los
+   índices de estado y de fecha estimada de devolución), los agrupa por
+   empleado y escribe un mensaje por empleado con correo en la bandeja de
+   salida (`mensaje_salida`). Cada préstamo avisado queda en `aviso_prestamo`
+   con el día: un préstamo se avisa como mucho una vez por día aunque el
+   proceso corra varias veces.
+2. `enviar_pendientes` vacía la bandeja con asyncio. Los envíos SMTP corren en
+   hilos, con a lo sumo `concurrencia` conexiones a la vez. Un error temporal
+   reprograma el mensaje con espera exponencial hasta `max_intentos`; un
+   rechazo permanente del servidor (código 5xx) lo marca como fallido.
+
+Antes de enviar un mensaje se lo reclama: se le suma un intento y su próximo
+intento se corre RECLAMO_SEGUNDOS, así otro notificador no lo toma y, si el
+proceso termina en medio del envío, el mensaje vuelve a quedar pendiente (los
+avisos se entregan al menos una vez).
+
+El servidor SMTP se configura con las variables de entorno SMTP_HOST,
+SMTP_PORT, SMTP_USUARIO, SMTP_CLAVE, SMTP_STARTTLS y SMTP_REMITENTE.
+
+Uso:
+    python -m app.notificador              # encolar y enviar una vez
+    python -m app.notificador --cada 900   # repetir cada 15 minutos
+"""
+
+import asyncio
+import os
+import smtplib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from itertools import groupby
+
+from sqlalchemy import exists, insert, update
+from sqlmodel import Session, select
+
+from app.models.aviso_prestamo import AvisoPrestamo
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from app.models.mensaje_salida import MensajeSalida
+from app.models.prestamo import Prestamo
+
+
+# Conexiones SMTP simultáneas
+CONCURRENCIA_SMTP = 4
+
+# Intentos de envío de un mensaje antes de marcarlo como fallido
+MAX_INTENTOS = 5
+
+# Espera antes del primer reintento; se duplica en cada intento
+ESPERA_BASE_SEGUNDOS = 60
+
+# Tiempo durante el cual un mensaje reclamado no se vuelve a reclamar; cubre
+# con margen un lote de MENSAJES_POR_CONEXION mensajes por conexión
+RECLAMO_SEGUNDOS = 600
+
+# Mensajes reclamados por lote, por cada conexión simultánea
+MENSAJES_POR_CONEXION = 4
+
+
+@dataclass
+class ConfigSMTP:
+    """Servidor SMTP y remitente de los avisos."""
+    host: str = "localhost"
+    port: int = 25
+    usuario: str | None = None
+    clave: str | None = None
+    starttls: bool = False
+    remitente: str = "gestor@localhost"
+    timeout: float = 30
+
+    @classmethod
+    def desde_entorno(cls) -> "ConfigSMTP":
+        """Configuración tomada de las variables de entorno SMTP_*"""
+        return cls(
+            host=os.getenv("SMTP_HOST", "localhost"),
+            port=int(os.getenv("SMTP_PORT", "25")),
+            usuario=os.getenv("SMTP_USUARIO") or None,
+            clave=os.getenv("SMTP_CLAVE") or None,
+            starttls=os.getenv("SMTP_STARTTLS", "False") == "True",
+            remitente=os.getenv("SMTP_REMITENTE", "gestor@localhost"),
+        )
+
+
+def _cuerpo(nombre: str, prestamos, ahora: datetime) -> str:
+    """Texto del aviso a un empleado"""
+    lineas = [f"Olá {nombre},", "", "Os seguintes empréstimos estão vencidos:", ""]
+    for prestamo in prestamos:
+        dias = (ahora - prestamo.fecha_devolucion_estimada).days
+        lineas.append(
+            f"- Empréstimo #{prestamo.id_prestamo}: {prestamo.herramienta} ({prestamo.codigo_interno}), "
+            f"vencido em {prestamo.fecha_devolucion_estimada.strftime('%d/%m/%Y')} ({dias} dias)"
+        )
+    lineas += ["", "Por favor, devolva as ferramentas o quanto antes."]
+    return "\n".join(lineas)
+
+
+def encolar_avisos_vencidos(session: Session, ahora: datetime | None = None):
+    """
+    Encolar un aviso por empleado con sus préstamos vencidos no avisados en el día.
+
+    Los empleados sin correo no reciben avisos.
+
+    Args:
+        session: Sesión de base de datos
+        ahora: Fecha de referencia (por defecto, ahora)
+
+    Returns:
+        Diccionario con los mensajes encolados y los préstamos que avisan
+    """
+    ahora = ahora or datetime.now()
+    hoy = ahora.date()
+    try:
+        avisado_hoy = exists().where(
+            AvisoPrestamo.id_prestamo == Prestamo.id_prestamo,
+            AvisoPrestamo.dia == hoy,
+        )
+        statement = (
+            select(
+                Prestamo.id_prestamo,
+                Prestamo.id_empleado_h,
+                Prestamo.fecha_devolucion_estimada,
+                Empleado.nombre,
+                Empleado.correo,
+                Herramienta.nombre.label("herramienta"),
+                Herramienta.codigo_interno,
+            )
+            .join(Empleado, Empleado.id == Prestamo.id_empleado_h)
+            .join(Herramienta, Herramienta.id_herramienta == Prestamo.id_herramienta_h)
+            .where(
+                Prestamo.estado == "activo",
+                Prestamo.fecha_devolucion_estimada < ahora,
+                Empleado.correo != None,  # noqa: E711
+                ~avisado_hoy,
+            )
+            .order_by(Prestamo.id_empleado_h, Prestamo.fecha_devolucion_estimada)
+        )
+        mensajes = []
+        for _, grupo in groupby(session.exec(statement).all(), key=lambda fila: fila.id_empleado_h):
+            prestamos = list(grupo)
+            mensaje = MensajeSalida(
+                id_empleado_h=prestamos[0].id_empleado_h,
+                destinatario=prestamos[0].correo,
+                asunto=f"Empréstimos vencidos: {len(prestamos)} ferramenta(s) para devolver",
+                cuerpo=_cuerpo(prestamos[0].nombre, prestamos, ahora),
+                prestamos=[p.id_prestamo for p in prestamos],
+                proximo_intento=ahora,
+            )
+            session.add(mensaje)
+            mensajes.append(mensaje)
+        if not mensajes:
+            return {"mensajes": 0, "prestamos": 0}
+        session.flush()
+        avisos = [
+            {"id_prestamo": id_prestamo, "dia": hoy, "id_mensaje": mensaje.id_mensaje}
+            for mensaje in mensajes for id_prestamo in mensaje.prestamos
+        ]
+        # Dos notificadores que encolan a la vez chocan con la clave (préstamo, día)
+        session.execute(insert(AvisoPrestamo), avisos)
+        session.commit()
+        return {"mensajes": len(mensajes), "prestamos": len(avisos)}
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al encolar avisos: {str(e)}")
+
+
+def _reclamar(engine, limite: int):
+    """Reclamar hasta `limite` mensajes pendientes cuyo intento ya venció"""
+    ahora = datetime.now()
+    with Session(engine) as session:
+        vencidos = session.exec(
+            select(MensajeSalida.id_mensaje)
+            .where(MensajeSalida.estado == "pendiente", MensajeSalida.proximo_intento <= ahora)
+            .order_by(MensajeSalida.proximo_intento, MensajeSalida.id_mensaje)
+            .limit(limite)
+        ).all()
+        if not vencidos:
+            return []
+        # Las condiciones se repiten en el UPDATE: si otro notificador reclamó
+        # un mensaje entre la lectura y la escritura, no se devuelve aquí
+        reclamados = session.execute(
+            update(MensajeSalida)
+            .where(
+                MensajeSalida.id_mensaje.in_(vencidos),
+                MensajeSalida.estado == "pendiente",
+                MensajeSalida.proximo_intento <= ahora,
+            )
+            .values(
+                intentos=MensajeSalida.intentos + 1,
+                proximo_intento=ahora + timedelta(seconds=RECLAMO_SEGUNDOS),
+            )
+            .returning(
+                MensajeSalida.id_mensaje,
+                MensajeSalida.destinatario,
+                MensajeSalida.asunto,
+                MensajeSalida.cuerpo,
+                MensajeSalida.intentos,
+            )
+        ).all()
+        session.commit()
+    return reclamados
+
+
+def _enviar(config: ConfigSMTP, mensaje):
+    """Enviar un mensaje por SMTP (bloqueante: corre en un hilo)"""
+    correo = EmailMessage()
+    correo["From"] = config.remitente
+    correo["To"] = mensaje.destinatario
+    correo["Subject"] = mensaje.asunto
+    correo.set_content(mensaje.cuerpo)
+    with smtplib.SMTP(config.host, config.port, timeout=config.timeout) as smtp:
+        if config.starttls:
+            smtp.starttls()
+        if config.usuario:
+            smtp.login(config.usuario, config.clave or "")
+        smtp.send_message(correo)
+
+
+def _es_permanente(error: Exception) -> bool:
+    """Si el servidor rechazó el mensaje de forma definitiva (código 5xx)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _registrar(engine, mensaje, error: Exception | None, max_intentos: int, espera_base: float) -> str:
+    """Guardar el resultado de un envío. Retorna "enviados", "reintentos" o "fallidos" """
+    ahora = datetime.now()
+    if error is None:
+        resultado, valores = "enviados", {"estado": "enviado", "fecha_envio": ahora, "ultimo_error": None}
+    elif _es_permanente(error) or mensaje.intentos >= max_intentos:
+        resultado, valores = "fallidos", {"estado": "fallido", "ultimo_error": str(error)}
+    else:
+        espera = timedelta(seconds=espera_base * 2 ** (mensaje.intentos - 1))
+        resultado, valores = "reintentos", {"proximo_intento": ahora + espera, "ultimo_error": str(error)}
+    with Session(engine) as session:
+        session.execute(
+            update(MensajeSalida).where(MensajeSalida.id_mensaje == mensaje.id_mensaje).values(**valores)
+        )
+        session.commit()
+    return resultado
+
+
+async def enviar_pendientes(
+    engine,
+    config: ConfigSMTP | None = None,
+    concurrencia: int = CONCURRENCIA_SMTP,
+    max_intentos: int = MAX_INTENTOS,
+    espera_base: float = ESPERA_BASE_SEGUNDOS,
+):
+    """
+    Enviar los mensajes pendientes de la bandeja de salida.
+
+    Termina cuando no quedan mensajes con el intento vencido; los que se
+    reprogramaron para más adelante quedan para la próxima llamada.
+
+    Args:
+        engine: Motor de la base de datos
+        config: Servidor SMTP (por defecto, el de las variables de entorno)
+        concurrencia: Máximo de conexiones SMTP simultáneas
+        max_intentos: Intentos antes de marcar un mensaje como fallido
+        espera_base: Segundos antes del primer reintento (se duplica en cada intento)
+
+    Returns:
+        Diccionario con los mensajes "enviados", los "reintentos" programados y los "fallidos"
+    """
+    config = config or ConfigSMTP.desde_entorno()
+    semaforo = asyncio.Semaphore(concurrencia)
+    resultado = {"enviados": 0, "reintentos": 0, "fallidos": 0}
+
+    async def procesar(mensaje):
+        error = None
+        async with semaforo:
+            try:
+                await asyncio.to_thread(_enviar, config, mensaje)
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+        # Las escrituras en la base son cortas: se hacen en el hilo del bucle, de a una
+        resultado[_registrar(engine, mensaje, error, max_intentos, espera_base)] += 1
+
+    while mensajes := _reclamar(engine, concurrencia * MENSAJES_POR_CONEXION):
+        await asyncio.gather(*(procesar(mensaje) for mensaje in mensajes))
+    return resultado
+
+
+async def _ejecutar(engine, config: ConfigSMTP, concurrencia: int, cada: float | None):
+    while True:
+        with Session(engine) as session:
+            encolados = encolar_avisos_vencidos(session)
+        enviados = await enviar_pendientes(engine, config, concurrencia)
+        print(
+            f"Avisos encolados: {encolados['mensajes']} ({encolados['prestamos']} préstamos); "
+            f"enviados: {enviados['enviados']}, reintentos: {enviados['reintentos']}, "
+            f"fallidos: {enviados['fallidos']}"
+        )
+        if not cada:
+            return
+        await asyncio.sleep(cada)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.config import engine
+
+    parser = argparse.ArgumentParser(description="Avisar por correo los préstamos vencidos")
+    parser.add_argument("--cada", type=float, default=None, help="Repetir cada N segundos (por defecto, una vez)")
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA_SMTP)
+    args = parser.parse_args()
+
+    asyncio.run(_ejecutar(engine, ConfigSMTP.desde_entorno(), args.concurrencia, args.cada))
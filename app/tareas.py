@@ -0,0 +1,372 @@
+"""
+Cola de tareas en segundo plano.
+
+Las operaciones largas (devolver todos los préstamos de un empleado, archivar,
+reconciliar contadores, enviar avisos) no deben correr en el hilo del script
+de Streamlit: la página queda bloqueada hasta que terminan y se pierden si el
+usuario navega a otra. Las páginas las encolan con `encolar_tarea`, que solo
+inserta una fila en `tarea` y retorna enseguida; un conjunto de hilos
+trabajadores (`PoolTareas`) las reclama y las ejecuta.
+
+Cada tipo de tarea es una función registrada con `@tipo_tarea(nombre)` que
+recibe una sesión propia, un `Avance` y los parámetros guardados en la fila.
+Llamar al `Avance` guarda el progreso (a lo sumo cada
+INTERVALO_AVANCE_SEGUNDOS), que las páginas consultan con `get_tarea`, y es
+el punto donde la tarea se detiene si se pidió cancelarla con
+`cancelar_tarea`. Los cambios de la tarea se atribuyen en la auditoría al
+actor que la encoló.
+
+Una tarea se reclama con un UPDATE condicional, así varios trabajadores (del
+mismo proceso o de otro, con `python -m app.tareas`) no toman la misma. Si el
+proceso termina en medio de una tarea, al iniciar el siguiente pool las que
+llevan más de LATIDO_VENCIDO_SEGUNDOS sin avanzar se marcan como fallidas.
+
+El número de trabajadores que `run_streamlit.py` inicia se configura con la
+variable de entorno TAREAS_TRABAJADORES (0 desactiva los trabajadores del
+proceso de Streamlit, por ejemplo si corren aparte).
+
+Uso:
+    python -m app.tareas --trabajadores 4
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from app.crud.archivo import ANTIGUEDAD_ARCHIVO_DIAS, ESTADOS_CERRADOS, TAMANO_LOTE_ARCHIVO, archivar_prestamos
+from app.crud.auditoria import actor_actual, con_actor
+from app.crud.crud_prestamo import devolver_prestamo, reconciliar_contadores
+from app.models.prestamo import Prestamo
+from app.models.tarea import Tarea
+from app.notificador import encolar_avisos_vencidos, enviar_pendientes
+
+
+# Trabajadores que inicia run_streamlit.py
+TRABAJADORES = int(os.getenv("TAREAS_TRABAJADORES", "2"))
+
+# Espera de un trabajador sin tareas antes de volver a consultar la cola
+ESPERA_SEGUNDOS = 1
+
+# Intervalo mínimo entre dos escrituras del progreso de una tarea
+INTERVALO_AVANCE_SEGUNDOS = 0.5
+
+# Una tarea en curso sin avanzar durante este tiempo se considera interrumpida
+LATIDO_VENCIDO_SEGUNDOS = 300
+
+ESTADOS_ACTIVOS = ("pendiente", "en_curso")
+
+_TIPOS = {}
+
+# Aviso a los trabajadores del proceso de que hay tareas nuevas
+_nuevas = threading.Event()
+
+
+class TareaCancelada(Exception):
+    """Se pidió cancelar la tarea en curso"""
+
+
+def tipo_tarea(nombre: str):
+    """Registrar una función como el tipo de tarea `nombre`"""
+    def registrar(funcion):
+        _TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+class Avance:
+    """Progreso de una tarea en curso; detiene la tarea si se pidió cancelarla."""
+
+    def __init__(self, engine, id_tarea: int, intervalo: float | None = None):
+        self.engine = engine
+        self.id_tarea = id_tarea
+        self.intervalo = INTERVALO_AVANCE_SEGUNDOS if intervalo is None else intervalo
+        self._ultimo = None
+
+    def __call__(self, progreso: float, mensaje: str | None = None):
+        """
+        Guardar el progreso (de 0 a 1) y un mensaje.
+
+        Las llamadas más seguidas que `intervalo` no escriben ni revisan la
+        cancelación. Lanza TareaCancelada si se pidió cancelar la tarea.
+        """
+        ahora = time.monotonic()
+        if self._ultimo is not None and ahora - self._ultimo < self.intervalo:
+            return
+        self._ultimo = ahora
+        with Session(self.engine) as session:
+            cancelar = session.execute(
+                update(Tarea)
+                .where(Tarea.id_tarea == self.id_tarea)
+                .values(progreso=min(max(progreso, 0), 1), mensaje=mensaje, latido=datetime.now())
+                .returning(Tarea.cancelar)
+            ).scalar_one()
+            session.commit()
+        if cancelar:
+            raise TareaCancelada()
+
+
+def encolar_tarea(session: Session, tipo: str, **parametros):
+    """
+    Encolar una tarea y retornar enseguida.
+
+    Args:
+        session: Sesión de base de datos
+        tipo: Nombre registrado con @tipo_tarea
+        **parametros: Argumentos de la tarea (serializables en JSON)
+
+    Returns:
+        La tarea creada
+    """
+    try:
+        if tipo not in _TIPOS:
+            raise ValueError(f"tipo de tarea desconocido: {tipo}")
+        tarea = Tarea(tipo=tipo, parametros=parametros, actor=actor_actual(session))
+        session.add(tarea)
+        session.commit()
+        session.refresh(tarea)
+        _nuevas.set()
+        return tarea
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al encolar tarea: {str(e)}")
+
+
+def get_tarea(session: Session, tarea_id: int):
+    """Obtener una tarea por ID"""
+    return session.get(Tarea, tarea_id)
+
+
+def get_tareas(session: Session, tipos: list[str] | None = None, limit: int = 20):
+    """Últimas tareas encoladas, de las más nuevas a las más viejas"""
+    statement = select(Tarea).order_by(Tarea.id_tarea.desc()).limit(limit)
+    if tipos:
+        statement = statement.where(Tarea.tipo.in_(tipos))
+    return session.exec(statement).all()
+
+
+def cancelar_tarea(session: Session, tarea_id: int):
+    """
+    Cancelar una tarea.
+
+    Una tarea pendiente se cancela enseguida; a una en curso se le pide que se
+    detenga, lo que hace en su próximo avance. Retorna False si la tarea no
+    existe o ya terminó.
+    """
+    try:
+        # Condicionales: un trabajador puede reclamar la tarea entre la lectura y la escritura
+        canceladas = session.execute(
+            update(Tarea)
+            .where(Tarea.id_tarea == tarea_id, Tarea.estado == "pendiente")
+            .values(estado="cancelada", fecha_fin=datetime.now())
+        ).rowcount
+        if not canceladas:
+            canceladas = session.execute(
+                update(Tarea)
+                .where(Tarea.id_tarea == tarea_id, Tarea.estado == "en_curso")
+                .values(cancelar=True)
+            ).rowcount
+        session.commit()
+        return bool(canceladas)
+    except Exception as e:
+        session.rollback()
+        raise Exception(f"Error al cancelar tarea: {str(e)}")
+
+
+def _reclamar(engine, trabajador: str):
+    """Reclamar la tarea pendiente más antigua, o None si no hay"""
+    with Session(engine) as session:
+        while True:
+            siguiente = session.exec(
+                select(Tarea.id_tarea)
+                .where(Tarea.estado == "pendiente")
+                .order_by(Tarea.id_tarea)
+                .limit(1)
+            ).first()
+            if siguiente is None:
+                return None
+            ahora = datetime.now()
+            # Si otro trabajador la reclamó antes, el UPDATE no devuelve nada y se prueba la siguiente
+            reclamada = session.execute(
+                update(Tarea)
+                .where(Tarea.id_tarea == siguiente, Tarea.estado == "pendiente")
+                .values(estado="en_curso", trabajador=trabajador, fecha_inicio=ahora, latido=ahora)
+                .returning(Tarea.id_tarea, Tarea.tipo, Tarea.parametros, Tarea.actor)
+            ).first()
+            session.commit()
+            if reclamada:
+                return reclamada
+
+
+def _ejecutar(engine, tarea):
+    """Ejecutar una tarea reclamada y guardar cómo terminó"""
+    try:
+        funcion = _TIPOS.get(tarea.tipo)
+        if funcion is None:
+            raise ValueError(f"tipo de tarea desconocido: {tarea.tipo}")
+        with con_actor(tarea.actor), Session(engine) as session:
+            resultado = funcion(session, Avance(engine, tarea.id_tarea), **tarea.parametros)
+        valores = {"estado": "terminada", "progreso": 1, "resultado": resultado}
+    except TareaCancelada:
+        valores = {"estado": "cancelada"}
+    except Exception as e:
+        valores = {"estado": "fallida", "error": str(e)}
+    ahora = datetime.now()
+    with Session(engine) as session:
+        session.execute(
+            update(Tarea)
+            .where(Tarea.id_tarea == tarea.id_tarea)
+            .values(**valores, fecha_fin=ahora, latido=ahora)
+        )
+        session.commit()
+
+
+def marcar_interrumpidas(engine) -> int:
+    """Marcar como fallidas las tareas en curso sin avanzar desde hace LATIDO_VENCIDO_SEGUNDOS"""
+    ahora = datetime.now()
+    with Session(engine) as session:
+        interrumpidas = session.execute(
+            update(Tarea)
+            .where(
+                Tarea.estado == "en_curso",
+                Tarea.latido < ahora - timedelta(seconds=LATIDO_VENCIDO_SEGUNDOS),
+            )
+            .values(estado="fallida", error="Tarea interrumpida", fecha_fin=ahora)
+        ).rowcount
+        session.commit()
+    return interrumpidas
+
+
+class PoolTareas:
+    """Hilos trabajadores que ejecutan las tareas de la cola."""
+
+    def __init__(self, engine, trabajadores: int = TRABAJADORES):
+        self.engine = engine
+        self.trabajadores = trabajadores
+        self._detenido = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        """Recuperar las tareas interrumpidas e iniciar los hilos"""
+        marcar_interrumpidas(self.engine)
+        prefijo = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.trabajadores):
+            hilo = threading.Thread(
+                target=self._trabajar, args=(f"{prefijo}:{i}",), name=f"tareas-{i}", daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def detener(self, timeout: float | None = None):
+        """Detener los hilos cuando terminen la tarea que están ejecutando"""
+        self._detenido.set()
+        _nuevas.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def _trabajar(self, trabajador: str):
+        while not self._detenido.is_set():
+            try:
+                tarea = _reclamar(self.engine, trabajador)
+            except Exception as e:
+                # Base no disponible: reintentar en la próxima vuelta
+                print(f"Error al reclamar tarea: {e}", file=sys.stderr)
+                tarea = None
+            if tarea is None:
+                _nuevas.wait(ESPERA_SEGUNDOS)
+                _nuevas.clear()
+                continue
+            _ejecutar(self.engine, tarea)
+
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def iniciar_trabajadores(engine, trabajadores: int = TRABAJADORES):
+    """Iniciar una vez por proceso el pool de trabajadores (None si `trabajadores` es 0)"""
+    global _pool
+    with _lock_pool:
+        if _pool is None and trabajadores > 0:
+            _pool = PoolTareas(engine, trabajadores).iniciar()
+        return _pool
+
+
+@tipo_tarea("devolver_prestamos")
+def _devolver_prestamos(session: Session, avance: Avance, empleado_id: int | None = None, ids: list[int] | None = None):
+    """Devolver los préstamos activos de un empleado o de una lista de IDs"""
+    statement = select(Prestamo.id_prestamo).where(Prestamo.estado == "activo").order_by(Prestamo.id_prestamo)
+    if empleado_id is not None:
+        statement = statement.where(Prestamo.id_empleado_h == empleado_id)
+    if ids is not None:
+        statement = statement.where(Prestamo.id_prestamo.in_(ids))
+    pendientes = session.exec(statement).all()
+    devueltos, errores = 0, []
+    for i, prestamo_id in enumerate(pendientes):
+        avance(i / len(pendientes), f"{i} de {len(pendientes)}")
+        try:
+            devueltos += devolver_prestamo(session, prestamo_id)
+        except Exception as e:
+            errores.append({"id_prestamo": prestamo_id, "error": str(e)})
+    return {"devueltos": devueltos, "errores": errores}
+
+
+@tipo_tarea("archivar_prestamos")
+def _archivar_prestamos(session: Session, avance: Avance, antiguedad_dias: int | None = None, lote: int = TAMANO_LOTE_ARCHIVO):
+    """Archivar los préstamos cerrados antiguos lote por lote"""
+    dias = ANTIGUEDAD_ARCHIVO_DIAS if antiguedad_dias is None else antiguedad_dias
+    total = session.exec(
+        select(func.count())
+        .select_from(Prestamo)
+        .where(
+            Prestamo.fecha_prestamo < datetime.now() - timedelta(days=dias),
+            Prestamo.estado.in_(ESTADOS_CERRADOS),
+        )
+    ).one()
+    archivados = 0
+    while True:
+        avance(archivados / total if total else 0, f"{archivados} de {total}")
+        movidos = archivar_prestamos(session, dias, lote, max_lotes=1)
+        if not movidos:
+            return {"archivados": archivados}
+        archivados += movidos
+
+
+@tipo_tarea("reconciliar_contadores")
+def _reconciliar_contadores(session: Session, avance: Avance):
+    """Recalcular los contadores de préstamos activos"""
+    return reconciliar_contadores(session)
+
+
+@tipo_tarea("avisos_vencidos")
+def _avisos_vencidos(session: Session, avance: Avance):
+    """Encolar y enviar los avisos de préstamos vencidos"""
+    encolados = encolar_avisos_vencidos(session)
+    avance(0.5, f"Enviando {encolados['mensajes']} avisos")
+    return {**encolados, **asyncio.run(enviar_pendientes(session.get_bind()))}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.config import engine
+
+    parser = argparse.ArgumentParser(description="Ejecutar las tareas en segundo plano")
+    parser.add_argument("--trabajadores", type=int, default=TRABAJADORES)
+    args = parser.parse_args()
+
+    pool = PoolTareas(engine, args.trabajadores).iniciar()
+    print(f"Trabajadores de tareas: {args.trabajadores}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.detener()
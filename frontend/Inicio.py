@@ -6,8 +6,12 @@ Este arquivo configura a aplicação Streamlit e define a estrutura base.
 
 import streamlit as st
 from sqlmodel import Session
-from app.database.config import engine
-from app.crud import get_empleados, get_herramientas, get_prestamos_activos
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_empleado import get_empleados
+from app.crud.crud_herramienta import get_herramientas
+from app.crud.crud_prestamo import get_prestamos_activos
+from frontend.trazas import tramo, trazar_pagina
 
 
 # Configuración inicial de la aplicación
@@ -25,7 +29,7 @@ st.set_page_config(
 @st.cache_resource
 def get_db_engine():
     """Obtener el motor de base de datos."""
-    return engine
+    return get_engine()
 
 
 # Función para obtener datos iniciales
@@ -65,6 +69,7 @@ def render_sidebar():
         #
 
 # Dashboard principal
+@tramo
 def render_dashboard():
     """Renderizar el dashboard principal."""
     # Título del dashboard
@@ -115,6 +120,8 @@ def render_dashboard():
 
 
 # Página principal
+@medir_pagina("Inicio")
+@trazar_pagina("Inicio")
 def main():
     """Ponto de entrada principal da aplicação."""
     
@@ -0,0 +1,117 @@
+"""
+Grilla de datos paginada compartida por las listas de entidades.
+
+La grilla muestra una sola página en un `st.dataframe` con selección de fila.
+La paginación y el orden se resuelven en la base de datos a través de la
+función `cargar_pagina` de cada página, y el panel de detalle con las
+acciones se dibuja solo para la fila seleccionada, de modo que el tiempo de
+render depende del tamaño de la página y no del tamaño de la tabla.
+"""
+
+import math
+import streamlit as st
+
+
+TAMANOS_PAGINA = [25, 50, 100]
+
+
+def render_grid(
+    key,
+    cargar_pagina,
+    columnas,
+    id_de,
+    render_detalle,
+    opciones_orden,
+    filtros=(),
+    orden_descendente=False,
+):
+    """
+    Renderizar una grilla paginada con ordenamiento del lado del servidor.
+
+    Args:
+        key: Prefijo único para las claves de los widgets de la grilla
+        cargar_pagina: Función (skip, limit, orden, descendente) -> (items, total)
+        columnas: Diccionario {título: función(item) -> valor} con las columnas a mostrar
+        id_de: Función que devuelve el ID de un item
+        render_detalle: Función que dibuja el panel de detalle y acciones de un item
+        opciones_orden: Diccionario {título: nombre de columna} para el selector de orden
+        filtros: Valores de los filtros activos; si cambian se vuelve a la primera página
+        orden_descendente: Sentido de orden inicial
+
+    Returns:
+        El total de items que cumplen los filtros
+    """
+    clave_pagina = f"{key}_pagina"
+    clave_seleccion = f"{key}_seleccionado"
+    clave_filtros = f"{key}_filtros"
+
+    # Volver a la primera página cuando cambian los filtros
+    filtros = tuple(filtros)
+    if st.session_state.get(clave_filtros) != filtros:
+        st.session_state[clave_filtros] = filtros
+        st.session_state[clave_pagina] = 1
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        titulo_orden = st.selectbox("Ordenar por", list(opciones_orden.keys()), key=f"{key}_orden")
+    with col2:
+        descendente = st.toggle("Descendente", value=orden_descendente, key=f"{key}_descendente")
+    with col3:
+        tamano = st.selectbox("Por página", TAMANOS_PAGINA, key=f"{key}_tamano")
+
+    orden = opciones_orden[titulo_orden]
+    pagina = max(1, st.session_state.get(clave_pagina, 1))
+    items, total = cargar_pagina((pagina - 1) * tamano, tamano, orden, descendente)
+
+    # Si la página quedó fuera de rango (p. ej. tras cambiar el tamaño), volver a la última
+    paginas = max(1, math.ceil(total / tamano))
+    if pagina > paginas:
+        pagina = paginas
+        items, total = cargar_pagina((pagina - 1) * tamano, tamano, orden, descendente)
+    st.session_state[clave_pagina] = pagina
+
+    ids = [id_de(item) for item in items]
+
+    def _al_seleccionar():
+        evento = st.session_state.get(clave_tabla)
+        filas = evento.selection.rows if evento else []
+        st.session_state[clave_seleccion] = ids[filas[0]] if filas else None
+
+    # La clave de la tabla cambia con la página y el orden para limpiar la selección visual
+    clave_tabla = f"{key}_tabla_{pagina}_{tamano}_{orden}_{descendente}_{hash(filtros)}"
+    st.dataframe(
+        [{titulo: valor(item) for titulo, valor in columnas.items()} for item in items],
+        key=clave_tabla,
+        on_select=_al_seleccionar,
+        selection_mode="single-row",
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    def _ir_a(destino):
+        st.session_state[clave_pagina] = destino
+
+    # Los botones cambian la página con un callback: el clic ya vuelve a ejecutar
+    # el fragmento que contiene la grilla, sin recargar toda la página
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{key}_anterior", disabled=pagina <= 1, use_container_width=True,
+                  on_click=_ir_a, args=(pagina - 1,))
+    with col2:
+        st.markdown(
+            f"<div style='text-align: center'>Página {pagina} de {paginas} · {total} registros</div>",
+            unsafe_allow_html=True,
+        )
+    with col3:
+        st.button("Próxima ➡️", key=f"{key}_proxima", disabled=pagina >= paginas, use_container_width=True,
+                  on_click=_ir_a, args=(pagina + 1,))
+
+    # Panel de detalle solo para la fila seleccionada de la página actual
+    seleccionado = st.session_state.get(clave_seleccion)
+    item = next((i for i in items if id_de(i) == seleccionado), None)
+    if item is not None:
+        render_detalle(item)
+    elif items:
+        st.caption("Selecione uma linha para ver detalhes e ações.")
+
+    return total
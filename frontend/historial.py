@@ -0,0 +1,36 @@
+"""
+Historial de cambios de una entidad, leído del registro de auditoría.
+
+Se muestra dentro del panel de detalle y solo consulta la base de datos
+cuando el usuario lo abre con el interruptor.
+"""
+
+import streamlit as st
+from sqlmodel import Session
+
+from app.crud.auditoria import get_eventos_auditoria
+from frontend.utils import format_date
+
+
+ACCIONES = {"crear": "Criado", "actualizar": "Alterado", "borrar": "Excluído"}
+
+
+def render_historial(engine, entidad, id_entidad, limite=20):
+    """Dibujar los últimos cambios de una fila con el detalle de cada campo."""
+    if not st.toggle("🕓 Ver histórico de alterações", key=f"historial_{entidad}_{id_entidad}"):
+        return
+
+    with Session(engine) as session:
+        eventos = get_eventos_auditoria(session, entidad, id_entidad, limit=limite)
+
+    if not eventos:
+        st.caption("Sem alterações registradas")
+        return
+
+    for evento in eventos:
+        actor = f" por {evento.actor}" if evento.actor else ""
+        campos = ", ".join(
+            f"{campo}: {antes} → {despues}" if evento.accion == "actualizar" else campo
+            for campo, (antes, despues) in evento.cambios.items()
+        )
+        st.caption(f"{format_date(evento.fecha)} · {ACCIONES.get(evento.accion, evento.accion)}{actor} · {campos}")
@@ -10,27 +10,42 @@ Permite:
 
 import streamlit as st
 from sqlmodel import Session
-from app.database.config import engine
-from app.crud import (
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_empleado import (
     create_empleado,
-    get_empleados,
     get_empleado_by_id,
     update_empleado,
     inhabilitar_empleado,
     habilitar_empleado,
-    get_empleados_activos,
-    get_empleados_por_area
+    buscar_empleados,
+    sugerir_empleados,
+)
+from app.crud.concurrencia import ConflictoVersion
+from frontend.grid import render_grid
+from frontend.historial import render_historial
+from frontend.trazas import tramo, trazar_pagina
+from frontend.utils import (
+    show_success,
+    queue_success,
+    show_pending_messages,
+    show_error,
+    show_info,
+    validate_required_fields,
+    clave_formulario,
+    renovar_clave_formulario,
 )
-from frontend.utils import show_success, show_error, show_info, validate_required_fields
 
 
 # Cachear el motor de base de datos (no la sesión)
 @st.cache_resource
 def get_db_engine():
     """Obtener el motor de base de datos."""
-    return engine
+    return get_engine()
 
 
+@st.fragment
+@tramo
 def render_empleado_form(empleado=None):
     """Renderizar formulario para crear/editar empleado."""
     if empleado:
@@ -54,7 +69,9 @@ def render_empleado_form(empleado=None):
             unsafe_allow_html=True
         )
     
-    with st.form(key="empleado_form"):
+    # Un envío repetido del formulario de alta no crea un segundo funcionário
+    clave = None if empleado else clave_formulario("empleado")
+    with st.form(key=f"empleado_form_{clave or empleado.id}"):
         col1, col2 = st.columns(2)
         
         with col1:
@@ -99,9 +116,12 @@ def render_empleado_form(empleado=None):
                 with Session(engine) as session:
                     if empleado:
                         # Actualizar empleado existente
+                        # Con la versión que se abrió para editar: si otro usuario lo
+                        # modificó mientras tanto, no se pisa su cambio
                         update_empleado(
                             session,
                             empleado.id,
+                            version=st.session_state.get("editing_empleado_version"),
                             nombre=nombre,
                             apellido=apellido,
                             area=area,
@@ -117,8 +137,10 @@ def render_empleado_form(empleado=None):
                             apellido=apellido,
                             area=area,
                             correo=correo,
-                            activo=activo
+                            activo=activo,
+                            clave_idempotencia=clave,
                         )
+                        renovar_clave_formulario("empleado")
                         show_success(f"Funcionário {nombre} {apellido} criado com sucesso")
                 
                 # Eliminar estado de edición si existe y recargar
@@ -126,12 +148,31 @@ def render_empleado_form(empleado=None):
                     del st.session_state["editing_empleado_id"]
                 st.rerun()
                 
+            except ConflictoVersion as e:
+                # La próxima vez que guarde, el usuario ya vio el aviso
+                st.session_state["editing_empleado_version"] = e.actual
+                show_error(
+                    "Este funcionário foi alterado por outro usuário enquanto você editava. "
+                    "Revise os dados e salve novamente para sobrescrever."
+                )
             except Exception as e:
                 show_error(f"Erro ao salvar funcionário: {str(e)}")
     
     return None
 
 
+def _cambiar_estado_empleado(empleado, activo):
+    """Habilitar o desabilitar un empleado desde un botón de la lista."""
+    engine = get_db_engine()
+    with Session(engine) as session:
+        if activo:
+            habilitar_empleado(session, empleado.id)
+        else:
+            inhabilitar_empleado(session, empleado.id)
+    queue_success(f"Funcionário {empleado.nombre} {'habilitado' if activo else 'desabilitado'}")
+
+
+@tramo
 def render_empleado_details(empleado, expanded=False):
     """Renderizar detalles de un empleado."""
     with st.expander(f"📋 {empleado.nombre} {empleado.apellido}", expanded=expanded):
@@ -143,45 +184,44 @@ def render_empleado_details(empleado, expanded=False):
         
         with col2:
             st.write(f"**E-mail:** {empleado.correo}")
+            st.write(f"**Empréstimos Ativos:** {empleado.prestamos_activos}")
             st.write(f"**Estado:** {'✅ Ativo' if empleado.activo else '❌ Inativo'}")
         
         with col3:
             if st.button("Editar", key=f"edit_{empleado.id}"):
                 st.session_state["editing_empleado_id"] = empleado.id
+                st.session_state["editing_empleado_version"] = empleado.version
                 st.rerun()
             
+            # Las acciones corren en un callback: el clic solo vuelve a ejecutar el
+            # fragmento de la lista, que ya encuentra los datos actualizados
             if empleado.activo:
-                if st.button("Desabilitar", key=f"disable_{empleado.id}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        inhabilitar_empleado(session, empleado.id)
-                    show_success(f"Funcionário {empleado.nombre} desabilitado")
-                    st.rerun()
+                st.button("Desabilitar", key=f"disable_{empleado.id}",
+                          on_click=_cambiar_estado_empleado, args=(empleado, False))
             else:
-                if st.button("Habilitar", key=f"enable_{empleado.id}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        habilitar_empleado(session, empleado.id)
-                    show_success(f"Funcionário {empleado.nombre} habilitado")
-                    st.rerun()
+                st.button("Habilitar", key=f"enable_{empleado.id}",
+                          on_click=_cambiar_estado_empleado, args=(empleado, True))
+
+        render_historial(get_db_engine(), "empleado", empleado.id)
 
 
-def render_empleados_list(empleados):
+def _usar_busqueda(texto):
+    """Reemplazar el texto de búsqueda de la lista (p. ej. por una sugerencia)."""
+    st.session_state.empleado_search_term = texto
+
+
+@st.fragment
+@tramo
+def render_empleados_list():
     """Renderizar lista de empleados."""
-    if not empleados:
-        st.info("Não há funcionários registrados. Adicione um usando o formulário.")
-        return
-    
-    # Estado para expandir/contraer todos
-    if "expand_all_empleados" not in st.session_state:
-        st.session_state.expand_all_empleados = False
-    
+    show_pending_messages()
+
     # Estado para filtros
     if "empleado_search_term" not in st.session_state:
         st.session_state.empleado_search_term = ""
     
     if "empleado_filter_activo" not in st.session_state:
-        st.session_state.empleado_filter_activo = "Activo"
+        st.session_state.empleado_filter_activo = "Ativo"
     
     # Filtros
     col1, col2, col3 = st.columns([2, 2, 1])
@@ -208,46 +248,66 @@ def render_empleados_list(empleados):
         if filter_activo != st.session_state.empleado_filter_activo:
             st.session_state.empleado_filter_activo = filter_activo
     
-    # with col3:
-    #     # Botón para expandir/contraer todos
-    #     expand_button = st.button(
-    #         "📑 Expandir Todo" if not st.session_state.expand_all_empleados else "📐 Contraer Todo",
-    #         key="expand_all_button"
-    #     )
-    #     if expand_button:
-    #         st.session_state.expand_all_empleados = not st.session_state.expand_all_empleados
-    #         st.rerun()
-    # 
-    # Filtrar empleados
-    filtered_empleados = empleados
+    # Traducir el filtro de estado al parámetro de búsqueda
+    activo = {"Ativo": True, "Inativo": False}.get(st.session_state.empleado_filter_activo)
     
-    # Usar los valores del session state para filtrar
-    if st.session_state.empleado_search_term:
-        search_term_lower = st.session_state.empleado_search_term.lower()
-        filtered_empleados = [
-            e for e in filtered_empleados
-            if (search_term_lower in str(e.nombre).lower() if e.nombre else "") or
-               (search_term_lower in str(e.apellido).lower() if e.apellido else "") or
-               (search_term_lower in str(e.correo).lower() if e.correo else "") or
-               (search_term_lower in str(e.area).lower() if e.area else "")
-        ]
+    def cargar_pagina(skip, limit, orden, descendente):
+        with Session(get_db_engine()) as session:
+            return buscar_empleados(
+                session,
+                texto=st.session_state.empleado_search_term,
+                activo=activo,
+                orden=orden,
+                descendente=descendente,
+                skip=skip,
+                limit=limit,
+            )
     
-    if st.session_state.empleado_filter_activo == "Ativo":
-        filtered_empleados = [e for e in filtered_empleados if e.activo]
-    elif st.session_state.empleado_filter_activo == "Inativo":
-        filtered_empleados = [e for e in filtered_empleados if not e.activo]
-    
-    # Mostrar resultados
-    st.write(f"**Total: {len(filtered_empleados)} funcionários**")
+    # Lista paginada en la base de datos; el detalle se carga solo para la fila seleccionada
+    total = render_grid(
+        "empleados",
+        cargar_pagina,
+        columnas={
+            "ID": lambda e: e.id,
+            "Nome": lambda e: f"{e.nombre} {e.apellido}",
+            "Departamento": lambda e: e.area,
+            "E-mail": lambda e: e.correo,
+            "Empréstimos Ativos": lambda e: e.prestamos_activos,
+            "Estado": lambda e: "✅ Ativo" if e.activo else "❌ Inativo",
+        },
+        id_de=lambda e: e.id,
+        render_detalle=lambda e: render_empleado_details(e, expanded=True),
+        # Con texto de búsqueda se puede ordenar por relevancia (índice de texto completo)
+        opciones_orden={
+            **({"Relevância": "relevancia"} if st.session_state.empleado_search_term.strip() else {}),
+            "Nome": "nombre",
+            "Sobrenome": "apellido",
+            "Departamento": "area",
+            "Empréstimos Ativos": "prestamos_activos",
+            "ID": "id",
+        },
+        filtros=(st.session_state.empleado_search_term, activo),
+    )
     
     # Mostrar mensaje si no se encontraron resultados
-    if st.session_state.empleado_search_term and len(filtered_empleados) == 0:
-        st.warning("Não foram encontrados funcionários que coincidam com a busca.")
-    
-    for empleado in filtered_empleados:
-        render_empleado_details(empleado, expanded=st.session_state.expand_all_empleados)
+    if total == 0:
+        if st.session_state.empleado_search_term:
+            st.warning("Não foram encontrados funcionários que coincidam com a busca.")
+            # Sugerir nombres parecidos (sin acentos o con errores de tipeo)
+            with Session(get_db_engine()) as session:
+                sugerencias = sugerir_empleados(session, st.session_state.empleado_search_term)
+            if sugerencias:
+                st.caption("Você quis dizer:")
+                # Varios funcionários pueden tener el mismo nombre: una sugerencia por nombre
+                nombres = dict.fromkeys(f"{e.nombre} {e.apellido}" for e in sugerencias)
+                for i, nombre in enumerate(nombres):
+                    st.button(nombre, key=f"sugerencia_empleado_{i}", on_click=_usar_busqueda, args=(nombre,))
+        else:
+            st.info("Não há funcionários registrados. Adicione um usando o formulário.")
 
 
+@medir_pagina("Funcionarios")
+@trazar_pagina("Funcionarios")
 def main():
     """Punto de entrada principal de la página."""
     # Establecer página actual
@@ -269,10 +329,7 @@ def main():
         unsafe_allow_html=True
     )
     
-    # Obtener empleados
     engine = get_db_engine()
-    with Session(engine) as session:
-        empleados = get_empleados(session)
     
     # Verificar si estamos editando un empleado
     if "editing_empleado_id" in st.session_state:
@@ -292,7 +349,7 @@ def main():
         st.markdown("---")
         
         # Mostrar lista de empleados
-        render_empleados_list(empleados)
+        render_empleados_list()
 
 
 if __name__ == "__main__":
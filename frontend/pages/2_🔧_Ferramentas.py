@@ -11,27 +11,45 @@ Permite:
 
 import streamlit as st
 from sqlmodel import Session
-from app.database.config import engine
-from app.crud import (
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_herramienta import (
     create_herramienta,
-    get_herramientas,
     get_herramienta_by_id,
     update_herramienta,
     inhabilitar_herramienta,
     habilitar_herramienta,
-    get_herramientas_disponibles,
+    buscar_herramientas,
+    sugerir_herramientas,
+    contar_herramientas,
+    generate_codigo_interno,
+)
+from app.crud.concurrencia import ConflictoVersion
+from app.crud.crud_categoria import get_diccionario_categorias
+from frontend.grid import render_grid
+from frontend.historial import render_historial
+from frontend.trazas import tramo, trazar_pagina
+from frontend.utils import (
+    show_success,
+    queue_success,
+    show_pending_messages,
+    show_error,
+    show_info,
+    validate_required_fields,
+    clave_formulario,
+    renovar_clave_formulario,
 )
-from app.crud.crud_herramienta import generate_codigo_interno
-from frontend.utils import show_success, show_error, show_info, validate_required_fields
 
 
 # Cachear el motor de base de datos (no la sesión)
 @st.cache_resource
 def get_db_engine():
     """Obtener el motor de base de datos."""
-    return engine
+    return get_engine()
 
 
+@st.fragment
+@tramo
 def render_herramienta_form(herramienta=None):
     """Renderizar formulario para crear/editar herramienta."""
     if herramienta:
@@ -64,22 +82,18 @@ def render_herramienta_form(herramienta=None):
                 del st.session_state["editing_herramienta_id"]
                 st.rerun()
     
-    with st.form(key="herramienta_form"):
+    # Un envío repetido del formulario de alta no crea una segunda ferramenta
+    clave = None if herramienta else clave_formulario("herramienta")
+    with st.form(key=f"herramienta_form_{clave or herramienta.id_herramienta}"):
         col1, col2 = st.columns(2)
         
         with col1:
             nombre = st.text_input("Nome", value=herramienta.nombre if herramienta else "")
             
-            # Obtener todas las categorías disponibles
-            engine = get_db_engine()
-            categorias_disponibles = []
-            categoria_por_id = {}
-            with Session(engine) as session:
-                # Importar aquí para evitar circular imports
-                from app.crud.crud_categoria import get_categorias_activas
-                categorias = get_categorias_activas(session)
-                categorias_disponibles = [c.nombre for c in categorias]
-                categoria_por_id = {c.id_categoria: c.nombre for c in categorias}
+            # Categorías activas, del diccionario compartido
+            categorias = _diccionario_categorias()
+            categorias_disponibles = [nombre_cat for _, nombre_cat in categorias.activas]
+            categoria_por_id = dict(categorias.activas)
             
             # Mostrar selectbox con todas las categorías disponibles
             categoria_id = None
@@ -145,9 +159,12 @@ def render_herramienta_form(herramienta=None):
                         # Actualizar herramienta existente
                         # Si no se proporciona código interno, generar uno automáticamente
                         codigo_final = codigo_interno if codigo_interno else generate_codigo_interno(nombre)
-                        update_herramienta(
+                        # Con la versión que se abrió para editar: si otro usuario (o un
+                        # préstamo, que mueve el stock) la modificó, no se pisa el cambio
+                        actualizada = update_herramienta(
                             session,
                             herramienta.id_herramienta,
+                            version=st.session_state.get("editing_herramienta_version"),
                             nombre=nombre,
                             categoria=categoria,
                             estado=herramienta.estado,
@@ -155,6 +172,7 @@ def render_herramienta_form(herramienta=None):
                             cantidad_disponible=cantidad_disponible,
                             descripcion=descripcion
                         )
+                        st.session_state["editing_herramienta_version"] = actualizada.version
                         show_success(f"Ferramenta {nombre} atualizada com sucesso")
                     else:
                         # Crear nueva herramienta
@@ -165,8 +183,10 @@ def render_herramienta_form(herramienta=None):
                             estado=True,
                             codigo_interno=codigo_interno,
                             cantidad_disponible=cantidad_disponible,
-                            descripcion=descripcion
+                            descripcion=descripcion,
+                            clave_idempotencia=clave,
                         )
+                        renovar_clave_formulario("herramienta")
                         show_success(f"Ferramenta {nombre} criada com sucesso")
                 
                 # Guardar que debemos volver al formulario después de guardar una nueva herramienta
@@ -180,6 +200,13 @@ def render_herramienta_form(herramienta=None):
                 # Recargar la página para ver los cambios
                 st.rerun()
                 
+            except ConflictoVersion as e:
+                # La próxima vez que guarde, el usuario ya vio el aviso
+                st.session_state["editing_herramienta_version"] = e.actual
+                show_error(
+                    "Esta ferramenta foi alterada por outro usuário ou por um empréstimo enquanto você editava. "
+                    "Revise os dados (principalmente o estoque) e salve novamente para sobrescrever."
+                )
             except Exception as e:
                 show_error(f"Erro ao salvar ferramenta: {str(e)}")
     
@@ -189,23 +216,34 @@ def render_herramienta_form(herramienta=None):
 
 
 
+def _cambiar_estado_herramienta(herramienta, estado):
+    """Habilitar o desabilitar una herramienta desde un botón de la lista."""
+    engine = get_db_engine()
+    with Session(engine) as session:
+        if estado:
+            habilitar_herramienta(session, herramienta.id_herramienta)
+        else:
+            inhabilitar_herramienta(session, herramienta.id_herramienta)
+    queue_success(f"Ferramenta {herramienta.nombre} {'habilitada' if estado else 'desabilitada'}")
+
+
+def _diccionario_categorias():
+    """Nombres de las categorías (caché del proceso: sin consulta salvo tras cambiarlas)."""
+    with Session(get_db_engine()) as session:
+        return get_diccionario_categorias(session)
+
+
+@tramo
 def render_herramienta_details(herramienta):
     """Renderizar detalles de una herramienta."""
     # Icono diferente para herramientas fuera de servicio
     icono = "🔧" if herramienta.estado else "⚠️"
     estado_texto = " (Em Serviço)" if herramienta.estado else " (Fora de Serviço)"
     
-    # Obtener el nombre de la categoría basado en id_categoria_h
-    categoria_nombre = "Sin categoría"
-    if herramienta.id_categoria_h:
-        engine = get_db_engine()
-        with Session(engine) as session:
-            from app.models.categoria import Categoria
-            categoria = session.get(Categoria, herramienta.id_categoria_h)
-            if categoria:
-                categoria_nombre = categoria.nombre
+    # Nombre de la categoría según id_categoria_h, sin consultar la base por cada herramienta
+    categoria_nombre = _diccionario_categorias().nombre(herramienta.id_categoria_h)
     
-    with st.expander(f"{icono} {herramienta.nombre}{estado_texto}", expanded=False):
+    with st.expander(f"{icono} {herramienta.nombre}{estado_texto}", expanded=True):
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -215,6 +253,7 @@ def render_herramienta_details(herramienta):
         
         with col2:
             st.write(f"**Estoque:** {herramienta.cantidad_disponible}")
+            st.write(f"**Emprestadas:** {herramienta.unidades_prestadas}")
             st.write(f"**Estado:** {'✅ Em Serviço' if herramienta.estado else '⚠️ Fora de Serviço'}")
             st.write(f"**Disponível:** {'✅ Sim' if herramienta.cantidad_disponible > 0 else '❌ Não'}")
         
@@ -227,43 +266,32 @@ def render_herramienta_details(herramienta):
                 # Guardar que venimos de la lista para volver después de guardar
                 st.session_state["after_save_action"] = "list"
                 st.session_state["editing_herramienta_id"] = herramienta.id_herramienta
+                st.session_state["editing_herramienta_version"] = herramienta.version
                 st.rerun()
             
+            # Las acciones corren en un callback: el clic solo vuelve a ejecutar el
+            # fragmento de la lista, que ya encuentra los datos actualizados
             if herramienta.estado:
-                if st.button("❌ Desabilitar", key=f"disable_herramienta_{herramienta.id_herramienta}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        inhabilitar_herramienta(session, herramienta.id_herramienta)
-                    show_success(f"Ferramenta {herramienta.nombre} desabilitada")
-                    st.rerun()
+                st.button("❌ Desabilitar", key=f"disable_herramienta_{herramienta.id_herramienta}",
+                          on_click=_cambiar_estado_herramienta, args=(herramienta, False))
             else:
-                if st.button("✅ Habilitar", key=f"enable_herramienta_{herramienta.id_herramienta}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        habilitar_herramienta(session, herramienta.id_herramienta)
-                    show_success(f"Ferramenta {herramienta.nombre} habilitada")
-                    st.rerun()
+                st.button("✅ Habilitar", key=f"enable_herramienta_{herramienta.id_herramienta}",
+                          on_click=_cambiar_estado_herramienta, args=(herramienta, True))
+
+        render_historial(get_db_engine(), "herramienta", herramienta.id_herramienta)
+
 
+def _usar_busqueda(texto):
+    """Reemplazar el texto de búsqueda de la lista (p. ej. por una sugerencia)."""
+    st.session_state.herramienta_search_term = texto
 
-def render_herramientas_list(herramientas):
+
+@st.fragment
+@tramo
+def render_herramientas_list():
     """Renderizar lista de herramientas."""
-    if not herramientas:
-        # Verificar si hay herramientas en la base de datos pero no se muestran por el filtro
-        herramientas_en_servicio = len([h for h in herramientas if h.estado == True])
-        herramientas_fuera_servicio = len([h for h in herramientas if h.estado == False])
-        
-        if herramientas_en_servicio == 0 and herramientas_fuera_servicio == 0:
-            st.info("Não há ferramentas registradas. Adicione uma usando o formulário.")
-        elif filter_estado == "Em Serviço":
-            st.info("Não há ferramentas **Em Serviço**. Você pode habilitar ferramentas que estejam atualmente **Fora de Serviço** ou adicionar novas.")
-        elif filter_estado == "Fora de Serviço":
-            st.info("Não há ferramentas **Fora de Serviço**. Todas as ferramentas registradas estão atualmente **Em Serviço**.")
-        elif filter_estado == "Todos":
-            st.info("Não há ferramentas registradas. Adicione uma usando o formulário.")
-        else:
-            st.info("Não há ferramentas registradas. Adicione uma usando o formulário.")
-        return
-    
+    show_pending_messages()
+
     # Filtros
     col1, col2, col3, col4 = st.columns(4)
     
@@ -276,7 +304,7 @@ def render_herramientas_list(herramientas):
         )
     
     with col2:
-        search_term = st.text_input("🔍 Buscar", placeholder="Nome ou código...")
+        search_term = st.text_input("🔍 Buscar", placeholder="Nome, código ou descrição...", key="herramienta_search_term")
     
     with col3:
         filter_disponibilidad = st.selectbox(
@@ -289,70 +317,110 @@ def render_herramientas_list(herramientas):
         # Espacio reservado para futuros filtros
         st.write("")
     
-    # Filtrar herramientas
-    filtered_herramientas = herramientas
-    
-    # Primero filtrar por estado (en servicio vs fuera de servicio)
-    if filter_estado == "Em Serviço":
-        filtered_herramientas = [h for h in filtered_herramientas if h.estado == True]
-    elif filter_estado == "Fora de Serviço":
-        filtered_herramientas = [h for h in filtered_herramientas if h.estado == False]
-    
-    # Luego aplicar otros filtros
-    if search_term:
-        search_term_lower = search_term.lower()
-        filtered_herramientas = [
-            h for h in filtered_herramientas
-            if (search_term_lower in h.nombre.lower() or
-                search_term_lower in h.codigo_interno.lower())
-        ]
+    # Traducir los filtros a parámetros de búsqueda
+    estado = {"Em Serviço": True, "Fora de Serviço": False}.get(filter_estado)
     
     # Filtrar por disponibilidad - solo aplica a herramientas En Servicio
-    if filter_disponibilidad != "Todos":
-        # Solo aplicar filtro de disponibilidad si estamos viendo herramientas En Servicio
-        if filter_estado == "Em Serviço":
-            if filter_disponibilidad == "Disponíveis":
-                filtered_herramientas = [h for h in filtered_herramientas if h.cantidad_disponible > 0]
-            elif filter_disponibilidad == "Não Disponíveis":
-                filtered_herramientas = [h for h in filtered_herramientas if h.cantidad_disponible <= 0]
-        # Si estamos viendo Fuera de Servicio, ignorar el filtro de disponibilidad
+    disponible = None
+    if filter_estado == "Em Serviço":
+        disponible = {"Disponíveis": True, "Não Disponíveis": False}.get(filter_disponibilidad)
     
     # Filtrado por categoría eliminado (ahora se gestiona en la página de categorías)
     
-    # Mostrar resultados
-    st.write(f"**Total: {len(filtered_herramientas)} ferramentas**")
+    # Estadísticas rápidas (conteo en la base de datos, sin cargar la tabla)
+    engine = get_db_engine()
+    with Session(engine) as session:
+        conteo = contar_herramientas(session)
+    
+    if conteo["total"] == 0:
+        st.info("Não há ferramentas registradas. Adicione uma usando o formulário.")
+        return
     
-    # Estadísticas rápidas
     col1, col2, col3 = st.columns(3)
     
     with col1:
         # Total de herramientas en servicio
-        herramientas_en_servicio = len([h for h in herramientas if h.estado == True])
-        st.metric("🔧 Em Serviço", herramientas_en_servicio)
+        st.metric("🔧 Em Serviço", conteo["en_servicio"])
     
     with col2:
         # Total de herramientas fuera de servicio
-        herramientas_fuera_servicio = len([h for h in herramientas if h.estado == False])
-        st.metric("⚠️ Fora de Serviço", herramientas_fuera_servicio)
+        st.metric("⚠️ Fora de Serviço", conteo["fuera_servicio"])
     
     with col3:
         # Total general
-        st.metric("📊 Total Registradas", len(herramientas))
+        st.metric("📊 Total Registradas", conteo["total"])
     
     # Mensajes informativos según el filtro de estado
-    if filter_estado == "Em Serviço" and len(filtered_herramientas) > 0:
+    if filter_estado == "Em Serviço":
         st.success("📋 Mostrando ferramentas **Em Serviço**. Estas são as ferramentas ativas e disponíveis para empréstimo.")
-    elif filter_estado == "Fora de Serviço" and len(filtered_herramientas) > 0:
+    elif filter_estado == "Fora de Serviço":
         st.info("💡 Estas ferramentas foram marcadas como **Fora de Serviço** (não são mais utilizadas ou foram retiradas). O filtro de disponibilidade não se aplica a esta seção.")
-    elif filter_estado == "Todos" and len(filtered_herramientas) > 0:
+    elif filter_estado == "Todos":
         st.info("📊 Mostrando todas as ferramentas registradas, tanto em serviço como fora de serviço.")
 
     st.markdown("---")
     
-    for herramienta in filtered_herramientas:
-        render_herramienta_details(herramienta)
+    def cargar_pagina(skip, limit, orden, descendente):
+        with Session(engine) as session:
+            return buscar_herramientas(
+                session,
+                texto=search_term,
+                estado=estado,
+                disponible=disponible,
+                orden=orden,
+                descendente=descendente,
+                skip=skip,
+                limit=limit,
+            )
+    
+    categorias = _diccionario_categorias()
 
+    # Lista paginada en la base de datos; el detalle se carga solo para la fila seleccionada
+    total = render_grid(
+        "herramientas",
+        cargar_pagina,
+        columnas={
+            "ID": lambda h: h.id_herramienta,
+            "Nome": lambda h: h.nombre,
+            "Código": lambda h: h.codigo_interno,
+            "Categoria": lambda h: categorias.nombre(h.id_categoria_h),
+            "Estoque": lambda h: h.cantidad_disponible,
+            "Emprestadas": lambda h: h.unidades_prestadas,
+            "Estado": lambda h: "✅ Em Serviço" if h.estado else "⚠️ Fora de Serviço",
+        },
+        id_de=lambda h: h.id_herramienta,
+        render_detalle=render_herramienta_details,
+        # Con texto de búsqueda se puede ordenar por relevancia (índice de texto completo)
+        opciones_orden={
+            **({"Relevância": "relevancia"} if search_term.strip() else {}),
+            "Nome": "nombre",
+            "Código": "codigo_interno",
+            "Estoque": "cantidad_disponible",
+            "Emprestadas": "unidades_prestadas",
+            "ID": "id",
+        },
+        filtros=(search_term, estado, disponible),
+    )
+    
+    if total == 0:
+        if filter_estado == "Em Serviço" and not search_term:
+            st.info("Não há ferramentas **Em Serviço**. Você pode habilitar ferramentas que estejam atualmente **Fora de Serviço** ou adicionar novas.")
+        elif filter_estado == "Fora de Serviço" and not search_term:
+            st.info("Não há ferramentas **Fora de Serviço**. Todas as ferramentas registradas estão atualmente **Em Serviço**.")
+        else:
+            st.warning("Não foram encontradas ferramentas que coincidam com a busca.")
+            # Sugerir ferramentas parecidas (sem acentos ou com erros de digitação)
+            with Session(engine) as session:
+                sugerencias = [h for h in sugerir_herramientas(session, search_term) if estado is None or h.estado == estado]
+            if sugerencias:
+                st.caption("Você quis dizer:")
+                for h in sugerencias:
+                    st.button(f"{h.nombre} ({h.codigo_interno})", key=f"sugerencia_herramienta_{h.id_herramienta}",
+                              on_click=_usar_busqueda, args=(h.codigo_interno or h.nombre,))
 
+
+@medir_pagina("Ferramentas")
+@trazar_pagina("Ferramentas")
 def main():
     """Punto de entrada principal de la página."""
     # Establecer página actual
@@ -374,10 +442,7 @@ def main():
         unsafe_allow_html=True
     )
     
-    # Obtener herramientas
     engine = get_db_engine()
-    with Session(engine) as session:
-        herramientas = get_herramientas(session)
     
     # Verificar si estamos editando una herramienta
     if "editing_herramienta_id" in st.session_state:
@@ -398,7 +463,7 @@ def main():
             
             if action == "list":
                 # Mostrar solo la lista de herramientas
-                render_herramientas_list(herramientas)
+                render_herramientas_list()
             elif action == "form":
                 # Mostrar formulario para nueva herramienta
                 render_herramienta_form()
@@ -406,7 +471,7 @@ def main():
                 st.markdown("---")
                 
                 # Mostrar lista de herramientas
-                render_herramientas_list(herramientas)
+                render_herramientas_list()
         else:
             # Mostrar formulario para nueva herramienta
             render_herramienta_form()
@@ -414,7 +479,7 @@ def main():
             st.markdown("---")
             
             # Mostrar lista de herramientas
-            render_herramientas_list(herramientas)
+            render_herramientas_list()
 
 
 if __name__ == "__main__":
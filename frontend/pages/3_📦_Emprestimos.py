@@ -7,29 +7,41 @@ Permite:
 - Devolver herramientas
 - Cancelar préstamos
 - Filtrar por empleado, herramienta y estado
+- Reservar herramientas para un período futuro
+- Lanzar en segundo plano devoluciones en lote, el archivo, la reconciliación
+  de contadores y los avisos de vencimiento
 """
 
 import streamlit as st
 from sqlmodel import Session
 from datetime import datetime, timedelta
-from app.database.config import engine
-from app.crud import (
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_prestamo import (
     create_prestamo,
-    get_prestamos,
-    get_prestamos_activos,
-    get_prestamos_por_empleado,
-    get_prestamos_por_herramienta,
-    get_prestamos_vencidos,
     devolver_prestamo,
     cancelar_prestamo,
-    get_empleados_activos,
-    get_herramientas_disponibles,
-    get_empleado_by_id,
-    get_herramienta_by_id
+    buscar_prestamos,
+    contar_prestamos_por_estado,
 )
+from app.crud.crud_categoria import get_diccionario_categorias
+from app.crud.crud_empleado import autocompletar_empleados, get_empleado_by_id
+from app.crud.crud_herramienta import autocompletar_herramientas, get_herramienta_by_id
+from app.crud.crud_reserva import create_reserva, buscar_reservas, cancelar_reserva, unidades_libres
+from app.crud.concurrencia import ConflictoVersion
+from frontend.grid import render_grid
+from frontend.historial import render_historial
+from frontend.tareas import render_tareas
+from app.tareas import encolar_tarea
+from frontend.trazas import tramo, trazar_pagina
 from frontend.utils import (
     show_success,
+    queue_success,
+    queue_error,
+    show_pending_messages,
     show_error,
+    clave_formulario,
+    renovar_clave_formulario,
     show_info,
     validate_required_fields,
     format_date,
@@ -37,13 +49,19 @@ from frontend.utils import (
 )
 
 
+# Número máximo de opciones en los selectores de funcionário y ferramenta
+LIMITE_OPCIONES = 20
+
+
 # Cachear el motor de base de datos (no la sesión)
 @st.cache_resource
 def get_db_engine():
     """Obtener el motor de base de datos."""
-    return engine
+    return get_engine()
 
 
+@st.fragment
+@tramo
 def render_prestamo_form():
     """Renderizar formulario para crear nuevo préstamo."""
     st.markdown(
@@ -58,42 +76,73 @@ def render_prestamo_form():
     
     engine = get_db_engine()
     
-    # Obtener datos antes del formulario para evitar problemas con la sesión
-    with Session(engine) as session:
-        empleados = get_empleados_activos(session)
-        herramientas = get_herramientas_disponibles(session)
-        herramientas_disponibles = [h for h in herramientas if h.cantidad_disponible > 0]
+    # Selectores con búsqueda: solo se consultan y se envían al navegador las
+    # mejores coincidencias. Están fuera del formulario para que escribir en la
+    # búsqueda actualice las opciones (recargando solo este fragmento)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        texto_empleado = st.text_input(
+            "🔍 Buscar funcionário",
+            placeholder="Nome, sobrenome ou departamento...",
+            key="prestamo_buscar_empleado"
+        )
+        with Session(engine) as session:
+            empleados = autocompletar_empleados(session, texto_empleado, limite=LIMITE_OPCIONES)
+    
+    with col2:
+        texto_herramienta = st.text_input(
+            "🔍 Buscar ferramenta",
+            placeholder="Nome ou código...",
+            key="prestamo_buscar_herramienta"
+        )
+        with Session(engine) as session:
+            herramientas_disponibles = autocompletar_herramientas(session, texto_herramienta, limite=LIMITE_OPCIONES)
     
     if not empleados:
-        st.warning("Não há funcionários ativos para atribuir empréstimos")
+        if texto_empleado:
+            st.warning("Nenhum funcionário ativo coincide com a busca")
+        else:
+            st.warning("Não há funcionários ativos para atribuir empréstimos")
         return
     
     if not herramientas_disponibles:
-        st.warning("Não há ferramentas disponíveis para empréstimo")
+        if texto_herramienta:
+            st.warning("Nenhuma ferramenta disponível coincide com a busca")
+        else:
+            st.warning("Não há ferramentas disponíveis para empréstimo")
         return
     
-    empleado_options = {f"{e.nombre} {e.apellido} ({e.area})": e.id for e in empleados}
-    herramienta_options = {f"{h.nombre} ({h.codigo_interno}) - Estoque: {h.cantidad_disponible}": h.id_herramienta for h in herramientas_disponibles}
+    # Las opciones son los IDs: dos empleados con el mismo nombre siguen siendo distintos
+    empleado_options = {e.id: f"{e.nombre} {e.apellido} ({e.area})" for e in empleados}
+    herramienta_options = {h.id_herramienta: f"{h.nombre} ({h.codigo_interno}) - Estoque: {h.cantidad_disponible}" for h in herramientas_disponibles}
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        empleado_id = st.selectbox(
+            "Funcionário",
+            options=list(empleado_options.keys()),
+            format_func=empleado_options.get
+        )
+    
+    with col2:
+        herramienta_id = st.selectbox(
+            "Ferramenta",
+            options=list(herramienta_options.keys()),
+            format_func=herramienta_options.get
+        )
+    
+    if len(empleados) == LIMITE_OPCIONES or len(herramientas_disponibles) == LIMITE_OPCIONES:
+        st.caption(f"Mostrando as {LIMITE_OPCIONES} primeiras coincidências. Digite para refinar a busca.")
     
-    with st.form(key="prestamo_form"):
+    # La misma clave en todos los envíos de este formulario: un doble clic o
+    # un rerun que repite el envío no crea un segundo préstamo
+    clave = clave_formulario("prestamo")
+    with st.form(key=f"prestamo_form_{clave}"):
         col1, col2 = st.columns(2)
         
         with col1:
-            selected_empleado_id = st.selectbox(
-                "Funcionário",
-                options=list(empleado_options.keys()),
-                format_func=lambda x: x
-            )
-            empleado_id = empleado_options[selected_empleado_id]
-            
-            selected_herramienta_id = st.selectbox(
-                "Ferramenta",
-                options=list(herramienta_options.keys()),
-                format_func=lambda x: x
-            )
-            herramienta_id = herramienta_options[selected_herramienta_id]
-        
-        with col2:
             fecha_prestamo = st.date_input(
                 "Data do Empréstimo",
                 value=datetime.now(),
@@ -110,7 +159,8 @@ def render_prestamo_form():
             
             fecha_devolucion_estimada = fecha_prestamo + timedelta(days=dias_prestamo)
             st.write(f"**Data Estimada de Devolução:** {fecha_devolucion_estimada.strftime('%d/%m/%Y')}")
-            
+        
+        with col2:
             observaciones = st.text_area(
                 "Observações (opcional)",
                 height=100,
@@ -123,34 +173,68 @@ def render_prestamo_form():
             try:
                 # Crear una nueva sesión para el envío del formulario
                 with Session(engine) as session:
-                    # Crear el préstamo
+                    # Crear el préstamo (el stock se vuelve a verificar al descontarlo)
                     prestamo = create_prestamo(
                         session,
                         id_empleado_h=empleado_id,
                         id_herramienta_h=herramienta_id,
                         fecha_prestamo=datetime.combine(fecha_prestamo, datetime.min.time()),
                         fecha_devolucion_estimada=datetime.combine(fecha_devolucion_estimada, datetime.min.time()),
-                        observaciones=observaciones
+                        observaciones=observaciones,
+                        clave_idempotencia=clave,
                     )
                     
                     if prestamo:
+                        renovar_clave_formulario("prestamo")
                         show_success(f"Empréstimo registrado com sucesso (ID: {prestamo.id_prestamo})")
                         st.rerun()
                     else:
-                        show_error("Não foi possível registrar o empréstimo. Verifique se a ferramenta está disponível.")
+                        show_error(
+                            "Não foi possível registrar o empréstimo. A ferramenta não está mais disponível, "
+                            "ficou sem estoque ou está reservada para esse período."
+                        )
                         
             except Exception as e:
                 show_error(f"Erro ao registrar empréstimo: {str(e)}")
 
 
-def render_prestamo_details(prestamo):
+def _accion_prestamo(prestamo_id, accion):
+    """Devolver o cancelar un préstamo, pidiendo confirmación con el primer clic."""
+    clave_confirmacion = f"confirm_{accion}_{prestamo_id}"
+    if not st.session_state.get(clave_confirmacion, False):
+        # Usar st.session_state para confirmar la acción
+        st.session_state[clave_confirmacion] = True
+        return
+
+    st.session_state.pop(clave_confirmacion, None)
+    engine = get_db_engine()
+    try:
+        with Session(engine) as session:
+            if accion == "devolver":
+                devolver_prestamo(session, prestamo_id)
+                queue_success("Empréstimo marcado como devolvido")
+            else:
+                cancelar_prestamo(session, prestamo_id)
+                queue_success("Empréstimo cancelado")
+    except ConflictoVersion:
+        # Otro usuario lo devolvió o canceló desde que se mostró la fila
+        queue_error("Este empréstimo já foi alterado por outro usuário. Confira o estado atual na lista.")
+    except Exception as e:
+        queue_error(f"Erro ao atualizar empréstimo: {str(e)}")
+
+
+@tramo
+def render_prestamo_details(prestamo, empleado=None, herramienta=None):
     """Renderizar detalles de un préstamo."""
     engine = get_db_engine()
     
-    # Obtener información del empleado y herramienta
+    # Obtener información del empleado y herramienta si no vienen ya cargados
     with Session(engine) as session:
-        empleado = get_empleado_by_id(session, prestamo.id_empleado_h)
-        herramienta = get_herramienta_by_id(session, prestamo.id_herramienta_h)
+        if empleado is None:
+            empleado = get_empleado_by_id(session, prestamo.id_empleado_h)
+        if herramienta is None:
+            herramienta = get_herramienta_by_id(session, prestamo.id_herramienta_h)
+        categorias = get_diccionario_categorias(session)
     
     nombre_empleado = f"{empleado.nombre} {empleado.apellido}" if empleado else "Funcionário não encontrado"
     nombre_herramienta = herramienta.nombre if herramienta else "Ferramenta não encontrada"
@@ -173,7 +257,7 @@ def render_prestamo_details(prestamo):
     
     with st.expander(
         f"📋 Empréstimo #{prestamo.id_prestamo} - {nombre_empleado} → {nombre_herramienta}",
-        expanded=(prestamo.estado == "activo" and prestamo.fecha_devolucion_estimada < datetime.now())
+        expanded=True
     ):
         st.markdown(f"""
         <div style="background-color: {bg_color}; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
@@ -193,7 +277,7 @@ def render_prestamo_details(prestamo):
         with col2:
             st.write(f"**Ferramenta:** {nombre_herramienta}")
             st.write(f"**Código:** {herramienta.codigo_interno if herramienta else 'N/A'}")
-            st.write(f"**Categoria:** {herramienta.categoria if herramienta else 'N/A'}")
+            st.write(f"**Categoria:** {categorias.nombre(herramienta.id_categoria_h) if herramienta else 'N/A'}")
         
         with col3:
             if prestamo.fecha_devolucion:
@@ -206,38 +290,32 @@ def render_prestamo_details(prestamo):
         if prestamo.estado == "activo":
             col1, col2 = st.columns(2)
             
+            # Las acciones corren en un callback: el clic solo vuelve a ejecutar el
+            # fragmento de la lista, que ya encuentra el préstamo actualizado
             with col1:
-                if st.button("✅ Devolver", key=f"devolver_{prestamo.id_prestamo}"):
-                    # Usar st.session_state para confirmar la acción
-                    if st.session_state.get(f"confirm_devolver_{prestamo.id_prestamo}", False):
-                        devolver_prestamo(session, prestamo.id_prestamo)
-                        show_success("Empréstimo marcado como devolvido")
-                        st.rerun()
-                    else:
-                        st.session_state[f"confirm_devolver_{prestamo.id_prestamo}"] = True
-                        st.warning("Tem certeza de que deseja marcar este empréstimo como devolvido?")
-                        st.button("Cancelar", key=f"cancel_confirm_devolver_{prestamo.id_prestamo}", 
-                                  on_click=lambda: st.session_state.pop(f"confirm_devolver_{prestamo.id_prestamo}", None))
+                st.button("✅ Devolver", key=f"devolver_{prestamo.id_prestamo}",
+                          on_click=_accion_prestamo, args=(prestamo.id_prestamo, "devolver"))
+                if st.session_state.get(f"confirm_devolver_{prestamo.id_prestamo}", False):
+                    st.warning("Tem certeza de que deseja marcar este empréstimo como devolvido?")
+                    st.button("Cancelar", key=f"cancel_confirm_devolver_{prestamo.id_prestamo}", 
+                              on_click=lambda: st.session_state.pop(f"confirm_devolver_{prestamo.id_prestamo}", None))
             
             with col2:
-                if st.button("❌ Cancelar", key=f"cancelar_{prestamo.id_prestamo}"):
-                    if st.session_state.get(f"confirm_cancelar_{prestamo.id_prestamo}", False):
-                        cancelar_prestamo(session, prestamo.id_prestamo)
-                        show_success("Empréstimo cancelado")
-                        st.rerun()
-                    else:
-                        st.session_state[f"confirm_cancelar_{prestamo.id_prestamo}"] = True
-                        st.warning("Tem certeza de que deseja cancelar este empréstimo?")
-                        st.button("Cancelar", key=f"cancel_confirm_cancelar_{prestamo.id_prestamo}",
-                                  on_click=lambda: st.session_state.pop(f"confirm_cancelar_{prestamo.id_prestamo}", None))
+                st.button("❌ Cancelar", key=f"cancelar_{prestamo.id_prestamo}",
+                          on_click=_accion_prestamo, args=(prestamo.id_prestamo, "cancelar"))
+                if st.session_state.get(f"confirm_cancelar_{prestamo.id_prestamo}", False):
+                    st.warning("Tem certeza de que deseja cancelar este empréstimo?")
+                    st.button("Cancelar", key=f"cancel_confirm_cancelar_{prestamo.id_prestamo}",
+                              on_click=lambda: st.session_state.pop(f"confirm_cancelar_{prestamo.id_prestamo}", None))
 
+        render_historial(engine, "prestamo", prestamo.id_prestamo)
 
-def render_prestamos_list(prestamos):
+@st.fragment
+@tramo
+def render_prestamos_list():
     """Renderizar lista de préstamos."""
-    if not prestamos:
-        st.info("Não há empréstimos registrados.")
-        return
-    
+    show_pending_messages()
+
     # Filtros
     col1, col2, col3 = st.columns(3)
     
@@ -253,68 +331,379 @@ def render_prestamos_list(prestamos):
         )
     
     with col3:
-        # Obtener empleados para filtro
+        # Opciones acotadas por la búsqueda, como en el formulario: no se lista
+        # toda la tabla de empleados en cada ejecución
         engine = get_db_engine()
-        with Session(engine) as session:
-            empleados = get_empleados_activos(session)
-        empleado_options = {f"{e.nombre} {e.apellido}": e.id for e in empleados}
-        filter_empleado = st.selectbox(
+        texto_empleado = st.text_input(
             "👤 Funcionário",
-            ["Todos"] + list(empleado_options.keys())
+            placeholder="Buscar funcionário...",
+            key="prestamos_filtro_buscar_empleado"
+        )
+        with Session(engine) as session:
+            empleados = autocompletar_empleados(session, texto_empleado, limite=LIMITE_OPCIONES)
+        empleado_options = {e.id: f"{e.nombre} {e.apellido} ({e.area})" for e in empleados}
+        empleado_id = st.selectbox(
+            "Funcionário",
+            options=[None] + list(empleado_options.keys()),
+            format_func=lambda id_: "Todos" if id_ is None else empleado_options[id_],
+            key="prestamos_filtro_empleado",
+            label_visibility="collapsed"
         )
     
-    # Filtrar préstamos
-    filtered_prestamos = prestamos
-    
-    if search_term:
-        search_term_lower = search_term.lower()
-        filtered_prestamos = [
-            p for p in filtered_prestamos
-            if (search_term_lower in str(p.id_prestamo) or
-                search_term_lower in str(p.id_empleado_h) or
-                search_term_lower in str(p.id_herramienta_h))
-        ]
-    
-    if filter_estado == "Ativos":
-        filtered_prestamos = [p for p in filtered_prestamos if p.estado == "activo"]
-    elif filter_estado == "Vencidos":
-        filtered_prestamos = [
-            p for p in filtered_prestamos
-            if p.estado == "activo" and p.fecha_devolucion_estimada < datetime.now()
-        ]
-    elif filter_estado == "Devolvidos":
-        filtered_prestamos = [p for p in filtered_prestamos if p.estado == "devuelto"]
-    elif filter_estado == "Cancelados":
-        filtered_prestamos = [p for p in filtered_prestamos if p.estado == "cancelado"]
-    
-    if filter_empleado != "Todos":
-        empleado_id = empleado_options[filter_empleado]
-        filtered_prestamos = [p for p in filtered_prestamos if p.id_empleado_h == empleado_id]
-    
-    # Mostrar resultados
-    st.write(f"**Total: {len(filtered_prestamos)} empréstimos**")
-    
-    # Estadísticas rápidas
+    # Traducir los filtros a parámetros de búsqueda
+    estado = {
+        "Ativos": "activo",
+        "Vencidos": "vencido",
+        "Devolvidos": "devuelto",
+        "Cancelados": "cancelado",
+    }.get(filter_estado)
+    
+    # Estadísticas rápidas (conteo agrupado en la base de datos)
+    with Session(engine) as session:
+        conteo = contar_prestamos_por_estado(session, texto=search_term, empleado_id=empleado_id)
+    
+    if sum(conteo[e] for e in ("activo", "devuelto", "cancelado")) == 0 and not search_term and empleado_id is None:
+        st.info("Não há empréstimos registrados.")
+        return
+    
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        activos = sum(1 for p in filtered_prestamos if p.estado == "activo")
-        st.metric("Ativos", activos)
+        st.metric("Ativos", conteo["activo"])
     with col2:
-        vencidos = sum(1 for p in filtered_prestamos if p.estado == "activo" and p.fecha_devolucion_estimada < datetime.now())
-        st.metric("Vencidos", vencidos, delta_color="inverse")
+        st.metric("Vencidos", conteo["vencido"], delta_color="inverse")
     with col3:
-        devueltos = sum(1 for p in filtered_prestamos if p.estado == "devuelto")
-        st.metric("Devolvidos", devueltos)
+        st.metric("Devolvidos", conteo["devuelto"])
     with col4:
-        cancelados = sum(1 for p in filtered_prestamos if p.estado == "cancelado")
-        st.metric("Cancelados", cancelados)
+        st.metric("Cancelados", conteo["cancelado"])
     
     st.markdown("---")
     
-    for prestamo in filtered_prestamos:
-        render_prestamo_details(prestamo)
+    def cargar_pagina(skip, limit, orden, descendente):
+        with Session(engine) as session:
+            return buscar_prestamos(
+                session,
+                texto=search_term,
+                estado=estado,
+                empleado_id=empleado_id,
+                orden=orden,
+                descendente=descendente,
+                skip=skip,
+                limit=limit,
+            )
+    
+    def estado_texto(prestamo):
+        if prestamo.estado == "activo" and prestamo.fecha_devolucion_estimada < datetime.now():
+            return "⚠️ Vencido"
+        return {"activo": "🟢 Activo", "devuelto": "🔵 Devuelto"}.get(prestamo.estado, "🔴 Cancelado")
+    
+    # Lista paginada en la base de datos; el detalle se carga solo para la fila seleccionada
+    total = render_grid(
+        "prestamos",
+        cargar_pagina,
+        columnas={
+            "ID": lambda fila: fila[0].id_prestamo,
+            "Funcionário": lambda fila: f"{fila[1].nombre} {fila[1].apellido}" if fila[1] else "Funcionário não encontrado",
+            "Ferramenta": lambda fila: fila[2].nombre if fila[2] else "Ferramenta não encontrada",
+            "Empréstimo": lambda fila: format_date_short(fila[0].fecha_prestamo),
+            "Devolução Estimada": lambda fila: format_date_short(fila[0].fecha_devolucion_estimada),
+            "Estado": lambda fila: estado_texto(fila[0]),
+        },
+        id_de=lambda fila: fila[0].id_prestamo,
+        render_detalle=lambda fila: render_prestamo_details(*fila),
+        opciones_orden={
+            "ID": "id",
+            "Data do Empréstimo": "fecha_prestamo",
+            "Data Estimada": "fecha_devolucion_estimada",
+            "Funcionário": "empleado",
+            "Ferramenta": "herramienta",
+        },
+        filtros=(search_term, estado, empleado_id),
+        orden_descendente=True,
+    )
+    
+    if total == 0:
+        st.info("Não há empréstimos que coincidam com os filtros.")
 
 
+@st.fragment
+@tramo
+def render_reserva_form():
+    """Renderizar formulario para reservar una herramienta en un período futuro."""
+    st.markdown(
+        """
+        <div class="page-title">
+            <span class="icon">📅</span>
+            <h2>Reservar Ferramenta</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    
+    engine = get_db_engine()
+    
+    # Los widgets no van en un st.form: las unidades libres se recalculan al
+    # cambiar la herramienta o el período, recargando solo este fragmento
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        texto_empleado = st.text_input(
+            "🔍 Buscar funcionário",
+            placeholder="Nome, sobrenome ou departamento...",
+            key="reserva_buscar_empleado"
+        )
+        with Session(engine) as session:
+            empleados = autocompletar_empleados(session, texto_empleado, limite=LIMITE_OPCIONES)
+    
+    with col2:
+        texto_herramienta = st.text_input(
+            "🔍 Buscar ferramenta",
+            placeholder="Nome ou código...",
+            key="reserva_buscar_herramienta"
+        )
+        # Se puede reservar una herramienta aunque hoy no tenga stock
+        with Session(engine) as session:
+            herramientas = autocompletar_herramientas(
+                session, texto_herramienta, limite=LIMITE_OPCIONES, con_stock=False
+            )
+    
+    if not empleados or not herramientas:
+        st.warning("Nenhum funcionário ativo ou ferramenta em serviço coincide com a busca")
+        return
+    
+    empleado_options = {e.id: f"{e.nombre} {e.apellido} ({e.area})" for e in empleados}
+    herramienta_options = {h.id_herramienta: f"{h.nombre} ({h.codigo_interno})" for h in herramientas}
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        empleado_id = st.selectbox(
+            "Reservado para",
+            options=list(empleado_options.keys()),
+            format_func=empleado_options.get,
+            key="reserva_empleado"
+        )
+    
+    with col2:
+        herramienta_id = st.selectbox(
+            "Ferramenta a reservar",
+            options=list(herramienta_options.keys()),
+            format_func=herramienta_options.get,
+            key="reserva_herramienta"
+        )
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        fecha_inicio = st.date_input(
+            "Início da Reserva",
+            value=datetime.now() + timedelta(days=1),
+            min_value=datetime.now(),
+            key="reserva_inicio"
+        )
+    
+    with col2:
+        dias = st.number_input("Dias", min_value=1, value=1, step=1, key="reserva_dias")
+    
+    with col3:
+        cantidad = st.number_input("Unidades", min_value=1, value=1, step=1, key="reserva_cantidad")
+    
+    inicio = datetime.combine(fecha_inicio, datetime.min.time())
+    fin = inicio + timedelta(days=dias)
+    
+    # Consulta la agenda en memoria: no recorre préstamos ni reservas
+    with Session(engine) as session:
+        libres = unidades_libres(session, herramienta_id, inicio, fin)
+    
+    st.write(f"**Unidades livres de {format_date_short(inicio)} a {format_date_short(fin)}:** {libres}")
+    
+    observaciones = st.text_input("Observações (opcional)", key="reserva_observaciones")
+    
+    clave = clave_formulario("reserva")
+    if st.button("Reservar", type="primary", disabled=libres < cantidad, key=f"reserva_crear_{clave}"):
+        try:
+            with Session(engine) as session:
+                # Las unidades libres se vuelven a verificar al crear la reserva
+                reserva = create_reserva(
+                    session,
+                    id_empleado_h=empleado_id,
+                    id_herramienta_h=herramienta_id,
+                    fecha_inicio=inicio,
+                    fecha_fin=fin,
+                    cantidad=cantidad,
+                    observaciones=observaciones or None,
+                    clave_idempotencia=clave,
+                )
+            
+            if reserva:
+                renovar_clave_formulario("reserva")
+                queue_success(f"Reserva registrada com sucesso (ID: {reserva.id_reserva})")
+                st.rerun()
+            else:
+                show_error("Não foi possível registrar a reserva. Não há unidades livres em todo o período.")
+        except Exception as e:
+            show_error(f"Erro ao registrar reserva: {str(e)}")
+
+
+def _cancelar_reserva(reserva_id):
+    """Cancelar una reserva desde el panel de detalle."""
+    engine = get_db_engine()
+    with Session(engine) as session:
+        if cancelar_reserva(session, reserva_id):
+            queue_success("Reserva cancelada")
+
+
+@tramo
+def render_reserva_details(reserva, empleado=None, herramienta=None):
+    """Renderizar detalles y acciones de una reserva."""
+    nombre_empleado = f"{empleado.nombre} {empleado.apellido}" if empleado else "Funcionário não encontrado"
+    nombre_herramienta = herramienta.nombre if herramienta else "Ferramenta não encontrada"
+    
+    with st.expander(f"📅 Reserva #{reserva.id_reserva} - {nombre_empleado} → {nombre_herramienta}", expanded=True):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write(f"**Período:** {format_date(reserva.fecha_inicio)} a {format_date(reserva.fecha_fin)}")
+            st.write(f"**Unidades:** {reserva.cantidad}")
+        
+        with col2:
+            if reserva.observaciones:
+                st.write(f"**Observações:** {reserva.observaciones[:50]}...")
+        
+        if reserva.estado == "activa":
+            st.button("❌ Cancelar Reserva", key=f"cancelar_reserva_{reserva.id_reserva}",
+                      on_click=_cancelar_reserva, args=(reserva.id_reserva,))
+
+
+@st.fragment
+@tramo
+def render_reservas_list():
+    """Renderizar lista de reservas."""
+    show_pending_messages()
+    
+    filter_estado = st.selectbox(
+        "📊 Estado da reserva",
+        ["Ativas", "Vencidas", "Cumpridas", "Canceladas", "Todas"],
+        index=0
+    )
+    estado = {
+        "Ativas": "activa",
+        "Vencidas": "vencida",
+        "Cumpridas": "cumplida",
+        "Canceladas": "cancelada",
+    }.get(filter_estado)
+    
+    engine = get_db_engine()
+    
+    def estado_texto(reserva):
+        if reserva.estado == "activa" and reserva.fecha_fin <= datetime.now():
+            return "⚠️ Vencida"
+        return {"activa": "🟢 Ativa", "cumplida": "🔵 Cumprida"}.get(reserva.estado, "🔴 Cancelada")
+    
+    def cargar_pagina(skip, limit, orden, descendente):
+        with Session(engine) as session:
+            return buscar_reservas(
+                session, estado=estado, orden=orden, descendente=descendente, skip=skip, limit=limit
+            )
+    
+    total = render_grid(
+        "reservas",
+        cargar_pagina,
+        columnas={
+            "ID": lambda fila: fila[0].id_reserva,
+            "Funcionário": lambda fila: f"{fila[1].nombre} {fila[1].apellido}" if fila[1] else "Funcionário não encontrado",
+            "Ferramenta": lambda fila: fila[2].nombre if fila[2] else "Ferramenta não encontrada",
+            "Início": lambda fila: format_date_short(fila[0].fecha_inicio),
+            "Fim": lambda fila: format_date_short(fila[0].fecha_fin),
+            "Unidades": lambda fila: fila[0].cantidad,
+            "Estado": lambda fila: estado_texto(fila[0]),
+        },
+        id_de=lambda fila: fila[0].id_reserva,
+        render_detalle=lambda fila: render_reserva_details(*fila),
+        opciones_orden={
+            "Início": "fecha_inicio",
+            "Fim": "fecha_fin",
+            "ID": "id",
+            "Funcionário": "empleado",
+            "Ferramenta": "herramienta",
+        },
+        filtros=(estado,),
+    )
+    
+    if total == 0:
+        st.info("Não há reservas que coincidam com os filtros.")
+
+
+def _encolar(tipo, mensaje, **parametros):
+    """Encolar una tarea en segundo plano; la página no espera a que termine."""
+    with Session(get_db_engine()) as session:
+        tarea = encolar_tarea(session, tipo, **parametros)
+    queue_success(f"{mensaje} (tarefa #{tarea.id_tarea})")
+
+
+@tramo
+def render_tareas_prestamos():
+    """Renderizar las operaciones en lote y su progreso."""
+    engine = get_db_engine()
+
+    st.markdown("#### ↩️ Devolver todos os empréstimos de um funcionário")
+    texto_empleado = st.text_input(
+        "🔍 Buscar funcionário",
+        placeholder="Nome, sobrenome ou departamento...",
+        key="tarea_buscar_empleado"
+    )
+    with Session(engine) as session:
+        empleados = autocompletar_empleados(session, texto_empleado, limite=LIMITE_OPCIONES)
+    if empleados:
+        empleado_options = {e.id: f"{e.nombre} {e.apellido} ({e.area}) - Ativos: {e.prestamos_activos}" for e in empleados}
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            empleado_id = st.selectbox(
+                "Funcionário",
+                options=list(empleado_options.keys()),
+                format_func=empleado_options.get,
+                key="tarea_empleado"
+            )
+        with col2:
+            st.button(
+                "Devolver todos",
+                key="tarea_devolver",
+                on_click=_encolar,
+                args=("devolver_prestamos", "Devolução em lote iniciada"),
+                kwargs={"empleado_id": empleado_id},
+            )
+    elif texto_empleado:
+        st.warning("Nenhum funcionário ativo coincide com a busca")
+
+    st.markdown("#### 🛠️ Manutenção")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.button(
+            "📁 Arquivar empréstimos antigos",
+            key="tarea_archivar",
+            on_click=_encolar,
+            args=("archivar_prestamos", "Arquivamento iniciado"),
+        )
+    with col2:
+        st.button(
+            "🔢 Reconciliar contadores",
+            key="tarea_reconciliar",
+            on_click=_encolar,
+            args=("reconciliar_contadores", "Reconciliação iniciada"),
+        )
+    with col3:
+        st.button(
+            "✉️ Enviar avisos de vencimento",
+            key="tarea_avisos",
+            on_click=_encolar,
+            args=("avisos_vencidos", "Envio de avisos iniciado"),
+        )
+
+    st.markdown("#### Tarefas recentes")
+    render_tareas(engine)
+
+
+@medir_pagina("Emprestimos")
+@trazar_pagina("Emprestimos")
 def main():
     """Punto de entrada principal de la página."""
     # Establecer página actual
@@ -336,18 +725,26 @@ def main():
         unsafe_allow_html=True
     )
     
-    # Obtener préstamos
-    engine = get_db_engine()
-    with Session(engine) as session:
-        prestamos = get_prestamos(session)
+    tab_prestamos, tab_reservas, tab_tareas = st.tabs(["📦 Empréstimos", "📅 Reservas", "⚙️ Tarefas"])
     
-    # Mostrar formulario para nuevo préstamo
-    render_prestamo_form()
+    with tab_prestamos:
+        # Mostrar formulario para nuevo préstamo
+        render_prestamo_form()
+        
+        st.markdown("---")
+        
+        # Mostrar lista de préstamos
+        render_prestamos_list()
     
-    st.markdown("---")
+    with tab_reservas:
+        render_reserva_form()
+        
+        st.markdown("---")
+        
+        render_reservas_list()
     
-    # Mostrar lista de préstamos
-    render_prestamos_list(prestamos)
+    with tab_tareas:
+        render_tareas_prestamos()
     
     # Inicializar estado de sesión para confirmaciones
     if "confirm_devolver" not in st.session_state:
@@ -6,25 +6,30 @@ Permite:
 - Ver préstamos vencidos
 - Estadísticas de uso por empleado
 - Disponibilidad de herramientas
+- Utilización de las herramientas (fracción del stock prestada, pico y días ociosos)
+- Duración y atraso de los préstamos (mediana y percentil 90 por categoría y área)
 """
 
 import streamlit as st
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session
 from datetime import datetime, timedelta
-from collections import Counter
-from app.database.config import engine
-from app.crud import (
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_prestamo import (
     get_prestamos,
-    get_prestamos_activos,
     get_prestamos_vencidos,
-    get_prestamos_por_empleado,
-    get_prestamos_por_herramienta,
-    get_empleados,
-    get_herramientas,
-    get_empleado_by_id,
-    get_herramienta_by_id
 )
-from app.models.empleado import Empleado
+from app.crud.crud_categoria import get_diccionario_categorias
+from app.crud.crud_reporte import (
+    get_herramientas_mas_solicitadas,
+    get_empleados_mas_activos,
+    get_estadisticas_generales,
+)
+from app.crud.utilizacion import get_utilizacion_herramientas
+from app.crud.estadisticas import get_antiguedad_vencidos, get_estadisticas_duracion
+from app.models.prestamo import Prestamo
+from frontend.trazas import tramo, trazar_pagina
 from frontend.utils import format_date_short
 
 
@@ -32,95 +37,10 @@ from frontend.utils import format_date_short
 @st.cache_resource
 def get_db_engine():
     """Obtener el motor de base de datos."""
-    return engine
-
-
-def get_herramientas_mas_solicitadas(session, top_n=5):
-    """Obtener las herramientas más solicitadas."""
-    prestamos = get_prestamos(session)
-    
-    # Contar préstamos por herramienta y recolectar IDs de empleados
-    herramienta_data = {}
-    for prestamo in prestamos:
-        if prestamo.id_herramienta_h not in herramienta_data:
-            herramienta_data[prestamo.id_herramienta_h] = {
-                'count': 0,
-                'empleados': set()
-            }
-        herramienta_data[prestamo.id_herramienta_h]['count'] += 1
-        herramienta_data[prestamo.id_herramienta_h]['empleados'].add(prestamo.id_empleado_h)
-    
-    # Obtener las herramientas más solicitadas
-    top_herramientas = sorted(herramienta_data.items(), key=lambda x: x[1]['count'], reverse=True)[:top_n]
-    
-    # Obtener detalles de las herramientas y nombres de empleados
-    resultado = []
-    for herramienta_id, data in top_herramientas:
-        herramienta = get_herramienta_by_id(session, herramienta_id)
-        if herramienta:
-            # Obtener nombres de empleados
-            empleados_nombres = []
-            for empleado_id in data['empleados']:
-                empleado = session.get(Empleado, empleado_id)
-                if empleado:
-                    empleados_nombres.append(f"{empleado.nombre} {empleado.apellido}")
-            
-            resultado.append({
-                "herramienta": herramienta,
-                "prestamos": data['count'],
-                "empleados": empleados_nombres
-            })
-    
-    return resultado
-
-
-def get_empleados_mas_activos(session, top_n=5):
-    """Obtener los empleados con más préstamos."""
-    prestamos = get_prestamos(session)
-    
-    # Contar préstamos por empleado
-    empleado_counts = Counter()
-    for prestamo in prestamos:
-        empleado_counts[prestamo.id_empleado_h] += 1
-    
-    # Obtener los empleados más activos
-    top_empleados = empleado_counts.most_common(top_n)
-    
-    # Obtener detalles de los empleados
-    resultado = []
-    for empleado_id, count in top_empleados:
-        empleado = get_empleado_by_id(session, empleado_id)
-        if empleado:
-            resultado.append({
-                "empleado": empleado,
-                "prestamos": count
-            })
-    
-    return resultado
-
-
-def get_estadisticas_generales(session):
-    """Obtener estadísticas generales."""
-    prestamos = get_prestamos(session)
-    prestamos_activos = get_prestamos_activos(session)
-    prestamos_vencidos = get_prestamos_vencidos(session)
-    empleados = get_empleados(session)
-    herramientas = get_herramientas(session)
-    
-    return {
-        "total_prestamos": len(prestamos),
-        "prestamos_activos": len(prestamos_activos),
-        "prestamos_vencidos": len(prestamos_vencidos),
-        "prestamos_devueltos": sum(1 for p in prestamos if p.estado == "devuelto"),
-        "prestamos_cancelados": sum(1 for p in prestamos if p.estado == "cancelado"),
-        "total_empleados": len(empleados),
-        "empleados_activos": sum(1 for e in empleados if e.activo),
-        "total_herramientas": len(herramientas),
-        "herramientas_activas": sum(1 for h in herramientas if h.estado),
-        "herramientas_disponibles": sum(h.cantidad_disponible for h in herramientas)
-    }
+    return get_engine()
 
 
+@tramo
 def render_reporte_herramientas_solicitadas():
     """Renderizar reporte de herramientas más solicitadas."""
     st.markdown(
@@ -136,6 +56,7 @@ def render_reporte_herramientas_solicitadas():
     engine = get_db_engine()
     with Session(engine) as session:
         herramientas = get_herramientas_mas_solicitadas(session, top_n=10)
+        categorias = get_diccionario_categorias(session)
     
     if not herramientas:
         st.info("Não há empréstimos registrados ainda.")
@@ -147,7 +68,7 @@ def render_reporte_herramientas_solicitadas():
             "Posição": i + 1,
             "Ferramenta": h["herramienta"].nombre,
             "Código": h["herramienta"].codigo_interno,
-            "Categoria": h["herramienta"].categoria,
+            "Categoria": categorias.nombre(h["herramienta"].id_categoria_h),
             "Empréstimos": ", ".join(h["empleados"]) if h["empleados"] else "Nenhum",
             "Estoque": h["herramienta"].cantidad_disponible
         } for i, h in enumerate(herramientas)],
@@ -156,6 +77,7 @@ def render_reporte_herramientas_solicitadas():
     )
 
 
+@tramo
 def render_reporte_prestamos_vencidos():
     """Renderizar reporte de préstamos vencidos."""
     st.markdown(
@@ -170,7 +92,10 @@ def render_reporte_prestamos_vencidos():
     
     engine = get_db_engine()
     with Session(engine) as session:
-        prestamos_vencidos = get_prestamos_vencidos(session)
+        # Empleado y herramienta de todos los préstamos en una consulta por tabla
+        prestamos_vencidos = get_prestamos_vencidos(
+            session, opciones_carga=(selectinload(Prestamo.empleado), selectinload(Prestamo.herramienta))
+        )
     
     if not prestamos_vencidos:
         st.success("✅ Não há empréstimos vencidos")
@@ -182,10 +107,17 @@ def render_reporte_prestamos_vencidos():
     # Mostrar alerta
     st.warning(f"🚨 Há {len(prestamos_vencidos)} empréstimos vencidos")
     
+    # Antigüedad de los vencidos, contada en la base de datos
+    with Session(engine) as session:
+        antiguedad = get_antiguedad_vencidos(session)
+        categorias = get_diccionario_categorias(session)
+    for columna, (etiqueta, cantidad) in zip(st.columns(len(antiguedad)), antiguedad.items()):
+        with columna:
+            st.metric(f"{etiqueta} dias", cantidad)
+    
     # Mostrar en tabla
     for prestamo in prestamos_vencidos:
-        empleado = get_empleado_by_id(session, prestamo.id_empleado_h)
-        herramienta = get_herramienta_by_id(session, prestamo.id_herramienta_h)
+        empleado, herramienta = prestamo.empleado, prestamo.herramienta
         
         with st.expander(
             f"Empréstimo #{prestamo.id_prestamo} - {empleado.nombre} {empleado.apellido} → {herramienta.nombre}",
@@ -201,7 +133,7 @@ def render_reporte_prestamos_vencidos():
             with col2:
                 st.write(f"**Ferramenta:** {herramienta.nombre}")
                 st.write(f"**Código:** {herramienta.codigo_interno}")
-                st.write(f"**Categoria:** {herramienta.categoria}")
+                st.write(f"**Categoria:** {categorias.nombre(herramienta.id_categoria_h)}")
             
             with col3:
                 st.write(f"**Data do Empréstimo:** {format_date_short(prestamo.fecha_prestamo)}")
@@ -210,6 +142,7 @@ def render_reporte_prestamos_vencidos():
                 st.write(f"**Dias Vencidos:** {dias_vencidos} dias")
 
 
+@tramo
 def render_reporte_empleados_activos():
     """Renderizar reporte de empleados más activos."""
     st.markdown(
@@ -244,6 +177,7 @@ def render_reporte_empleados_activos():
     )
 
 
+@tramo
 def render_estadisticas_generales():
     """Renderizar estadísticas generales."""
     st.markdown(
@@ -315,6 +249,8 @@ def render_estadisticas_generales():
         })
 
 
+@st.fragment
+@tramo
 def render_reporte_por_fecha():
     """Renderizar reporte filtrado por fecha."""
     st.markdown(
@@ -328,28 +264,13 @@ def render_reporte_por_fecha():
     )
     
     engine = get_db_engine()
-    with Session(engine) as session:
-        prestamos = get_prestamos(session)
-    
-    if not prestamos:
-        st.info("Não há empréstimos registrados ainda.")
-        return
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Convertir datetime a date para el min_value y manejar el caso de lista vacía
-        min_date = min(p.fecha_prestamo.date() for p in prestamos) if prestamos else datetime.now().date()
-        
-        # Asegurar que el valor por defecto sea al menos min_date
-        default_start = datetime.now() - timedelta(days=30)
-        if default_start.date() < min_date:
-            default_start = datetime.combine(min_date, datetime.min.time())
-        
         fecha_inicio = st.date_input(
             "Data Inicial",
-            value=default_start,
-            min_value=min_date
+            value=datetime.now() - timedelta(days=30)
         )
     
     with col2:
@@ -359,11 +280,17 @@ def render_reporte_por_fecha():
             min_value=fecha_inicio
         )
     
-    # Filtrar préstamos por fecha
-    prestamos_filtrados = [
-        p for p in prestamos
-        if fecha_inicio <= p.fecha_prestamo.date() <= fecha_fin
-    ]
+    # Solo los préstamos del período; los archivados se leen si el período los alcanza
+    with Session(engine) as session:
+        prestamos_filtrados = get_prestamos(
+            session,
+            limit=None,
+            desde=datetime.combine(fecha_inicio, datetime.min.time()),
+            hasta=datetime.combine(fecha_fin, datetime.max.time()),
+            # Con el archivo la consulta es sobre un alias: opciones en función de la entidad
+            opciones_carga=(lambda P: selectinload(P.empleado), lambda P: selectinload(P.herramienta)),
+        )
+        categorias = get_diccionario_categorias(session)
     
     if not prestamos_filtrados:
         st.info("Não há empréstimos no período selecionado.")
@@ -388,8 +315,7 @@ def render_reporte_por_fecha():
     
     # Mostrar préstamos
     for prestamo in prestamos_filtrados:
-        empleado = get_empleado_by_id(session, prestamo.id_empleado_h)
-        herramienta = get_herramienta_by_id(session, prestamo.id_herramienta_h)
+        empleado, herramienta = prestamo.empleado, prestamo.herramienta
         
         with st.expander(
             f"Empréstimo #{prestamo.id_prestamo} - {empleado.nombre} {empleado.apellido} → {herramienta.nombre}",
@@ -403,13 +329,211 @@ def render_reporte_por_fecha():
             
             with col2:
                 st.write(f"**Ferramenta:** {herramienta.nombre}")
-                st.write(f"**Categoria:** {herramienta.categoria}")
+                st.write(f"**Categoria:** {categorias.nombre(herramienta.id_categoria_h)}")
             
             with col3:
                 st.write(f"**Funcionário:** {empleado.nombre} {empleado.apellido}")
                 st.write(f"**Departamento:** {empleado.area}")
 
 
+@st.fragment
+@tramo
+def render_reporte_utilizacion():
+    """Renderizar la utilización de las herramientas en un período."""
+    st.markdown(
+        """
+        <div class="page-title">
+            <span class="icon">📈</span>
+            <h2>Utilização das Ferramentas</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fecha_inicio = st.date_input(
+            "Data Inicial",
+            value=datetime.now() - timedelta(days=90),
+            key="utilizacion_inicio"
+        )
+    
+    with col2:
+        fecha_fin = st.date_input(
+            "Data Final",
+            value=datetime.now(),
+            min_value=fecha_inicio,
+            key="utilizacion_fin"
+        )
+    
+    # El cálculo recorre todos los préstamos del período: solo al pedirlo,
+    # y el resultado queda en la sesión para no repetirlo en cada ejecución
+    if st.button("📈 Calcular utilização", key="calcular_utilizacion"):
+        with st.spinner("Calculando utilização..."):
+            with Session(get_db_engine()) as session:
+                st.session_state.utilizacion = get_utilizacion_herramientas(
+                    session,
+                    desde=datetime.combine(fecha_inicio, datetime.min.time()),
+                    hasta=datetime.combine(fecha_fin, datetime.max.time()),
+                )
+    
+    resultado = st.session_state.get("utilizacion")
+    if resultado is None:
+        st.info("Selecione o período e clique em Calcular utilização.")
+        return
+    
+    st.caption(
+        f"Período: {format_date_short(resultado['desde'])} a {format_date_short(resultado['hasta'])} "
+        f"({resultado['dias']} dias, {resultado['prestamos']} empréstimos)"
+    )
+    
+    sin_uso = sum(1 for h in resultado["herramientas"] if h["dias_ociosos"] == resultado["dias"])
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Utilização Média", f"{resultado['utilizacion']:.1%}", help="Fração das unidades emprestadas no período")
+    
+    with col2:
+        st.metric("Pico Simultâneo", resultado["pico"], help="Máximo de unidades emprestadas ao mesmo tempo")
+    
+    with col3:
+        st.metric("Ferramentas Sem Uso", sin_uso, help="Ferramentas sem nenhum empréstimo no período")
+    
+    st.line_chart(
+        [{"Data": d["fecha"], "Unidades emprestadas": d["unidades_prestadas"]} for d in resultado["diaria"]],
+        x="Data",
+        y="Unidades emprestadas"
+    )
+    
+    st.dataframe(
+        [{
+            "Ferramenta": h["nombre"],
+            "Código": h["codigo_interno"],
+            "Unidades": h["unidades"],
+            "Utilização": h["utilizacion"],
+            "Pico": h["pico"],
+            "Horas Emprestadas": h["horas_prestadas"],
+            "Dias Ociosos": h["dias_ociosos"],
+            "Estado": "✅ Ativa" if h["estado"] else "❌ Inativa"
+        } for h in resultado["herramientas"]],
+        column_config={
+            "Utilização": st.column_config.ProgressColumn(min_value=0, max_value=1, format="percent"),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+
+def _tabla_percentiles(filas, titulo_grupo, sin_grupo):
+    """Tabla de medianas y percentiles 90 (en dias) de duración y atraso por grupo."""
+    st.dataframe(
+        [{
+            titulo_grupo: f["grupo"] or sin_grupo,
+            "Empréstimos": f["prestamos"],
+            "Duração Mediana": f["duracion_mediana"],
+            "Duração P90": f["duracion_p90"],
+            "Atraso Mediano": f["atraso_mediana"],
+            "Atraso P90": f["atraso_p90"]
+        } for f in filas],
+        column_config={
+            columna: st.column_config.NumberColumn(format="%.1f dias")
+            for columna in ("Duração Mediana", "Duração P90", "Atraso Mediano", "Atraso P90")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+
+@st.fragment
+@tramo
+def render_reporte_duracion():
+    """Renderizar la duración y el atraso de los préstamos por categoría y área."""
+    st.markdown(
+        """
+        <div class="page-title">
+            <span class="icon">⏱️</span>
+            <h2>Duração e Atraso dos Empréstimos</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fecha_inicio = st.date_input(
+            "Data Inicial",
+            value=datetime.now() - timedelta(days=90),
+            key="duracion_inicio"
+        )
+    
+    with col2:
+        fecha_fin = st.date_input(
+            "Data Final",
+            value=datetime.now(),
+            min_value=fecha_inicio,
+            key="duracion_fin"
+        )
+    
+    # Igual que la utilización: solo al pedirlo (el resultado además queda
+    # cacheado hasta que cambien los datos)
+    if st.button("⏱️ Calcular prazos", key="calcular_duracion"):
+        with st.spinner("Calculando prazos..."):
+            with Session(get_db_engine()) as session:
+                st.session_state.duracion = get_estadisticas_duracion(
+                    session,
+                    desde=datetime.combine(fecha_inicio, datetime.min.time()),
+                    hasta=datetime.combine(fecha_fin, datetime.max.time()),
+                )
+    
+    resultado = st.session_state.get("duracion")
+    if resultado is None:
+        st.info("Selecione o período e clique em Calcular prazos.")
+        return
+    
+    general = resultado["general"]
+    st.caption(
+        f"Período: {format_date_short(resultado['desde'])} a {format_date_short(resultado['hasta'])} "
+        f"({general['prestamos']} empréstimos, {general['devueltos']} devolvidos)"
+    )
+    
+    if not general["prestamos"]:
+        st.info("Não há empréstimos no período.")
+        return
+    
+    dias = lambda valor: "N/A" if valor is None else f"{valor:.1f} dias"  # noqa: E731
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Duração Mediana", dias(general["duracion_mediana"]))
+    
+    with col2:
+        st.metric("Duração P90", dias(general["duracion_p90"]), help="90% dos empréstimos devolvidos duraram até")
+    
+    with col3:
+        st.metric("Atraso Mediano", dias(general["atraso_mediana"]))
+    
+    with col4:
+        st.metric("Atraso P90", dias(general["atraso_p90"]), help="90% dos empréstimos atrasaram até")
+    
+    st.markdown("#### Por Categoria")
+    _tabla_percentiles(resultado["por_categoria"], "Categoria", "Sem categoria")
+    
+    st.markdown("#### Por Departamento")
+    _tabla_percentiles(resultado["por_area"], "Departamento", "Sem departamento")
+    
+    st.markdown("#### Empréstimos Vencidos por Dias de Atraso")
+    st.bar_chart(
+        [{"Dias de atraso": etiqueta, "Empréstimos": cantidad} for etiqueta, cantidad in resultado["vencidos"].items()],
+        x="Dias de atraso",
+        y="Empréstimos",
+        sort=False
+    )
+
+
+@medir_pagina("Relatorios")
+@trazar_pagina("Relatorios")
 def main():
     """Punto de entrada principal de la página."""
     # Establecer página actual
@@ -440,11 +564,13 @@ def main():
     st.markdown("---")
     
     # Mostrar reportes
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "🔝 Ferramentas Solicitadas",
         "⚠️ Empréstimos Vencidos",
         "👥 Funcionários Ativos",
-        "📅 Filtro por Data"
+        "📅 Filtro por Data",
+        "📈 Utilização",
+        "⏱️ Prazos"
     ])
     
     with tab1:
@@ -458,6 +584,12 @@ def main():
     
     with tab4:
         render_reporte_por_fecha()
+    
+    with tab5:
+        render_reporte_utilizacion()
+    
+    with tab6:
+        render_reporte_duracion()
 
 
 if __name__ == "__main__":
@@ -11,27 +11,43 @@ Permite:
 
 import streamlit as st
 from sqlmodel import Session
-from app.database.config import engine
-from app.crud import (
+from app.database.config import get_engine
+from app.metricas import medir_pagina
+from app.crud.crud_categoria import (
     create_categoria,
-    get_categorias,
     get_categoria_by_id,
     update_categoria,
     inhabilitar_categoria,
     habilitar_categoria,
     delete_categoria,
-    get_categorias_activas,
+    buscar_categorias,
+    contar_categorias,
+    get_herramientas_por_categoria,
+)
+from app.crud.concurrencia import ConflictoVersion
+from frontend.grid import render_grid
+from frontend.trazas import tramo, trazar_pagina
+from frontend.utils import (
+    show_success,
+    queue_success,
+    show_pending_messages,
+    show_error,
+    show_info,
+    validate_required_fields,
+    clave_formulario,
+    renovar_clave_formulario,
 )
-from frontend.utils import show_success, show_error, show_info, validate_required_fields
 
 
 # Cachear o motor de base de dados (não a sessão)
 @st.cache_resource
 def get_db_engine():
     """Obter o motor de base de dados."""
-    return engine
+    return get_engine()
 
 
+@st.fragment
+@tramo
 def render_categoria_form(categoria=None):
     """Renderizar formulário para criar/editar categoria."""
     if categoria:
@@ -62,7 +78,9 @@ def render_categoria_form(categoria=None):
             del st.session_state["editing_categoria_id"]
             st.rerun()
     
-    with st.form(key=f"categoria_form_{categoria.id_categoria if categoria else 'new'}"):
+    # Un envío repetido del formulario de alta no crea una segunda categoría
+    clave = None if categoria else clave_formulario("categoria")
+    with st.form(key=f"categoria_form_{categoria.id_categoria if categoria else clave}"):
         nombre = st.text_input("Nome da Categoria", value=categoria.nombre if categoria else "")
         
         # Solo mostrar checkbox de estado para categorías existentes
@@ -92,12 +110,15 @@ def render_categoria_form(categoria=None):
                 with Session(engine) as session:
                     if categoria:
                         # Atualizar categoria existente
-                        update_categoria(
+                        # Com a versão aberta para edição: se outro usuário a alterou, não sobrescreve
+                        atualizada = update_categoria(
                             session,
                             categoria.id_categoria,
+                            version=st.session_state.get("editing_categoria_version"),
                             nombre=nombre,
                             estado=estado,
                         )
+                        st.session_state["editing_categoria_version"] = atualizada.version
                         show_success(f"Categoria {nombre} atualizada com sucesso")
                     else:
                         # Criar nova categoria
@@ -105,25 +126,46 @@ def render_categoria_form(categoria=None):
                             session,
                             nombre=nombre,
                             estado=estado,
+                            clave_idempotencia=clave,
                         )
+                        renovar_clave_formulario("categoria")
                         show_success(f"Categoria {nombre} criada com sucesso")
                 
                 # Recarregar a página para ver as alterações
                 st.rerun()
                 
+            except ConflictoVersion as e:
+                # La próxima vez que guarde, el usuario ya vio el aviso
+                st.session_state["editing_categoria_version"] = e.actual
+                show_error(
+                    "Esta categoria foi alterada por outro usuário enquanto você editava. "
+                    "Revise os dados e salve novamente para sobrescrever."
+                )
             except Exception as e:
                 show_error(f"Erro ao salvar categoria: {str(e)}")
     
     return None
 
 
+def _cambiar_estado_categoria(categoria, estado):
+    """Ativar ou desativar uma categoria a partir de um botão da lista."""
+    engine = get_db_engine()
+    with Session(engine) as session:
+        if estado:
+            habilitar_categoria(session, categoria.id_categoria)
+        else:
+            inhabilitar_categoria(session, categoria.id_categoria)
+    queue_success(f"Categoria {categoria.nombre} {'ativada' if estado else 'desativada'}")
+
+
+@tramo
 def render_categoria_details(categoria):
     """Renderizar detalhes de uma categoria."""
     # Ícone diferente para categorias inativas
     icono = "📁" if categoria.estado else "🗑️"
     estado_texto = " (Ativa)" if categoria.estado else " (Inativa)"
     
-    with st.expander(f"{icono} {categoria.nombre}{estado_texto}", expanded=False):
+    with st.expander(f"{icono} {categoria.nombre}{estado_texto}", expanded=True):
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -132,8 +174,6 @@ def render_categoria_details(categoria):
             # Obter ferramentas associadas a esta categoria
             engine = get_db_engine()
             with Session(engine) as session:
-                # Importar aqui para evitar circular imports
-                from app.crud import get_herramientas_por_categoria
                 herramientas = get_herramientas_por_categoria(session, categoria.id_categoria)
             
             # if herramientas:
@@ -149,22 +189,17 @@ def render_categoria_details(categoria):
             if st.button("📝 Editar", key=f"edit_categoria_{categoria.id_categoria}"):
                 # Salvar que viemos da lista para voltar depois de salvar
                 st.session_state["editing_categoria_id"] = categoria.id_categoria
+                st.session_state["editing_categoria_version"] = categoria.version
                 st.rerun()
             
+            # As ações rodam num callback: o clique recarrega apenas o fragmento
+            # da lista, que já encontra os dados atualizados
             if categoria.estado:
-                if st.button("❌ Desativar", key=f"disable_categoria_{categoria.id_categoria}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        inhabilitar_categoria(session, categoria.id_categoria)
-                    show_success(f"Categoria {categoria.nombre} desativada")
-                    st.rerun()
+                st.button("❌ Desativar", key=f"disable_categoria_{categoria.id_categoria}",
+                          on_click=_cambiar_estado_categoria, args=(categoria, False))
             else:
-                if st.button("✅ Ativar", key=f"enable_categoria_{categoria.id_categoria}"):
-                    engine = get_db_engine()
-                    with Session(engine) as session:
-                        habilitar_categoria(session, categoria.id_categoria)
-                    show_success(f"Categoria {categoria.nombre} ativada")
-                    st.rerun()
+                st.button("✅ Ativar", key=f"enable_categoria_{categoria.id_categoria}",
+                          on_click=_cambiar_estado_categoria, args=(categoria, True))
             
             # Botão para eliminar categoria
             if st.button("🗑️ Excluir", key=f"delete_categoria_{categoria.id_categoria}"):
@@ -190,13 +225,17 @@ def render_categoria_details(categoria):
                             st.rerun()
 
 
+@st.fragment
+@tramo
 def render_categorias_list():
     """Renderizar lista de todas as categorias."""
+    show_pending_messages()
+
     engine = get_db_engine()
     with Session(engine) as session:
-        categorias = get_categorias(session)
+        conteo = contar_categorias(session)
     
-    if not categorias:
+    if conteo["total"] == 0:
         st.info("Não há categorias registradas. Adicione uma usando o formulário.")
         return
     
@@ -213,32 +252,49 @@ def render_categorias_list():
     
     with col2:
         # Estatísticas rápidas
-        categorias_activas = len([c for c in categorias if c.estado == True])
-        st.metric("📁 Ativas", categorias_activas)
+        st.metric("📁 Ativas", conteo["activas"])
     
     with col3:
         # Estatísticas rápidas
-        categorias_inactivas = len([c for c in categorias if c.estado == False])
-        st.metric("⚠️ Inativas", categorias_inactivas)
+        st.metric("⚠️ Inativas", conteo["inactivas"])
     
-    # Filtrar categorias segundo a seleção
-    if filter_estado == "Ativas":
-        categorias_filtradas = [c for c in categorias if c.estado == True]
-    elif filter_estado == "Inativas":
-        categorias_filtradas = [c for c in categorias if c.estado == False]
-    else:
-        categorias_filtradas = categorias
+    # Filtrar categorias segundo a seleção (na base de dados)
+    estado = {"Ativas": True, "Inativas": False}.get(filter_estado)
     
-    # Mostrar total filtrado
-    st.info(f"Mostrando {len(categorias_filtradas)} de {len(categorias)} categorias")
+    def cargar_pagina(skip, limit, orden, descendente):
+        with Session(engine) as session:
+            return buscar_categorias(
+                session,
+                estado=estado,
+                orden=orden,
+                descendente=descendente,
+                skip=skip,
+                limit=limit,
+            )
     
     st.markdown("---")
     
-    # Mostrar categorias filtradas
-    for categoria in categorias_filtradas:
-        render_categoria_details(categoria)
+    # Lista paginada; o detalhe só é carregado para a linha selecionada
+    render_grid(
+        "categorias",
+        cargar_pagina,
+        columnas={
+            "ID": lambda c: c.id_categoria,
+            "Nome": lambda c: c.nombre,
+            "Estado": lambda c: "✅ Ativa" if c.estado else "⚠️ Inativa",
+        },
+        id_de=lambda c: c.id_categoria,
+        render_detalle=render_categoria_details,
+        opciones_orden={
+            "Nome": "nombre",
+            "ID": "id",
+        },
+        filtros=(estado,),
+    )
 
 
+@medir_pagina("Categorias")
+@trazar_pagina("Categorias")
 def main():
     """Ponto de entrada principal da página."""
     # Estabelecer página atual
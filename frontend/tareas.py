@@ -0,0 +1,88 @@
+"""
+Panel de tareas en segundo plano.
+
+Muestra las últimas tareas encoladas con su progreso y un botón para
+cancelarlas. Mientras haya tareas pendientes o en curso, el panel se vuelve a
+dibujar solo cada INTERVALO_ACTUALIZACION segundos, sin recargar la página.
+"""
+
+import streamlit as st
+from sqlmodel import Session
+
+from app.tareas import ESTADOS_ACTIVOS, cancelar_tarea, get_tareas
+from frontend.utils import format_date, queue_success
+
+
+# Segundos entre dos consultas del progreso mientras hay tareas activas
+INTERVALO_ACTUALIZACION = 2
+
+NOMBRES = {
+    "devolver_prestamos": "Devolução em lote",
+    "archivar_prestamos": "Arquivamento de empréstimos",
+    "reconciliar_contadores": "Reconciliação de contadores",
+    "avisos_vencidos": "Avisos de vencimento",
+}
+
+ESTADOS = {
+    "pendiente": "⏳ Na fila",
+    "en_curso": "▶️ Em andamento",
+    "terminada": "✅ Concluída",
+    "fallida": "❌ Falhou",
+    "cancelada": "⛔ Cancelada",
+}
+
+
+def _cancelar(engine, tarea_id):
+    with Session(engine) as session:
+        if cancelar_tarea(session, tarea_id):
+            queue_success("Cancelamento solicitado")
+
+
+def _render_lista(engine, tipos, limite, sondeo):
+    with Session(engine) as session:
+        tareas = get_tareas(session, tipos, limit=limite)
+
+    activas = any(t.estado in ESTADOS_ACTIVOS for t in tareas)
+    if sondeo and not activas:
+        # Terminaron todas: recargar la página deja de consultar el progreso
+        st.rerun()
+
+    if not tareas:
+        st.caption("Nenhuma tarefa executada ainda")
+        return
+
+    for tarea in tareas:
+        with st.container(border=True):
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**#{tarea.id_tarea} · {NOMBRES.get(tarea.tipo, tarea.tipo)}** · {ESTADOS.get(tarea.estado, tarea.estado)}")
+                actor = f" por {tarea.actor}" if tarea.actor else ""
+                st.caption(f"{format_date(tarea.fecha_creacion)}{actor}")
+                if tarea.estado == "en_curso":
+                    st.progress(tarea.progreso, text=tarea.mensaje)
+                elif tarea.estado == "terminada" and tarea.resultado:
+                    st.caption(" · ".join(
+                        f"{campo}: {len(valor) if isinstance(valor, list) else valor}"
+                        for campo, valor in tarea.resultado.items()
+                    ))
+                elif tarea.estado == "fallida":
+                    st.caption(f"Erro: {tarea.error}")
+            with col2:
+                if tarea.estado in ESTADOS_ACTIVOS:
+                    st.button(
+                        "Cancelar",
+                        key=f"cancelar_tarea_{tarea.id_tarea}",
+                        disabled=tarea.cancelar,
+                        on_click=_cancelar,
+                        args=(engine, tarea.id_tarea),
+                    )
+
+
+def render_tareas(engine, tipos=None, limite=5):
+    """Dibujar las últimas tareas de los tipos dados (todas si `tipos` es None)."""
+    with Session(engine) as session:
+        activas = any(t.estado in ESTADOS_ACTIVOS for t in get_tareas(session, tipos, limit=limite))
+    # Solo se consulta periódicamente mientras hay algo que avanzar
+    st.fragment(_render_lista, run_every=INTERVALO_ACTUALIZACION if activas else None)(
+        engine, tipos, limite, activas
+    )
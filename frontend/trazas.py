@@ -0,0 +1,252 @@
+"""
+Registro de las ejecuciones lentas de las páginas.
+
+Cada página decora su `main` con `@trazar_pagina(nombre)` y sus funciones
+render_* con `@tramo`; así cada ejecución del script forma un árbol de tramos
+con la duración, las sentencias SQL y las filas de cada sección. Las
+sentencias se cuentan con los eventos de SQLAlchemy en todos los motores; las
+filas son las leídas por las consultas de una Session y las afectadas por
+INSERT, UPDATE y DELETE. Las filas leídas se cuentan a medida que el código
+las consume, sin copiar el resultado; cuentan para el tramo en que se
+ejecutó la consulta.
+
+Las ejecuciones que tardan UMBRAL_MS o más se agregan como una línea JSON a
+ARCHIVO_TRAZAS. Un fragmento (`st.fragment`) que se vuelve a ejecutar solo
+forma su propio árbol, con "pagina" en null.
+
+Fuera de una ejecución trazada, los eventos solo leen una ContextVar.
+
+Uso (resumen de las secciones más lentas):
+    python -m frontend.trazas trazas_lentas.jsonl --top 15
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, IteratorResult
+from sqlmodel import Session
+
+
+# Duración mínima de una ejecución para registrarla, en milisegundos
+UMBRAL_MS = float(os.getenv("TRAZAS_UMBRAL_MS", "1000"))
+
+# Archivo donde se agregan las ejecuciones lentas (una línea JSON por ejecución)
+ARCHIVO_TRAZAS = os.getenv("TRAZAS_ARCHIVO", "trazas_lentas.jsonl")
+
+# Tramo abierto en este hilo (cada ejecución del script corre en su propio hilo)
+_tramo_actual = ContextVar("tramo_actual", default=None)
+
+_lock_archivo = threading.Lock()
+
+
+class Tramo:
+    """Sección de una ejecución: duración, sentencias SQL y filas, con sus subtramos."""
+
+    __slots__ = ("nombre", "padre", "inicio", "duracion_ms", "sentencias", "filas", "error", "tramos")
+
+    def __init__(self, nombre: str, padre=None):
+        self.nombre = nombre
+        self.padre = padre
+        self.inicio = time.perf_counter()
+        self.duracion_ms = None
+        self.sentencias = 0
+        self.filas = 0
+        self.error = None
+        self.tramos = []
+
+    def cerrar(self):
+        self.duracion_ms = (time.perf_counter() - self.inicio) * 1000
+        if self.padre is not None:
+            # Los totales del padre incluyen los de sus subtramos
+            self.padre.sentencias += self.sentencias
+            self.padre.filas += self.filas
+            self.padre.tramos.append(self)
+
+    def a_dict(self) -> dict:
+        datos = {
+            "nombre": self.nombre,
+            "duracion_ms": round(self.duracion_ms, 2),
+            "sentencias": self.sentencias,
+            "filas": self.filas,
+        }
+        if self.error:
+            datos["error"] = self.error
+        if self.tramos:
+            datos["tramos"] = [t.a_dict() for t in self.tramos]
+        return datos
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _contar_sentencia(conn, cursor, statement, parameters, context, executemany):
+    tramo = _tramo_actual.get()
+    if tramo is None:
+        return
+    tramo.sentencias += 1
+    # Filas escritas; las leídas se cuentan en _contar_filas (en SQLite
+    # rowcount es -1 para un SELECT)
+    if context is not None and not context.isddl and (context.isinsert or context.isupdate or context.isdelete):
+        tramo.filas += max(cursor.rowcount, 0)
+
+
+def _contando(filas, tramo: Tramo):
+    for fila in filas:
+        tramo.filas += 1
+        yield fila
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _contar_filas(estado):
+    tramo = _tramo_actual.get()
+    opciones = estado.execution_options
+    if tramo is None or not estado.is_select or opciones.get("yield_per") or opciones.get("stream_results"):
+        return None
+    resultado = estado.invoke_statement()
+    if isinstance(resultado, IteratorResult):
+        # Contar cada fila cuando se lee del resultado (all, first, iterar, ...)
+        resultado.iterator = _contando(resultado.iterator, tramo)
+    return resultado
+
+
+class _Ejecucion:
+    """Abrir un tramo; si no hay uno abierto, es la raíz de una ejecución nueva."""
+
+    def __init__(self, nombre: str, pagina: str | None = None):
+        self.nombre = nombre
+        self.pagina = pagina
+
+    def __enter__(self):
+        padre = _tramo_actual.get()
+        self.raiz = padre is None
+        self.tramo = Tramo(self.nombre, padre)
+        self.token = _tramo_actual.set(self.tramo)
+        return self.tramo
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is not None:
+            # st.rerun y st.stop también terminan con una excepción
+            self.tramo.error = tipo.__name__
+        _tramo_actual.reset(self.token)
+        self.tramo.cerrar()
+        if self.raiz and self.tramo.duracion_ms >= UMBRAL_MS:
+            registrar(self.tramo, self.pagina)
+        return False
+
+
+def registrar(raiz: Tramo, pagina: str | None, archivo: str | None = None):
+    """Agregar la ejecución `raiz` como una línea JSON al archivo de trazas"""
+    linea = json.dumps(
+        {"fecha": datetime.now().isoformat(timespec="seconds"), "pagina": pagina, **raiz.a_dict()},
+        ensure_ascii=False,
+    )
+    try:
+        with _lock_archivo, open(archivo or ARCHIVO_TRAZAS, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    except OSError as e:
+        print(f"No se pudo escribir la traza: {e}", file=sys.stderr)
+
+
+def tramo(funcion):
+    """Decorador: medir cada llamada a una función render_* como un tramo con su nombre"""
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with _Ejecucion(funcion.__name__):
+            return funcion(*args, **kwargs)
+    return envoltura
+
+
+def trazar_pagina(pagina: str):
+    """Decorador para el `main` de una página: la raíz del árbol de cada ejecución"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with _Ejecucion(funcion.__name__, pagina):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _recorrer(nodo: dict, ruta: tuple):
+    """Cada tramo del árbol con su ruta y su tiempo propio (sin el de sus subtramos)"""
+    ruta = (*ruta, nodo["nombre"])
+    hijos = nodo.get("tramos", [])
+    propio = nodo["duracion_ms"] - sum(h["duracion_ms"] for h in hijos)
+    yield ruta, nodo, max(propio, 0.0)
+    for hijo in hijos:
+        yield from _recorrer(hijo, ruta)
+
+
+def _percentil(valores: list, fraccion: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fraccion * len(ordenados)))]
+
+
+def resumir(lineas, top: int = 15) -> list[dict]:
+    """
+    Agrupar los tramos de las ejecuciones registradas por página y ruta.
+
+    Args:
+        lineas: Líneas JSON del archivo de trazas
+        top: Cuántos tramos retornar
+
+    Returns:
+        Los `top` tramos con más tiempo propio acumulado, cada uno con
+        "pagina", "ruta" ("main > render_x"), "n", "propio_total_ms",
+        "p50_ms" y "p90_ms" (duración del tramo con sus subtramos), "max_ms"
+        y los promedios "sentencias" y "filas"
+    """
+    grupos = {}
+    for linea in lineas:
+        if not linea.strip():
+            continue
+        ejecucion = json.loads(linea)
+        for ruta, nodo, propio in _recorrer(ejecucion, ()):
+            grupo = grupos.setdefault((ejecucion.get("pagina"), ruta), {"duraciones": [], "propio": 0.0, "sentencias": 0, "filas": 0})
+            grupo["duraciones"].append(nodo["duracion_ms"])
+            grupo["propio"] += propio
+            grupo["sentencias"] += nodo["sentencias"]
+            grupo["filas"] += nodo["filas"]
+
+    filas = []
+    for (pagina, ruta), grupo in grupos.items():
+        n = len(grupo["duraciones"])
+        filas.append({
+            "pagina": pagina,
+            "ruta": " > ".join(ruta),
+            "n": n,
+            "propio_total_ms": round(grupo["propio"], 1),
+            "p50_ms": round(_percentil(grupo["duraciones"], 0.5), 1),
+            "p90_ms": round(_percentil(grupo["duraciones"], 0.9), 1),
+            "max_ms": round(max(grupo["duraciones"]), 1),
+            "sentencias": round(grupo["sentencias"] / n, 1),
+            "filas": round(grupo["filas"] / n, 1),
+        })
+    filas.sort(key=lambda f: f["propio_total_ms"], reverse=True)
+    return filas[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tramos más lentos de las ejecuciones registradas")
+    parser.add_argument("archivo", nargs="?", default=ARCHIVO_TRAZAS, help="Archivo de trazas (JSON por línea)")
+    parser.add_argument("--top", type=int, default=15, help="Cuántos tramos mostrar")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = parser.parse_args()
+
+    with open(args.archivo, encoding="utf-8") as f:
+        resumen = resumir(f, args.top)
+    if args.json:
+        print(json.dumps(resumen, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'propio ms':>10} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'max ms':>9} {'SQL':>6} {'filas':>7}  página · tramo")
+        for fila in resumen:
+            print(
+                f"{fila['propio_total_ms']:>10} {fila['n']:>5} {fila['p50_ms']:>9} {fila['p90_ms']:>9} "
+                f"{fila['max_ms']:>9} {fila['sentencias']:>6} {fila['filas']:>7}  {fila['pagina'] or '(fragmento)'} · {fila['ruta']}"
+            )
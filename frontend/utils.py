@@ -7,6 +7,8 @@ Este módulo contiene funciones de ayuda para formateo, validación y manipulaci
 import streamlit as st
 from datetime import datetime
 import json
+import re
+import uuid
 from pathlib import Path
 
 
@@ -30,6 +32,39 @@ def show_info(message):
     st.info(message)
 
 
+def queue_success(message):
+    """Guardar un mensaje de éxito para mostrarlo en la próxima ejecución (útil en callbacks)."""
+    st.session_state.setdefault("_pending_messages", []).append((message, None))
+
+
+def queue_error(message):
+    """Guardar un mensaje de error para mostrarlo en la próxima ejecución (útil en callbacks)."""
+    st.session_state.setdefault("_pending_messages", []).append((message, "❌"))
+
+
+def show_pending_messages():
+    """Mostrar como notificación los mensajes guardados con queue_success y queue_error."""
+    for message, icon in st.session_state.pop("_pending_messages", []):
+        st.toast(message, icon=icon)
+
+
+def clave_formulario(nombre):
+    """
+    Clave de idempotencia del formulario `nombre`: una por formulario mostrado.
+
+    Se usa también en la clave del formulario (o del botón). Un doble envío
+    llega con la misma clave y crea una sola fila; después de crear se llama a
+    renovar_clave_formulario, así un clic atrasado sobre el formulario anterior
+    ya no corresponde a ningún widget.
+    """
+    return st.session_state.setdefault(f"clave_formulario_{nombre}", uuid.uuid4().hex)
+
+
+def renovar_clave_formulario(nombre):
+    """Empezar un formulario nuevo, con otra clave, después de un envío exitoso."""
+    st.session_state[f"clave_formulario_{nombre}"] = uuid.uuid4().hex
+
+
 def format_date(date):
     """Formatear fecha para display."""
     if date:
@@ -61,11 +96,12 @@ def get_session():
     return _get_session()
 
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
 def validate_email(email):
     """Validar formato de correo electrónico."""
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 
 def validate_required_fields(**fields):
@@ -78,7 +114,7 @@ def validate_required_fields(**fields):
 
 def get_employee_name_by_id(employee_id, session):
     """Obtener nombre de empleado por ID."""
-    from app.crud import get_empleado_by_id
+    from app.crud.crud_empleado import get_empleado_by_id
     
     employee = get_empleado_by_id(session, employee_id)
     if employee:
@@ -88,7 +124,7 @@ def get_employee_name_by_id(employee_id, session):
 
 def get_tool_name_by_id(tool_id, session):
     """Obtener nombre de herramienta por ID."""
-    from app.crud import get_herramienta_by_id
+    from app.crud.crud_herramienta import get_herramienta_by_id
     
     tool = get_herramienta_by_id(session, tool_id)
     if tool:
@@ -13,6 +13,10 @@ Uso recomendado para Render:
    - DATABASE_URL: URL de la base de datos
    - STREAMLIT_SERVER_PORT: Puerto para Streamlit (default: 8501)
    - STREAMLIT_SERVER_ADDRESS: Dirección para Streamlit (default: 0.0.0.0)
+   - TAREAS_TRABAJADORES: Hilos que ejecutan las tareas en segundo plano
+     (default: 2; 0 si corren aparte con `python -m app.tareas`)
+   - METRICAS_PUERTO: Puerto local de las métricas de Prometheus en /metrics
+     (default: 9464; 0 las desactiva)
 """
 
 import os
@@ -64,8 +68,8 @@ def main():
         print(f"Error al cargar módulos: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Inicializar la base de datos (crear tablas si no existen)
-    # Esto es redundante pero asegura que todo esté en orden
+    # Inicializar la base de datos: aplicar las migraciones pendientes
+    # (con la base al día solo se consulta la versión del esquema)
     try:
         print("\n" + "=" * 60)
         print("📊 INICIALIZANDO BASE DE DATOS")
@@ -85,6 +89,22 @@ def main():
         print("Puerto: (se elegirá automáticamente)")
     print(f"Dirección: {os.getenv('STREAMLIT_SERVER_ADDRESS')}")
 
+    # Iniciar los trabajadores de la cola de tareas en este proceso: las
+    # páginas encolan las operaciones largas y retornan enseguida
+    from app.tareas import TRABAJADORES, iniciar_trabajadores
+
+    iniciar_trabajadores(engine)
+    print(f"Trabajadores de tareas: {TRABAJADORES}")
+
+    # Métricas del proceso (sentencias por función, pool, cachés y páginas)
+    # para Prometheus; se instrumenta antes de que las páginas importen app.crud
+    from app.metricas import iniciar_metricas
+
+    servidor_metricas = iniciar_metricas(engine)
+    if servidor_metricas:
+        host, puerto = servidor_metricas.server_address[:2]
+        print(f"Métricas: http://{host}:{puerto}/metrics")
+
     # Iniciar Streamlit directamente
     # Usamos sys.argv para pasar los argumentos directamente a Streamlit
     # Esto evita problemas con subprocess y es más compatible con Render
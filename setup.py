@@ -9,7 +9,12 @@ setup(
         "sqlmodel>=0.0.31",
         "sqlalchemy>=2.0.0",
         "pydantic>=2.0.0",
+        "numpy>=1.24.0",
     ],
+    extras_require={
+        # API HTTP para integraciones (app/api.py)
+        "api": ["starlette>=0.37.0", "uvicorn>=0.29.0"],
+    },
     python_requires=">=3.7",
     entry_points={
         "console_scripts": [
@@ -0,0 +1,58 @@
+"""Configuración compartida de pytest."""
+import os
+import tempfile
+
+import pytest
+
+# Usar una base de datos temporal para que importar app.database.config
+# no toque la base de datos de desarrollo
+_DB_PRUEBAS = os.path.join(tempfile.gettempdir(), "gestor_herramientas_test.db")
+if "DATABASE_URL" not in os.environ:
+    # Empezar cada corrida con una base vacía y con el esquema actual
+    if os.path.exists(_DB_PRUEBAS):
+        os.remove(_DB_PRUEBAS)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PRUEBAS}"
+
+# Un acceso a una relación no cargada falla en lugar de hacer una consulta
+# por objeto: el código debe pedir la carga con opciones (selectinload, ...)
+os.environ.setdefault("CARGA_RELACIONES", "raise_on_sql")
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+import app.models.aviso_prestamo  # noqa: F401  (registrar todas las tablas)
+import app.models.categoria  # noqa: F401
+import app.models.clave_idempotencia  # noqa: F401
+import app.models.empleado  # noqa: F401
+import app.models.evento_auditoria  # noqa: F401
+import app.models.herramienta  # noqa: F401
+import app.models.mensaje_salida  # noqa: F401
+import app.models.prestamo  # noqa: F401
+import app.models.prestamo_archivado  # noqa: F401
+import app.models.reserva  # noqa: F401
+import app.models.secuencia_cambios  # noqa: F401
+import app.models.tarea  # noqa: F401
+import app.models.version_esquema  # noqa: F401
+
+# init_db_test.py es un script manual (ver tests/README.md), no un test
+collect_ignore = ["init_db_test.py"]
+
+
+@pytest.fixture
+def engine():
+    """Motor SQLite en memoria con todas las tablas creadas."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    """Sesión de base de datos sobre el motor de pruebas."""
+    with Session(engine) as session:
+        yield session
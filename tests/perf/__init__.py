@@ -0,0 +1 @@
+"""Generador de datos y benchmarks de rendimiento"""
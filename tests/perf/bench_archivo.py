@@ -0,0 +1,97 @@
+"""
+Benchmark de las consultas de préstamos activos a medida que crece la historia.
+
+Para cada volumen de préstamos genera una base de datos nueva con
+`generar_datos`, mide las consultas del día a día (préstamos activos,
+vencidos, primera página de activos y conteo por estado), archiva los
+préstamos cerrados y vuelve a medir.
+
+Uso:
+    python -m tests.perf.bench_archivo --volumenes 50000 200000 1000000 --salida archivo.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlmodel import Session, create_engine
+
+import app.crud as crud
+from tests.perf.generar_datos import generar_datos
+
+
+CONSULTAS = {
+    "get_prestamos_activos": lambda s: crud.get_prestamos_activos(s),
+    "get_prestamos_vencidos": lambda s: crud.get_prestamos_vencidos(s),
+    "buscar_prestamos(activo)": lambda s: crud.buscar_prestamos(s, estado="activo", limit=25),
+    "contar_prestamos_por_estado": lambda s: crud.contar_prestamos_por_estado(s),
+}
+
+
+def medir(engine, iteraciones: int) -> dict:
+    """Mediana en ms de cada consulta, con una sesión nueva por llamada."""
+    resultados = {}
+    for nombre, consulta in CONSULTAS.items():
+        tiempos = []
+        for _ in range(iteraciones + 1):
+            with Session(engine) as session:
+                inicio = time.perf_counter()
+                consulta(session)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        resultados[nombre] = round(statistics.median(tiempos[1:]), 3)
+    return resultados
+
+
+def ejecutar(volumenes: list[int], iteraciones: int, dias: int) -> dict:
+    """Medir cada volumen antes y después de archivar. Retorna {volumen: {...}}"""
+    resultados = {}
+    for prestamos in volumenes:
+        with tempfile.TemporaryDirectory() as directorio:
+            engine = create_engine(f"sqlite:///{os.path.join(directorio, 'archivo.db')}")
+            # Pocas herramientas: el stock limita los préstamos activos, que quedan
+            # casi constantes mientras la historia crece
+            generar_datos(engine, empleados=5000, herramientas=300, categorias=50, prestamos=prestamos)
+
+            antes = medir(engine, iteraciones)
+            inicio = time.perf_counter()
+            with Session(engine) as session:
+                archivados = crud.archivar_prestamos(session, antiguedad_dias=dias)
+            segundos = time.perf_counter() - inicio
+            despues = medir(engine, iteraciones)
+            engine.dispose()
+
+        resultados[prestamos] = {
+            "archivados": archivados,
+            "archivo_s": round(segundos, 2),
+            "antes_ms": antes,
+            "despues_ms": despues,
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de consultas de préstamos activos según la historia")
+    parser.add_argument("--volumenes", type=int, nargs="+", default=[50_000, 200_000, 1_000_000])
+    parser.add_argument("--iteraciones", type=int, default=10)
+    parser.add_argument("--dias", type=int, default=180, help="Antigüedad de archivo")
+    parser.add_argument("--salida", help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.volumenes, args.iteraciones, args.dias)
+
+    print(f"{'Préstamos':>10}  {'Consulta':<30}{'antes ms':>10}{'después ms':>12}")
+    for prestamos, r in resultados.items():
+        for consulta in CONSULTAS:
+            print(f"{prestamos:>10}  {consulta:<30}{r['antes_ms'][consulta]:>10}{r['despues_ms'][consulta]:>12}")
+        print(f"{'':>10}  {r['archivados']} archivados en {r['archivo_s']} s\n")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Benchmarks de las funciones CRUD y de las agregaciones de Relatórios.
+
+Mide cada función exportada por `app.crud` contra una base de datos llenada
+con `tests.perf.generar_datos`, y guarda los resultados en JSON para poder
+comparar corridas y detectar regresiones.
+
+Uso:
+    # Generar datos (una sola vez)
+    python -m tests.perf.generar_datos --url sqlite:///bench.db --prestamos 500000
+
+    # Medir y guardar resultados
+    python -m tests.perf.bench_crud --url sqlite:///bench.db --salida bench_base.json
+
+    # Medir y comparar contra una corrida anterior
+    python -m tests.perf.bench_crud --url sqlite:///bench.db --salida bench_nuevo.json \\
+        --comparar bench_base.json --umbral 0.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import func
+from sqlmodel import Session, create_engine, select
+
+import app.crud as crud
+from app.models.categoria import Categoria
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+from app.models.reserva import Reserva
+from tests.perf.generar_datos import FECHA_REFERENCIA
+
+
+@dataclass
+class Benchmark:
+    """Una función a medir y, opcionalmente, la preparación de sus argumentos."""
+    nombre: str
+    funcion: Callable
+    preparar: Callable | None = None
+
+
+def _max_id(session: Session, columna) -> int:
+    return session.exec(select(func.max(columna))).one() or 1
+
+
+def _herramienta_con_stock(session: Session) -> int:
+    statement = select(Herramienta.id_herramienta).where(
+        (Herramienta.estado == True) & (Herramienta.cantidad_disponible > 0)
+    ).limit(1)
+    return session.exec(statement).first()
+
+
+def _prestamo_nuevo(session: Session):
+    """Crear un préstamo activo para las funciones que lo cierran."""
+    prestamo = crud.create_prestamo(session, 1, _herramienta_con_stock(session))
+    return (prestamo.id_prestamo,)
+
+
+def _reserva_nueva(session: Session):
+    """Crear una reserva lejana (un día por llamada) para las funciones que la usan."""
+    herramienta_id = _herramienta_con_stock(session)
+    inicio = datetime.now() + timedelta(days=365 + session.exec(select(func.count()).select_from(Reserva)).one())
+    reserva = crud.create_reserva(session, 1, herramienta_id, inicio, inicio + timedelta(hours=8))
+    return (reserva.id_reserva,)
+
+
+def construir_benchmarks(session: Session) -> list[Benchmark]:
+    """Construir la lista de benchmarks usando IDs existentes en la base de datos."""
+    empleado_id = _max_id(session, Empleado.id) // 2 or 1
+    herramienta_id = _max_id(session, Herramienta.id_herramienta) // 2 or 1
+    categoria_id = _max_id(session, Categoria.id_categoria) // 2 or 1
+    prestamo_id = _max_id(session, Prestamo.id_prestamo) // 2 or 1
+    reserva_id = _reserva_nueva(session)[0]
+    semana = (datetime.now() + timedelta(days=7), datetime.now() + timedelta(days=14))
+    contador = iter(range(10**9))
+
+    def _categoria_nueva(s):
+        return (crud.create_categoria(s, nombre=f"Bench {next(contador)}").id_categoria,)
+
+    return [
+        # Categorías
+        Benchmark("create_categoria", lambda s: crud.create_categoria(s, nombre=f"Bench {next(contador)}")),
+        Benchmark("get_categoria_by_id", lambda s: crud.get_categoria_by_id(s, categoria_id)),
+        Benchmark("get_categorias", lambda s: crud.get_categorias(s)),
+        Benchmark("get_categorias_activas", lambda s: crud.get_categorias_activas(s)),
+        Benchmark("buscar_categorias", lambda s: crud.buscar_categorias(s, estado=True, orden="nombre")),
+        Benchmark("contar_categorias", lambda s: crud.contar_categorias(s)),
+        Benchmark("get_diccionario_categorias", lambda s: crud.get_diccionario_categorias(s)),
+        Benchmark("update_categoria", lambda s: crud.update_categoria(s, categoria_id, nombre="Bench")),
+        Benchmark("inhabilitar_categoria", lambda s: crud.inhabilitar_categoria(s, categoria_id)),
+        Benchmark("habilitar_categoria", lambda s: crud.habilitar_categoria(s, categoria_id)),
+        Benchmark("delete_categoria", lambda s, cid: crud.delete_categoria(s, cid), _categoria_nueva),
+
+        # Empleados
+        Benchmark("create_empleado", lambda s: crud.create_empleado(s, "Bench", "Mark", "Calidad")),
+        Benchmark("get_empleado_by_id", lambda s: crud.get_empleado_by_id(s, empleado_id)),
+        Benchmark("get_empleados", lambda s: crud.get_empleados(s)),
+        Benchmark("get_empleados_activos", lambda s: crud.get_empleados_activos(s)),
+        Benchmark("get_empleados_por_area", lambda s: crud.get_empleados_por_area(s, "Logística")),
+        Benchmark("buscar_empleados", lambda s: crud.buscar_empleados(s, texto="silva", activo=True, orden="nombre")),
+        # La primera llamada (calentamiento) construye el índice de trigramas
+        Benchmark("sugerir_empleados", lambda s: crud.sugerir_empleados(s, "nunez gonzales")),
+        Benchmark("autocompletar_empleados", lambda s: crud.autocompletar_empleados(s, "jo log")),
+        Benchmark("update_empleado", lambda s: crud.update_empleado(s, empleado_id, area="Calidad")),
+        Benchmark("inhabilitar_empleado", lambda s: crud.inhabilitar_empleado(s, empleado_id)),
+        Benchmark("habilitar_empleado", lambda s: crud.habilitar_empleado(s, empleado_id)),
+
+        # Herramientas
+        Benchmark("create_herramienta", lambda s: crud.create_herramienta(s, "Bench", cantidad_disponible=5)),
+        Benchmark("get_herramienta_by_id", lambda s: crud.get_herramienta_by_id(s, herramienta_id)),
+        Benchmark("get_herramientas", lambda s: crud.get_herramientas(s)),
+        Benchmark("get_herramientas_disponibles", lambda s: crud.get_herramientas_disponibles(s)),
+        Benchmark("get_herramientas_por_categoria", lambda s: crud.get_herramientas_por_categoria(s, categoria_id)),
+        Benchmark("buscar_herramientas", lambda s: crud.buscar_herramientas(s, texto="llave", estado=True, disponible=True)),
+        Benchmark("sugerir_herramientas", lambda s: crud.sugerir_herramientas(s, "furadiera")),
+        Benchmark("autocompletar_herramientas", lambda s: crud.autocompletar_herramientas(s, "gen-0001")),
+        Benchmark("contar_herramientas", lambda s: crud.contar_herramientas(s)),
+        Benchmark("update_herramienta", lambda s: crud.update_herramienta(s, herramienta_id, descripcion="Bench")),
+        Benchmark("inhabilitar_herramienta", lambda s: crud.inhabilitar_herramienta(s, herramienta_id)),
+        Benchmark("habilitar_herramienta", lambda s: crud.habilitar_herramienta(s, herramienta_id)),
+        Benchmark("generate_codigo_interno", lambda s: crud.generate_codigo_interno("Llave inglesa")),
+
+        # Préstamos
+        Benchmark("create_prestamo", lambda s: crud.create_prestamo(s, empleado_id, _herramienta_con_stock(s))),
+        Benchmark("get_prestamo_by_id", lambda s: crud.get_prestamo_by_id(s, prestamo_id)),
+        Benchmark("get_prestamos", lambda s: crud.get_prestamos(s)),
+        Benchmark("get_prestamos_activos", lambda s: crud.get_prestamos_activos(s)),
+        Benchmark("get_prestamos_por_empleado", lambda s: crud.get_prestamos_por_empleado(s, empleado_id)),
+        Benchmark("get_prestamos_por_herramienta", lambda s: crud.get_prestamos_por_herramienta(s, herramienta_id)),
+        Benchmark("get_prestamos_vencidos", lambda s: crud.get_prestamos_vencidos(s)),
+        Benchmark("buscar_prestamos", lambda s: crud.buscar_prestamos(s, estado="activo", orden="fecha_prestamo")),
+        Benchmark("contar_prestamos_por_estado", lambda s: crud.contar_prestamos_por_estado(s)),
+        Benchmark("update_prestamo", lambda s: crud.update_prestamo(s, prestamo_id, observaciones="Bench")),
+        Benchmark("devolver_prestamo", lambda s, pid: crud.devolver_prestamo(s, pid), _prestamo_nuevo),
+        Benchmark("cancelar_prestamo", lambda s, pid: crud.cancelar_prestamo(s, pid), _prestamo_nuevo),
+        Benchmark("reconciliar_contadores", lambda s: crud.reconciliar_contadores(s)),
+        # Un lote acotado por llamada: la primera mueve la historia antigua, las siguientes lo que quede
+        Benchmark("archivar_prestamos", lambda s: crud.archivar_prestamos(s, lote=1000, max_lotes=1)),
+
+        # Reservas
+        Benchmark("create_reserva", lambda s: _reserva_nueva(s)),
+        Benchmark("get_reserva_by_id", lambda s: crud.get_reserva_by_id(s, reserva_id)),
+        Benchmark("get_reservas_por_herramienta", lambda s: crud.get_reservas_por_herramienta(s, herramienta_id)),
+        Benchmark("buscar_reservas", lambda s: crud.buscar_reservas(s, orden="fecha_inicio")),
+        Benchmark("cancelar_reserva", lambda s, rid: crud.cancelar_reserva(s, rid), _reserva_nueva),
+        # La primera llamada (calentamiento) construye la agenda en memoria
+        Benchmark("unidades_libres", lambda s: crud.unidades_libres(s, herramienta_id, *semana)),
+
+        # Reportes
+        Benchmark("get_herramientas_mas_solicitadas", lambda s: crud.get_herramientas_mas_solicitadas(s, top_n=10)),
+        Benchmark("get_empleados_mas_activos", lambda s: crud.get_empleados_mas_activos(s, top_n=10)),
+        Benchmark("get_estadisticas_generales", lambda s: crud.get_estadisticas_generales(s)),
+        # Toda la historia generada (dos años antes de la fecha de referencia)
+        Benchmark("get_utilizacion_herramientas", lambda s: crud.get_utilizacion_herramientas(
+            s, desde=FECHA_REFERENCIA - timedelta(days=731),
+        )),
+        # Sin la caché por versión de los datos: se mide el cálculo
+        Benchmark("get_estadisticas_duracion", lambda s: crud.get_estadisticas_duracion(
+            s, desde=FECHA_REFERENCIA - timedelta(days=731), hasta=FECHA_REFERENCIA, usar_cache=False,
+        )),
+        Benchmark("get_antiguedad_vencidos", lambda s: crud.get_antiguedad_vencidos(s)),
+
+        # Auditoría
+        Benchmark("get_eventos_auditoria", lambda s: crud.get_eventos_auditoria(s, "empleado", empleado_id)),
+        Benchmark("get_cambios_desde", lambda s: crud.get_cambios_desde(s, 0, limit=1000)),
+        Benchmark("get_versiones", lambda s: crud.get_versiones(s, "herramienta", list(range(1, 101)))),
+    ]
+
+
+def medir(engine, benchmark: Benchmark, iteraciones: int, calentamiento: int = 1) -> dict:
+    """
+    Ejecutar un benchmark y resumir sus tiempos en milisegundos.
+
+    Cada iteración usa una sesión nueva, igual que las páginas de Streamlit.
+    """
+    tiempos = []
+    for i in range(calentamiento + iteraciones):
+        with Session(engine) as session:
+            args = benchmark.preparar(session) if benchmark.preparar else ()
+            inicio = time.perf_counter()
+            benchmark.funcion(session, *args)
+            transcurrido = (time.perf_counter() - inicio) * 1000
+        if i >= calentamiento:
+            tiempos.append(transcurrido)
+
+    tiempos.sort()
+    return {
+        "iteraciones": iteraciones,
+        "min_ms": round(tiempos[0], 4),
+        "mediana_ms": round(statistics.median(tiempos), 4),
+        "media_ms": round(statistics.fmean(tiempos), 4),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+        "max_ms": round(tiempos[-1], 4),
+    }
+
+
+def _volumenes(session: Session) -> dict:
+    return {
+        "categorias": session.exec(select(func.count()).select_from(Categoria)).one(),
+        "empleados": session.exec(select(func.count()).select_from(Empleado)).one(),
+        "herramientas": session.exec(select(func.count()).select_from(Herramienta)).one(),
+        "prestamos": session.exec(select(func.count()).select_from(Prestamo)).one(),
+    }
+
+
+def _commit_actual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def ejecutar(engine, iteraciones: int = 20, filtro: str | None = None) -> dict:
+    """
+    Ejecutar todos los benchmarks y devolver el documento de resultados.
+
+    Args:
+        engine: Motor de la base de datos con datos generados
+        iteraciones: Repeticiones medidas por benchmark
+        filtro: Si se indica, solo se ejecutan los benchmarks cuyo nombre lo contenga
+
+    Returns:
+        Diccionario serializable a JSON con metadatos y resultados
+    """
+    with Session(engine) as session:
+        benchmarks = construir_benchmarks(session)
+        volumenes = _volumenes(session)
+
+    # Cada función exportada debe tener su benchmark
+    faltantes = set(crud.__all__) - {b.nombre for b in benchmarks}
+    if faltantes:
+        raise RuntimeError(f"Funciones de app.crud sin benchmark: {sorted(faltantes)}")
+
+    resultados = {}
+    for benchmark in benchmarks:
+        if filtro and filtro not in benchmark.nombre:
+            continue
+        resultados[benchmark.nombre] = medir(engine, benchmark, iteraciones)
+        print(f"{benchmark.nombre:<36} mediana {resultados[benchmark.nombre]['mediana_ms']:>10.3f} ms")
+
+    return {
+        "metadatos": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_actual(),
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "base_de_datos": engine.dialect.name,
+            "volumenes": volumenes,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(base: dict, nuevo: dict, umbral: float = 0.2) -> list[str]:
+    """
+    Comparar dos corridas y devolver los benchmarks que empeoraron.
+
+    Se compara la mediana; un benchmark se considera regresión si es más lento
+    que la base en más de `umbral` (0.2 = 20%).
+    """
+    regresiones = []
+    for nombre, resultado in nuevo["resultados"].items():
+        anterior = base["resultados"].get(nombre)
+        if not anterior or not anterior["mediana_ms"]:
+            continue
+        cambio = resultado["mediana_ms"] / anterior["mediana_ms"] - 1
+        marca = "  REGRESIÓN" if cambio > umbral else ""
+        print(f"{nombre:<36} {anterior['mediana_ms']:>10.3f} -> {resultado['mediana_ms']:>10.3f} ms ({cambio:+.0%}){marca}")
+        if cambio > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de app.crud")
+    parser.add_argument("--url", default="sqlite:///bench_gestor_herramientas.db", help="URL de la base de datos")
+    parser.add_argument("--iteraciones", type=int, default=20)
+    parser.add_argument("--filtro", help="Ejecutar solo benchmarks cuyo nombre contenga este texto")
+    parser.add_argument("--salida", default="bench_resultados.json", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="Archivo JSON de una corrida anterior")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Tolerancia de regresión (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    documento = ejecutar(engine, iteraciones=args.iteraciones, filtro=args.filtro)
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        print(f"\nComparación contra {args.comparar}:")
+        if comparar(base, documento, args.umbral):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark del índice de trigramas en memoria.
+
+Construye un índice con nombres y códigos sintéticos (los mismos catálogos
+que `generar_datos`) y mide la latencia de búsquedas típicas: sin acentos,
+con errores de tipeo, por prefijo y por código.
+
+Uso:
+    python -m tests.perf.bench_indice --entidades 100000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from app.crud.indice_texto import IndiceTrigramas
+from tests.perf.generar_datos import APELLIDOS, HERRAMIENTAS_BASE, NOMBRES
+
+
+CONSULTAS = [
+    "nunez", "ana", "j", "maria gonzales", "Núñez Pérez",
+    "furadiera", "llave ing", "taladro 5", "gen-00123",
+]
+
+
+def construir(entidades: int, semilla: int = 42) -> IndiceTrigramas:
+    """Llenar un índice con mitad empleados y mitad herramientas sintéticos."""
+    rng = random.Random(semilla)
+    indice = IndiceTrigramas()
+    for i in range(entidades):
+        if i % 2:
+            indice.agregar(i, f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}")
+        else:
+            indice.agregar(i, f"{rng.choice(HERRAMIENTAS_BASE)} {i % 97} GEN-{i:07d}")
+    return indice
+
+
+def medir(indice: IndiceTrigramas, iteraciones: int = 50) -> dict:
+    """Medir cada consulta y devolver {consulta: {mediana_ms, p95_ms}}."""
+    resultados = {}
+    for consulta in CONSULTAS:
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            indice.buscar(consulta, 10)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        resultados[consulta] = {
+            "mediana_ms": round(statistics.median(tiempos), 3),
+            "p95_ms": round(tiempos[int(len(tiempos) * 0.95) - 1], 3),
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de trigramas")
+    parser.add_argument("--entidades", type=int, default=100_000)
+    parser.add_argument("--iteraciones", type=int, default=50)
+    parser.add_argument("--objetivo-ms", type=float, default=5.0, help="p95 máximo aceptable por consulta")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    indice = construir(args.entidades)
+    print(f"Índice de {len(indice)} entidades construido en {time.perf_counter() - inicio:.2f} s\n")
+
+    resultados = medir(indice, args.iteraciones)
+    print(f"{'Consulta':<20}{'mediana ms':>12}{'p95 ms':>10}")
+    for consulta, r in resultados.items():
+        print(f"{consulta:<20}{r['mediana_ms']:>12}{r['p95_ms']:>10}")
+
+    lentas = [c for c, r in resultados.items() if r["p95_ms"] > args.objetivo_ms]
+    if lentas:
+        print(f"\nConsultas sobre el objetivo de {args.objetivo_ms} ms: {', '.join(lentas)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
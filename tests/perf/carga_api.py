@@ -0,0 +1,179 @@
+"""
+Prueba de carga local de la API HTTP (app/api.py).
+
+Levanta la API con uvicorn en un hilo, sobre una base de datos sintética
+generada con `generar_datos` (o sobre `--url`), y mide por escenario las
+peticiones por segundo y los percentiles de latencia con varios clientes
+concurrentes que reutilizan su conexión:
+
+- lista / fila: lecturas completas
+- lista_304 / fila_304: lecturas condicionales con el ETag ya conocido
+- prestar_devolver: POST /prestamos seguido de su devolución
+
+Uso:
+    python -m tests.perf.carga_api --clientes 8 --duracion 10
+    python -m tests.perf.carga_api --url sqlite:///carga_gestor_herramientas.db --salida api.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar_api(engine):
+    """Iniciar uvicorn en un hilo. Retorna (servidor, puerto)"""
+    import uvicorn
+
+    from app.api import crear_app
+
+    puerto = _puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(crear_app(engine), host="127.0.0.1", port=puerto, log_level="error"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, puerto
+
+
+class Cliente:
+    """Conexión HTTP persistente con los ETag recibidos por ruta"""
+
+    def __init__(self, puerto: int):
+        self.conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+        self.etags = {}
+
+    def pedir(self, metodo: str, ruta: str, cuerpo=None, condicional: bool = False):
+        cabeceras = {"Content-Type": "application/json"}
+        if condicional and ruta in self.etags:
+            cabeceras["If-None-Match"] = self.etags[ruta]
+        datos = json.dumps(cuerpo) if cuerpo is not None else None
+        self.conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+        respuesta = self.conexion.getresponse()
+        contenido = respuesta.read()
+        if respuesta.getheader("ETag"):
+            self.etags[ruta] = respuesta.getheader("ETag")
+        return respuesta.status, json.loads(contenido) if contenido else None
+
+
+def _escenarios(volumenes: dict) -> dict:
+    empleados, herramientas = volumenes["empleados"], volumenes["herramientas"]
+
+    def lista(cliente, rng, condicional=False):
+        # Pocas páginas distintas para que las lecturas condicionales repitan rutas
+        despues = rng.randrange(20) * 50
+        return cliente.pedir("GET", f"/herramientas?despues={despues}&limite=50", condicional=condicional)[0]
+
+    def fila(cliente, rng, condicional=False):
+        # Un conjunto acotado de filas "calientes", como un cliente que revalida su caché
+        return cliente.pedir("GET", f"/empleados/{rng.randrange(1, min(empleados, 100) + 1)}", condicional=condicional)[0]
+
+    def prestar_devolver(cliente, rng):
+        estado, prestamo = cliente.pedir("POST", "/prestamos", {
+            "id_empleado_h": rng.randrange(1, empleados + 1),
+            "id_herramienta_h": rng.randrange(1, herramientas + 1),
+        })
+        if estado == 201:
+            cliente.pedir("POST", f"/prestamos/{prestamo['id_prestamo']}/devolucion")
+        return estado
+
+    return {
+        "lista": lista,
+        "lista_304": lambda c, r: lista(c, r, condicional=True),
+        "fila": fila,
+        "fila_304": lambda c, r: fila(c, r, condicional=True),
+        "prestar_devolver": prestar_devolver,
+    }
+
+
+def medir(puerto: int, escenario, clientes: int, duracion: float) -> dict:
+    """Ejecutar un escenario con `clientes` hilos durante `duracion` segundos"""
+    tiempos, estados = [], {}
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def trabajar(semilla):
+        rng = random.Random(semilla)
+        cliente = Cliente(puerto)
+        propios, vistos = [], {}
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            estado = escenario(cliente, rng)
+            propios.append((time.perf_counter() - inicio) * 1000)
+            vistos[estado] = vistos.get(estado, 0) + 1
+        with lock:
+            tiempos.extend(propios)
+            for estado, n in vistos.items():
+                estados[estado] = estados.get(estado, 0) + n
+
+    hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    tiempos.sort()
+    return {
+        "peticiones": len(tiempos),
+        "rps": round(len(tiempos) / duracion, 1),
+        "p50_ms": round(statistics.median(tiempos), 2) if tiempos else None,
+        "p95_ms": round(tiempos[int(len(tiempos) * 0.95)], 2) if tiempos else None,
+        "estados": {str(k): v for k, v in sorted(estados.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga local de la API HTTP")
+    parser.add_argument("--url", help="Base de datos existente (por defecto una sintética temporal)")
+    parser.add_argument("--empleados", type=int, default=5000)
+    parser.add_argument("--herramientas", type=int, default=2000)
+    parser.add_argument("--prestamos", type=int, default=50_000)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--salida", help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    from sqlmodel import create_engine
+
+    with tempfile.TemporaryDirectory() as directorio:
+        if args.url:
+            engine = create_engine(args.url)
+            volumenes = {"empleados": args.empleados, "herramientas": args.herramientas}
+        else:
+            from tests.perf.generar_datos import generar_datos
+
+            engine = create_engine(f"sqlite:///{os.path.join(directorio, 'api.db')}", connect_args={"timeout": 30})
+            volumenes = generar_datos(
+                engine, empleados=args.empleados, herramientas=args.herramientas,
+                categorias=50, prestamos=args.prestamos,
+            )
+
+        servidor, puerto = levantar_api(engine)
+        resultados = {}
+        try:
+            for nombre, escenario in _escenarios(volumenes).items():
+                resultados[nombre] = medir(puerto, escenario, args.clientes, args.duracion)
+                r = resultados[nombre]
+                print(f"{nombre:<18}{r['rps']:>10} rps  p50 {r['p50_ms']:>7} ms  p95 {r['p95_ms']:>7} ms  {r['estados']}")
+        finally:
+            servidor.should_exit = True
+            engine.dispose()
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"clientes": args.clientes, "duracion_s": args.duracion, "escenarios": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
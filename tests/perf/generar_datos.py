@@ -0,0 +1,232 @@
+"""
+Generador determinista de datos sintéticos para pruebas de rendimiento.
+
+Llena una base de datos usando las tablas de `app.models` con volúmenes
+configurables. Con la misma semilla y los mismos volúmenes siempre produce
+exactamente los mismos registros, de modo que dos corridas de benchmark
+son comparables.
+
+Uso:
+    python -m tests.perf.generar_datos --url sqlite:///bench.db \\
+        --empleados 50000 --herramientas 20000 --categorias 500 --prestamos 5000000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, insert, update
+from sqlmodel import Session, create_engine
+
+from app.crud.crud_prestamo import reconciliar_contadores
+from app.database.migraciones import migrar
+from app.models.categoria import Categoria
+from app.models.empleado import Empleado
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+
+
+VOLUMENES_DEFECTO = {
+    "empleados": 50_000,
+    "herramientas": 20_000,
+    "categorias": 500,
+    "prestamos": 5_000_000,
+}
+
+# Fecha de referencia fija para que los datos no dependan del día de ejecución
+FECHA_REFERENCIA = datetime(2026, 1, 1)
+
+NOMBRES = [
+    "Juan", "María", "José", "Ana", "Luis", "Carmen", "Pedro", "Lucía", "João", "Beatriz",
+    "Carlos", "Sofía", "Miguel", "Paula", "Andrés", "Fernanda", "Diego", "Camila", "Rafael", "Inês",
+]
+APELLIDOS = [
+    "Pérez", "Núñez", "González", "Rodríguez", "Fernández", "López", "Martínez", "Sánchez",
+    "Silva", "Santos", "Oliveira", "Souza", "Gómez", "Díaz", "Muñoz", "Ramírez",
+]
+AREAS = ["Mantenimiento", "Producción", "Logística", "Almacén", "Calidad", "Manutenção", "Obras"]
+HERRAMIENTAS_BASE = [
+    "Llave inglesa", "Furadeira", "Taladro", "Martillo", "Destornillador", "Alicate",
+    "Sierra circular", "Esmeriladora", "Nivel láser", "Multímetro", "Chave de fenda", "Lijadora",
+]
+
+# Distribución de estados de los préstamos (aprox. a un sistema en producción)
+PROPORCION_ACTIVOS = 0.04
+PROPORCION_CANCELADOS = 0.03
+
+
+def _insertar_en_lotes(session: Session, modelo, filas, lote: int):
+    """Insertar filas con inserciones multi-fila de tamaño acotado."""
+    for inicio in range(0, len(filas), lote):
+        session.execute(insert(modelo), filas[inicio:inicio + lote])
+    session.commit()
+
+
+def _generar_prestamos(rng: random.Random, n: int, n_empleados: int, stock: list[int]):
+    """
+    Generar préstamos con distribución realista de estados y fechas.
+
+    Los préstamos activos solo se asignan mientras la herramienta tenga stock,
+    y se descuentan de `stock` para que `cantidad_disponible` quede coherente.
+    """
+    n_herramientas = len(stock)
+    for _ in range(n):
+        # Dos años de historia, con más préstamos recientes
+        antiguedad = int(730 * (rng.random() ** 1.5))
+        fecha_prestamo = FECHA_REFERENCIA - timedelta(days=antiguedad, minutes=rng.randrange(600))
+        # Plazo: la mayoría de 1 a 7 días, algunos hasta 30
+        plazo = 1 + min(29, int(rng.expovariate(1 / 3)))
+        fecha_estimada = fecha_prestamo + timedelta(days=plazo)
+
+        # Las herramientas populares concentran la mayor parte de los préstamos
+        id_herramienta = 1 + int(n_herramientas * rng.random() ** 2)
+        id_empleado = rng.randint(1, n_empleados)
+
+        sorteo = rng.random()
+        if sorteo < PROPORCION_ACTIVOS and antiguedad < 60 and stock[id_herramienta - 1] > 0:
+            stock[id_herramienta - 1] -= 1
+            estado, fecha_devolucion = "activo", None
+        elif sorteo < PROPORCION_ACTIVOS + PROPORCION_CANCELADOS:
+            estado, fecha_devolucion = "cancelado", None
+        else:
+            # Retraso: la mayoría devuelve a tiempo, una cola larga se atrasa
+            retraso = rng.expovariate(1 / 1.5) - 1
+            fecha_devolucion = fecha_estimada + timedelta(days=retraso)
+            estado = "devuelto"
+
+        yield {
+            "id_empleado_h": id_empleado,
+            "id_herramienta_h": id_herramienta,
+            "fecha_prestamo": fecha_prestamo,
+            "fecha_devolucion_estimada": fecha_estimada,
+            "fecha_devolucion": fecha_devolucion,
+            "observaciones": None if rng.random() < 0.8 else "Generado para benchmark",
+            "estado": estado,
+        }
+
+
+def generar_datos(
+    engine,
+    empleados: int = VOLUMENES_DEFECTO["empleados"],
+    herramientas: int = VOLUMENES_DEFECTO["herramientas"],
+    categorias: int = VOLUMENES_DEFECTO["categorias"],
+    prestamos: int = VOLUMENES_DEFECTO["prestamos"],
+    semilla: int = 42,
+    lote: int = 10_000,
+):
+    """
+    Llenar la base de datos con datos sintéticos deterministas.
+
+    Se aplican las migraciones pendientes. Se espera una base de datos vacía,
+    ya que los IDs generados asumen que empiezan en 1.
+
+    Args:
+        engine: Motor de base de datos destino
+        empleados: Número de empleados a generar
+        herramientas: Número de herramientas a generar
+        categorias: Número de categorías a generar
+        prestamos: Número de préstamos a generar
+        semilla: Semilla del generador pseudoaleatorio
+        lote: Número de filas por inserción
+
+    Returns:
+        Diccionario con los volúmenes insertados por tabla
+    """
+    rng = random.Random(semilla)
+    # El esquema real, con todas las tablas que leen las páginas (tarea, reserva, ...)
+    migrar(engine)
+
+    with Session(engine) as session:
+        _insertar_en_lotes(session, Categoria, [
+            {"nombre": f"Categoría {i:04d}", "estado": rng.random() > 0.05}
+            for i in range(1, categorias + 1)
+        ], lote)
+
+        _insertar_en_lotes(session, Empleado, [
+            {
+                "nombre": rng.choice(NOMBRES),
+                "apellido": rng.choice(APELLIDOS),
+                "area": rng.choice(AREAS),
+                "correo": f"empleado{i}@empresa.com" if rng.random() > 0.1 else None,
+                "activo": rng.random() > 0.08,
+            }
+            for i in range(1, empleados + 1)
+        ], lote)
+
+        stock = [1 + int(rng.expovariate(1 / 3)) for _ in range(herramientas)]
+        _insertar_en_lotes(session, Herramienta, [
+            {
+                "nombre": f"{rng.choice(HERRAMIENTAS_BASE)} {i}",
+                "categoria": None,
+                "estado": rng.random() > 0.03,
+                "codigo_interno": f"GEN-{i:07d}",
+                "cantidad_disponible": stock[i - 1],
+                "descripcion": None if rng.random() < 0.5 else "Herramienta de uso general",
+                "id_categoria_h": rng.randint(1, categorias) if categorias else None,
+            }
+            for i in range(1, herramientas + 1)
+        ], lote)
+        stock_inicial = list(stock)
+
+        # Los préstamos se generan en flujo para no materializar 5M de filas
+        pendientes = []
+        for fila in _generar_prestamos(rng, prestamos, empleados, stock):
+            pendientes.append(fila)
+            if len(pendientes) >= lote:
+                session.execute(insert(Prestamo), pendientes)
+                pendientes = []
+        if pendientes:
+            session.execute(insert(Prestamo), pendientes)
+
+        # Descontar del stock los préstamos activos generados
+        cambios = [
+            {"hid": i + 1, "cantidad": restante}
+            for i, (inicial, restante) in enumerate(zip(stock_inicial, stock))
+            if inicial != restante
+        ]
+        if cambios:
+            session.connection().execute(
+                update(Herramienta.__table__)
+                .where(Herramienta.__table__.c.id_herramienta == bindparam("hid"))
+                .values(cantidad_disponible=bindparam("cantidad")),
+                cambios,
+            )
+        session.commit()
+
+        # Contadores de préstamos activos por empleado y por herramienta
+        reconciliar_contadores(session)
+
+    return {
+        "categorias": categorias,
+        "empleados": empleados,
+        "herramientas": herramientas,
+        "prestamos": prestamos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generar datos sintéticos para benchmarks")
+    parser.add_argument("--url", default="sqlite:///bench_gestor_herramientas.db", help="URL de la base de datos")
+    for nombre, valor in VOLUMENES_DEFECTO.items():
+        parser.add_argument(f"--{nombre}", type=int, default=valor)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    inicio = time.perf_counter()
+    volumenes = generar_datos(
+        engine,
+        empleados=args.empleados,
+        herramientas=args.herramientas,
+        categorias=args.categorias,
+        prestamos=args.prestamos,
+        semilla=args.semilla,
+        lote=args.lote,
+    )
+    print(f"Datos generados en {time.perf_counter() - inicio:.1f}s: {volumenes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Arranque en frío de las páginas.
+
+Cada página se ejecuta con `AppTest` en un proceso nuevo, lanzado con
+`python -X importtime`, y se mide:
+
+- primer render: tiempo de la primera ejecución del script, que incluye
+  importar los módulos de la aplicación y construir el motor
+- importaciones: tiempo propio de los módulos importados durante esa
+  ejecución (streamlit y AppTest ya están cargados antes), agrupado por
+  paquete, y los módulos más lentos
+
+Con `--presupuesto-ms` sale con código 1 si el primer render de alguna página
+supera el presupuesto (mediana de `--repeticiones` procesos).
+
+Uso:
+    python -m tests.perf.medir_arranque --url sqlite:///carga_gestor_herramientas.db
+    python -m tests.perf.medir_arranque --paginas inicio funcionarios --modulos 15
+    python -m tests.perf.medir_arranque --presupuesto-ms 400 --salida arranque.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[2]
+PAGINAS = {
+    "inicio": RAIZ / "frontend" / "Inicio.py",
+    "funcionarios": RAIZ / "frontend" / "pages" / "1_📋_Funcionarios.py",
+    "ferramentas": RAIZ / "frontend" / "pages" / "2_🔧_Ferramentas.py",
+    "emprestimos": RAIZ / "frontend" / "pages" / "3_📦_Emprestimos.py",
+    "relatorios": RAIZ / "frontend" / "pages" / "4_📊_Relatorios.py",
+    "categorias": RAIZ / "frontend" / "pages" / "5_📁_Categorias.py",
+}
+
+# Separa en stderr las importaciones de streamlit de las de la página
+MARCA = "--- primer render ---"
+
+
+def _hijo(pagina: str, timeout: float):
+    """Ejecutar una página una vez e imprimir los milisegundos en stdout"""
+    from streamlit.testing.v1 import AppTest
+
+    print(MARCA, file=sys.stderr, flush=True)
+    inicio = time.perf_counter()
+    at = AppTest.from_file(str(PAGINAS[pagina]), default_timeout=timeout).run()
+    ms = (time.perf_counter() - inicio) * 1000
+    print(MARCA, file=sys.stderr, flush=True)
+    print(json.dumps({"ms": round(ms, 1), "excepciones": len(at.exception)}))
+
+
+def _importaciones(stderr: str) -> list[tuple[str, int, int]]:
+    """Líneas de -X importtime entre las marcas: (módulo, propio_us, acumulado_us)"""
+    filas, dentro = [], False
+    for linea in stderr.splitlines():
+        if linea == MARCA:
+            dentro = not dentro
+        elif dentro and linea.startswith("import time:") and "|" in linea:
+            propio, acumulado, modulo = linea[len("import time:"):].split("|")
+            if propio.strip().isdigit():
+                filas.append((modulo.strip(), int(propio), int(acumulado)))
+    return filas
+
+
+def medir_pagina(pagina: str, url: str, timeout: float = 60.0) -> dict:
+    """Primer render de una página en un proceso nuevo, con el detalle de importaciones"""
+    entorno = {**os.environ, "DATABASE_URL": url}
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "tests.perf.medir_arranque", "--hijo", pagina],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, timeout=timeout * 2,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"{pagina}: {proceso.stderr.strip().splitlines()[-1]}")
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    filas = _importaciones(proceso.stderr)
+
+    paquetes = {}
+    for modulo, propio, _ in filas:
+        raiz = modulo.split(".")[0]
+        paquetes[raiz] = paquetes.get(raiz, 0) + propio
+    return {
+        "ms": resultado["ms"],
+        "excepciones": resultado["excepciones"],
+        "importaciones_ms": round(sum(f[1] for f in filas) / 1000, 1),
+        "modulos_importados": len(filas),
+        "paquetes_ms": {k: round(v / 1000, 1) for k, v in sorted(paquetes.items(), key=lambda p: -p[1])},
+        "modulos_ms": [(m, round(p / 1000, 1), round(a / 1000, 1)) for m, p, a in sorted(filas, key=lambda f: -f[1])],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir el arranque en frío de las páginas")
+    parser.add_argument("--url", default="sqlite:///gestor_herramientas.db", help="URL de la base de datos")
+    parser.add_argument("--paginas", nargs="+", choices=list(PAGINAS), default=list(PAGINAS))
+    parser.add_argument("--repeticiones", type=int, default=3, help="Procesos por página (se reporta la mediana)")
+    parser.add_argument("--modulos", type=int, default=8, help="Módulos más lentos a mostrar por página")
+    parser.add_argument("--presupuesto-ms", type=float, help="Máximo de primer render por página")
+    parser.add_argument("--salida", help="Archivo JSON con los resultados")
+    parser.add_argument("--hijo", help=argparse.SUPPRESS)
+    parser.add_argument("--timeout", type=float, default=60.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        _hijo(args.hijo, args.timeout)
+        return
+
+    resultados = {}
+    for pagina in args.paginas:
+        corridas = sorted(
+            (medir_pagina(pagina, args.url, args.timeout) for _ in range(args.repeticiones)),
+            key=lambda r: r["ms"],
+        )
+        r = resultados[pagina] = corridas[len(corridas) // 2]
+        r["ms_corridas"] = [c["ms"] for c in corridas]
+        paquetes = ", ".join(f"{k} {v}" for k, v in list(r["paquetes_ms"].items())[:4])
+        print(f"{pagina:<14}{r['ms']:>9} ms  importaciones {r['importaciones_ms']:>7} ms "
+              f"({r['modulos_importados']} módulos: {paquetes})")
+        for modulo, propio, acumulado in r["modulos_ms"][:args.modulos]:
+            print(f"{'':<16}{modulo:<44}{propio:>8} ms propio {acumulado:>8} ms acumulado")
+        if r["excepciones"]:
+            print(f"{'':<16}¡la página terminó con {r['excepciones']} excepción(es)!")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    if args.presupuesto_ms is not None:
+        excedidas = [p for p, r in resultados.items() if r["ms"] > args.presupuesto_ms]
+        if excedidas:
+            print(f"\nSuperan el presupuesto de {args.presupuesto_ms} ms: {', '.join(excedidas)}")
+            sys.exit(1)
+        print(f"\nTodas las páginas dentro del presupuesto de {args.presupuesto_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
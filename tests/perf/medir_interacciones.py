@@ -0,0 +1,151 @@
+"""
+Medición de consultas SQL y tiempo de render por interacción.
+
+Recorre con `AppTest` las interacciones más comunes de las páginas (abrir,
+seleccionar una fila, desabilitar/habilitar, devolver) y para cada una
+reporta el tiempo de la ejecución del script y el número de sentencias SQL
+emitidas. Sirve para comparar el costo de una acción antes y después de un
+cambio en las páginas.
+
+Uso:
+    python -m tests.perf.medir_interacciones --url sqlite:///carga_gestor_herramientas.db
+    python -m tests.perf.medir_interacciones --url sqlite:///carga.db --salida antes.json
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from tests.perf.carga_streamlit import PAGINAS, _runtime_compartido, _widget
+
+
+class ContadorSQL:
+    """Contar las sentencias SQL emitidas por el motor de la aplicación."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._lock = threading.Lock()
+        self.total = 0
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _contar(conn, cursor, statement, parameters, context, executemany):
+            with self._lock:
+                self.total += 1
+
+
+def _medir(contador: ContadorSQL, resultados: list, nombre: str, accion):
+    antes = contador.total
+    inicio = time.perf_counter()
+    at = accion()
+    transcurrido = (time.perf_counter() - inicio) * 1000
+    errores = [e.message for e in at.exception]
+    resultados.append({
+        "interaccion": nombre,
+        "ms": round(transcurrido, 1),
+        "consultas": contador.total - antes,
+        "errores": errores,
+    })
+    return at
+
+
+def _seleccionar(at, clave: str):
+    """Seleccionar la primera fila de la grilla de la página."""
+    if at.dataframe and len(at.dataframe[0].value):
+        at.session_state[clave] = int(at.dataframe[0].value["ID"].iloc[0])
+    return at.run()
+
+
+def _alternar_estado(contador: ContadorSQL, resultados: list, at, pagina: str, desabilitar: str, habilitar: str):
+    """Pulsar el botón de desabilitar o habilitar que muestre el detalle, y luego el contrario."""
+    for etiqueta in (desabilitar, habilitar, desabilitar):
+        boton = _widget(at.button, etiqueta)
+        if boton:
+            accion = "desabilitar" if etiqueta == desabilitar else "habilitar"
+            if any(r["interaccion"] == f"{pagina}.{accion}" for r in resultados):
+                break
+            at = _medir(contador, resultados, f"{pagina}.{accion}", boton.click().run)
+    return at
+
+
+def medir_interacciones(timeout: float = 60.0) -> list[dict]:
+    """
+    Ejecutar los escenarios y devolver una fila por interacción.
+
+    Cada fila tiene el nombre de la interacción, los milisegundos que tardó
+    la ejecución del script y el número de consultas SQL emitidas.
+    """
+    from streamlit.testing.v1 import AppTest
+    from app.database.config import engine
+
+    contador = ContadorSQL(engine)
+    resultados = []
+
+    with _runtime_compartido():
+        # Funcionários: abrir, seleccionar, desabilitar y volver a habilitar
+        at = AppTest.from_file(str(PAGINAS["funcionarios"]), default_timeout=timeout)
+        at = _medir(contador, resultados, "funcionarios.cargar", at.run)
+        filtro = _widget(at.selectbox, "Filtrar por estado")
+        if filtro:
+            at = filtro.select("Todos").run()
+        at = _medir(contador, resultados, "funcionarios.seleccionar", lambda: _seleccionar(at, "empleados_seleccionado"))
+        _alternar_estado(contador, resultados, at, "funcionarios", "Desabilitar", "Habilitar")
+
+        # Ferramentas: abrir, seleccionar, desabilitar y volver a habilitar
+        at = AppTest.from_file(str(PAGINAS["ferramentas"]), default_timeout=timeout)
+        at = _medir(contador, resultados, "ferramentas.cargar", at.run)
+        filtro = _widget(at.selectbox, "📋 Estado")
+        if filtro:
+            at = filtro.select("Todos").run()
+        at = _medir(contador, resultados, "ferramentas.seleccionar", lambda: _seleccionar(at, "herramientas_seleccionado"))
+        _alternar_estado(contador, resultados, at, "ferramentas", "❌ Desabilitar", "✅ Habilitar")
+
+        # Empréstimos: abrir, seleccionar un préstamo activo y devolverlo (con confirmación)
+        at = AppTest.from_file(str(PAGINAS["emprestimos"]), default_timeout=timeout)
+        at = _medir(contador, resultados, "emprestimos.cargar", at.run)
+        at = _medir(contador, resultados, "emprestimos.seleccionar", lambda: _seleccionar(at, "prestamos_seleccionado"))
+        boton = _widget(at.button, "✅ Devolver")
+        if boton:
+            at = _medir(contador, resultados, "emprestimos.devolver", boton.click().run)
+            boton = _widget(at.button, "✅ Devolver")
+            if boton:
+                _medir(contador, resultados, "emprestimos.confirmar_devolucion", boton.click().run)
+
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir consultas y tiempo de render por interacción")
+    parser.add_argument("--url", default="sqlite:///carga_gestor_herramientas.db", help="URL de la base de datos")
+    parser.add_argument("--salida", help="Archivo JSON para guardar los resultados")
+    parser.add_argument("--comparar", help="Archivo JSON de una medición anterior")
+    args = parser.parse_args()
+
+    # La URL debe fijarse antes de importar app.database.config
+    os.environ["DATABASE_URL"] = args.url
+    resultados = medir_interacciones()
+
+    anteriores = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anteriores = {r["interaccion"]: r for r in json.load(f)}
+
+    print(f"\n{'Interacción':<36}{'ms':>10}{'consultas':>11}")
+    for r in resultados:
+        linea = f"{r['interaccion']:<36}{r['ms']:>10}{r['consultas']:>11}"
+        anterior = anteriores.get(r["interaccion"])
+        if anterior:
+            linea += f"   (antes: {anterior['ms']} ms, {anterior['consultas']} consultas)"
+        if r["errores"]:
+            linea += f"   ERROR: {r['errores'][0][:80]}"
+        print(linea)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
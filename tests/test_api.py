@@ -0,0 +1,148 @@
+"""Tests de la API HTTP (opcional: se omiten si starlette no está instalado)"""
+import json
+
+import pytest
+
+pytest.importorskip("starlette")
+
+import anyio
+
+from sqlmodel import Session
+
+from app import api
+from app.api import crear_app
+from app.crud import cancelar_prestamo, create_empleado, create_herramienta, create_prestamo
+
+
+def _pedir(app, metodo, ruta, cuerpo=None, cabeceras=None):
+    """Ejecutar una petición contra la aplicación ASGI. Retorna (código, cabeceras, JSON)"""
+    ruta, _, consulta = ruta.partition("?")
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": metodo, "path": ruta, "raw_path": ruta.encode(),
+        "query_string": consulta.encode(), "root_path": "", "scheme": "http", "server": ("test", 80),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (cabeceras or {}).items()],
+    }
+    mensajes = []
+
+    async def recibir():
+        return {"type": "http.request", "body": datos, "more_body": False}
+
+    async def enviar(mensaje):
+        mensajes.append(mensaje)
+
+    anyio.run(app, scope, recibir, enviar)
+    inicio = mensajes[0]
+    cuerpo = b"".join(m.get("body", b"") for m in mensajes[1:])
+    headers = {k.decode(): v.decode() for k, v in inicio["headers"]}
+    return inicio["status"], headers, json.loads(cuerpo) if cuerpo else None
+
+
+@pytest.fixture
+def app(engine):
+    return crear_app(engine)
+
+
+def test_paginacion_por_clave(app, session):
+    for i in range(5):
+        create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras")
+
+    estado, _, pagina = _pedir(app, "GET", "/empleados?limite=2")
+    assert estado == 200
+    assert [e["nombre"] for e in pagina["items"]] == ["E0", "E1"]
+    _, _, pagina = _pedir(app, "GET", f"/empleados?limite=2&despues={pagina['siguiente']}")
+    _, _, ultima = _pedir(app, "GET", f"/empleados?limite=2&despues={pagina['siguiente']}")
+    assert [e["nombre"] for e in pagina["items"] + ultima["items"]] == ["E2", "E3", "E4"]
+    assert ultima["siguiente"] is None
+    assert _pedir(app, "GET", "/proveedores")[0] == 404
+    # Límites fuera de rango: 400 en lugar de un error o de la tabla entera
+    for consulta in ("limite=0", "limite=-1", "limite=1001", "despues=-1", "limite=x"):
+        estado, _, cuerpo = _pedir(app, "GET", f"/empleados?{consulta}")
+        assert estado == 400 and "inválido" in cuerpo["error"]
+
+
+def test_get_condicional_con_etag_y_last_modified(app, session):
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+    ruta = f"/herramientas/{herramienta.id_herramienta}"
+
+    estado, cabeceras, cuerpo = _pedir(app, "GET", ruta)
+    assert estado == 200 and cuerpo["cantidad_disponible"] == 2
+    etag = cabeceras["etag"]
+    assert _pedir(app, "GET", ruta, cabeceras={"If-None-Match": etag})[0] == 304
+    assert _pedir(app, "GET", ruta, cabeceras={"If-Modified-Since": cabeceras["last-modified"]})[0] == 304
+    _, cabeceras_lista, _ = _pedir(app, "GET", "/herramientas")
+    assert _pedir(app, "GET", "/herramientas", cabeceras={"If-None-Match": cabeceras_lista["etag"]})[0] == 304
+
+    # Un préstamo cambia el stock: cambian la versión de la fila y la de la lista
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    estado, _, prestamo = _pedir(app, "POST", "/prestamos", {
+        "id_empleado_h": empleado.id,
+        "id_herramienta_h": herramienta.id_herramienta,
+        "fecha_devolucion_estimada": "2099-01-01T00:00:00",
+    })
+    assert estado == 201
+    estado, cabeceras, cuerpo = _pedir(app, "GET", ruta, cabeceras={"If-None-Match": etag})
+    assert estado == 200 and cuerpo["cantidad_disponible"] == 1 and cabeceras["etag"] != etag
+    assert _pedir(app, "GET", "/herramientas", cabeceras={"If-None-Match": cabeceras_lista["etag"]})[0] == 200
+
+    estado, _, devuelto = _pedir(app, "POST", f"/prestamos/{prestamo['id_prestamo']}/devolucion")
+    assert estado == 200 and devuelto["estado"] == "devuelto"
+    assert _pedir(app, "POST", f"/prestamos/{prestamo['id_prestamo']}/devolucion")[0] == 409
+
+
+def test_operaciones_en_lote_y_cambios(app, session):
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+    estado, _, resultados = _pedir(app, "POST", "/empleados/lote", [
+        {"nombre": "Ana", "apellido": "Diaz", "area": "Obras"},
+        {"nombre": "Luis", "apellido": "Rey", "area": "Obras", "cargo": "Jefe"},
+    ])
+    assert estado == 200
+    assert [r["estado"] for r in resultados] == [201, 400]
+
+    empleado_id = resultados[0]["item"]["id"]
+    prestamo = {"id_empleado_h": empleado_id, "id_herramienta_h": herramienta.id_herramienta}
+    _, _, creados = _pedir(app, "POST", "/prestamos/lote", [prestamo] * 3)
+    assert [r["estado"] for r in creados] == [201, 201, 409]  # Solo hay dos unidades
+
+    ids = [r["item"]["id_prestamo"] for r in creados if r["estado"] == 201]
+    _, _, devueltos = _pedir(app, "POST", "/prestamos/devoluciones", {"ids": ids + [999]})
+    assert [r["estado"] for r in devueltos] == [200, 200, 404]
+
+    _, _, feed = _pedir(app, "GET", "/cambios?entidad=prestamo")
+    assert [c["accion"] for c in feed["cambios"]] == ["crear", "crear", "actualizar", "actualizar"]
+    _, _, resto = _pedir(app, "GET", f"/cambios?desde={feed['siguiente']}&entidad=prestamo")
+    assert resto["cambios"] == []
+
+
+def test_reintento_con_idempotency_key(app, session):
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=5)
+    empleado = create_empleado(session, nombre="Ana", apellido="Diaz", area="Obras")
+    prestamo = {"id_empleado_h": empleado.id, "id_herramienta_h": herramienta.id_herramienta}
+
+    estado, _, primero = _pedir(app, "POST", "/prestamos", prestamo, {"Idempotency-Key": "pedido-7"})
+    assert estado == 201
+    estado, _, reintento = _pedir(app, "POST", "/prestamos", prestamo, {"Idempotency-Key": "pedido-7"})
+    assert estado == 201 and reintento["id_prestamo"] == primero["id_prestamo"]
+    _, _, pagina = _pedir(app, "GET", "/prestamos")
+    assert len(pagina["items"]) == 1
+
+
+def test_devolucion_concurrente_es_un_conflicto(app, session, engine, monkeypatch):
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+    empleado = create_empleado(session, nombre="Ana", apellido="Diaz", area="Obras")
+    ids = [create_prestamo(session, empleado.id, herramienta.id_herramienta).id_prestamo for _ in range(2)]
+    devolver_original = api.devolver_prestamo
+
+    def devolver_despues_de_otro(sesion, prestamo_id):
+        # Otro usuario cancela el primer préstamo entre la comprobación y la devolución
+        if prestamo_id == ids[0]:
+            with Session(engine) as otra:
+                cancelar_prestamo(otra, prestamo_id)
+        return devolver_original(sesion, prestamo_id)
+
+    monkeypatch.setattr(api, "devolver_prestamo", devolver_despues_de_otro)
+    estado, _, devueltos = _pedir(app, "POST", "/prestamos/devoluciones", {"ids": ids})
+
+    assert estado == 200
+    assert [(r["id"], r["estado"]) for r in devueltos] == [(ids[0], 409), (ids[1], 200)]
+    assert "otro usuario" in devueltos[0]["item"]["error"]
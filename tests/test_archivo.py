@@ -0,0 +1,105 @@
+"""Tests del archivo de préstamos cerrados"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from app.crud import (
+    archivar_prestamos,
+    buscar_prestamos,
+    cancelar_prestamo,
+    contar_prestamos_por_estado,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_prestamos,
+    get_prestamos_por_empleado,
+)
+from app.crud.archivo import fuente_prestamos
+from app.models.prestamo import Prestamo
+from app.models.prestamo_archivado import PrestamoArchivado
+
+
+def _historia(session):
+    """Cinco préstamos cerrados de hace un año, uno cerrado reciente y uno activo"""
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=3)
+    hace_un_ano = datetime.now() - timedelta(days=365)
+    for dia in range(5):
+        fecha = hace_un_ano + timedelta(days=dia)
+        prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta, fecha, fecha + timedelta(days=1))
+        if dia % 2:
+            cancelar_prestamo(session, prestamo.id_prestamo)
+        else:
+            devolver_prestamo(session, prestamo.id_prestamo, fecha + timedelta(days=1))
+    reciente = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    devolver_prestamo(session, reciente.id_prestamo)
+    create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    return empleado, herramienta, hace_un_ano
+
+
+def _contar(session, modelo):
+    return session.exec(select(func.count()).select_from(modelo)).one()
+
+
+def test_archivar_mueve_solo_cerrados_antiguos_en_lotes(session):
+    empleado, herramienta, _ = _historia(session)
+
+    assert archivar_prestamos(session, antiguedad_dias=180, lote=2, max_lotes=1) == 2
+    assert archivar_prestamos(session, antiguedad_dias=180, lote=2) == 3
+    assert archivar_prestamos(session, antiguedad_dias=180) == 0
+
+    assert (_contar(session, Prestamo), _contar(session, PrestamoArchivado)) == (2, 5)
+    session.refresh(herramienta)
+    assert (herramienta.cantidad_disponible, herramienta.unidades_prestadas) == (2, 1)
+
+
+def test_historia_lee_el_archivo_de_forma_transparente(session):
+    empleado, _, hace_un_ano = _historia(session)
+    antes = {p.id_prestamo for p in get_prestamos_por_empleado(session, empleado.id)}
+    conteo_antes = contar_prestamos_por_estado(session)
+    archivar_prestamos(session, antiguedad_dias=180)
+
+    assert {p.id_prestamo for p in get_prestamos_por_empleado(session, empleado.id)} == antes
+    assert {p.id_prestamo for p in get_prestamos(session, limit=None)} == antes
+    assert contar_prestamos_por_estado(session) == conteo_antes
+
+    filas, total = buscar_prestamos(session, estado="devuelto", orden="fecha_prestamo", descendente=False)
+    assert total == 4
+    assert filas[0][0].fecha_prestamo < filas[-1][0].fecha_prestamo
+    assert filas[0][1].nombre == "Juan"
+
+    # Un período que termina antes de la historia reciente solo trae archivados
+    antiguos = get_prestamos(session, desde=hace_un_ano - timedelta(days=1), hasta=hace_un_ano + timedelta(days=10))
+    assert len(antiguos) == 5
+
+
+def test_consultas_recientes_y_activas_no_tocan_el_archivo(session):
+    _, _, hace_un_ano = _historia(session)
+    archivar_prestamos(session, antiguedad_dias=180)
+
+    assert fuente_prestamos(session, estado="activo") is Prestamo
+    assert fuente_prestamos(session, estado="vencido") is Prestamo
+    assert fuente_prestamos(session, desde=datetime.now() - timedelta(days=30)) is Prestamo
+    assert fuente_prestamos(session, desde=hace_un_ano) is not Prestamo
+    assert buscar_prestamos(session, estado="activo")[1] == 1
+
+
+def test_los_ids_archivados_no_se_reutilizan(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=3)
+    hace_un_ano = datetime.now() - timedelta(days=365)
+    ids = []
+    for _ in range(2):
+        # El préstamo archivado es siempre el más reciente de la tabla
+        prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta, hace_un_ano, hace_un_ano)
+        ids.append(prestamo.id_prestamo)
+        devolver_prestamo(session, prestamo.id_prestamo, hace_un_ano)
+        assert archivar_prestamos(session, antiguedad_dias=180) == 1
+
+    assert ids[1] > ids[0]
+    assert create_prestamo(session, empleado.id, herramienta.id_herramienta).id_prestamo > ids[1]
+    assert {p.id_prestamo for p in get_prestamos(session, limit=None, desde=hace_un_ano - timedelta(days=1))} == {
+        ids[0], ids[1], ids[1] + 1
+    }
@@ -0,0 +1,52 @@
+"""Tests del arranque: qué se carga al importar (en un proceso nuevo, este ya tiene todo importado)"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def _importar(codigo: str) -> dict:
+    """Ejecutar `codigo` en un intérprete nuevo y retornar el JSON que imprime"""
+    proceso = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proceso.stdout)
+
+
+def test_importar_no_crea_el_motor_ni_carga_todo_crud():
+    resultado = _importar(
+        "import json, sys\n"
+        "from app.database import config\n"
+        "from app.crud.crud_empleado import get_empleados\n"
+        "print(json.dumps({\n"
+        "    'motores': config.get_engine.cache_info().currsize,\n"
+        "    'modulos': sorted(m for m in sys.modules if m.startswith('app.crud.') or m == 'numpy'),\n"
+        "}))\n"
+    )
+    assert resultado["motores"] == 0
+    # La captura de auditoría se registra aunque no se cargue el resto de app.crud
+    assert "app.crud.auditoria" in resultado["modulos"]
+    assert "app.crud.crud_prestamo" not in resultado["modulos"]
+    assert "app.crud.crud_reporte" not in resultado["modulos"]
+    assert "numpy" not in resultado["modulos"]
+
+
+def test_app_crud_exporta_bajo_demanda():
+    resultado = _importar(
+        "import json, sys\n"
+        "import app.crud as crud\n"
+        "antes = 'app.crud.crud_reserva' in sys.modules\n"
+        "funcion = crud.unidades_libres\n"
+        "print(json.dumps({\n"
+        "    'antes': antes,\n"
+        "    'despues': 'app.crud.crud_reserva' in sys.modules,\n"
+        "    'modulo': funcion.__module__,\n"
+        "    'todos': all(callable(getattr(crud, n)) for n in crud.__all__),\n"
+        "    'listados': set(crud.__all__) <= set(dir(crud)),\n"
+        "}))\n"
+    )
+    assert resultado == {
+        "antes": False, "despues": True, "modulo": "app.crud.crud_reserva", "todos": True, "listados": True,
+    }
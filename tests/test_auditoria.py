@@ -0,0 +1,72 @@
+"""Tests del registro de auditoría"""
+from sqlalchemy import event, func, update
+from sqlmodel import select
+
+from app.crud import (
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_eventos_auditoria,
+    reconciliar_contadores,
+    update_empleado,
+)
+from app.crud.auditoria import con_actor
+from app.models.empleado import Empleado
+from app.models.evento_auditoria import EventoAuditoria
+
+
+def test_registra_creacion_y_cambios_con_valores_anteriores(session):
+    with con_actor("ana"):
+        empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+        update_empleado(session, empleado.id, area="Calidad", correo="juan@empresa.com")
+    update_empleado(session, empleado.id, area="Calidad")  # Sin cambios reales: no registra
+
+    actualizacion, creacion = get_eventos_auditoria(session, "empleado", empleado.id)
+    assert creacion.accion == "crear"
+    assert creacion.cambios["nombre"] == [None, "Juan"]
+    assert actualizacion.accion == "actualizar"
+    assert actualizacion.cambios == {"area": ["Obras", "Calidad"], "correo": [None, "juan@empresa.com"]}
+    assert actualizacion.actor == "ana"
+
+
+def test_eventos_en_la_misma_transaccion_con_un_insert(session, engine):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+
+    sentencias = []
+    event.listen(engine, "before_cursor_execute", lambda *a: sentencias.append(a[2]))
+    prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    inserts = [s for s in sentencias if s.startswith("INSERT INTO evento_auditoria")]
+    assert len(inserts) == 1
+    # Los contadores que cambian con sentencias UPDATE también quedan registrados
+    contador = get_eventos_auditoria(session, "empleado", empleado.id, limit=1)[0]
+    assert contador.cambios == {"prestamos_activos": [0, 1]}
+    stock = get_eventos_auditoria(session, "herramienta", herramienta.id_herramienta, limit=1)[0]
+    assert stock.cambios == {"cantidad_disponible": [2, 1], "unidades_prestadas": [0, 1]}
+
+    # Un cambio que se deshace no deja eventos
+    session.get(Empleado, empleado.id).area = "Calidad"
+    session.flush()
+    session.rollback()
+    eventos = get_eventos_auditoria(session, "empleado", empleado.id)
+    assert all("area" not in e.cambios for e in eventos if e.accion == "actualizar")
+
+    devolver_prestamo(session, prestamo.id_prestamo)
+    ultimo = get_eventos_auditoria(session, "prestamo", prestamo.id_prestamo, limit=1)[0]
+    assert ultimo.cambios["estado"] == ["activo", "devuelto"]
+
+
+def test_operaciones_masivas_registran_sus_eventos(session):
+    empleados = [create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras") for i in range(3)]
+    session.execute(update(Empleado).values(prestamos_activos=4))
+    session.commit()
+
+    assert reconciliar_contadores(session)["empleados"] == 3
+    eventos = session.exec(
+        select(EventoAuditoria).where(EventoAuditoria.entidad == "empleado", EventoAuditoria.accion == "actualizar")
+    ).all()
+    assert {(e.id_entidad, tuple(e.cambios["prestamos_activos"])) for e in eventos} == {
+        (e.id, (4, 0)) for e in empleados
+    }
+    assert session.exec(select(func.count()).select_from(EventoAuditoria)).one() == 6
@@ -0,0 +1,100 @@
+"""Tests de la búsqueda de texto completo"""
+from sqlalchemy import text
+
+from app.crud import (
+    autocompletar_empleados,
+    autocompletar_herramientas,
+    buscar_empleados,
+    buscar_herramientas,
+    buscar_prestamos,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    update_empleado,
+    update_prestamo,
+)
+from app.database.busqueda import reconstruir_indices_busqueda
+
+
+def test_busqueda_sin_acentos_y_por_prefijo(session):
+    create_empleado(session, nombre="José", apellido="Núñez", area="Logística", correo="jose@empresa.com")
+    create_empleado(session, nombre="Pedro", apellido="Silva", area="Obras")
+
+    empleados, total = buscar_empleados(session, texto="nunez")
+    assert total == 1 and empleados[0].nombre == "José"
+    # Varias palabras deben aparecer todas, cada una como prefijo
+    _, total = buscar_empleados(session, texto="jos logist")
+    assert total == 1
+    _, total = buscar_empleados(session, texto="jose obras")
+    assert total == 0
+
+
+def test_busqueda_en_descripcion_y_relevancia(session):
+    create_herramienta(session, "Taladro percutor", codigo_interno="TAL-0001",
+                       descripcion="Taladro con percutor, uso en taladro de concreto")
+    create_herramienta(session, "Llave inglesa", codigo_interno="LLA-0001", descripcion="Para taladro")
+    create_herramienta(session, "Furadeira", codigo_interno="FUR-0001")
+
+    herramientas, total = buscar_herramientas(session, texto="taladro", orden="relevancia")
+    assert total == 2
+    assert herramientas[0].codigo_interno == "TAL-0001"
+    _, total = buscar_herramientas(session, texto="fur-00")
+    assert total == 1
+
+
+def test_indice_sigue_los_cambios(session):
+    empleado = create_empleado(session, nombre="Ana", apellido="Souza", area="Obras")
+    update_empleado(session, empleado.id, apellido="Pereira")
+    assert buscar_empleados(session, texto="souza")[1] == 0
+    assert buscar_empleados(session, texto="pereira")[1] == 1
+
+    session.delete(empleado)
+    session.commit()
+    assert buscar_empleados(session, texto="pereira")[1] == 0
+
+
+def test_prestamos_por_observaciones_empleado_o_herramienta(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=5)
+    prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    update_prestamo(session, prestamo.id_prestamo, observaciones="Entregado en la obra norte")
+    create_prestamo(session, empleado.id, herramienta.id_herramienta)
+
+    assert buscar_prestamos(session, texto="norte")[1] == 1
+    assert buscar_prestamos(session, texto="perez")[1] == 2
+    assert buscar_prestamos(session, texto="MAR-0001")[1] == 2
+
+
+def test_reconstruir_indices(engine, session):
+    create_herramienta(session, "Nivel láser", codigo_interno="NIV-0001")
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO herramienta_fts(herramienta_fts) VALUES ('delete-all')"))
+    assert buscar_herramientas(session, texto="laser")[1] == 0
+
+    reconstruir_indices_busqueda(engine)
+    assert buscar_herramientas(session, texto="laser")[1] == 1
+
+
+def test_autocompletar_solo_activos_y_disponibles(session):
+    create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    create_empleado(session, nombre="Juana", apellido="Lima", area="Calidad", activo=False)
+    create_empleado(session, nombre="Ana", apellido="Juarez", area="Obras", correo="juan@empresa.com")
+    create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=1)
+    create_herramienta(session, "Taladro viejo", codigo_interno="TAL-0002", cantidad_disponible=0)
+
+    # El correo no cuenta para el selector; los inactivos no aparecen
+    assert {e.nombre for e in autocompletar_empleados(session, "jua")} == {"Ana", "Juan"}
+    assert {e.nombre for e in autocompletar_empleados(session, "obras jua")} == {"Ana", "Juan"}
+    assert len(autocompletar_empleados(session, limite=1)) == 1
+    assert [h.codigo_interno for h in autocompletar_herramientas(session, "tal")] == ["TAL-0001"]
+
+
+def test_prestamo_verifica_stock_al_registrar(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=1)
+
+    assert create_prestamo(session, empleado.id, herramienta.id_herramienta) is not None
+    # El stock se agotó después de mostrar el selector
+    assert create_prestamo(session, empleado.id, herramienta.id_herramienta) is None
+    session.refresh(herramienta)
+    assert herramienta.cantidad_disponible == 0
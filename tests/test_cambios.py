@@ -0,0 +1,86 @@
+"""Tests de la fuente de cambios para integraciones"""
+import threading
+
+from sqlalchemy import func
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.crud import (
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_cambios_desde,
+    update_empleado,
+)
+from app.models.evento_auditoria import EventoAuditoria
+
+
+def test_cambios_en_orden_y_compactos(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+    prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    devolver_prestamo(session, prestamo.id_prestamo)
+
+    cambios = get_cambios_desde(session)
+    assert [c["secuencia"] for c in cambios] == list(range(1, len(cambios) + 1))
+    assert [(c["entidad"], c["accion"]) for c in cambios[:2]] == [("empleado", "crear"), ("herramienta", "crear")]
+    # El préstamo y los contadores que mueve se confirman juntos
+    assert {(c["entidad"], c["accion"]) for c in cambios[2:5]} == {
+        ("prestamo", "crear"), ("herramienta", "actualizar"), ("empleado", "actualizar"),
+    }
+    assert cambios[-1]["cambios"]["estado"] == "devuelto"
+
+    # Paginación por secuencia y filtro por entidad
+    assert get_cambios_desde(session, cambios[1]["secuencia"], limit=1) == [cambios[2]]
+    solo_prestamos = get_cambios_desde(session, entidades=["prestamo"])
+    assert {c["entidad"] for c in solo_prestamos} == {"prestamo"}
+    assert get_cambios_desde(session, cambios[-1]["secuencia"]) == []
+
+
+def test_sin_cambios_perdidos_con_escrituras_concurrentes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cambios.db'}", connect_args={"timeout": 30})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        ids = [create_empleado(session, nombre=f"E{i}", apellido="X", area="0").id for i in range(4)]
+
+    escrituras = 25
+    terminado = threading.Event()
+    recibidos = []
+
+    def escribir(empleado_id):
+        with Session(engine) as session:
+            for n in range(1, escrituras + 1):
+                update_empleado(session, empleado_id, area=str(n))
+
+    def consumir():
+        ultima = 0
+        with Session(engine) as session:
+            while True:
+                fin = terminado.is_set()
+                lote = get_cambios_desde(session, ultima, limit=7)
+                session.rollback()  # Nueva lectura en cada vuelta
+                recibidos.extend(lote)
+                if lote:
+                    ultima = lote[-1]["secuencia"]
+                elif fin:
+                    return
+
+    consumidor = threading.Thread(target=consumir)
+    consumidor.start()
+    escritores = [threading.Thread(target=escribir, args=(i,)) for i in ids]
+    for hilo in escritores:
+        hilo.start()
+    for hilo in escritores:
+        hilo.join()
+    terminado.set()
+    consumidor.join()
+
+    with Session(engine) as session:
+        total = session.exec(select(func.count()).select_from(EventoAuditoria)).one()
+    assert total == len(ids) * (escrituras + 1)
+    # Cada cambio recibido una vez, en orden y sin huecos
+    assert [c["secuencia"] for c in recibidos] == list(range(1, total + 1))
+    for empleado_id in ids:
+        areas = [c["cambios"]["area"] for c in recibidos if c["id"] == empleado_id and c["accion"] == "actualizar"]
+        assert areas == [str(n) for n in range(1, escrituras + 1)]
+    engine.dispose()
@@ -0,0 +1,127 @@
+"""Tests del control de concurrencia optimista"""
+import threading
+
+import pytest
+from sqlmodel import Session, create_engine
+
+from app.crud import (
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_empleado_by_id,
+    get_herramienta_by_id,
+    get_prestamo_by_id,
+    update_empleado,
+    update_herramienta,
+)
+from app.crud.concurrencia import ConflictoVersion
+from app.database.migraciones import migrar
+
+
+@pytest.fixture
+def engine_archivo(tmp_path):
+    """Base en archivo: cada sesión (o hilo) tiene su propia conexión y transacción"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'concurrencia.db'}", connect_args={"check_same_thread": False})
+    migrar(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_version_vista_desactualizada(session):
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001")
+    vista = herramienta.version
+
+    update_herramienta(session, herramienta.id_herramienta, version=vista, nombre="Martillo grande")
+    assert herramienta.version == vista + 1
+
+    # Un segundo formulario abierto con la misma versión no pisa el cambio
+    with pytest.raises(ConflictoVersion) as conflicto:
+        update_herramienta(session, herramienta.id_herramienta, version=vista, nombre="Maza")
+    assert (conflicto.value.esperada, conflicto.value.actual) == (vista, vista + 1)
+    assert get_herramienta_by_id(session, herramienta.id_herramienta).nombre == "Martillo grande"
+
+
+def test_escritura_entre_lectura_y_commit(engine_archivo):
+    with Session(engine_archivo) as session:
+        empleado_id = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras").id
+
+    with Session(engine_archivo) as primera, Session(engine_archivo) as segunda:
+        # Las dos leen la misma versión (y la conservan en su mapa de identidad)
+        leidos = [get_empleado_by_id(primera, empleado_id), get_empleado_by_id(segunda, empleado_id)]
+        assert [empleado.version for empleado in leidos] == [1, 1]
+        update_empleado(primera, empleado_id, area="Taller")
+        # La segunda sesión escribe sobre la versión que leyó, que ya no existe
+        with pytest.raises(ConflictoVersion):
+            update_empleado(segunda, empleado_id, area="Depósito")
+
+    with Session(engine_archivo) as session:
+        assert get_empleado_by_id(session, empleado_id).area == "Taller"
+
+
+def test_devolucion_simultanea_suma_el_stock_una_vez(engine_archivo):
+    with Session(engine_archivo) as session:
+        empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+        herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=3)
+        empleado_id, herramienta_id = empleado.id, herramienta.id_herramienta
+        prestamo_id = create_prestamo(session, empleado_id, herramienta_id).id_prestamo
+
+    with Session(engine_archivo) as primera, Session(engine_archivo) as segunda:
+        leidos = [get_prestamo_by_id(primera, prestamo_id), get_prestamo_by_id(segunda, prestamo_id)]
+        assert devolver_prestamo(primera, prestamo_id)
+        with pytest.raises(ConflictoVersion):
+            devolver_prestamo(segunda, prestamo_id)
+        assert [prestamo.estado for prestamo in leidos] == ["devuelto", "devuelto"]
+
+    with Session(engine_archivo) as session:
+        herramienta = get_herramienta_by_id(session, herramienta_id)
+        assert (herramienta.cantidad_disponible, herramienta.unidades_prestadas) == (3, 0)
+        assert get_empleado_by_id(session, empleado_id).prestamos_activos == 0
+
+
+def test_movimiento_de_stock_invalida_la_edicion(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=5)
+    vista, stock_visto = herramienta.version, herramienta.cantidad_disponible
+    version_empleado = empleado.version
+
+    create_prestamo(session, empleado.id, herramienta.id_herramienta)
+
+    # Guardar el formulario con el stock que se vio borraría el préstamo del stock
+    with pytest.raises(ConflictoVersion):
+        update_herramienta(session, herramienta.id_herramienta, version=vista, cantidad_disponible=stock_visto)
+    assert get_herramienta_by_id(session, herramienta.id_herramienta).cantidad_disponible == 4
+    # El contador de préstamos no cambia la versión del empleado
+    update_empleado(session, empleado.id, version=version_empleado, area="Taller")
+
+
+def test_sin_actualizaciones_perdidas_entre_hilos(engine_archivo):
+    hilos = 8
+    with Session(engine_archivo) as session:
+        herramienta_id = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=0).id_herramienta
+    barrera = threading.Barrier(hilos)
+
+    def sumar_una_unidad():
+        barrera.wait()
+        while True:
+            with Session(engine_archivo) as session:
+                herramienta = get_herramienta_by_id(session, herramienta_id)
+                try:
+                    update_herramienta(
+                        session, herramienta_id, version=herramienta.version,
+                        cantidad_disponible=herramienta.cantidad_disponible + 1,
+                    )
+                    return
+                except ConflictoVersion:
+                    continue  # Otro hilo escribió primero: leer de nuevo
+
+    trabajadores = [threading.Thread(target=sumar_una_unidad) for _ in range(hilos)]
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join(timeout=30)
+
+    with Session(engine_archivo) as session:
+        herramienta = get_herramienta_by_id(session, herramienta_id)
+        assert herramienta.cantidad_disponible == hilos
+        assert herramienta.version == 1 + hilos
@@ -0,0 +1,82 @@
+"""Tests de los contadores de préstamos activos por empleado y por herramienta"""
+import pytest
+
+from app.crud import (
+    buscar_empleados,
+    buscar_herramientas,
+    cancelar_prestamo,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+    get_prestamo_by_id,
+    reconciliar_contadores,
+    update_prestamo,
+)
+from app.crud.concurrencia import ConflictoVersion
+
+
+def _contadores(session, empleado, herramienta):
+    session.refresh(empleado)
+    session.refresh(herramienta)
+    return empleado.prestamos_activos, herramienta.unidades_prestadas, herramienta.cantidad_disponible
+
+
+def test_prestar_devolver_y_cancelar_actualizan_contadores(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=3)
+
+    p1 = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    p2 = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    assert _contadores(session, empleado, herramienta) == (2, 2, 1)
+
+    devolver_prestamo(session, p1.id_prestamo)
+    cancelar_prestamo(session, p2.id_prestamo)
+    assert _contadores(session, empleado, herramienta) == (0, 0, 3)
+
+    # Cerrar de nuevo un préstamo ya cerrado es un conflicto: no suma stock ni cambia su estado
+    for cerrar in (devolver_prestamo, cancelar_prestamo):
+        with pytest.raises(ConflictoVersion):
+            cerrar(session, p2.id_prestamo)
+    assert get_prestamo_by_id(session, p2.id_prestamo).estado == "cancelado"
+    assert _contadores(session, empleado, herramienta) == (0, 0, 3)
+    assert devolver_prestamo(session, 999) is False
+
+
+def test_prestamo_registrado_cerrado_no_ocupa_stock(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+
+    for estado in ("devuelto", "cancelado"):
+        assert create_prestamo(session, empleado.id, herramienta.id_herramienta, estado=estado).estado == estado
+    assert _contadores(session, empleado, herramienta) == (0, 0, 2)
+    # Los contadores ya coinciden con los préstamos: reconciliar no corrige nada
+    assert reconciliar_contadores(session) == {"empleados": 0, "herramientas": 0}
+
+
+def test_ordenar_listas_por_contador(session):
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=5)
+    otra = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=5)
+    ana = create_empleado(session, nombre="Ana", apellido="Lima", area="Obras")
+    juan = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    for _ in range(2):
+        create_prestamo(session, juan.id, herramienta.id_herramienta)
+    create_prestamo(session, ana.id, otra.id_herramienta)
+
+    empleados, _ = buscar_empleados(session, orden="prestamos_activos", descendente=True)
+    assert [(e.nombre, e.prestamos_activos) for e in empleados] == [("Juan", 2), ("Ana", 1)]
+    herramientas, _ = buscar_herramientas(session, orden="unidades_prestadas")
+    assert [h.unidades_prestadas for h in herramientas] == [1, 2]
+
+
+def test_reconciliar_corrige_desfases(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=3)
+    prestamo = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    create_prestamo(session, empleado.id, herramienta.id_herramienta)
+
+    # update_prestamo cambia el estado sin pasar por los contadores
+    update_prestamo(session, prestamo.id_prestamo, estado="devuelto")
+    assert reconciliar_contadores(session) == {"empleados": 1, "herramientas": 1}
+    assert _contadores(session, empleado, herramienta)[:2] == (1, 1)
+    assert reconciliar_contadores(session) == {"empleados": 0, "herramientas": 0}
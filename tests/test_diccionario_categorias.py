@@ -0,0 +1,109 @@
+"""Tests del diccionario de categorías compartido"""
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+
+from app.crud import (
+    create_categoria,
+    delete_categoria,
+    get_diccionario_categorias,
+    habilitar_categoria,
+    inhabilitar_categoria,
+    update_categoria,
+)
+from app.crud import crud_categoria
+from app.database.migraciones import migrar
+from app.models.categoria import Categoria
+
+
+@pytest.fixture
+def sentencias(engine):
+    registradas = []
+
+    def registrar(conn, cursor, statement, *args):
+        registradas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    yield registradas
+    event.remove(engine, "before_cursor_execute", registrar)
+
+
+def test_una_consulta_y_luego_solo_la_version(session, sentencias):
+    ids = [create_categoria(session, nombre=nombre).id_categoria for nombre in ("Manuales", "Eléctricas")]
+    inhabilitar_categoria(session, ids[0])
+    sentencias.clear()
+
+    diccionario = get_diccionario_categorias(session)
+    assert len(sentencias) == 2  # versión de los datos y categorías
+    assert diccionario.nombres == {ids[0]: "Manuales", ids[1]: "Eléctricas"}
+    assert diccionario.activas == [(ids[1], "Eléctricas")]
+    assert diccionario.nombre(None) == diccionario.nombre(999) == "Sin categoría"
+
+    # Cien herramientas en la lista: ninguna consulta más
+    assert all(diccionario.nombre(ids[1]) == "Eléctricas" for _ in range(100))
+    assert len(sentencias) == 2
+
+    # La página siguiente solo comprueba la versión
+    assert get_diccionario_categorias(session) is diccionario
+    assert len(sentencias) == 3
+
+
+@pytest.mark.parametrize("escribir", [
+    lambda s, cid: create_categoria(s, nombre="Nueva"),
+    lambda s, cid: update_categoria(s, cid, nombre="Renombrada"),
+    lambda s, cid: inhabilitar_categoria(s, cid),
+    lambda s, cid: habilitar_categoria(s, cid),
+    lambda s, cid: delete_categoria(s, cid),
+], ids=["create", "update", "inhabilitar", "habilitar", "delete"])
+def test_las_escrituras_invalidan(session, escribir):
+    categoria_id = create_categoria(session, nombre="Manuales", estado=False).id_categoria
+    antes = get_diccionario_categorias(session)
+
+    escribir(session, categoria_id)
+
+    despues = get_diccionario_categorias(session)
+    assert despues is not antes
+    assert despues is get_diccionario_categorias(session)
+
+
+def test_no_guarda_lo_leido_antes_de_una_escritura(session, monkeypatch):
+    categoria_id = create_categoria(session, nombre="Manuales").id_categoria
+    exec_original = session.exec
+
+    def exec_con_escritura_concurrente(statement, *args, **kwargs):
+        resultado = exec_original(statement, *args, **kwargs)
+        # Otra sesión confirma un cambio mientras esta lee las categorías
+        crud_categoria._invalidar_diccionario()
+        return resultado
+
+    monkeypatch.setattr(session, "exec", exec_con_escritura_concurrente)
+    leido = get_diccionario_categorias(session)
+    monkeypatch.setattr(session, "exec", exec_original)
+
+    assert leido.nombre(categoria_id) == "Manuales"
+    assert get_diccionario_categorias(session) is not leido
+
+
+def test_ve_los_cambios_de_otro_proceso(tmp_path):
+    # Dos motores sobre la misma base: las escrituras de uno no invalidan el
+    # diccionario del otro, como las de la API o de otra instancia
+    url = f"sqlite:///{tmp_path / 'compartida.db'}"
+    aplicacion, otro_proceso = create_engine(url), create_engine(url)
+    migrar(aplicacion)
+    with Session(aplicacion) as session, Session(otro_proceso) as otra:
+        categoria_id = create_categoria(session, nombre="Manuales").id_categoria
+        antes = get_diccionario_categorias(session)
+
+        # Escrituras del otro proceso: no pasan por `_invalidar_diccionario`
+        otra.get(Categoria, categoria_id).nombre = "Renombrada"
+        nueva = Categoria(nombre="Eléctricas")
+        otra.add(nueva)
+        otra.commit()
+
+        despues = get_diccionario_categorias(session)
+        assert despues is not antes
+        assert despues.nombre(categoria_id) == "Renombrada"
+        assert despues.activas == [(nueva.id_categoria, "Eléctricas"), (categoria_id, "Renombrada")]
+        assert get_diccionario_categorias(session) is despues
+    aplicacion.dispose()
+    otro_proceso.dispose()
@@ -0,0 +1,128 @@
+"""Tests de las estadísticas de duración y atraso de los préstamos"""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from app.crud import (
+    archivar_prestamos,
+    create_categoria,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    get_antiguedad_vencidos,
+    get_estadisticas_duracion,
+)
+from app.models.prestamo import Prestamo
+
+DIA = timedelta(days=1)
+INICIO = datetime(2025, 3, 1)
+FIN = INICIO + 60 * DIA
+
+
+def _datos(session):
+    """Dos categorías (y una herramienta sin categoría), dos áreas y 400 préstamos al azar"""
+    rng = random.Random(11)
+    manuales = create_categoria(session, nombre="Manuales").id_categoria
+    electricas = create_categoria(session, nombre="Eléctricas").id_categoria
+    herramientas = {
+        create_herramienta(session, "Martillo", categoria=manuales, codigo_interno="MAR-0001").id_herramienta: "Manuales",
+        create_herramienta(session, "Taladro", categoria=electricas, codigo_interno="TAL-0001").id_herramienta: "Eléctricas",
+        create_herramienta(session, "Escalera", codigo_interno="ESC-0001").id_herramienta: None,
+    }
+    empleados = {
+        create_empleado(session, nombre="Juan", apellido="Perez", area="Obras").id: "Obras",
+        create_empleado(session, nombre="Ana", apellido="Gomez", area="Taller").id: "Taller",
+    }
+    filas = []
+    for _ in range(400):
+        inicio = INICIO + timedelta(minutes=rng.randrange(-5 * 1440, 65 * 1440))
+        estimada = inicio + timedelta(days=rng.choice([1, 3, 7]))
+        estado = rng.choice(["devuelto", "devuelto", "devuelto", "activo", "cancelado"])
+        devolucion = inicio + timedelta(minutes=rng.randrange(1, 20 * 1440)) if estado == "devuelto" else None
+        filas.append({
+            "id_empleado_h": rng.choice(list(empleados)),
+            "id_herramienta_h": rng.choice(list(herramientas)),
+            "fecha_prestamo": inicio,
+            "fecha_devolucion_estimada": estimada,
+            "fecha_devolucion": devolucion,
+            "estado": estado,
+        })
+    session.execute(insert(Prestamo), filas)
+    session.commit()
+    return herramientas, empleados, filas
+
+
+def test_percentiles_por_categoria_y_area(session):
+    herramientas, empleados, filas = _datos(session)
+    # Parte de la historia en el archivo: se lee igual
+    archivar_prestamos(session, antiguedad_dias=(datetime.now() - INICIO).days)
+
+    resultado = get_estadisticas_duracion(session, INICIO, FIN)
+    ahora = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def esperado(incluir):
+        del_periodo = [
+            f for f in filas
+            if f["estado"] != "cancelado" and INICIO <= f["fecha_prestamo"] < FIN and incluir(f)
+        ]
+        duracion = [(f["fecha_devolucion"] - f["fecha_prestamo"]) / DIA for f in del_periodo if f["fecha_devolucion"]]
+        atraso = [max((f["fecha_devolucion"] or ahora) - f["fecha_devolucion_estimada"], timedelta(0)) / DIA for f in del_periodo]
+        return {
+            "prestamos": len(del_periodo),
+            "devueltos": len(duracion),
+            "duracion_mediana": pytest.approx(np.percentile(duracion, 50)),
+            "duracion_p90": pytest.approx(np.percentile(duracion, 90)),
+            "atraso_mediana": pytest.approx(np.percentile(atraso, 50)),
+            "atraso_p90": pytest.approx(np.percentile(atraso, 90)),
+        }
+
+    assert resultado["general"] == esperado(lambda f: True)
+    por_categoria = {f.pop("grupo"): f for f in resultado["por_categoria"]}
+    assert set(por_categoria) == {"Manuales", "Eléctricas", None}
+    for categoria, fila in por_categoria.items():
+        assert fila == esperado(lambda f: herramientas[f["id_herramienta_h"]] == categoria)
+    por_area = {f.pop("grupo"): f for f in resultado["por_area"]}
+    assert set(por_area) == {"Obras", "Taller"}
+    for area, fila in por_area.items():
+        assert fila == esperado(lambda f: empleados[f["id_empleado_h"]] == area)
+
+
+def test_periodo_sin_prestamos(session):
+    _datos(session)
+    resultado = get_estadisticas_duracion(session, datetime(2020, 1, 1), datetime(2020, 2, 1))
+    assert resultado["general"]["prestamos"] == 0
+    assert resultado["general"]["duracion_mediana"] is None
+    assert resultado["por_categoria"] == [] and resultado["por_area"] == []
+
+
+def test_antiguedad_vencidos(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=10)
+    ahora = datetime(2025, 6, 1, 12)
+    # Días vencidos: 0, 1, 2, 7, 8, 30, 31 y uno que todavía no vence
+    for horas in (3, 36, 49, 7 * 24 + 1, 8 * 24, 30 * 24 + 23, 31 * 24, -5):
+        create_prestamo(
+            session, empleado.id, herramienta.id_herramienta,
+            fecha_prestamo=ahora - timedelta(days=40),
+            fecha_devolucion_estimada=ahora - timedelta(hours=horas),
+        )
+    assert get_antiguedad_vencidos(session, ahora) == {"0-1": 2, "2-7": 2, "8-30": 2, "30+": 1}
+
+
+def test_cache_por_version_de_los_datos(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=10)
+    desde = datetime.now() - 10 * DIA
+
+    primero = get_estadisticas_duracion(session, desde)
+    assert get_estadisticas_duracion(session, desde) is primero
+    assert get_estadisticas_duracion(session, desde, usar_cache=False) is not primero
+
+    # Un préstamo nuevo cambia la versión de los datos
+    create_prestamo(session, empleado.id, herramienta.id_herramienta, fecha_prestamo=datetime.now() - DIA)
+    segundo = get_estadisticas_duracion(session, desde)
+    assert segundo is not primero
+    assert (primero["general"]["prestamos"], segundo["general"]["prestamos"]) == (0, 1)
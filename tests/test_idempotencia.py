@@ -0,0 +1,132 @@
+"""Tests de las claves de idempotencia de las creaciones"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, func
+from sqlmodel import Session, create_engine, select
+
+from app.crud import (
+    create_categoria,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    create_reserva,
+    get_empleado_by_id,
+    get_herramienta_by_id,
+)
+from app.crud.idempotencia import purgar_claves
+from app.database.migraciones import migrar
+from app.models.clave_idempotencia import ClaveIdempotencia
+from app.models.evento_auditoria import EventoAuditoria
+from app.models.prestamo import Prestamo
+
+
+@pytest.fixture
+def datos(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=5)
+    return empleado, herramienta
+
+
+def test_prestamo_repetido_no_vuelve_a_escribir(session, engine, datos):
+    empleado_id, herramienta_id = datos[0].id, datos[1].id_herramienta
+    primero = create_prestamo(session, empleado_id, herramienta_id, clave_idempotencia="envio-1")
+    eventos = session.exec(select(func.count()).select_from(EventoAuditoria)).one()
+
+    sentencias = []
+
+    def registrar(conn, cursor, statement, *args):
+        sentencias.append(statement)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        repetido = create_prestamo(session, empleado_id, herramienta_id, clave_idempotencia="envio-1")
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+    assert repetido.id_prestamo == primero.id_prestamo
+    # Búsqueda de la clave por clave primaria y lectura del préstamo; ninguna escritura
+    assert len(sentencias) <= 2
+    assert all(s.lstrip().upper().startswith("SELECT") for s in sentencias)
+    assert session.exec(select(func.count()).select_from(Prestamo)).one() == 1
+    assert session.exec(select(func.count()).select_from(EventoAuditoria)).one() == eventos
+    session.expire_all()
+    assert get_herramienta_by_id(session, herramienta_id).cantidad_disponible == 4
+    assert get_empleado_by_id(session, empleado_id).prestamos_activos == 1
+
+    # Otra clave es otro envío
+    otro = create_prestamo(session, empleado_id, herramienta_id, clave_idempotencia="envio-2")
+    assert otro.id_prestamo != primero.id_prestamo
+
+
+@pytest.mark.parametrize("crear", [
+    lambda s, e, h, clave: create_categoria(s, nombre="Manuales", clave_idempotencia=clave),
+    lambda s, e, h, clave: create_empleado(s, nombre="Ana", apellido="Gomez", area="Taller", clave_idempotencia=clave),
+    lambda s, e, h, clave: create_herramienta(s, "Taladro", cantidad_disponible=2, clave_idempotencia=clave),
+    lambda s, e, h, clave: create_reserva(
+        s, e.id, h.id_herramienta, datetime.now() + timedelta(days=2), datetime.now() + timedelta(days=3),
+        clave_idempotencia=clave,
+    ),
+], ids=["categoria", "empleado", "herramienta", "reserva"])
+def test_demas_creaciones(session, datos, crear):
+    empleado, herramienta = datos
+    primera = crear(session, empleado, herramienta, "envio-1")
+    modelo = type(primera)
+    total = session.exec(select(func.count()).select_from(modelo)).one()
+
+    assert crear(session, empleado, herramienta, "envio-1") is primera
+    assert session.exec(select(func.count()).select_from(modelo)).one() == total
+    # Sin clave, cada llamada crea
+    crear(session, empleado, herramienta, None)
+    assert session.exec(select(func.count()).select_from(modelo)).one() == total + 1
+
+
+def test_clave_de_otra_entidad(session, datos):
+    empleado, herramienta = datos
+    create_prestamo(session, empleado.id, herramienta.id_herramienta, clave_idempotencia="envio-1")
+    with pytest.raises(Exception, match="ya se usó para crear prestamo"):
+        create_categoria(session, nombre="Manuales", clave_idempotencia="envio-1")
+
+
+def test_envios_simultaneos_crean_un_prestamo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotencia.db'}", connect_args={"check_same_thread": False})
+    migrar(engine)
+    with Session(engine) as session:
+        empleado_id = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras").id
+        herramienta_id = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=5).id_herramienta
+
+    hilos = 6
+    barrera = threading.Barrier(hilos)
+    creados = []
+
+    def enviar():
+        with Session(engine) as session:
+            barrera.wait()
+            prestamo = create_prestamo(session, empleado_id, herramienta_id, clave_idempotencia="envio-1")
+            creados.append(prestamo.id_prestamo)
+
+    trabajadores = [threading.Thread(target=enviar) for _ in range(hilos)]
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join(timeout=30)
+
+    assert len(creados) == hilos and len(set(creados)) == 1
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(Prestamo)).one() == 1
+        herramienta = get_herramienta_by_id(session, herramienta_id)
+        assert (herramienta.cantidad_disponible, herramienta.unidades_prestadas) == (4, 1)
+        assert get_empleado_by_id(session, empleado_id).prestamos_activos == 1
+    engine.dispose()
+
+
+def test_purgar_claves(session):
+    create_categoria(session, nombre="Vieja", clave_idempotencia="vieja")
+    create_categoria(session, nombre="Nueva", clave_idempotencia="nueva")
+    session.get(ClaveIdempotencia, "vieja").fecha = datetime.now() - timedelta(hours=30)
+    session.commit()
+
+    assert purgar_claves(session, horas=24) == 1
+    assert session.get(ClaveIdempotencia, "vieja") is None
+    assert session.get(ClaveIdempotencia, "nueva") is not None
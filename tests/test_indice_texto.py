@@ -0,0 +1,78 @@
+"""Tests del índice de trigramas en memoria"""
+from sqlmodel import Session, create_engine
+
+from app.crud import create_empleado, create_herramienta, sugerir_empleados, sugerir_herramientas, update_empleado
+from app.crud.indice_texto import IndiceTrigramas, indice_de, normalizar
+from app.database.migraciones import migrar
+
+
+def test_normalizar_quita_acentos_y_mayusculas():
+    assert normalizar("Núñez") == "nunez"
+    assert normalizar("MANUTENÇÃO") == "manutencao"
+    assert normalizar(None) == ""
+
+
+def test_busqueda_aproximada_y_por_prefijo():
+    indice = IndiceTrigramas()
+    indice.agregar(1, "Llave inglesa LLA-0001")
+    indice.agregar(2, "Furadeira FUR-0001")
+    indice.agregar(3, "Llave 14mm LLA-0002")
+
+    assert [id_ for id_, _ in indice.buscar("furadiera")] == [2]
+    assert [id_ for id_, _ in indice.buscar("llave ing")][0] == 1
+    assert {id_ for id_, _ in indice.buscar("lla")} == {1, 3}
+    assert [id_ for id_, _ in indice.buscar("f")] == [2]
+    assert indice.buscar("zzz") == []
+
+
+def test_reemplazar_quitar_y_compactar():
+    indice = IndiceTrigramas()
+    for i in range(3000):
+        indice.agregar(i, f"Martillo {i}")
+    for i in range(2000):
+        indice.quitar(i)
+    indice.agregar(2999, "Sierra circular")
+
+    assert len(indice) == 1000
+    assert [id_ for id_, _ in indice.buscar("sierra")] == [2999]
+    assert all(id_ >= 2000 for id_, _ in indice.buscar("martillo", limite=50))
+
+
+def test_indice_sigue_los_commits(session, engine):
+    create_empleado(session, nombre="José", apellido="Núñez", area="Obras")
+    # Construir el índice antes de los cambios siguientes
+    assert [e.apellido for e in sugerir_empleados(session, "nunes")] == ["Núñez"]
+
+    empleado = create_empleado(session, nombre="Inês", apellido="Gonçalves", area="Obras")
+    assert [e.id for e in sugerir_empleados(session, "ines goncalves")] == [empleado.id]
+
+    update_empleado(session, empleado.id, apellido="Souza")
+    assert sugerir_empleados(session, "goncalves") == []
+
+    # Los cambios que se deshacen no llegan al índice
+    with Session(engine) as otra:
+        herramienta = create_herramienta(otra, "Esmeriladora", codigo_interno="ESM-0001")
+        herramienta.nombre = "Lijadora"
+        otra.flush()
+        otra.rollback()
+    assert [h.nombre for h in sugerir_herramientas(session, "esmerila")] == ["Esmeriladora"]
+    assert len(indice_de(session, "herramienta")) == 1
+
+
+def test_indice_incorpora_los_cambios_de_otro_proceso(tmp_path):
+    # Dos motores sobre la misma base: los commits de uno no pasan por las
+    # sesiones del otro, como los de la API o de otra instancia
+    url = f"sqlite:///{tmp_path / 'compartida.db'}"
+    aplicacion, otro_proceso = create_engine(url), create_engine(url)
+    migrar(aplicacion)
+    with Session(aplicacion) as session, Session(otro_proceso) as otra:
+        empleado = create_empleado(otra, nombre="José", apellido="Núñez", area="Obras")
+        assert [e.id for e in sugerir_empleados(session, "nunez")] == [empleado.id]
+
+        update_empleado(otra, empleado.id, apellido="Souza")
+        nuevo = create_empleado(otra, nombre="Inês", apellido="Gonçalves", area="Obras")
+        assert sugerir_empleados(session, "nunez") == []
+        assert [e.id for e in sugerir_empleados(session, "goncalves")] == [nuevo.id]
+        assert len(indice_de(session, "empleado")) == 2
+    aplicacion.dispose()
+    otro_proceso.dispose()
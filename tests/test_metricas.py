@@ -0,0 +1,98 @@
+"""Tests de las métricas del proceso"""
+import urllib.request
+
+import pytest
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from sqlmodel import Session, create_engine
+
+import app.crud.crud_empleado as crud_empleado
+import app.crud.crud_herramienta as crud_herramienta
+import app.crud.crud_prestamo as crud_prestamo
+from app import metricas
+from app.crud.estadisticas import get_estadisticas_duracion
+from app.database.migraciones import migrar
+
+
+@pytest.fixture
+def instrumentado(engine):
+    metricas.instrumentar_motor(engine)
+    metricas.instrumentar_crud()
+    return engine
+
+
+def test_sentencias_por_funcion_crud(instrumentado, session):
+    antes = {f: metricas.SQL_SENTENCIAS.valor(f) for f in ("create_prestamo", "unidades_libres")}
+    checkouts = metricas.POOL_CHECKOUTS.valor()
+
+    empleado = crud_empleado.create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = crud_herramienta.create_herramienta(session, "Martillo", codigo_interno="MAR-0001")
+    crud_prestamo.create_prestamo(session, empleado.id, herramienta.id_herramienta)
+
+    # Las sentencias de las funciones que create_prestamo llama cuentan para ella
+    assert metricas.SQL_SENTENCIAS.valor("create_prestamo") > antes["create_prestamo"]
+    assert metricas.SQL_SENTENCIAS.valor("unidades_libres") == antes["unidades_libres"]
+    assert metricas.SQL_SEGUNDOS.cuenta("create_prestamo") >= metricas.SQL_SENTENCIAS.valor("create_prestamo") - antes["create_prestamo"]
+    assert metricas.POOL_CHECKOUTS.valor() > checkouts
+    # Instrumentar otra vez no envuelve dos veces
+    metricas.instrumentar_crud()
+    assert crud_prestamo.create_prestamo.__wrapped__.__name__ == "create_prestamo"
+    assert not hasattr(crud_prestamo.create_prestamo.__wrapped__, "_funcion_metricas")
+
+
+def test_formato_y_endpoint(instrumentado, session):
+    metricas.SQL_SEGUNDOS.observar(0.003, "prueba_formato")
+    metricas.SQL_SEGUNDOS.observar(20, "prueba_formato")
+    metricas.contar_cache("prueba", acierto=True)
+
+    servidor = metricas.servir("127.0.0.1", 0)
+    try:
+        url = f"http://127.0.0.1:{servidor.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as respuesta:
+            tipo = respuesta.headers["Content-Type"]
+            texto = respuesta.read().decode()
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+    assert tipo.startswith("text/plain; version=0.0.4")
+    lineas = texto.splitlines()
+    assert "# TYPE gestor_sql_segundos histogram" in lineas
+    # Cubetas acumuladas: 0.003 cae en le="0.005"; 20 solo en +Inf
+    assert 'gestor_sql_segundos_bucket{funcion="prueba_formato",le="0.0025"} 0' in lineas
+    assert 'gestor_sql_segundos_bucket{funcion="prueba_formato",le="0.005"} 1' in lineas
+    assert 'gestor_sql_segundos_bucket{funcion="prueba_formato",le="10"} 1' in lineas
+    assert 'gestor_sql_segundos_bucket{funcion="prueba_formato",le="+Inf"} 2' in lineas
+    assert 'gestor_sql_segundos_count{funcion="prueba_formato"} 2' in lineas
+    assert any(l.startswith('gestor_cache_total{cache="prueba",resultado="acierto"} ') for l in lineas)
+
+
+def test_espera_y_timeout_del_pool(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0, pool_timeout=0.1)
+    metricas.instrumentar_motor(engine)
+    esperas = metricas.POOL_ESPERA.cuenta()
+    timeouts = metricas.POOL_TIMEOUTS.valor()
+
+    with engine.connect():
+        assert "gestor_pool_en_uso 1" in metricas.exponer().splitlines()
+        with pytest.raises(TimeoutPool):
+            engine.connect()
+
+    assert metricas.POOL_TIMEOUTS.valor() == timeouts + 1
+    assert metricas.POOL_ESPERA.cuenta() == esperas + 2
+    assert 'gestor_pool_tamano 1' in metricas.exponer().splitlines()
+    engine.dispose()
+
+
+def test_aciertos_del_cache_de_estadisticas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    migrar(engine)
+    aciertos = metricas.CACHE.valor("estadisticas_duracion", "acierto")
+    fallos = metricas.CACHE.valor("estadisticas_duracion", "fallo")
+
+    with Session(engine) as session:
+        get_estadisticas_duracion(session)
+        get_estadisticas_duracion(session)
+
+    assert metricas.CACHE.valor("estadisticas_duracion", "fallo") == fallos + 1
+    assert metricas.CACHE.valor("estadisticas_duracion", "acierto") == aciertos + 1
+    engine.dispose()
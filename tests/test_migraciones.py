@@ -0,0 +1,115 @@
+"""Tests de las migraciones versionadas del esquema"""
+from sqlalchemy import create_engine, event, inspect, text
+from sqlmodel import Session, SQLModel
+
+from app.crud import buscar_prestamos, create_empleado, create_prestamo, get_cambios_desde
+from app.database.migraciones import MIGRACIONES, migrar, version_actual
+from app.models.prestamo_archivado import PrestamoArchivado
+
+
+ULTIMA = MIGRACIONES[-1].version
+
+
+def _base_anterior(engine):
+    """Esquema anterior a los contadores y a la auditoría, con un préstamo activo"""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE categoria (id_categoria INTEGER PRIMARY KEY, nombre VARCHAR, estado BOOLEAN)"))
+        connection.execute(text(
+            "CREATE TABLE empleado (id INTEGER PRIMARY KEY, nombre VARCHAR, apellido VARCHAR, "
+            "area VARCHAR, correo VARCHAR UNIQUE, activo BOOLEAN)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE herramienta (id_herramienta INTEGER PRIMARY KEY, nombre VARCHAR, categoria VARCHAR, "
+            "estado BOOLEAN, codigo_interno VARCHAR UNIQUE, cantidad_disponible INTEGER, descripcion VARCHAR, "
+            "id_categoria_h INTEGER)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE prestamo (id_prestamo INTEGER PRIMARY KEY, id_empleado_h INTEGER, id_herramienta_h INTEGER, "
+            "fecha_prestamo DATETIME, fecha_devolucion_estimada DATETIME, fecha_devolucion DATETIME, "
+            "observaciones VARCHAR, estado VARCHAR)"
+        ))
+        connection.execute(text("INSERT INTO empleado VALUES (1, 'Juan', 'Perez', 'Obras', NULL, 1)"))
+        connection.execute(text("INSERT INTO herramienta VALUES (1, 'Taladro', NULL, 1, 'TAL-0001', 2, NULL, NULL)"))
+        connection.execute(text(
+            "INSERT INTO prestamo VALUES (1, 1, 1, '2026-01-01', '2026-01-02', NULL, NULL, 'activo')"
+        ))
+
+
+def test_base_nueva_queda_en_la_ultima_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'nueva.db'}")
+    assert len(migrar(engine)) == ULTIMA
+    with engine.connect() as connection:
+        assert version_actual(connection) == ULTIMA
+        assert {"empleado", "evento_auditoria", "secuencia_cambios"} <= set(inspect(connection).get_table_names())
+
+    # Con la base al día el arranque no aplica nada y solo lee la versión
+    sentencias = []
+    event.listen(engine, "before_cursor_execute", lambda *a: sentencias.append(a[2]))
+    assert migrar(engine) == []
+    assert len(sentencias) <= 2
+    engine.dispose()
+
+
+def test_base_existente_recibe_lo_que_le_falta(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    _base_anterior(engine)
+
+    assert len(migrar(engine)) == ULTIMA
+    assert migrar(engine) == []
+    with Session(engine) as session:
+        assert session.execute(text("SELECT prestamos_activos FROM empleado")).scalar() == 1
+        assert session.execute(text("SELECT unidades_prestadas FROM herramienta")).scalar() == 1
+        # Las tablas nuevas funcionan sobre la base migrada
+        create_empleado(session, nombre="Ana", apellido="Diaz", area="Obras")
+        assert [c["secuencia"] for c in get_cambios_desde(session)] == [1]
+    engine.dispose()
+
+
+def test_solo_se_aplican_las_pendientes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'parcial.db'}")
+    _base_anterior(engine)
+    with engine.begin() as connection:
+        # Base que ya tenía los contadores y la migración 2 registrada
+        MIGRACIONES[0].aplicar(connection)
+        MIGRACIONES[1].aplicar(connection)
+        connection.execute(text("INSERT INTO schema_version VALUES (1, 'a', '2026-01-01'), (2, 'b', '2026-01-01')"))
+
+    assert [m.split(":")[0] for m in migrar(engine)] == [str(m.version) for m in MIGRACIONES[2:]]
+    engine.dispose()
+
+
+def test_ids_de_prestamos_siguen_despues_del_archivo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archivo.db'}")
+    _base_anterior(engine)
+    with engine.begin() as connection:
+        # Base anterior al arreglo: el préstamo 7, el más reciente, ya se archivó
+        PrestamoArchivado.__table__.create(connection)
+        connection.execute(text(
+            "INSERT INTO prestamo_archivado (id_prestamo, id_empleado_h, id_herramienta_h, fecha_prestamo, "
+            "fecha_devolucion_estimada, estado, version, fecha_archivo) "
+            "VALUES (7, 1, 1, '2025-01-01', '2025-01-02', 'devuelto', 1, '2025-08-01')"
+        ))
+
+    migrar(engine)
+    with Session(engine) as session:
+        ddl = session.execute(text("SELECT sql FROM sqlite_master WHERE name = 'prestamo'")).scalar()
+        assert "AUTOINCREMENT" in ddl
+        assert session.execute(text("SELECT id_prestamo, estado FROM prestamo")).all() == [(1, "activo")]
+        assert create_prestamo(session, 1, 1, observaciones="Mango flojo").id_prestamo == 8
+        # El índice de búsqueda sigue a la tabla rehecha
+        assert buscar_prestamos(session, texto="mango")[1] == 1
+    engine.dispose()
+
+
+def test_base_existente_recibe_los_indices_de_los_modelos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'indices.db'}")
+    _base_anterior(engine)
+
+    migrar(engine)
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        for tabla in SQLModel.metadata.sorted_tables:
+            existentes = {i["name"] for i in inspector.get_indexes(tabla.name)}
+            assert {i.name for i in tabla.indexes} <= existentes, tabla.name
+        assert "ix_empleado_nombre" in {i["name"] for i in inspector.get_indexes("empleado")}
+    engine.dispose()
@@ -0,0 +1,127 @@
+"""Tests del notificador de préstamos vencidos contra un servidor SMTP local (aiosmtpd)"""
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller  # noqa: E402
+from sqlmodel import select  # noqa: E402
+
+from app.crud import create_empleado, create_herramienta, create_prestamo, devolver_prestamo  # noqa: E402
+from app.models.mensaje_salida import MensajeSalida  # noqa: E402
+from app.notificador import ConfigSMTP, encolar_avisos_vencidos, enviar_pendientes  # noqa: E402
+
+DIA = timedelta(days=1)
+
+
+class Buzon:
+    """Servidor SMTP de prueba: guarda los mensajes y puede responder errores"""
+
+    def __init__(self, respuestas=()):
+        self.recibidos = []
+        self.respuestas = list(respuestas)
+        self.activos = 0
+        self.max_activos = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.activos += 1
+        self.max_activos = max(self.max_activos, self.activos)
+        await asyncio.sleep(0.05)
+        self.activos -= 1
+        if self.respuestas:
+            return self.respuestas.pop(0)
+        self.recibidos.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp():
+    """Levantar un Buzon; el test fija sus respuestas en `buzon.respuestas`"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        puerto = s.getsockname()[1]
+    buzon = Buzon()
+    controller = Controller(buzon, hostname="127.0.0.1", port=puerto)
+    controller.start()
+    yield buzon, ConfigSMTP(host="127.0.0.1", port=puerto, remitente="gestor@empresa.com", timeout=5)
+    controller.stop()
+
+
+def _vencido(session, empleado, herramienta, dias=2):
+    return create_prestamo(
+        session, empleado.id, herramienta.id_herramienta,
+        fecha_prestamo=datetime.now() - (dias + 3) * DIA,
+        fecha_devolucion_estimada=datetime.now() - dias * DIA,
+    )
+
+
+def test_encolar_agrupa_por_empleado_y_avisa_una_vez_por_dia(session):
+    juan = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras", correo="juan@empresa.com")
+    ana = create_empleado(session, nombre="Ana", apellido="Gomez", area="Taller", correo="ana@empresa.com")
+    sin_correo = create_empleado(session, nombre="Luis", apellido="Diaz", area="Obras")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=20)
+    de_juan = [_vencido(session, juan, herramienta, dias) for dias in (1, 5, 10)]
+    _vencido(session, ana, herramienta)
+    _vencido(session, sin_correo, herramienta)
+    # Ni los que no vencieron ni los devueltos
+    create_prestamo(session, juan.id, herramienta.id_herramienta, fecha_devolucion_estimada=datetime.now() + 3 * DIA)
+    devolver_prestamo(session, _vencido(session, ana, herramienta).id_prestamo)
+
+    assert encolar_avisos_vencidos(session) == {"mensajes": 2, "prestamos": 4}
+    mensajes = {m.destinatario: m for m in session.exec(select(MensajeSalida)).all()}
+    assert set(mensajes) == {"juan@empresa.com", "ana@empresa.com"}
+    # Del más vencido al menos vencido
+    assert mensajes["juan@empresa.com"].prestamos == [p.id_prestamo for p in reversed(de_juan)]
+    assert "Martillo (MAR-0001)" in mensajes["juan@empresa.com"].cuerpo
+
+    # El mismo día no se repiten; un préstamo que vence después sí se avisa
+    assert encolar_avisos_vencidos(session) == {"mensajes": 0, "prestamos": 0}
+    nuevo = _vencido(session, juan, herramienta, dias=0)
+    assert encolar_avisos_vencidos(session) == {"mensajes": 1, "prestamos": 1}
+    assert session.exec(select(MensajeSalida).order_by(MensajeSalida.id_mensaje.desc())).first().prestamos == [nuevo.id_prestamo]
+    # Al día siguiente se vuelven a avisar todos
+    assert encolar_avisos_vencidos(session, datetime.now() + DIA) == {"mensajes": 2, "prestamos": 5}
+
+
+def test_envia_con_concurrencia_acotada(session, engine, smtp):
+    buzon, config = smtp
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=20)
+    for i in range(10):
+        empleado = create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras", correo=f"e{i}@empresa.com")
+        _vencido(session, empleado, herramienta)
+    encolar_avisos_vencidos(session)
+
+    resultado = asyncio.run(enviar_pendientes(engine, config, concurrencia=3))
+
+    assert resultado == {"enviados": 10, "reintentos": 0, "fallidos": 0}
+    assert sorted(e.rcpt_tos[0] for e in buzon.recibidos) == sorted(f"e{i}@empresa.com" for i in range(10))
+    assert 1 < buzon.max_activos <= 3
+    session.expire_all()
+    assert {m.estado for m in session.exec(select(MensajeSalida)).all()} == {"enviado"}
+    # Nada pendiente: una segunda pasada no envía nada
+    assert asyncio.run(enviar_pendientes(engine, config))["enviados"] == 0
+
+
+@pytest.mark.parametrize("respuestas, max_intentos, estado, intentos", [
+    # Errores temporales: se reintenta hasta que se envía
+    (["451 Intente mas tarde", "451 Intente mas tarde"], 5, "enviado", 3),
+    # ... o hasta agotar los intentos
+    (["451 Intente mas tarde"] * 3, 2, "fallido", 2),
+    # Un rechazo permanente no se reintenta
+    (["550 Buzon inexistente"], 5, "fallido", 1),
+])
+def test_reintentos(session, engine, smtp, respuestas, max_intentos, estado, intentos):
+    buzon, config = smtp
+    buzon.respuestas = respuestas
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras", correo="juan@empresa.com")
+    _vencido(session, empleado, create_herramienta(session, "Martillo", codigo_interno="MAR-0001"))
+    encolar_avisos_vencidos(session)
+
+    asyncio.run(enviar_pendientes(engine, config, max_intentos=max_intentos, espera_base=0))
+
+    mensaje = session.exec(select(MensajeSalida)).one()
+    session.refresh(mensaje)
+    assert (mensaje.estado, mensaje.intentos) == (estado, intentos)
+    assert len(buzon.recibidos) == (estado == "enviado")
@@ -0,0 +1,80 @@
+"""Tests de la búsqueda paginada del lado del servidor"""
+from datetime import datetime, timedelta
+
+from app.crud import (
+    buscar_categorias,
+    buscar_empleados,
+    buscar_herramientas,
+    buscar_prestamos,
+    contar_herramientas,
+    contar_prestamos_por_estado,
+    create_categoria,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    devolver_prestamo,
+)
+
+
+def test_buscar_empleados_pagina_y_total(session):
+    for i in range(7):
+        create_empleado(session, nombre=f"Ana{i}", apellido="Núñez", area="Logística", activo=i % 2 == 0)
+    create_empleado(session, nombre="Pedro", apellido="Silva", area="Obras")
+
+    pagina, total = buscar_empleados(session, texto="núñez", orden="nombre", descendente=True, skip=0, limit=3)
+    assert total == 7
+    assert [e.nombre for e in pagina] == ["Ana6", "Ana5", "Ana4"]
+
+    pagina, total = buscar_empleados(session, texto="NÚÑEZ", activo=True, skip=3, limit=3)
+    assert total == 4
+    assert [e.nombre for e in pagina] == ["Ana6"]
+
+
+def test_buscar_empleados_escapa_comodines(session):
+    create_empleado(session, nombre="Ana", apellido="A", area="x")
+    create_empleado(session, nombre="100%", apellido="B", area="x")
+    _, total = buscar_empleados(session, texto="%")
+    assert total == 1
+
+
+def test_buscar_herramientas_filtros_y_conteo(session):
+    create_herramienta(session, "Llave inglesa", codigo_interno="LLA-0001", cantidad_disponible=2)
+    create_herramienta(session, "Llave 14mm", codigo_interno="LLA-0002", cantidad_disponible=0)
+    create_herramienta(session, "Furadeira", codigo_interno="FUR-0001", estado=False)
+
+    _, total = buscar_herramientas(session, texto="lla", estado=True, disponible=True)
+    assert total == 1
+    pagina, total = buscar_herramientas(session, orden="cantidad_disponible", limit=10)
+    assert total == 3
+    assert [h.cantidad_disponible for h in pagina] == [0, 1, 2]
+    assert contar_herramientas(session) == {"en_servicio": 2, "fuera_servicio": 1, "total": 3}
+
+
+def test_buscar_prestamos_trae_empleado_y_herramienta(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=5)
+    ayer = datetime.now() - timedelta(days=3)
+    vencido = create_prestamo(session, empleado.id, herramienta.id_herramienta,
+                              fecha_prestamo=ayer, fecha_devolucion_estimada=ayer + timedelta(days=1))
+    create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    devuelto = create_prestamo(session, empleado.id, herramienta.id_herramienta)
+    devolver_prestamo(session, devuelto.id_prestamo)
+
+    filas, total = buscar_prestamos(session, texto="taladro", estado="activo")
+    assert total == 2
+    prestamo, emp, herr = filas[0]
+    assert emp.nombre == "Juan" and herr.nombre == "Taladro"
+
+    filas, total = buscar_prestamos(session, estado="vencido")
+    assert [p.id_prestamo for p, _, _ in filas] == [vencido.id_prestamo]
+    assert contar_prestamos_por_estado(session, empleado_id=empleado.id) == {
+        "activo": 2, "vencido": 1, "devuelto": 1, "cancelado": 0,
+    }
+
+
+def test_buscar_categorias(session):
+    for nombre in ["Manuales", "Eléctricas", "Medición"]:
+        create_categoria(session, nombre=nombre)
+    pagina, total = buscar_categorias(session, estado=True, orden="nombre", limit=2)
+    assert total == 3
+    assert [c.nombre for c in pagina] == ["Eléctricas", "Manuales"]
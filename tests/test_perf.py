@@ -0,0 +1,71 @@
+"""Tests del generador de datos sintéticos y del runner de benchmarks"""
+from sqlalchemy import func
+from sqlmodel import Session, create_engine, select
+
+import app.crud as crud
+from app.models.herramienta import Herramienta
+from app.models.prestamo import Prestamo
+from tests.perf.bench_crud import comparar, ejecutar
+from tests.perf.generar_datos import generar_datos
+
+
+VOLUMENES_PEQUENOS = dict(empleados=50, herramientas=30, categorias=5, prestamos=2000)
+
+
+def _contenido(engine):
+    with Session(engine) as session:
+        prestamos = session.exec(select(Prestamo).order_by(Prestamo.id_prestamo)).all()
+        herramientas = session.exec(select(Herramienta).order_by(Herramienta.id_herramienta)).all()
+        return (
+            [(p.id_empleado_h, p.id_herramienta_h, p.fecha_prestamo, p.estado) for p in prestamos],
+            [h.cantidad_disponible for h in herramientas],
+        )
+
+
+def test_generador_es_determinista():
+    a = create_engine("sqlite://")
+    b = create_engine("sqlite://")
+    generar_datos(a, **VOLUMENES_PEQUENOS)
+    generar_datos(b, **VOLUMENES_PEQUENOS)
+    assert _contenido(a) == _contenido(b)
+
+
+def test_generador_mantiene_stock_coherente(engine):
+    generar_datos(engine, **VOLUMENES_PEQUENOS)
+    with Session(engine) as session:
+        estados = dict(session.exec(select(Prestamo.estado, func.count()).group_by(Prestamo.estado)).all())
+        negativos = session.exec(
+            select(func.count()).select_from(Herramienta).where(Herramienta.cantidad_disponible < 0)
+        ).one()
+
+    assert sum(estados.values()) == VOLUMENES_PEQUENOS["prestamos"]
+    assert set(estados) <= {"activo", "devuelto", "cancelado"}
+    assert estados["devuelto"] > estados.get("activo", 0)
+    assert negativos == 0
+
+
+def test_benchmarks_cubren_todo_app_crud(engine):
+    generar_datos(engine, **VOLUMENES_PEQUENOS)
+    documento = ejecutar(engine, iteraciones=1)
+
+    assert set(documento["resultados"]) == set(crud.__all__)
+    assert documento["metadatos"]["volumenes"]["prestamos"] >= VOLUMENES_PEQUENOS["prestamos"]
+
+
+def test_comparar_detecta_regresiones():
+    base = {"resultados": {"a": {"mediana_ms": 1.0}, "b": {"mediana_ms": 1.0}}}
+    nuevo = {"resultados": {"a": {"mediana_ms": 1.1}, "b": {"mediana_ms": 2.0}}}
+    assert comparar(base, nuevo, umbral=0.2) == ["b"]
+
+
+def test_carga_streamlit_reporta_latencias_y_pool():
+    from sqlmodel import SQLModel
+    from app.database.config import engine as engine_app
+    from tests.perf.carga_streamlit import ejecutar_carga
+
+    SQLModel.metadata.create_all(engine_app)
+    reporte = ejecutar_carga(sesiones=2, iteraciones=1, duracion=60, flujos=["dashboard"])
+
+    assert reporte["interacciones"]["inicio.cargar"]["n"] == 2
+    assert reporte["errores"] == {}
+    assert reporte["pool"]["checkouts"] > 0
@@ -0,0 +1,106 @@
+"""Tests de las relaciones entre modelos y de las opciones de carga de las listas"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlmodel import Session
+
+from app.crud import (
+    archivar_prestamos,
+    create_categoria,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    delete_categoria,
+    devolver_prestamo,
+    get_categorias,
+    get_empleados,
+    get_prestamos,
+    get_prestamos_activos,
+)
+from app.models.categoria import Categoria
+from app.models.empleado import Empleado
+from app.models.prestamo import Prestamo
+
+
+@pytest.fixture
+def sentencias(engine):
+    registradas = []
+
+    def registrar(conn, cursor, statement, *args):
+        registradas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    yield registradas
+    event.remove(engine, "before_cursor_execute", registrar)
+
+
+@pytest.fixture
+def prestamos(session):
+    categoria = create_categoria(session, nombre="Manuales")
+    herramientas = [
+        create_herramienta(session, f"H{i}", codigo_interno=f"H-{i:04d}", cantidad_disponible=5, categoria=categoria.id_categoria)
+        for i in range(4)
+    ]
+    empleados = [create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras") for i in range(5)]
+    for i, empleado in enumerate(empleados):
+        create_prestamo(session, empleado.id, herramientas[i % 4].id_herramienta)
+    return categoria.id_categoria
+
+
+def test_acceso_perezoso_falla_en_los_tests(engine, prestamos):
+    with Session(engine) as session:
+        prestamo = get_prestamos_activos(session)[0]
+        # Los tests corren con CARGA_RELACIONES=raise_on_sql: sin opción de carga
+        # el acceso que haría una consulta por préstamo falla
+        with pytest.raises(InvalidRequestError):
+            prestamo.empleado
+        # raiseload también se puede pedir explícitamente
+        empleado = get_empleados(session, opciones_carga=(raiseload(Empleado.prestamos),))[0]
+        with pytest.raises(InvalidRequestError):
+            empleado.prestamos
+
+
+@pytest.mark.parametrize("opcion, consultas", [
+    (selectinload, 3),  # Préstamos, y una consulta por relación para todos a la vez
+    (joinedload, 1),  # Todo en la misma consulta
+])
+def test_carga_sin_n_mas_1(engine, prestamos, sentencias, opcion, consultas):
+    with Session(engine) as session:
+        sentencias.clear()
+        activos = get_prestamos_activos(
+            session, opciones_carga=(opcion(Prestamo.empleado), opcion(Prestamo.herramienta))
+        )
+        nombres = [(p.empleado.nombre, p.herramienta.nombre) for p in activos]
+
+    assert len(nombres) == 5 and nombres[0] == ("E0", "H0")
+    assert len(sentencias) == consultas
+
+
+def test_opciones_sobre_la_union_con_el_archivo(engine, session, prestamos):
+    hace_un_ano = datetime.now() - timedelta(days=365)
+    empleado_id = get_prestamos_activos(session)[0].id_empleado_h
+    herramienta_id = get_prestamos_activos(session)[0].id_herramienta_h
+    viejo = create_prestamo(session, empleado_id, herramienta_id, hace_un_ano, hace_un_ano + timedelta(days=1))
+    devolver_prestamo(session, viejo.id_prestamo, hace_un_ano + timedelta(days=1))
+    assert archivar_prestamos(session, antiguedad_dias=180) == 1
+
+    with Session(engine) as otra:
+        historia = get_prestamos(
+            otra, limit=None, desde=hace_un_ano - timedelta(days=1),
+            opciones_carga=(lambda P: selectinload(P.empleado),),
+        )
+        assert len(historia) == 6
+        assert {p.empleado.nombre for p in historia} == {"E0", "E1", "E2", "E3", "E4"}
+
+
+def test_herramientas_de_una_categoria(engine, prestamos):
+    with Session(engine) as session:
+        categoria, = get_categorias(session, opciones_carga=(selectinload(Categoria.herramientas),))
+        assert sorted(h.nombre for h in categoria.herramientas) == ["H0", "H1", "H2", "H3"]
+
+    # Borrar la categoría no carga sus herramientas (no falla con raise_on_sql)
+    with Session(engine) as session:
+        assert delete_categoria(session, prestamos)
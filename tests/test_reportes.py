@@ -0,0 +1,103 @@
+"""Tests de las agregaciones de la página de Relatórios"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app.crud import (
+    archivar_prestamos,
+    create_empleado,
+    create_herramienta,
+    get_empleados_mas_activos,
+    get_estadisticas_generales,
+    get_herramientas_mas_solicitadas,
+    inhabilitar_empleado,
+    inhabilitar_herramienta,
+)
+from app.models.prestamo import Prestamo
+
+
+@pytest.fixture
+def sentencias(engine):
+    registradas = []
+
+    def registrar(conn, cursor, statement, *args):
+        registradas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    yield registradas
+    event.remove(engine, "before_cursor_execute", registrar)
+
+
+def _historia(session):
+    """Más de cien préstamos (el antiguo límite de get_prestamos), una parte archivada"""
+    empleados = [
+        create_empleado(session, nombre=f"Empleado{i}", apellido="Silva", area="Obras").id for i in range(4)
+    ]
+    herramientas = [
+        create_herramienta(session, f"Herramienta{i}", codigo_interno=f"HER-{i:04d}").id_herramienta
+        for i in range(6)
+    ]
+    hace_un_ano = datetime.now() - timedelta(days=365)
+    filas = []
+    for i in range(240):
+        fecha = hace_un_ano + timedelta(days=i)
+        filas.append({
+            "id_empleado_h": empleados[i % 7 % 4],
+            "id_herramienta_h": herramientas[i % 11 % 6],
+            "fecha_prestamo": fecha,
+            "fecha_devolucion_estimada": fecha + timedelta(days=3),
+            "fecha_devolucion": fecha + timedelta(days=1) if i % 3 else None,
+            "estado": "devuelto" if i % 3 else ("cancelado" if i % 2 else "activo"),
+        })
+    session.execute(insert(Prestamo), filas)
+    session.commit()
+    assert archivar_prestamos(session, antiguedad_dias=180) > 0
+    return empleados, herramientas, filas
+
+
+def test_rankings_cuentan_toda_la_historia(session, sentencias):
+    empleados, herramientas, filas = _historia(session)
+    por_herramienta = Counter(f["id_herramienta_h"] for f in filas)
+    por_empleado = Counter(f["id_empleado_h"] for f in filas)
+    sentencias.clear()
+
+    top = get_herramientas_mas_solicitadas(session, top_n=3)
+    assert [(h["herramienta"].id_herramienta, h["prestamos"]) for h in top] == sorted(
+        por_herramienta.items(), key=lambda x: (-x[1], x[0])
+    )[:3]
+    pidieron = {}
+    for f in filas:
+        nombre = f"Empleado{empleados.index(f['id_empleado_h'])} Silva"
+        pidieron.setdefault(f["id_herramienta_h"], set()).add(nombre)
+    assert all(h["empleados"] == sorted(pidieron[h["herramienta"].id_herramienta]) for h in top)
+    # Archivo en uso, ranking, herramientas y empleados: una consulta cada uno,
+    # sin importar el top ni la cantidad de préstamos
+    assert len(sentencias) == 4
+
+    activos = get_empleados_mas_activos(session, top_n=10)
+    assert [(e["empleado"].id, e["prestamos"]) for e in activos] == sorted(
+        por_empleado.items(), key=lambda x: (-x[1], x[0])
+    )
+
+
+def test_estadisticas_generales(session):
+    empleados, herramientas, filas = _historia(session)
+    inhabilitar_empleado(session, empleados[0])
+    inhabilitar_herramienta(session, herramientas[0])
+    estados = Counter(f["estado"] for f in filas)
+
+    stats = get_estadisticas_generales(session)
+    assert stats == {
+        "total_prestamos": len(filas),
+        "prestamos_activos": estados["activo"],
+        "prestamos_vencidos": estados["activo"],  # todos con fecha estimada pasada
+        "prestamos_devueltos": estados["devuelto"],
+        "prestamos_cancelados": estados["cancelado"],
+        "total_empleados": 4,
+        "empleados_activos": 3,
+        "total_herramientas": 6,
+        "herramientas_activas": 5,
+        "herramientas_disponibles": 6,
+    }
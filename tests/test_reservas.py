@@ -0,0 +1,147 @@
+"""Tests de las reservas de herramientas y de la agenda de unidades comprometidas"""
+import random
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, create_engine
+
+from app.crud import (
+    buscar_reservas,
+    cancelar_reserva,
+    create_empleado,
+    create_herramienta,
+    create_prestamo,
+    create_reserva,
+    devolver_prestamo,
+    get_reserva_by_id,
+    unidades_libres,
+)
+from app.crud.agenda import Agenda, recargar_agenda
+from app.database.migraciones import migrar
+
+
+def _datos(session, unidades=2):
+    ana = create_empleado(session, nombre="Ana", apellido="Lima", area="Obras")
+    juan = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    herramienta = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=unidades)
+    return ana, juan, herramienta
+
+
+def test_agenda_coincide_con_recorrido_completo():
+    rng = random.Random(7)
+    base = datetime(2030, 1, 1)
+    agenda = Agenda()
+    compromisos = {}
+    for paso in range(400):
+        clave = rng.randrange(60)
+        if rng.random() < 0.3:
+            agenda.quitar(clave)
+            compromisos.pop(clave, None)
+        else:
+            inicio = base + timedelta(hours=rng.randrange(200))
+            fin = inicio + timedelta(hours=rng.randrange(1, 48))
+            cantidad = rng.randrange(1, 4)
+            agenda.agregar(clave, inicio, fin, cantidad)
+            compromisos[clave] = (inicio, fin, cantidad)
+
+        desde = base + timedelta(hours=rng.randrange(220))
+        hasta = desde + timedelta(hours=rng.randrange(1, 72))
+        instantes = {desde} | {i for i, _, _ in compromisos.values() if desde <= i < hasta}
+        esperado = max(
+            sum(c for i, f, c in compromisos.values() if i <= t < f) for t in instantes
+        )
+        assert agenda.ocupadas(desde, hasta, ahora=base) == esperado
+
+
+def test_prestamo_vencido_ocupa_hasta_que_se_devuelve():
+    ahora = datetime(2030, 1, 10)
+    agenda = Agenda()
+    agenda.agregar(("prestamo", 1), datetime(2030, 1, 1), datetime(2030, 1, 5), es_prestamo=True)
+    assert agenda.ocupadas(datetime(2030, 2, 1), datetime(2030, 2, 2), ahora=ahora) == 1
+    agenda.quitar(("prestamo", 1))
+    assert agenda.ocupadas(datetime(2030, 2, 1), datetime(2030, 2, 2), ahora=ahora) == 0
+
+
+def test_reservas_no_superan_las_unidades(session):
+    ana, juan, herramienta = _datos(session)
+    manana = datetime.now() + timedelta(days=1)
+
+    assert create_reserva(session, ana.id, herramienta.id_herramienta, manana, manana + timedelta(days=2), cantidad=2)
+    assert unidades_libres(session, herramienta.id_herramienta, manana, manana + timedelta(days=1)) == 0
+    # Período solapado: no quedan unidades; después del fin de la reserva sí
+    assert create_reserva(session, juan.id, herramienta.id_herramienta, manana + timedelta(days=1), manana + timedelta(days=3)) is None
+    assert create_reserva(session, juan.id, herramienta.id_herramienta, manana + timedelta(days=2), manana + timedelta(days=3))
+    assert unidades_libres(session, herramienta.id_herramienta, manana + timedelta(days=2), manana + timedelta(days=3)) == 1
+
+
+def test_prestamo_no_rompe_una_reserva_ajena(session):
+    ana, juan, herramienta = _datos(session, unidades=1)
+    ahora = datetime.now()
+    reserva = create_reserva(session, ana.id, herramienta.id_herramienta, ahora + timedelta(days=2), ahora + timedelta(days=4))
+
+    # Un préstamo que se devuelve antes de la reserva se permite
+    corto = create_prestamo(session, juan.id, herramienta.id_herramienta, fecha_devolucion_estimada=ahora + timedelta(days=1))
+    assert corto is not None
+    devolver_prestamo(session, corto.id_prestamo)
+
+    # Uno que la pisa se rechaza sin tocar el stock
+    assert create_prestamo(session, juan.id, herramienta.id_herramienta, fecha_devolucion_estimada=ahora + timedelta(days=3)) is None
+    session.refresh(herramienta)
+    assert (herramienta.cantidad_disponible, herramienta.unidades_prestadas) == (1, 0)
+
+    # El dueño de la reserva sí puede retirarla, y la reserva queda cumplida
+    propio = create_prestamo(session, ana.id, herramienta.id_herramienta, fecha_devolucion_estimada=ahora + timedelta(days=3))
+    assert propio is not None
+    assert get_reserva_by_id(session, reserva.id_reserva).estado == "cumplida"
+
+
+def test_agenda_en_memoria_sigue_los_commits(session):
+    ana, juan, herramienta = _datos(session)
+    inicio = datetime.now() + timedelta(days=5)
+    fin = inicio + timedelta(days=1)
+    assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 2  # construye la agenda
+
+    reserva = create_reserva(session, ana.id, herramienta.id_herramienta, inicio, fin)
+    prestamo = create_prestamo(session, juan.id, herramienta.id_herramienta, fecha_devolucion_estimada=fin)
+    assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 0
+
+    cancelar_reserva(session, reserva.id_reserva)
+    devolver_prestamo(session, prestamo.id_prestamo)
+    assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 2
+    assert not cancelar_reserva(session, reserva.id_reserva)
+
+    recargar_agenda(session)
+    assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 2
+
+
+def test_buscar_reservas_por_estado(session):
+    ana, juan, herramienta = _datos(session)
+    manana = datetime.now() + timedelta(days=1)
+    activa = create_reserva(session, ana.id, herramienta.id_herramienta, manana, manana + timedelta(days=1))
+    cancelada = create_reserva(session, juan.id, herramienta.id_herramienta, manana, manana + timedelta(days=1))
+    cancelar_reserva(session, cancelada.id_reserva)
+
+    filas, total = buscar_reservas(session, estado="activa")
+    assert total == 1 and filas[0][0].id_reserva == activa.id_reserva
+    assert filas[0][1].nombre == "Ana" and filas[0][2].nombre == "Taladro"
+    assert buscar_reservas(session, estado=None)[1] == 2
+
+
+def test_agenda_incorpora_los_cambios_de_otro_proceso(tmp_path):
+    # Dos motores sobre la misma base: los commits de uno no pasan por las sesiones del otro
+    url = f"sqlite:///{tmp_path / 'compartida.db'}"
+    aplicacion, otro_proceso = create_engine(url), create_engine(url)
+    migrar(aplicacion)
+    with Session(aplicacion) as session, Session(otro_proceso) as otra:
+        ana, juan, herramienta = _datos(otra)
+        inicio = datetime.now() + timedelta(days=5)
+        fin = inicio + timedelta(days=1)
+        assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 2
+
+        reserva = create_reserva(otra, ana.id, herramienta.id_herramienta, inicio, fin)
+        create_prestamo(otra, juan.id, herramienta.id_herramienta, fecha_devolucion_estimada=fin)
+        assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 0
+
+        cancelar_reserva(otra, reserva.id_reserva)
+        assert unidades_libres(session, herramienta.id_herramienta, inicio, fin) == 1
+    aplicacion.dispose()
+    otro_proceso.dispose()
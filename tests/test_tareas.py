@@ -0,0 +1,151 @@
+"""Tests de la cola de tareas en segundo plano"""
+import threading
+import time
+
+import pytest
+from sqlmodel import Session, create_engine
+
+from app.crud import create_empleado, create_herramienta, create_prestamo, get_prestamo_by_id
+from app.crud.auditoria import get_eventos_auditoria
+from app.database.migraciones import migrar
+from app import tareas
+from app.tareas import PoolTareas, cancelar_tarea, encolar_tarea, get_tarea, tipo_tarea
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Base en archivo: los trabajadores usan sus propias conexiones desde otros hilos"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'tareas.db'}", connect_args={"check_same_thread": False})
+    migrar(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def pool(engine):
+    pools = []
+
+    def iniciar(trabajadores=1):
+        pools.append(PoolTareas(engine, trabajadores).iniciar())
+
+    yield iniciar
+    for p in pools:
+        p.detener(timeout=5)
+
+
+@pytest.fixture(autouse=True)
+def avance_inmediato(monkeypatch):
+    monkeypatch.setattr(tareas, "INTERVALO_AVANCE_SEGUNDOS", 0)
+
+
+def esperar(session, tarea, estados=("terminada", "fallida", "cancelada"), timeout=10):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        session.refresh(tarea)
+        if tarea.estado in estados:
+            return tarea
+        time.sleep(0.02)
+    raise AssertionError(f"la tarea quedó en {tarea.estado}")
+
+
+@tipo_tarea("prueba_pasos")
+def _pasos(session, avance, pasos, pausa=0.0):
+    for i in range(pasos):
+        avance(i / pasos, f"paso {i}")
+        time.sleep(pausa)
+    return {"pasos": pasos}
+
+
+@tipo_tarea("prueba_falla")
+def _falla(session, avance):
+    raise RuntimeError("sin conexión")
+
+
+_barrera = threading.Barrier(2, timeout=5)
+
+
+@tipo_tarea("prueba_barrera")
+def _esperar_otra(session, avance):
+    _barrera.wait()
+    return {}
+
+
+def test_progreso_y_resultado(session, pool):
+    tarea = encolar_tarea(session, "prueba_pasos", pasos=3)
+    assert (tarea.estado, tarea.progreso) == ("pendiente", 0)
+
+    pool()
+    esperar(session, tarea)
+
+    assert (tarea.estado, tarea.progreso, tarea.resultado) == ("terminada", 1, {"pasos": 3})
+    assert tarea.mensaje == "paso 2"
+    assert tarea.fecha_inicio <= tarea.fecha_fin
+
+
+def test_cancelar_pendiente_y_en_curso(session, pool):
+    en_curso = encolar_tarea(session, "prueba_pasos", pasos=1000, pausa=0.01)
+    pendiente = encolar_tarea(session, "prueba_pasos", pasos=1)
+    pool()
+    esperar(session, en_curso, estados=("en_curso",))
+    while en_curso.progreso == 0:  # Que haya avanzado al menos un paso antes de cancelar
+        time.sleep(0.02)
+        session.refresh(en_curso)
+
+    assert cancelar_tarea(session, pendiente.id_tarea)
+    assert cancelar_tarea(session, en_curso.id_tarea)
+
+    assert esperar(session, en_curso).estado == "cancelada"
+    assert 0 < en_curso.progreso < 1
+    assert get_tarea(session, pendiente.id_tarea).estado == "cancelada"
+    assert pendiente.fecha_inicio is None
+    # Ya terminadas: no hay nada que cancelar
+    assert not cancelar_tarea(session, en_curso.id_tarea)
+
+
+def test_tarea_fallida(session, pool):
+    fallida = encolar_tarea(session, "prueba_falla")
+    siguiente = encolar_tarea(session, "prueba_pasos", pasos=1)
+    pool()
+
+    assert esperar(session, fallida).estado == "fallida"
+    assert fallida.error == "sin conexión"
+    # El trabajador sigue con la siguiente
+    assert esperar(session, siguiente).estado == "terminada"
+    with pytest.raises(Exception, match="tipo de tarea desconocido"):
+        encolar_tarea(session, "no_existe")
+
+
+def test_trabajadores_en_paralelo(session, pool):
+    # Cada tarea espera a la otra: solo terminan si corren a la vez
+    primera = encolar_tarea(session, "prueba_barrera")
+    segunda = encolar_tarea(session, "prueba_barrera")
+    pool(trabajadores=2)
+
+    assert esperar(session, primera).estado == "terminada"
+    assert esperar(session, segunda).estado == "terminada"
+    assert primera.trabajador != segunda.trabajador
+
+
+def test_devolver_prestamos_de_un_empleado(session, pool):
+    juan = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    ana = create_empleado(session, nombre="Ana", apellido="Gomez", area="Taller")
+    herramienta = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=10)
+    de_juan = [create_prestamo(session, juan.id, herramienta.id_herramienta) for _ in range(4)]
+    de_ana = create_prestamo(session, ana.id, herramienta.id_herramienta)
+
+    session.info["actor"] = "supervisor"
+    tarea = encolar_tarea(session, "devolver_prestamos", empleado_id=juan.id)
+    pool()
+
+    assert esperar(session, tarea).resultado == {"devueltos": 4, "errores": []}
+    session.expire_all()
+    assert {get_prestamo_by_id(session, p.id_prestamo).estado for p in de_juan} == {"devuelto"}
+    assert get_prestamo_by_id(session, de_ana.id_prestamo).estado == "activo"
+    # Los cambios quedan a nombre de quien encoló la tarea
+    assert get_eventos_auditoria(session, "prestamo", de_juan[0].id_prestamo)[0].actor == "supervisor"
@@ -0,0 +1,103 @@
+"""Tests del registro de ejecuciones lentas de las páginas"""
+import json
+
+import pytest
+from sqlmodel import select
+
+from app.crud import create_empleado, get_empleados
+from app.models.empleado import Empleado
+from frontend import trazas
+from frontend.trazas import resumir, tramo, trazar_pagina
+
+
+@pytest.fixture
+def archivo(tmp_path, monkeypatch):
+    archivo = tmp_path / "trazas.jsonl"
+    monkeypatch.setattr(trazas, "ARCHIVO_TRAZAS", str(archivo))
+    monkeypatch.setattr(trazas, "UMBRAL_MS", 0)
+    return archivo
+
+
+def _pagina(session):
+    @tramo
+    def render_alta():
+        for i in range(3):
+            create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras")
+
+    @tramo
+    def render_lista():
+        return len(get_empleados(session))
+
+    @trazar_pagina("Funcionarios")
+    def main():
+        render_alta()
+        return render_lista()
+
+    return main
+
+
+def test_arbol_de_tramos_con_sentencias_y_filas(session, archivo):
+    assert _pagina(session)() == 3
+
+    ejecucion = json.loads(archivo.read_text())
+    assert (ejecucion["pagina"], ejecucion["nombre"]) == ("Funcionarios", "main")
+    alta, lista = ejecucion["tramos"]
+    assert (alta["nombre"], lista["nombre"]) == ("render_alta", "render_lista")
+    assert lista["filas"] == 3 and lista["sentencias"] >= 1
+    assert alta["filas"] >= 3  # Al menos los INSERT de los tres empleados
+    # La raíz suma sus subtramos
+    assert ejecucion["sentencias"] == alta["sentencias"] + lista["sentencias"]
+    assert ejecucion["duracion_ms"] >= alta["duracion_ms"] + lista["duracion_ms"]
+
+
+def test_solo_se_registran_las_ejecuciones_lentas(session, archivo, monkeypatch):
+    monkeypatch.setattr(trazas, "UMBRAL_MS", 60_000)
+    _pagina(session)()
+    assert not archivo.exists()
+
+    # Un tramo sin página abierta (fragmento que se vuelve a ejecutar) es su propia raíz
+    monkeypatch.setattr(trazas, "UMBRAL_MS", 0)
+    with pytest.raises(RuntimeError):
+        tramo(lambda: (_ for _ in ()).throw(RuntimeError("x")))()
+    ejecucion = json.loads(archivo.read_text())
+    assert (ejecucion["pagina"], ejecucion["error"]) == (None, "RuntimeError")
+
+
+def test_resumen_ordena_por_tiempo_propio():
+    def ejecucion(lista_ms, detalle_ms):
+        return json.dumps({
+            "pagina": "Ferramentas", "nombre": "main", "duracion_ms": lista_ms + 5, "sentencias": 4, "filas": 40,
+            "tramos": [{
+                "nombre": "render_lista", "duracion_ms": lista_ms, "sentencias": 4, "filas": 40,
+                "tramos": [{"nombre": "render_detalle", "duracion_ms": detalle_ms, "sentencias": 3, "filas": 30}],
+            }],
+        })
+
+    resumen = resumir([ejecucion(1000, 900), ejecucion(2000, 1900), ""], top=2)
+
+    assert [f["ruta"] for f in resumen] == ["main > render_lista > render_detalle", "main > render_lista"]
+    assert resumen[0]["n"] == 2 and resumen[0]["propio_total_ms"] == 2800
+    assert resumen[0]["max_ms"] == 1900 and resumen[0]["sentencias"] == 3
+    assert resumen[1]["propio_total_ms"] == 200
+
+
+def test_filas_contadas_al_consumirlas(session, archivo):
+    for i in range(5):
+        create_empleado(session, nombre=f"E{i}", apellido="X", area="Obras")
+
+    @tramo
+    def render_primero():
+        # Sin copiar el resultado: solo cuenta la fila que se leyó
+        return session.exec(select(Empleado)).first()
+
+    @tramo
+    def render_iterar():
+        return sum(1 for _ in session.exec(select(Empleado.id)))
+
+    @trazar_pagina("Funcionarios")
+    def main():
+        return render_primero().nombre, render_iterar()
+
+    assert main() == ("E0", 5)
+    primero, iterar = json.loads(archivo.read_text())["tramos"]
+    assert (primero["filas"], iterar["filas"]) == (1, 5)
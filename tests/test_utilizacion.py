@@ -0,0 +1,104 @@
+"""Tests de la utilización de herramientas"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app.crud import archivar_prestamos, create_empleado, create_herramienta, get_utilizacion_herramientas
+from app.models.prestamo import Prestamo
+
+DIA = timedelta(days=1)
+INICIO = datetime(2025, 3, 1)
+FIN = INICIO + 10 * DIA
+
+
+def _prestamos(session, empleado_id, filas):
+    """Insertar préstamos (herramienta, inicio, fin o None, estado) con fechas fijas"""
+    session.execute(insert(Prestamo), [
+        {
+            "id_empleado_h": empleado_id,
+            "id_herramienta_h": herramienta,
+            "fecha_prestamo": inicio,
+            "fecha_devolucion_estimada": inicio + DIA,
+            "fecha_devolucion": fin,
+            "estado": estado,
+        }
+        for herramienta, inicio, fin, estado in filas
+    ])
+    session.commit()
+
+
+def test_utilizacion_pico_y_dias_ociosos(session):
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    taladro = create_herramienta(session, "Taladro", codigo_interno="TAL-0001", cantidad_disponible=2)
+    sierra = create_herramienta(session, "Sierra", codigo_interno="SIE-0001", cantidad_disponible=1)
+    martillo = create_herramienta(session, "Martillo", codigo_interno="MAR-0001", cantidad_disponible=1)
+    _prestamos(session, empleado.id, [
+        (taladro.id_herramienta, INICIO, INICIO + 2 * DIA, "devuelto"),
+        (taladro.id_herramienta, INICIO + 1.5 * DIA, INICIO + 1.75 * DIA, "devuelto"),
+        # Empieza justo cuando termina el primero: no se suma al pico
+        (taladro.id_herramienta, INICIO + 2 * DIA, INICIO + 3 * DIA, "devuelto"),
+        (taladro.id_herramienta, INICIO + DIA, INICIO + 9 * DIA, "cancelado"),
+        # Empezó antes del período y sigue activo: cuenta desde el inicio hasta el fin
+        (sierra.id_herramienta, INICIO - 5 * DIA, None, "activo"),
+    ])
+
+    resultado = get_utilizacion_herramientas(session, INICIO, FIN)
+    filas = {f["codigo_interno"]: f for f in resultado["herramientas"]}
+
+    assert resultado["dias"] == 10 and resultado["prestamos"] == 4
+    assert filas["TAL-0001"]["pico"] == 2
+    assert filas["TAL-0001"]["horas_prestadas"] == 78
+    assert filas["TAL-0001"]["utilizacion"] == pytest.approx(78 / (2 * 240))
+    assert filas["TAL-0001"]["dias_ociosos"] == 7
+    assert (filas["SIE-0001"]["utilizacion"], filas["SIE-0001"]["dias_ociosos"]) == (1.0, 0)
+    # Sin préstamos: aparece igual, ociosa todo el período
+    assert filas["MAR-0001"]["id_herramienta"] == martillo.id_herramienta
+    assert (filas["MAR-0001"]["utilizacion"], filas["MAR-0001"]["pico"], filas["MAR-0001"]["dias_ociosos"]) == (0.0, 0, 10)
+    assert [f["codigo_interno"] for f in resultado["herramientas"]] == ["SIE-0001", "TAL-0001", "MAR-0001"]
+    assert resultado["pico"] == 3
+    assert [d["unidades_prestadas"] for d in resultado["diaria"][:4]] == [2.0, 2.25, 2.0, 1.0]
+
+
+def test_coincide_con_el_calculo_directo(session):
+    rng = random.Random(7)
+    empleado = create_empleado(session, nombre="Juan", apellido="Perez", area="Obras")
+    ids = [
+        create_herramienta(session, f"H{i}", codigo_interno=f"H-{i:04d}", cantidad_disponible=3).id_herramienta
+        for i in range(6)
+    ]
+    filas = []
+    for _ in range(300):
+        inicio = INICIO + timedelta(minutes=rng.randrange(-3 * 1440, 12 * 1440))
+        fin = inicio + timedelta(minutes=rng.randrange(1, 3 * 1440))
+        filas.append((rng.choice(ids), inicio, fin, "devuelto"))
+    _prestamos(session, empleado.id, filas)
+    # Parte de la historia en el archivo: se lee igual
+    archivar_prestamos(session, antiguedad_dias=(datetime.now() - INICIO).days)
+
+    resultado = get_utilizacion_herramientas(session, INICIO, FIN)
+    por_id = {f["id_herramienta"]: f for f in resultado["herramientas"]}
+
+    minutos = int((FIN - INICIO).total_seconds() // 60)
+    flota = [0] * minutos
+    for herramienta in ids:
+        # Unidades prestadas minuto a minuto (las fechas generadas caen en minutos exactos)
+        ocupacion = [0] * minutos
+        for h, inicio, fin, _ in filas:
+            if h != herramienta:
+                continue
+            desde = max(0, int((inicio - INICIO).total_seconds() // 60))
+            hasta = min(minutos, int((fin - INICIO).total_seconds() // 60))
+            for m in range(desde, hasta):
+                ocupacion[m] += 1
+                flota[m] += 1
+        fila = por_id[herramienta]
+        assert fila["pico"] == max(ocupacion)
+        assert fila["horas_prestadas"] == round(sum(ocupacion) / 60, 1)
+        dias_ocupados = {m // 1440 for m, n in enumerate(ocupacion) if n}
+        assert fila["dias_ociosos"] == 10 - len(dias_ocupados)
+    assert resultado["pico"] == max(flota)
+    assert [d["unidades_prestadas"] for d in resultado["diaria"]] == [
+        round(sum(flota[d * 1440:(d + 1) * 1440]) / 1440, 2) for d in range(10)
+    ]